@@ -0,0 +1,106 @@
+"""
+Índice local de aeropuertos para validar códigos IATA sin llamar a la API
+
+Si existe el CSV de OurAirports (https://ourairports.com/data/airports.csv,
+ruta en AIRPORTS_CSV o `data/airports.csv`) se cargan los aeropuertos con
+código IATA. Si no está, la validación se limita al formato (tres letras) y
+cualquier código inventado pasa: se avisa en cada carga salvo que se acepte
+explícitamente con AIRPORTS_FORMAT_ONLY=1.
+"""
+
+import csv
+import os
+import re
+from typing import Dict, Optional
+
+IATA_PATTERN = re.compile(r'^[A-Z]{3}$')
+
+DEFAULT_AIRPORTS_CSV = os.path.join('data', 'airports.csv')
+
+# Acepta validar solo el formato cuando falta el CSV (sin advertencia)
+FORMAT_ONLY_ENV = 'AIRPORTS_FORMAT_ONLY'
+
+# Tipos de OurAirports que reciben vuelos comerciales
+AIRPORT_TYPES = ('large_airport', 'medium_airport', 'small_airport')
+
+
+class AirportIndex:
+    """Índice en memoria de aeropuertos por código IATA"""
+    
+    def __init__(self, airports: Optional[Dict[str, Dict]] = None, source: str = 'formato'):
+        """
+        Inicializa el índice
+        
+        Args:
+            airports: Diccionario código IATA → datos del aeropuerto (None
+                valida solo el formato del código)
+            source: Descripción del origen de los datos
+        """
+        self.airports = airports
+        self.source = source
+    
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'AirportIndex':
+        """
+        Carga el índice desde el CSV de OurAirports si existe
+        
+        Args:
+            path: Ruta del CSV (default AIRPORTS_CSV o data/airports.csv)
+        
+        Returns:
+            Índice con los aeropuertos del CSV, o de solo formato si no hay archivo
+        """
+        path = path or os.getenv('AIRPORTS_CSV', DEFAULT_AIRPORTS_CSV)
+        if not os.path.exists(path):
+            if os.getenv(FORMAT_ONLY_ENV, '0').lower() in ('1', 'true'):
+                return cls(source=f'formato ({FORMAT_ONLY_ENV}=1)')
+            print(f"⚠️  ÍNDICE DE AEROPUERTOS NO ENCONTRADO ({path}): solo se valida el formato "
+                  f"IATA y se aceptan códigos inexistentes. Descarga "
+                  f"https://ourairports.com/data/airports.csv en esa ruta o define "
+                  f"{FORMAT_ONLY_ENV}=1 para aceptar la validación por formato.")
+            return cls(source=f'formato (falta {path})')
+        
+        airports = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                code = (row.get('iata_code') or '').strip().upper()
+                if not IATA_PATTERN.match(code) or row.get('type') not in AIRPORT_TYPES:
+                    continue
+                airports[code] = {
+                    'iata_code': code,
+                    'name': row.get('name'),
+                    'city': row.get('municipality'),
+                    'country': row.get('iso_country'),
+                    'type': row.get('type')
+                }
+        
+        return cls(airports, source=path)
+    
+    def is_valid(self, code: str) -> bool:
+        """
+        Indica si un código IATA es válido
+        
+        Args:
+            code: Código a validar (se normaliza a mayúsculas)
+        
+        Returns:
+            True si tiene formato IATA y, con CSV cargado, existe en el índice
+        """
+        code = (code or '').strip().upper()
+        if not IATA_PATTERN.match(code):
+            return False
+        return self.airports is None or code in self.airports
+    
+    def get(self, code: str) -> Optional[Dict]:
+        """
+        Obtiene los datos de un aeropuerto
+        
+        Returns:
+            Diccionario con iata_code, name, city, country y type, o None
+        """
+        if self.airports is None:
+            return None
+        return self.airports.get((code or '').strip().upper())
+    
+    def __len__(self) -> int:
+        return len(self.airports) if self.airports is not None else 0
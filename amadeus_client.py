@@ -1,24 +1,41 @@
 import requests
 import json
+import threading
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from api_quota import RateLimiter
+
+
+class AmadeusAPIError(Exception):
+    """Error de una llamada a la API con el código HTTP de la respuesta (None si no hubo)"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 class AmadeusClient:
     """Cliente para interactuar con la API de Amadeus"""
     
-    def __init__(self, api_key: str, api_secret: str):
+    def __init__(self, api_key: str, api_secret: str, rate_limiter: Optional[RateLimiter] = None):
         """
         Inicializa el cliente de Amadeus
         
         Args:
             api_key: API Key de Amadeus
             api_secret: API Secret de Amadeus
+            rate_limiter: Límite de llamadas por segundo (compartirlo entre
+                los clientes de un mismo proceso; ver `api_quota.py`)
         """
         self.api_key = api_key
         self.api_secret = api_secret
         self.base_url = "https://test.api.amadeus.com"
         self.access_token = None
         self.token_expiry = None
+        self.rate_limiter = rate_limiter
+        # Los fetchers del pipeline del monitor comparten el cliente entre hilos
+        self._token_lock = threading.Lock()
         self._authenticate()
     
     def _authenticate(self):
@@ -58,9 +75,12 @@ class AmadeusClient:
         return datetime.now().timestamp() < (self.token_expiry - 60)
     
     def _ensure_authenticated(self):
-        """Asegura que haya un token válido"""
-        if not self._is_token_valid():
-            self._authenticate()
+        """Asegura que haya un token válido (una sola renovación entre hilos)"""
+        if self._is_token_valid():
+            return
+        with self._token_lock:
+            if not self._is_token_valid():
+                self._authenticate()
     
     def search_flights(
         self,
@@ -85,6 +105,29 @@ class AmadeusClient:
         Returns:
             Lista de diccionarios con ofertas de vuelos
         """
+        return self.process_flight_offers(self.search_flights_raw(
+            origin, destination, departure_date, return_date, adults, max_results
+        ))
+    
+    def search_flights_raw(
+        self,
+        origin: str,
+        destination: str,
+        departure_date: str,
+        return_date: Optional[str] = None,
+        adults: int = 1,
+        max_results: int = 10
+    ) -> List[Dict]:
+        """
+        Busca ofertas de vuelos sin procesarlas
+        
+        Separa la llamada a la API del procesamiento para que el pipeline del
+        monitor pueda normalizar en otra etapa mientras sigue buscando.
+        Mismos argumentos que `search_flights`.
+        
+        Returns:
+            Lista de ofertas tal como las devuelve Amadeus
+        """
         self._ensure_authenticated()
         
         search_url = f"{self.base_url}/v2/shopping/flight-offers"
@@ -107,26 +150,38 @@ class AmadeusClient:
             params['returnDate'] = return_date
         
         try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
             response = requests.get(search_url, headers=headers, params=params, timeout=15)
             response.raise_for_status()
             
             data = response.json()
             
-            # Procesar y formatear los resultados
-            offers = []
-            
-            if 'data' in data and len(data['data']) > 0:
-                for offer in data['data']:
-                    processed_offer = self._process_flight_offer(offer)
-                    if processed_offer:
-                        offers.append(processed_offer)
-            
-            return offers
+            return data.get('data') or []
             
         except requests.exceptions.Timeout:
-            raise Exception("Timeout buscando vuelos. La API de Amadeus no respondió a tiempo.")
+            raise AmadeusAPIError("Timeout buscando vuelos. La API de Amadeus no respondió a tiempo.")
         except requests.exceptions.RequestException as e:
-            raise Exception(f"Error buscando vuelos: {str(e)}")
+            status_code = e.response.status_code if e.response is not None else None
+            raise AmadeusAPIError(f"Error buscando vuelos: {str(e)}", status_code)
+    
+    def process_flight_offers(self, raw_offers: List[Dict]) -> List[Dict]:
+        """
+        Procesa y formatea las ofertas crudas de `search_flights_raw`
+        
+        Args:
+            raw_offers: Ofertas tal como las devuelve Amadeus
+        
+        Returns:
+            Lista de diccionarios con ofertas de vuelos (se descartan las que
+            no se pueden procesar)
+        """
+        offers = []
+        for offer in raw_offers:
+            processed_offer = self._process_flight_offer(offer)
+            if processed_offer:
+                offers.append(processed_offer)
+        return offers
     
     def _process_flight_offer(self, offer: Dict) -> Optional[Dict]:
         """
@@ -342,6 +397,8 @@ class AmadeusClient:
         }
         
         try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
             response = requests.get(url, headers=headers, params=params, timeout=10)
             response.raise_for_status()
             
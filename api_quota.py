@@ -0,0 +1,294 @@
+"""
+Cuota de la API de Amadeus: contabilidad, pronóstico y límite por segundo
+
+Amadeus limita las llamadas por mes (AMADEUS_MONTHLY_QUOTA, default 2000 en
+el plan gratuito de Flight Offers Search) y por segundo
+(AMADEUS_MAX_CALLS_PER_SECOND, default 10 en el entorno de prueba). Las
+llamadas se cuentan por día y origen ('monitor' o 'app') en la tabla
+`api_quota_usage`.
+
+- El monitor puede usar como máximo la cuota menos la reserva de la app
+  (AMADEUS_APP_RESERVE, default 20%), repartida en los días que quedan del
+  mes y, dentro de cada día, a lo largo de las horas: una pasada a las 2 de
+  la mañana no gasta lo de todo el día
+- Antes de cada pasada se pronostican sus llamadas y se recortan las
+  búsquedas de menor valor que no entran (quedan vencidas para la próxima),
+  informando cuántas y por qué
+- La app consulta `ApiQuota.status` para mostrar la cuota restante y bloquea
+  las búsquedas reales cuando se agota
+
+Estado de la cuota:
+    python api_quota.py
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MONTHLY_QUOTA = 2000
+DEFAULT_APP_RESERVE = 0.2
+DEFAULT_MAX_CALLS_PER_SECOND = 10.0
+
+# Motivos de recorte de búsquedas
+REASON_PACE = 'ritmo diario'
+REASON_MONTHLY = 'cuota mensual'
+
+
+class RateLimiter:
+    """Espacia las llamadas para no superar un máximo por segundo (seguro entre hilos)"""
+    
+    def __init__(self, max_per_second: float):
+        """
+        Inicializa el limitador
+        
+        Args:
+            max_per_second: Llamadas por segundo permitidas (0 sin límite)
+        """
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0
+    
+    def acquire(self) -> float:
+        """
+        Espera el próximo turno libre
+        
+        Returns:
+            Segundos esperados
+        """
+        if not self.interval:
+            return 0.0
+        
+        # Cada llamada reserva su turno; la espera ocurre fuera del lock
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            wait = slot - now
+            self.waited += wait
+        
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def rate_limiter_from_config(config=None) -> RateLimiter:
+    """Limitador con AMADEUS_MAX_CALLS_PER_SECOND de `config` (default el entorno)"""
+    config = config if config is not None else os.environ
+    return RateLimiter(float(config.get('AMADEUS_MAX_CALLS_PER_SECOND', DEFAULT_MAX_CALLS_PER_SECOND)))
+
+
+class ApiQuota:
+    """Cuota mensual de llamadas a la API compartida entre el monitor y la app"""
+    
+    def __init__(self, db, monthly_limit: int = DEFAULT_MONTHLY_QUOTA,
+                 app_reserve: float = DEFAULT_APP_RESERVE):
+        """
+        Inicializa la cuota
+        
+        Args:
+            db: Instancia de base de datos (con `record_api_calls` y `get_api_usage`)
+            monthly_limit: Llamadas por mes (0 sin límite)
+            app_reserve: Fracción de la cuota reservada para las búsquedas de la app
+        """
+        self.db = db
+        self.monthly_limit = int(monthly_limit)
+        self.app_reserve = min(max(float(app_reserve), 0.0), 1.0)
+    
+    @classmethod
+    def from_config(cls, db, config=None) -> 'ApiQuota':
+        """
+        Crea la cuota desde `st.secrets` o el entorno
+        
+        Args:
+            db: Instancia de base de datos
+            config: Mapeo con AMADEUS_MONTHLY_QUOTA y AMADEUS_APP_RESERVE
+                (default `os.environ`)
+        """
+        config = config if config is not None else os.environ
+        return cls(
+            db,
+            monthly_limit=int(config.get('AMADEUS_MONTHLY_QUOTA', DEFAULT_MONTHLY_QUOTA)),
+            app_reserve=float(config.get('AMADEUS_APP_RESERVE', DEFAULT_APP_RESERVE))
+        )
+    
+    @property
+    def unlimited(self) -> bool:
+        """Si no hay límite mensual configurado"""
+        return self.monthly_limit <= 0
+    
+    def record(self, calls: int, source: str = 'monitor') -> bool:
+        """Registra llamadas realizadas (ver `Database.record_api_calls`)"""
+        return self.db.record_api_calls(calls, source)
+    
+    def status(self, now: Optional[datetime] = None) -> Dict:
+        """
+        Uso y saldo de la cuota del mes en curso
+        
+        Args:
+            now: Momento de la consulta (default ahora)
+        
+        Returns:
+            Diccionario con period, limit, used, remaining, by_source,
+            used_today, days_left, projected (llamadas del mes al ritmo
+            actual), monitor_remaining (saldo del mes para el monitor),
+            daily_allowance y monitor_allowance (lo que el monitor puede usar
+            ahora según el ritmo); los saldos son None sin límite
+        """
+        now = now or datetime.now()
+        today = now.date()
+        month_start = today.replace(day=1)
+        next_month = date(today.year + today.month // 12, today.month % 12 + 1, 1)
+        days_left = (next_month - today).days
+        month_days = (next_month - month_start).days
+        
+        by_source, used_today = Counter(), Counter()
+        for row in self.db.get_api_usage(month_start):
+            day = row['day']
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            by_source[row['source']] += int(row['calls'])
+            if day == today:
+                used_today[row['source']] += int(row['calls'])
+        
+        used = sum(by_source.values())
+        elapsed_days = (today - month_start).days + (now.hour * 60 + now.minute + 1) / 1440
+        status = {
+            'period': month_start.isoformat(),
+            'limit': self.monthly_limit if not self.unlimited else None,
+            'used': used,
+            'by_source': dict(by_source),
+            'used_today': dict(used_today),
+            'days_left': days_left,
+            'projected': round(used / elapsed_days * month_days),
+            'remaining': None,
+            'monitor_remaining': None,
+            'daily_allowance': None,
+            'monitor_allowance': None
+        }
+        if self.unlimited:
+            return status
+        
+        remaining = max(self.monthly_limit - used, 0)
+        monitor_cap = math.floor(self.monthly_limit * (1 - self.app_reserve))
+        monitor_remaining = max(min(monitor_cap - by_source['monitor'], remaining), 0)
+        
+        # Saldo del monitor al empezar el día, repartido en los días que
+        # quedan y acumulado hora a hora dentro del día
+        monitor_today = used_today['monitor']
+        daily_allowance = (monitor_remaining + monitor_today) / days_left
+        paced = math.ceil(daily_allowance * (now.hour + 1) / 24)
+        
+        status.update(
+            remaining=remaining,
+            monitor_remaining=monitor_remaining,
+            daily_allowance=round(daily_allowance, 1),
+            monitor_allowance=max(min(paced - monitor_today, monitor_remaining), 0)
+        )
+        return status
+    
+    @staticmethod
+    def forecast(jobs: List[Dict]) -> int:
+        """Llamadas que hará una pasada (una búsqueda de ofertas por búsqueda planificada)"""
+        return len(jobs)
+    
+    def fit(
+        self,
+        jobs: List[Dict],
+        now: Optional[datetime] = None,
+        reserved: int = 0
+    ) -> Tuple[List[Dict], List[Dict], Dict]:
+        """
+        Recorta las búsquedas de una pasada a lo que permite la cuota
+        
+        Se conservan las primeras (el planificador las ordena por valor); las
+        demás no se ejecutan y quedan vencidas para la próxima pasada.
+        
+        Args:
+            jobs: Búsquedas planificadas, de mayor a menor valor
+            now: Momento de la pasada (default ahora)
+            reserved: Llamadas comprometidas que todavía no se registraron
+                (por ejemplo búsquedas ya encoladas para los workers)
+        
+        Returns:
+            Tupla (búsquedas a ejecutar, búsquedas recortadas con `skip_reason`,
+            reporte con forecast, allowed, kept, skipped, reasons y los campos
+            de `status`)
+        """
+        status = self.status(now)
+        forecast = self.forecast(jobs)
+        
+        if self.unlimited:
+            allowed = forecast
+        else:
+            allowed = max(min(status['monitor_allowance'] - reserved, forecast), 0)
+        
+        kept = jobs[:allowed]
+        skipped = []
+        for position, job in enumerate(jobs[allowed:], allowed):
+            # Más allá del saldo del mes no alcanza ni esperando al día siguiente
+            reason = REASON_MONTHLY if position + reserved >= status['monitor_remaining'] else REASON_PACE
+            skipped.append(dict(job, skip_reason=reason))
+        
+        report = dict(status, forecast=forecast, allowed=allowed, kept=len(kept), skipped=len(skipped),
+                      reasons=dict(Counter(job['skip_reason'] for job in skipped)))
+        return kept, skipped, report
+    
+    def allows_interactive(self, now: Optional[datetime] = None) -> bool:
+        """Si la app puede hacer una búsqueda real (queda cuota en el mes)"""
+        return self.unlimited or self.status(now)['remaining'] > 0
+
+
+def format_quota_report(report: Dict, skipped: List[Dict], limit: int = 5) -> str:
+    """Resumen legible del recorte de una pasada (ver `ApiQuota.fit`)"""
+    if report['limit'] is None:
+        return f"📡 Cuota de API sin límite: {report['forecast']} llamadas previstas"
+    
+    lines = [
+        f"📡 Cuota de API: {report['used']}/{report['limit']} llamadas usadas en el mes "
+        f"({report['remaining']} restantes, proyección {report['projected']})",
+        f"   Pasada: {report['forecast']} llamadas previstas, {report['allowed']} permitidas "
+        f"(ritmo de {report['daily_allowance']:.0f} por día para el monitor)"
+    ]
+    if skipped:
+        reasons = ', '.join(f"{count} por {reason}" for reason, count in report['reasons'].items())
+        lines.append(f"   ⏸️  {len(skipped)} búsquedas recortadas ({reasons}); quedan para la próxima pasada")
+        for job in skipped[:limit]:
+            lines.append(f"      {job['origin']} → {job['destination']} ({job['departure_date']}, "
+                         f"prioridad {job.get('priority') or 0}): {job['skip_reason']}")
+        if len(skipped) > limit:
+            lines.append(f"      ... y {len(skipped) - limit} más")
+    return "\n".join(lines)
+
+
+def main():
+    from storage import create_database
+    
+    try:
+        with create_database(os.environ) as db:
+            status = ApiQuota.from_config(db).status()
+    except Exception as e:
+        print(f"❌ Error leyendo la cuota: {str(e)}")
+        return 1
+    
+    if status['limit'] is None:
+        print(f"📡 Sin límite mensual: {status['used']} llamadas en el mes")
+        return 0
+    
+    print(f"📡 Cuota {status['period'][:7]}: {status['used']}/{status['limit']} llamadas "
+          f"({status['remaining']} restantes, {status['days_left']} días)")
+    for source, calls in sorted(status['by_source'].items()):
+        print(f"   {source:<8} {calls:>6} en el mes, {status['used_today'].get(source, 0):>4} hoy")
+    print(f"   Proyección del mes: {status['projected']} llamadas")
+    print(f"   Monitor: {status['monitor_remaining']} restantes, {status['daily_allowance']:.0f} por día, "
+          f"{status['monitor_allowance']} disponibles ahora")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
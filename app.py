@@ -3,8 +3,12 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from database import Database
+from storage import create_database
 from amadeus_client import AmadeusClient
+from api_quota import ApiQuota, rate_limiter_from_config
+from export_data import export_to_bytes
+from indicators import IndicatorEngine, SIGNAL_BUY, SIGNAL_WAIT, SIGNAL_WATCH
+from price_forecast import forecaster_from_config
 import time
 import os
 import random
@@ -22,13 +26,8 @@ st.set_page_config(
 def init_database():
     """Inicializa la conexión a la base de datos"""
     try:
-        db = Database(
-            host=st.secrets["DB_HOST"],
-            port=int(st.secrets.get("DB_PORT", 5432)),
-            database=st.secrets["DB_NAME"],
-            user=st.secrets["DB_USER"],
-            password=st.secrets["DB_PASSWORD"]
-        )
+        # DB_BACKEND = "sqlite" usa un archivo local en lugar de PostgreSQL
+        db = create_database(st.secrets)
         return db
     except Exception as e:
         st.error(f"Error conectando a la base de datos: {str(e)}")
@@ -40,13 +39,24 @@ def init_amadeus():
     try:
         amadeus = AmadeusClient(
             api_key=st.secrets["AMADEUS_API_KEY"],
-            api_secret=st.secrets["AMADEUS_API_SECRET"]
+            api_secret=st.secrets["AMADEUS_API_SECRET"],
+            rate_limiter=rate_limiter_from_config(st.secrets)
         )
         return amadeus
     except Exception as e:
         st.warning(f"API de Amadeus no disponible: {str(e)}")
         return None
 
+@st.cache_resource
+def init_indicators():
+    """Inicializa el motor de indicadores (se actualiza incrementalmente en cada recarga)"""
+    return IndicatorEngine()
+
+@st.cache_resource
+def init_forecaster():
+    """Carga el modelo de pronóstico entrenado offline (None si no hay, ver price_forecast.py)"""
+    return forecaster_from_config(st.secrets)
+
 # Función de simulación de vuelos mejorada
 def simulate_flight_search(origin, destination, departure_date, return_date, adults):
     """Simula búsqueda de vuelos cuando no hay API disponible"""
@@ -124,14 +134,13 @@ def simulate_flight_search(origin, destination, departure_date, return_date, adu
 # Inicializar
 db = init_database()
 amadeus = init_amadeus()
+# Cuota mensual de Amadeus compartida con el monitor (AMADEUS_MONTHLY_QUOTA)
+quota = ApiQuota.from_config(db, st.secrets) if db else None
 
 # Inicializar estado de sesión
 if 'simulation_mode' not in st.session_state:
     st.session_state.simulation_mode = (amadeus is None)
 
-if 'active_searches' not in st.session_state:
-    st.session_state.active_searches = []
-
 # Título principal
 st.title("✈️ Flight Scan - Monitor de Precios de Vuelos")
 st.markdown("**Sistema de monitoreo y análisis de tarifas usando Amadeus API**")
@@ -229,6 +238,14 @@ if submit_search:
                             return_date.strftime('%Y-%m-%d'),
                             adults
                         )
+                    elif quota is not None and not quota.allows_interactive():
+                        st.warning("⚠️ Cuota mensual de la API agotada. Usando datos simulados...")
+                        offers = simulate_flight_search(
+                            origin, destination,
+                            departure_date.strftime('%Y-%m-%d'),
+                            return_date.strftime('%Y-%m-%d'),
+                            adults
+                        )
                     else:
                         try:
                             offers = amadeus.search_flights(
@@ -248,6 +265,9 @@ if submit_search:
                                 return_date.strftime('%Y-%m-%d'),
                                 adults
                             )
+                        finally:
+                            if quota is not None:
+                                quota.record(1, 'app')
                 
                 if offers:
                     st.success(f"✅ Se encontraron {len(offers)} ofertas de vuelos")
@@ -258,54 +278,48 @@ if submit_search:
                         st.balloons()
                         st.success(f"🎯 ¡Precio objetivo alcanzado! Precio más bajo: ${lowest_price:.2f}")
                     
-                    # Guardar ofertas en la base de datos
+                    # Guardar ofertas en la base de datos (escritura diferida en segundo plano)
                     if db:
-                        saved_count = 0
-                        for offer in offers:
+                        try:
+                            db.enqueue_flight_offers([
+                                {
+                                    'origin': origin,
+                                    'destination': destination,
+                                    'departure_date': departure_date.strftime('%Y-%m-%d'),
+                                    'return_date': return_date.strftime('%Y-%m-%d'),
+                                    'adults': adults,
+                                    'price': offer['price'],
+                                    'currency': offer['currency'],
+                                    'airline': offer.get('airline', 'N/A'),
+                                    'flight_data': offer
+                                }
+                                for offer in offers
+                            ])
+                            st.info(f"💾 {len(offers)} ofertas en cola de guardado")
+                        except Exception as e:
+                            st.warning(f"Error guardando ofertas: {str(e)}")
+                    
+                    # Vigilar el precio objetivo en la base (lo evalúan la app y el monitor)
+                    if target_price > 0:
+                        if db:
                             try:
-                                db.insert_flight_offer(
+                                watch_id = db.create_price_watch(
                                     origin=origin,
                                     destination=destination,
-                                    departure_date=departure_date.strftime('%Y-%m-%d'),
+                                    departure_from=departure_date.strftime('%Y-%m-%d'),
+                                    target_price=target_price,
                                     return_date=return_date.strftime('%Y-%m-%d'),
                                     adults=adults,
-                                    price=offer['price'],
-                                    currency=offer['currency'],
-                                    airline=offer.get('airline', 'N/A'),
-                                    flight_data=offer
+                                    last_price=lowest_price
                                 )
-                                saved_count += 1
-                            except Exception as e:
-                                st.warning(f"Error guardando oferta: {str(e)}")
-                        
-                        st.info(f"💾 Se guardaron {saved_count} ofertas en la base de datos")
-                    
-                    # Agregar a búsquedas activas si hay precio objetivo
-                    if target_price > 0:
-                        search_item = {
-                            'origin': origin,
-                            'destination': destination,
-                            'departure_date': departure_date.strftime('%Y-%m-%d'),
-                            'return_date': return_date.strftime('%Y-%m-%d'),
-                            'adults': adults,
-                            'target_price': target_price,
-                            'current_price': lowest_price,
-                            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        }
-                        
-                        # Evitar duplicados
-                        exists = any(
-                            s['origin'] == origin and 
-                            s['destination'] == destination and 
-                            s['departure_date'] == departure_date.strftime('%Y-%m-%d')
-                            for s in st.session_state.active_searches
-                        )
-                        
-                        if not exists:
-                            st.session_state.active_searches.append(search_item)
-                            st.success(f"📌 Búsqueda agregada a monitoreo activo")
+                                if watch_id is not None:
+                                    st.success(f"📌 Precio objetivo vigilado (vigilancia #{watch_id})")
+                                else:
+                                    st.warning("No se pudo guardar la vigilancia de precio")
+                            except ValueError as e:
+                                st.warning(f"Vigilancia no válida: {str(e)}")
                         else:
-                            st.info("ℹ️ Esta búsqueda ya está en monitoreo activo")
+                            st.info("ℹ️ Sin base de datos el precio objetivo no se puede vigilar")
                     
                     # Mostrar resultados en tabla mejorada
                     df_offers = pd.DataFrame(offers)
@@ -318,13 +332,40 @@ if submit_search:
                         df_offers['Cumple Objetivo'] = df_offers['price'] <= target_price
                         display_columns.append('Cumple Objetivo')
                     
+                    # Pronóstico comprar/esperar para todas las ofertas en un solo lote
+                    forecaster = init_forecaster()
+                    if forecaster is not None:
+                        try:
+                            series = init_indicators().series_latest(
+                                origin, destination, departure_date, return_date, adults
+                            )
+                            forecast = forecaster.predict([
+                                {
+                                    'origin': origin,
+                                    'destination': destination,
+                                    'departure_date': departure_date,
+                                    'airline': offer.get('airline', 'N/A'),
+                                    'price': offer['price'],
+                                    'recent_mean': series['mean'] if series else None
+                                }
+                                for offer in offers
+                            ])
+                            df_offers['Pronóstico'] = forecast['recommendation']
+                            df_offers['Prob. baja'] = forecast['drop_probability'] * 100
+                            df_offers['Ahorro esperado'] = forecast['expected_savings']
+                            display_columns += ['Pronóstico', 'Prob. baja', 'Ahorro esperado']
+                        except Exception as e:
+                            st.warning(f"Error calculando el pronóstico: {str(e)}")
+                    
                     st.dataframe(
                         df_offers[display_columns],
                         use_container_width=True,
                         column_config={
                             'price': st.column_config.NumberColumn('Precio', format="$%.2f"),
                             'stops': st.column_config.NumberColumn('Escalas'),
-                            'Cumple Objetivo': st.column_config.CheckboxColumn('🎯 Objetivo')
+                            'Cumple Objetivo': st.column_config.CheckboxColumn('🎯 Objetivo'),
+                            'Prob. baja': st.column_config.NumberColumn('📉 Prob. baja', format="%.0f%%"),
+                            'Ahorro esperado': st.column_config.NumberColumn('Ahorro esperado', format="$%.2f")
                         }
                     )
                     
@@ -340,30 +381,88 @@ if submit_search:
     else:
         st.warning("⚠️ Por favor ingresa origen y destino")
 
-# Gestión de búsquedas activas
-if st.session_state.active_searches:
+# Vigilancias de precio objetivo (tabla price_watches)
+price_watches = db.get_price_watches() if db else []
+if price_watches:
     st.sidebar.markdown("---")
     st.sidebar.header("📋 Búsquedas Activas")
     
-    for idx, search in enumerate(st.session_state.active_searches):
-        with st.sidebar.expander(f"{search['origin']} → {search['destination']}"):
-            st.write(f"**Salida:** {search['departure_date']}")
-            st.write(f"**Objetivo:** ${search['target_price']:.2f}")
-            st.write(f"**Último precio:** ${search['current_price']:.2f}")
+    for watch in price_watches:
+        with st.sidebar.expander(f"{watch['origin']} → {watch['destination']}"):
+            departure = str(watch['departure_from'])
+            if watch['departure_to'] != watch['departure_from']:
+                departure = f"{departure} a {watch['departure_to']}"
+            st.write(f"**Salida:** {departure}")
+            target = float(watch['target_price'])
+            st.write(f"**Objetivo:** ${target:.2f}")
             
-            if search['current_price'] <= search['target_price']:
-                st.success("✅ Objetivo alcanzado")
+            if watch['last_price'] is None:
+                st.info("⏳ Todavía sin precios observados")
             else:
-                diff = search['current_price'] - search['target_price']
-                st.info(f"📊 Faltan ${diff:.2f}")
+                current = float(watch['last_price'])
+                st.write(f"**Último precio:** ${current:.2f}")
                 
-                # Barra de progreso
-                progress = min(1.0, search['target_price'] / search['current_price'])
-                st.progress(progress)
+                if current <= target:
+                    st.success("✅ Objetivo alcanzado")
+                else:
+                    st.info(f"📊 Faltan ${current - target:.2f}")
+                    
+                    # Barra de progreso
+                    st.progress(min(1.0, target / current))
+            
+            if watch['triggered_count']:
+                st.caption(f"🔔 {watch['triggered_count']} alertas, la última el "
+                           f"{watch['last_triggered_at']:%Y-%m-%d %H:%M}")
             
-            if st.button(f"🗑️ Eliminar", key=f"del_{idx}"):
-                st.session_state.active_searches.pop(idx)
+            if st.button(f"🗑️ Eliminar", key=f"del_watch_{watch['id']}"):
+                db.delete_price_watch(watch['id'])
                 st.rerun()
+    
+    price_alerts = db.get_price_alerts(limit=10)
+    if price_alerts:
+        with st.sidebar.expander(f"🔔 Alertas de precio ({len(price_alerts)})"):
+            for alert in price_alerts:
+                label = "⚡ caída anómala, " if alert.get('kind') == 'anomaly' else ""
+                st.write(f"**{alert['origin']} → {alert['destination']}** {alert['departure_date']}: "
+                         f"${float(alert['price']):.2f} ({label}objetivo ${float(alert['target_price']):.2f}, "
+                         f"{alert['airline']})")
+                st.caption(f"{alert['triggered_at']:%Y-%m-%d %H:%M}")
+
+# Cuota de la API de Amadeus
+if quota is not None:
+    quota_status = quota.status()
+    if quota_status['limit'] is not None:
+        with st.sidebar.expander("📡 Cuota de API"):
+            st.write(f"**Usadas en el mes:** {quota_status['used']} de {quota_status['limit']}")
+            st.progress(min(1.0, quota_status['used'] / quota_status['limit']))
+            st.write(f"**Restantes:** {quota_status['remaining']} · "
+                     f"**Proyección:** {quota_status['projected']}")
+            st.write(f"**Hoy:** {quota_status['used_today'].get('app', 0)} búsquedas de la app, "
+                     f"{quota_status['used_today'].get('monitor', 0)} del monitor")
+            if quota_status['remaining'] == 0:
+                st.error("Cuota agotada: las búsquedas usan datos simulados")
+            elif quota_status['remaining'] < 0.1 * quota_status['limit']:
+                st.warning("Queda menos del 10% de la cuota del mes")
+
+# Métricas de la caché de consultas
+if db and hasattr(db, 'cache_stats'):
+    cache_stats = db.cache_stats()
+    if cache_stats:
+        with st.sidebar.expander("⚡ Caché de consultas"):
+            st.write(f"**Tasa de aciertos:** {cache_stats['hit_rate']:.0%} "
+                     f"({cache_stats['hits']} de {cache_stats['hits'] + cache_stats['misses']})")
+            st.write(f"**Tiempo ahorrado:** {cache_stats['saved_seconds']:.2f} s")
+            st.write(f"**Memoria:** {cache_stats['bytes'] / 1024:.0f} KB en {cache_stats['entries']} resultados")
+
+# Métricas de la cola de escritura diferida
+if db and hasattr(db, 'write_queue_stats'):
+    queue_stats = db.write_queue_stats()
+    if queue_stats:
+        with st.sidebar.expander("💾 Cola de guardado"):
+            st.write(f"**Pendientes:** {queue_stats['queue_depth']}")
+            st.write(f"**Guardadas:** {queue_stats['written']} · **Fallidas:** {queue_stats['failed']}")
+            st.write(f"**Latencia de vaciado:** {queue_stats['avg_flush_seconds'] * 1000:.0f} ms "
+                     f"(máx. {queue_stats['max_flush_seconds'] * 1000:.0f} ms)")
 
 # Tabs principales
 tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "📈 Análisis de Tarifas", "📋 Historial"])
@@ -434,6 +533,86 @@ with tab1:
                 
         except Exception as e:
             st.error(f"Error cargando dashboard: {str(e)}")
+        
+        # Caídas anómalas detectadas al guardar ofertas (ver price_anomalies.py)
+        try:
+            anomalies = db.get_price_anomalies(limit=50, since=datetime.now() - timedelta(days=7))
+            
+            if anomalies:
+                st.subheader("⚡ Caídas anómalas de precio")
+                st.caption("Precios muy por debajo de lo habitual para la ruta y fechas "
+                           "(posibles ofertas o tarifas erróneas), últimos 7 días")
+                
+                df_anomalies = pd.DataFrame(anomalies)
+                df_anomalies['route'] = df_anomalies['origin'] + ' → ' + df_anomalies['destination']
+                st.dataframe(
+                    df_anomalies[['detected_at', 'route', 'departure_date', 'return_date', 'airline',
+                                  'price', 'expected_price', 'drop_pct', 'zscore', 'currency']],
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        'detected_at': st.column_config.DatetimeColumn('Detectada', format="YYYY-MM-DD HH:mm"),
+                        'route': 'Ruta',
+                        'departure_date': 'Salida',
+                        'return_date': 'Regreso',
+                        'airline': 'Aerolínea',
+                        'price': st.column_config.NumberColumn('Precio', format="%.2f"),
+                        'expected_price': st.column_config.NumberColumn('Esperado', format="%.2f"),
+                        'drop_pct': st.column_config.NumberColumn('Caída', format="%.1f%%"),
+                        'zscore': st.column_config.NumberColumn('Desvíos', format="%.1f"),
+                        'currency': 'Moneda'
+                    }
+                )
+        
+        except Exception as e:
+            st.error(f"Error cargando anomalías: {str(e)}")
+        
+        # Señales de los indicadores por serie (ruta y fechas) del monitor
+        try:
+            signals = init_indicators().refresh(db)
+            
+            if len(signals) > 0:
+                st.subheader("🎯 Señales por ruta")
+                
+                counts = signals['signal'].value_counts()
+                col1, col2, col3 = st.columns(3)
+                col1.metric("🟢 Comprar", int(counts.get(SIGNAL_BUY, 0)))
+                col2.metric("🔴 Esperar", int(counts.get(SIGNAL_WAIT, 0)))
+                col3.metric("🟡 Monitorear", int(counts.get(SIGNAL_WATCH, 0)))
+                
+                selected_signals = st.multiselect(
+                    "Señal",
+                    [SIGNAL_BUY, SIGNAL_WAIT, SIGNAL_WATCH],
+                    default=[SIGNAL_BUY, SIGNAL_WAIT, SIGNAL_WATCH],
+                    key="indicator_signals"
+                )
+                
+                table = signals[signals['signal'].isin(selected_signals)].copy()
+                table['signal_order'] = table['signal'].map({SIGNAL_BUY: 0, SIGNAL_WATCH: 1, SIGNAL_WAIT: 2})
+                table = table.sort_values(['signal_order', 'drawdown'])
+                table['route'] = table['origin'] + ' → ' + table['destination']
+                table['momentum'] = (table['momentum'] * 100).round(1)
+                table['drawdown'] = (table['drawdown'] * 100).round(1)
+                table['cv'] = (table['cv'] * 100).round(1)
+                
+                st.dataframe(
+                    table[['signal', 'trend', 'route', 'departure_date', 'return_date', 'adults', 'price',
+                           'mean', 'band_lower', 'band_upper', 'cv', 'momentum', 'drawdown', 'observations',
+                           'timestamp']].rename(columns={
+                        'signal': 'Señal', 'trend': 'Tendencia', 'route': 'Ruta', 'departure_date': 'Salida',
+                        'return_date': 'Regreso', 'adults': 'Adultos', 'price': 'Precio', 'mean': 'Media',
+                        'band_lower': 'Banda inf.', 'band_upper': 'Banda sup.', 'cv': 'CV %',
+                        'momentum': 'Momentum %', 'drawdown': 'Drawdown %', 'observations': 'Obs.',
+                        'timestamp': 'Última búsqueda'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+                st.caption("Indicadores sobre el precio mínimo de cada búsqueda del monitor "
+                           "(ver docs/GUIA_TRADING.md)")
+        
+        except Exception as e:
+            st.error(f"Error calculando indicadores: {str(e)}")
     else:
         st.error("No se pudo conectar a la base de datos")
 
@@ -489,16 +668,78 @@ with tab2:
                     with col4:
                         st.metric("Precio Max", f"${df_route['price'].max():.2f}")
                     
-                    # Gráfico temporal
-                    fig = px.scatter(
-                        df_route,
-                        x='search_timestamp',
-                        y='price',
-                        color='airline' if 'airline' in df_route.columns else None,
-                        title=f'Precios {selected_route[0]} → {selected_route[1]}',
-                        labels={'search_timestamp': 'Fecha', 'price': 'Precio (USD)'}
+                    # Percentiles desde los sketches diarios (sin recorrer las búsquedas)
+                    quantiles = db.get_price_quantiles(
+                        origin=selected_route[0],
+                        destination=selected_route[1],
+                        days=days_back
                     )
-                    fig.update_traces(marker=dict(size=10))
+                    if quantiles:
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Ofertas vistas", quantiles['count'])
+                        with col2:
+                            st.metric("P10", f"${quantiles['p10']:.2f}")
+                        with col3:
+                            st.metric("Mediana (P50)", f"${quantiles['p50']:.2f}")
+                        with col4:
+                            st.metric("P90", f"${quantiles['p90']:.2f}")
+                        
+                        by_airline = db.get_price_quantiles_by_airline(
+                            origin=selected_route[0],
+                            destination=selected_route[1],
+                            days=days_back
+                        )
+                        if by_airline:
+                            with st.expander("Percentiles por aerolínea"):
+                                df_quantiles = pd.DataFrame(by_airline)[
+                                    ['airline', 'count', 'min_price', 'p10', 'p50', 'p90', 'max_price']
+                                ]
+                                st.dataframe(
+                                    df_quantiles.rename(columns={
+                                        'airline': 'Aerolínea',
+                                        'count': 'Ofertas',
+                                        'min_price': 'Mínimo',
+                                        'p10': 'P10',
+                                        'p50': 'P50',
+                                        'p90': 'P90',
+                                        'max_price': 'Máximo'
+                                    }),
+                                    use_container_width=True,
+                                    hide_index=True
+                                )
+                    
+                    # Gráfico temporal (serie escalonada: cada precio vale hasta su last_seen)
+                    series = db.get_price_series(
+                        origin=selected_route[0],
+                        destination=selected_route[1],
+                        days=days_back
+                    )
+                    df_series = pd.DataFrame(series) if series else pd.DataFrame()
+                    
+                    if len(df_series) > 0:
+                        df_series['timestamp'] = pd.to_datetime(df_series['timestamp'])
+                        fig = px.line(
+                            df_series,
+                            x='timestamp',
+                            y='price',
+                            color='airline',
+                            line_group='itinerary_fingerprint',
+                            line_shape='hv',
+                            markers=True,
+                            title=f'Precios {selected_route[0]} → {selected_route[1]}',
+                            labels={'timestamp': 'Fecha', 'price': 'Precio (USD)'}
+                        )
+                    else:
+                        fig = px.scatter(
+                            df_route,
+                            x='search_timestamp',
+                            y='price',
+                            color='airline' if 'airline' in df_route.columns else None,
+                            title=f'Precios {selected_route[0]} → {selected_route[1]}',
+                            labels={'search_timestamp': 'Fecha', 'price': 'Precio (USD)'}
+                        )
+                        fig.update_traces(marker=dict(size=10))
                     st.plotly_chart(fig, use_container_width=True)
                     
                     # Tabla de datos
@@ -516,6 +757,25 @@ with tab2:
                         file_name=f"flight_data_{selected_route[0]}_{selected_route[1]}.csv",
                         mime="text/csv"
                     )
+                    
+                    # Exportación columnar desde la base (sin pasar por el DataFrame)
+                    if st.button("📦 Preparar Parquet", key="prepare_route_parquet"):
+                        try:
+                            parquet_data = export_to_bytes(
+                                db,
+                                fmt='parquet',
+                                origin=selected_route[0],
+                                destination=selected_route[1],
+                                date_from=datetime.now() - timedelta(days=days_back)
+                            )
+                            st.download_button(
+                                label="📥 Descargar Parquet",
+                                data=parquet_data,
+                                file_name=f"flight_data_{selected_route[0]}_{selected_route[1]}.parquet",
+                                mime="application/vnd.apache.parquet"
+                            )
+                        except ImportError as e:
+                            st.warning(str(e))
                 else:
                     st.info("No hay datos para esta ruta en el período seleccionado")
                     
@@ -585,6 +845,24 @@ with tab3:
                     mime="text/csv"
                 )
                 
+                # Exportación del histórico completo (no solo los últimos 500) en Parquet
+                if st.button("📦 Preparar Parquet del histórico completo", key="prepare_history_parquet"):
+                    try:
+                        parquet_all = export_to_bytes(
+                            db,
+                            fmt='parquet',
+                            origin=filter_origin if filter_origin != 'Todos' else None,
+                            destination=filter_destination if filter_destination != 'Todos' else None
+                        )
+                        st.download_button(
+                            label="📥 Descargar Parquet",
+                            data=parquet_all,
+                            file_name=f"flight_history_{datetime.now().strftime('%Y%m%d')}.parquet",
+                            mime="application/vnd.apache.parquet"
+                        )
+                    except ImportError as e:
+                        st.warning(str(e))
+                
             else:
                 st.info("🔭 No hay historial disponible")
                 
@@ -0,0 +1,264 @@
+"""
+Archivo en frío del histórico de búsquedas
+
+En lugar de eliminar definitivamente las búsquedas antiguas, `archive_old_searches`
+las mueve a archivos Parquet comprimidos particionados por ruta y mes:
+    
+    archive/origin=EZE/destination=MIA/month=2025-01/part-<id_min>-<id_max>.parquet
+
+La tabla caliente queda acotada y el histórico sigue disponible: `load_price_history`
+une archivo y base de datos para análisis de largo plazo (estacionalidad).
+
+Uso desde la línea de comandos:
+    python archive.py --days 90 --dir archive
+"""
+
+import argparse
+import glob
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from export_data import export_schema, normalize_row
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dependencia opcional
+    pa = None
+
+import pandas as pd
+
+
+def _partition_dir(archive_dir: str, origin: str, destination: str, month: str) -> str:
+    """Ruta del directorio de una partición ruta-mes"""
+    return os.path.join(
+        archive_dir, f"origin={origin}", f"destination={destination}", f"month={month}"
+    )
+
+
+def archive_old_searches(
+    db,
+    archive_dir: str = 'archive',
+    days: int = 90,
+    chunk_size: int = 50000,
+    compression: str = 'zstd'
+) -> Dict:
+    """
+    Mueve las búsquedas más antiguas que N días a Parquet y las elimina de la base
+    
+    Los archivos se escriben (y cierran) antes de eliminar; el borrado se
+    limita al id máximo archivado, por lo que nunca se elimina una fila que
+    no esté en el archivo. Si el proceso se interrumpe entre ambos pasos,
+    la siguiente ejecución vuelve a archivar esas filas y `load_price_history`
+    descarta los duplicados por id.
+    
+    Args:
+        db: Instancia de `Database` o `SQLiteDatabase`
+        archive_dir: Directorio raíz del archivo
+        days: Antigüedad mínima (en días) de las búsquedas a archivar, contada
+            desde la última vez que se vieron (`last_seen`)
+        chunk_size: Filas leídas por bloque
+        compression: Códec Parquet ('zstd', 'snappy', 'gzip')
+    
+    Returns:
+        Diccionario con archived (filas archivadas), deleted (filas
+        eliminadas de la base) y files (archivos escritos)
+    """
+    if pa is None:
+        raise ImportError("El archivo requiere pyarrow: pip install pyarrow")
+    
+    schema = export_schema()
+    cutoff = datetime.now() - timedelta(days=days)
+    
+    archived = 0
+    max_id = None
+    files = []
+    
+    for rows in db.iter_flight_history(seen_before=cutoff, chunk_size=chunk_size):
+        partitions: Dict[tuple, List[Dict]] = defaultdict(list)
+        for row in rows:
+            month = row['search_timestamp'].strftime('%Y-%m')
+            partitions[(row['origin'], row['destination'], month)].append(normalize_row(row))
+        
+        for (origin, destination, month), partition_rows in partitions.items():
+            directory = _partition_dir(archive_dir, origin, destination, month)
+            os.makedirs(directory, exist_ok=True)
+            
+            first_id, last_id = partition_rows[0]['id'], partition_rows[-1]['id']
+            path = os.path.join(directory, f"part-{first_id}-{last_id}.parquet")
+            
+            table = pa.Table.from_pylist(partition_rows, schema=schema)
+            pq.write_table(table, path, compression=compression)
+            files.append(path)
+        
+        archived += len(rows)
+        max_id = rows[-1]['id']
+    
+    deleted = 0
+    if max_id is not None:
+        deleted = db.delete_old_searches(before=cutoff, max_id=max_id)
+    
+    return {'archived': archived, 'deleted': deleted, 'files': files}
+
+
+def _archive_files(
+    archive_dir: str,
+    origin: str,
+    destination: str,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime]
+) -> List[str]:
+    """Lista los archivos de la ruta cuyas particiones de mes caen en el rango"""
+    pattern = os.path.join(
+        archive_dir, f"origin={origin}", f"destination={destination}", "month=*", "*.parquet"
+    )
+    
+    month_from = date_from.strftime('%Y-%m') if date_from else None
+    month_to = date_to.strftime('%Y-%m') if date_to else None
+    
+    selected = []
+    for path in sorted(glob.glob(pattern)):
+        month = os.path.basename(os.path.dirname(path)).split('=', 1)[1]
+        if month_from and month < month_from:
+            continue
+        if month_to and month > month_to:
+            continue
+        selected.append(path)
+    
+    return selected
+
+
+def load_price_history(
+    db,
+    origin: str,
+    destination: str,
+    archive_dir: str = 'archive',
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Une el histórico archivado y el de la base para una ruta
+    
+    Solo se leen las particiones de mes dentro del rango pedido.
+    
+    Args:
+        db: Instancia de base de datos (datos calientes)
+        origin: Código IATA de origen
+        destination: Código IATA de destino
+        archive_dir: Directorio raíz del archivo
+        date_from: Búsquedas desde este momento (opcional)
+        date_to: Búsquedas anteriores a este momento (opcional)
+        columns: Columnas a devolver (por defecto todas las exportadas)
+    
+    Returns:
+        DataFrame ordenado por search_timestamp, sin ids duplicados
+    """
+    frames = []
+    
+    if pa is not None:
+        for path in _archive_files(archive_dir, origin, destination, date_from, date_to):
+            frames.append(pq.read_table(path, columns=columns).to_pandas())
+    
+    live_rows = []
+    for rows in db.iter_flight_history(
+        origin=origin, destination=destination, date_from=date_from, date_to=date_to
+    ):
+        live_rows.extend(normalize_row(row) for row in rows)
+    if live_rows:
+        live = pd.DataFrame(live_rows)
+        frames.append(live[columns] if columns else live)
+    
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    
+    history = pd.concat(frames, ignore_index=True)
+    history['search_timestamp'] = pd.to_datetime(history['search_timestamp'])
+    
+    if date_from is not None:
+        history = history[history['search_timestamp'] >= pd.Timestamp(date_from)]
+    if date_to is not None:
+        history = history[history['search_timestamp'] < pd.Timestamp(date_to)]
+    
+    if 'id' in history.columns:
+        history = history.drop_duplicates(subset='id', keep='last')
+    
+    return history.sort_values('search_timestamp').reset_index(drop=True)
+
+
+def get_long_range_statistics(
+    db,
+    origin: str,
+    destination: str,
+    archive_dir: str = 'archive',
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> Dict:
+    """
+    Estadísticas de largo plazo (archivo + base) y perfil mensual de precios
+    
+    Args:
+        db: Instancia de base de datos
+        origin: Código IATA de origen
+        destination: Código IATA de destino
+        archive_dir: Directorio raíz del archivo
+        date_from: Desde este momento (opcional)
+        date_to: Hasta este momento (opcional)
+    
+    Returns:
+        Diccionario con min_price, max_price, avg_price, search_count y
+        monthly (lista de {month, min_price, avg_price, search_count})
+    """
+    history = load_price_history(
+        db, origin, destination, archive_dir, date_from, date_to,
+        columns=['id', 'search_timestamp', 'price']
+    )
+    
+    if len(history) == 0:
+        return {}
+    
+    monthly = (
+        history.groupby(history['search_timestamp'].dt.to_period('M'))['price']
+        .agg(min_price='min', avg_price='mean', search_count='count')
+        .reset_index()
+    )
+    monthly['month'] = monthly['search_timestamp'].astype(str)
+    
+    return {
+        'min_price': float(history['price'].min()),
+        'max_price': float(history['price'].max()),
+        'avg_price': float(history['price'].mean()),
+        'search_count': int(len(history)),
+        'monthly': monthly[['month', 'min_price', 'avg_price', 'search_count']].to_dict('records')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiva búsquedas antiguas en Parquet")
+    parser.add_argument('--days', type=int, default=90, help="Antigüedad mínima a archivar")
+    parser.add_argument('--dir', default=os.getenv('ARCHIVE_DIR', 'archive'),
+                        help="Directorio del archivo")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Filas por bloque")
+    args = parser.parse_args()
+    
+    try:
+        from storage import create_database
+        db = create_database(os.environ)
+        
+        result = archive_old_searches(db, archive_dir=args.dir, days=args.days,
+                                      chunk_size=args.chunk_size)
+        
+        print(f"✅ {result['archived']} búsquedas archivadas en {len(result['files'])} archivos")
+        print(f"🗑️  {result['deleted']} búsquedas eliminadas de la base")
+        return 0
+    
+    except Exception as e:
+        print(f"❌ Error archivando: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Micro-benchmark de las sentencias preparadas de `Database`
+
+Compara, para las consultas frecuentes, la latencia ejecutando el SQL común
+(el servidor lo analiza y planifica en cada llamada) contra EXECUTE de la
+sentencia preparada, y muestra el tiempo de planificación que informa
+PostgreSQL (`EXPLAIN (ANALYZE, SUMMARY)`). Con las tasas de llamadas
+indicadas proyecta el tiempo ahorrado por día.
+
+Las inserciones se ejecutan dentro de una transacción que se revierte, por
+lo que el benchmark no deja datos en la base.
+
+Uso:
+    python benchmark_queries.py --origin EZE --destination MIA --iterations 500 \\
+        --inserts-per-day 2000 --reads-per-day 20000
+
+Usa las mismas variables de entorno que `monitor_script.py` (solo PostgreSQL).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from database import Database
+
+
+def _sample_offer(origin: str, destination: str, index: int) -> Dict:
+    """Oferta sintética (cada una con un itinerario distinto)"""
+    departure = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    return {
+        'origin': origin,
+        'destination': destination,
+        'departure_date': departure,
+        'return_date': None,
+        'adults': 1,
+        'price': 500.0 + index % 100,
+        'currency': 'USD',
+        'airline': 'BENCH',
+        'flight_data': {
+            'airline_code': 'ZZ',
+            'stops': 0,
+            'duration': '10h 30m',
+            'departure_time': f"{departure}T10:00:00",
+            'arrival_time': f"{departure}T20:30:00",
+            'number_of_bookable_seats': 9,
+            'flight_number': f"ZZ{index}"
+        }
+    }
+
+
+def _time_calls(call: Callable[[int], None], iterations: int, warmup: int = 10) -> List[float]:
+    """Ejecuta `call` y devuelve la latencia de cada iteración en milisegundos"""
+    for i in range(warmup):
+        call(i)
+    
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        call(warmup + i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _planning_time_ms(db: Database, query: str, params: tuple) -> float:
+    """Tiempo de planificación (ms) que informa PostgreSQL para una consulta"""
+    with db._connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {query}", params)
+        plan = cursor.fetchone()[0]
+        cursor.close()
+        # La conexión se devuelve con rollback: los INSERT analizados no persisten
+    
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0].get('Planning Time', 0.0))
+
+
+def benchmark(db_plain: Database, db_prepared: Database, origin: str, destination: str,
+              iterations: int) -> List[Dict]:
+    """
+    Mide cada consulta frecuente con y sin sentencias preparadas
+    
+    Returns:
+        Lista de diccionarios con name, plain_ms, prepared_ms (medianas) y
+        planning_ms
+    """
+    cutoff = datetime.now() - timedelta(days=30)
+    results = []
+    
+    # Mismo SQL que los métodos de Database (para EXPLAIN)
+    read_queries = {
+        'get_searches_by_route': """
+            SELECT id, search_timestamp, origin, destination, departure_date, return_date,
+                   adults, price, currency, airline, created_at
+            FROM flight_searches
+            WHERE origin = %s AND destination = %s AND search_timestamp >= %s
+            ORDER BY search_timestamp DESC""",
+        'get_price_statistics': """
+            SELECT MIN(price), MAX(price), AVG(price), COUNT(*)
+            FROM flight_searches
+            WHERE origin = %s AND destination = %s AND search_timestamp >= %s""",
+        'get_cheapest_by_airline': """
+            SELECT airline, MIN(price) as min_price, COUNT(*)
+            FROM flight_searches
+            WHERE origin = %s AND destination = %s AND search_timestamp >= %s
+              AND airline IS NOT NULL AND airline != 'N/A'
+            GROUP BY airline
+            ORDER BY min_price ASC"""
+    }
+    
+    for name in read_queries:
+        timings = {}
+        for label, db in (('plain', db_plain), ('prepared', db_prepared)):
+            fn = getattr(db, name)
+            timings[label] = _time_calls(lambda _i, fn=fn: fn(origin, destination, 30), iterations)
+        
+        results.append({
+            'name': name,
+            'plain_ms': statistics.median(timings['plain']),
+            'prepared_ms': statistics.median(timings['prepared']),
+            'planning_ms': _planning_time_ms(db_plain, read_queries[name], (origin, destination, cutoff))
+        })
+    
+    # Inserción: el mismo camino que insert_flight_offer, revertido al final
+    timings = {}
+    for label, db in (('plain', db_plain), ('prepared', db_prepared)):
+        with db._connection() as conn:
+            cursor = conn.cursor()
+            timings[label] = _time_calls(
+                lambda i, db=db, cursor=cursor: db._write_offer(
+                    cursor, _sample_offer(origin, destination, i), change_only=True
+                ),
+                iterations
+            )
+            cursor.close()
+            conn.rollback()
+    
+    insert_query = """
+        INSERT INTO flight_searches (origin, destination, departure_date, adults, price, airline)
+        VALUES (%s, %s, %s, 1, %s, %s)"""
+    results.append({
+        'name': 'insert_flight_offer',
+        'plain_ms': statistics.median(timings['plain']),
+        'prepared_ms': statistics.median(timings['prepared']),
+        'planning_ms': _planning_time_ms(
+            db_plain, insert_query, (origin, destination, datetime.now().date(), 500.0, 'BENCH')
+        )
+    })
+    
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de sentencias preparadas")
+    parser.add_argument('--origin', help="Ruta a consultar (por defecto la más activa)")
+    parser.add_argument('--destination')
+    parser.add_argument('--iterations', type=int, default=300, help="Llamadas medidas por consulta")
+    parser.add_argument('--inserts-per-day', type=int, default=2000,
+                        help="Ofertas insertadas por día (monitor + app)")
+    parser.add_argument('--reads-per-day', type=int, default=20000,
+                        help="Lecturas por ruta por día sin caché")
+    args = parser.parse_args()
+    
+    config = dict(
+        host=os.getenv('DB_HOST'),
+        port=int(os.getenv('DB_PORT', 5432)),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        cache_max_mb=0,
+        min_connections=1,
+        max_connections=1
+    )
+    
+    try:
+        with Database(**config, prepared_statements=False) as db_plain, \
+                Database(**config, prepared_statements=True) as db_prepared:
+            origin, destination = args.origin, args.destination
+            if not (origin and destination):
+                routes = db_plain.get_unique_routes(order_by='activity')
+                origin, destination = routes[0] if routes else ('EZE', 'MIA')
+            
+            print(f"Ruta: {origin} → {destination}, {args.iterations} llamadas por consulta\n")
+            results = benchmark(db_plain, db_prepared, origin.upper(), destination.upper(),
+                                args.iterations)
+    
+    except Exception as e:
+        print(f"❌ Error ejecutando benchmark: {str(e)}")
+        return 1
+    
+    print(f"{'Consulta':<26}{'SQL común':>12}{'Preparada':>12}{'Ahorro':>10}{'Planificación':>16}")
+    total_saved = 0.0
+    for result in results:
+        saved = result['plain_ms'] - result['prepared_ms']
+        calls = args.inserts_per_day if result['name'] == 'insert_flight_offer' else args.reads_per_day
+        total_saved += saved * calls
+        print(f"{result['name']:<26}{result['plain_ms']:>10.3f}ms{result['prepared_ms']:>10.3f}ms"
+              f"{saved:>8.3f}ms{result['planning_ms']:>14.3f}ms")
+    
+    print(f"\nAhorro proyectado: {total_saved / 1000:.1f}s por día "
+          f"({args.inserts_per_day} inserciones y {args.reads_per_day} lecturas por consulta)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
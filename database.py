@@ -1,15 +1,57 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-import json
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection as PgConnection
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, time
+import re
+from typing import List, Dict, Iterator, Optional, Tuple, Union
+import threading
+from flight_records import prepare_offer, split_raw_payload
+from price_anomalies import detect as detect_anomalies, series_key
+from price_watches import best_observations, evaluate_matches, normalize_watch, window_start
+from quantile_sketch import (
+    ALL_AIRLINES, DEFAULT_QUANTILES, KLLSketch, build_sketches, merge_all, sketch_groups, summarize
+)
+from query_cache import QueryCache, cached_query
+from write_queue import WriteBehindQueue
+
+
+class PreparingConnection(PgConnection):
+    """Conexión que recuerda qué sentencias tiene preparadas en el servidor"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
 
 class Database:
     """Clase para manejar operaciones de base de datos PostgreSQL"""
     
-    def __init__(self, host: str, port: int, database: str, user: str, password: str):
+    # Cola de búsquedas compartida entre workers (scan_jobs, ver scan_worker.py)
+    supports_job_queue = True
+    
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        database: str,
+        user: str,
+        password: str,
+        cache_max_mb: float = 32,
+        min_connections: int = 1,
+        max_connections: int = 10,
+        statement_timeout_ms: int = 30000,
+        pool_timeout: float = 30.0,
+        application_name: str = 'flight_scan',
+        prepared_statements: bool = True
+    ):
         """
-        Inicializa la conexión a PostgreSQL
+        Inicializa el pool de conexiones a PostgreSQL
+        
+        Una misma instancia puede compartirse entre hilos (por ejemplo todas
+        las sesiones de Streamlit vía `st.cache_resource`): cada operación
+        toma una conexión del pool y la devuelve al terminar.
         
         Args:
             host: Host de la base de datos
@@ -17,19 +59,244 @@ class Database:
             database: Nombre de la base de datos
             user: Usuario de PostgreSQL
             password: Contraseña del usuario
+            cache_max_mb: Memoria máxima de la caché de consultas en MB
+                (0 desactiva la caché)
+            min_connections: Conexiones abiertas de antemano en el pool
+            max_connections: Conexiones simultáneas máximas; las operaciones
+                adicionales esperan a que se libere una
+            statement_timeout_ms: Tiempo máximo de cada sentencia en el
+                servidor en milisegundos (0 sin límite)
+            pool_timeout: Segundos máximos de espera por una conexión libre
+            application_name: Nombre con el que las conexiones aparecen en
+                `pg_stat_activity`
+            prepared_statements: Ejecutar las consultas frecuentes como
+                sentencias preparadas en el servidor (desactivar detrás de
+                un pooler en modo transacción, como PgBouncer)
         """
         self.connection_params = {
             'host': host,
             'port': port,
             'database': database,
             'user': user,
-            'password': password
+            'password': password,
+            'application_name': application_name,
+            'options': f'-c statement_timeout={int(statement_timeout_ms)}'
         }
-        self._create_tables()
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.prepared_statements = prepared_statements
+        self._prepared_sql: Dict[str, str] = {}
+        
+        self._pool = ThreadedConnectionPool(
+            min_connections, max_connections,
+            connection_factory=PreparingConnection, **self.connection_params
+        )
+        # El pool de psycopg2 falla si se agota; el semáforo hace esperar en su lugar
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._pool_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._closed = False
+        
+        self.query_cache = QueryCache(int(cache_max_mb * 1024 * 1024)) if cache_max_mb > 0 else None
+        self.write_queue = None
+        self._write_queue_lock = threading.Lock()
+        
+        try:
+            self._create_tables()
+        except Exception:
+            self._pool.closeall()
+            raise
+    
+    @contextmanager
+    def _connection(self):
+        """
+        Toma una conexión del pool durante el bloque `with`
+        
+        Si el bloque termina con una transacción abierta (error o lectura
+        sin commit) se hace rollback antes de devolverla; las conexiones
+        rotas se descartan en lugar de volver al pool.
+        
+        Yields:
+            Conexión psycopg2 de uso exclusivo del hilo actual
+        """
+        if self._closed:
+            raise PoolError("La base de datos está cerrada")
+        
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise PoolError(
+                f"No hay conexiones libres después de {self.pool_timeout}s "
+                f"(máximo {self.max_connections})"
+            )
+        
+        conn = None
+        try:
+            conn = self._pool.getconn()
+            with self._pool_lock:
+                self._in_use += 1
+                self._checkouts += 1
+            
+            yield conn
+        finally:
+            if conn is not None:
+                broken = bool(conn.closed)
+                if not broken and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                
+                with self._pool_lock:
+                    self._in_use -= 1
+                try:
+                    self._pool.putconn(conn, close=broken)
+                except PoolError:
+                    # El pool se cerró mientras la conexión estaba en uso
+                    conn.close()
+            self._slots.release()
+    
+    def close(self):
+        """
+        Libera los recursos: vacía la cola de escritura y cierra el pool
+        
+        Es idempotente; después de cerrar, cualquier operación falla con
+        `PoolError`.
+        """
+        if self._closed:
+            return
+        
+        if self.write_queue is not None:
+            self.write_queue.shutdown()
+        
+        self._closed = True
+        self._pool.closeall()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def pool_stats(self) -> Dict:
+        """
+        Obtiene el estado del pool de conexiones
+        
+        Returns:
+            Diccionario con in_use (conexiones prestadas en este momento),
+            max_connections, checkouts (préstamos totales) y closed
+        """
+        with self._pool_lock:
+            return {
+                'in_use': self._in_use,
+                'max_connections': self.max_connections,
+                'checkouts': self._checkouts,
+                'closed': self._closed
+            }
+    
+    def _execute(self, cursor, name: str, query: str, params: tuple):
+        """
+        Ejecuta una consulta frecuente como sentencia preparada
+        
+        La sentencia se prepara (PREPARE) la primera vez que se usa en cada
+        conexión del pool y luego solo se envía EXECUTE con los parámetros,
+        sin volver a analizar ni planificar el SQL en el servidor. Si la
+        conexión no lleva registro de sentencias preparadas o estas están
+        desactivadas, se ejecuta la consulta común.
+        
+        Args:
+            cursor: Cursor sobre una conexión del pool
+            name: Nombre de la sentencia en el servidor
+            query: Consulta SQL con placeholders %s
+            params: Parámetros de la consulta
+        """
+        conn = cursor.connection
+        prepared = getattr(conn, 'prepared', None)
+        
+        if not self.prepared_statements or prepared is None:
+            cursor.execute(query, params)
+            return
+        
+        started_idle = conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        
+        try:
+            if name not in prepared:
+                statement = self._prepared_sql.get(name)
+                if statement is None:
+                    counter = iter(range(1, len(params) + 1))
+                    statement = re.sub(r'%s', lambda _: f"${next(counter)}", query.strip().rstrip(';'))
+                    self._prepared_sql[name] = statement
+                cursor.execute(f"PREPARE {name} AS {statement}")
+                prepared.add(name)
+            
+            placeholders = ', '.join(['%s'] * len(params))
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        
+        except psycopg2.Error as e:
+            # 26000: la sentencia ya no existe en el servidor (DISCARD ALL,
+            # pooler externo); 42P05: ya existía con ese nombre
+            if e.pgcode not in ('26000', '42P05'):
+                raise
+            prepared.clear()
+            if not started_idle:
+                # La transacción en curso quedó abortada: la reintenta quien llamó
+                raise
+            conn.rollback()
+            cursor.execute("DEALLOCATE ALL")
+            cursor.execute(query, params)
+    
+    def _data_generation(self) -> Tuple:
+        """
+        Lee el token de generación de datos usado para invalidar la caché
+        
+        El contador de `data_generation` lo incrementa, en la misma
+        transacción, cada escritura que cambia datos cacheables (inserciones,
+        limpiezas y archivo, migraciones y completado de columnas), también
+        las hechas por otros procesos. El máximo id y la actividad de rutas
+        cubren procesos con versiones anteriores que no lo incrementan.
+        
+        Returns:
+            Tupla (contador, máximo id, última actividad de rutas, cantidad de rutas)
+        """
+        query = """
+        SELECT 
+            (SELECT generation FROM data_generation WHERE id = 1),
+            (SELECT COALESCE(MAX(id), 0) FROM flight_searches),
+            (SELECT MAX(last_seen) FROM routes),
+            (SELECT COUNT(*) FROM routes);
+        """
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            generation = cursor.fetchone()
+            cursor.close()
+        
+        return tuple(generation)
+    
+    def _bump_generation(self, cursor):
+        """
+        Incrementa el contador de generación de datos (sin hacer commit)
+        
+        Se llama justo antes del commit: el lock de la fila se mantiene
+        solo hasta el final de la transacción, y los lectores ven el
+        contador nuevo recién junto con los datos nuevos.
+        """
+        cursor.execute("UPDATE data_generation SET generation = generation + 1 WHERE id = 1;")
+    
+    def _invalidate_cache(self):
+        """Descarta los resultados cacheados después de una escritura propia"""
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
     
-    def _get_connection(self):
-        """Crea una nueva conexión a la base de datos"""
-        return psycopg2.connect(**self.connection_params)
+    def cache_stats(self) -> Dict:
+        """
+        Obtiene las métricas de la caché de consultas
+        
+        Returns:
+            Diccionario con aciertos, fallos, tasa de aciertos, memoria usada
+            y segundos de consulta ahorrados (vacío si la caché está desactivada)
+        """
+        return self.query_cache.stats() if self.query_cache is not None else {}
     
     def _create_tables(self):
         """Crea las tablas necesarias si no existen"""
@@ -53,375 +320,3292 @@ class Database:
         CREATE INDEX IF NOT EXISTS idx_search_timestamp ON flight_searches(search_timestamp);
         CREATE INDEX IF NOT EXISTS idx_departure_date ON flight_searches(departure_date);
         CREATE INDEX IF NOT EXISTS idx_price ON flight_searches(price);
+        
+        -- Payloads crudos de Amadeus deduplicados por hash de contenido
+        CREATE TABLE IF NOT EXISTS flight_payloads (
+            payload_hash CHAR(64) PRIMARY KEY,
+            payload JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS payload_hash CHAR(64);
+        CREATE INDEX IF NOT EXISTS idx_payload_hash ON flight_searches(payload_hash);
+        
+        -- Registro de cambios: una fila por cambio de precio/disponibilidad
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS itinerary_fingerprint CHAR(64);
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS bookable_seats SMALLINT;
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP;
+        CREATE INDEX IF NOT EXISTS idx_fingerprint
+            ON flight_searches(itinerary_fingerprint, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_seen
+            ON flight_searches((COALESCE(last_seen, search_timestamp)));
+        
+        -- Contador de generación de datos para invalidar cachés (ver _data_generation)
+        CREATE TABLE IF NOT EXISTS data_generation (
+            id SMALLINT PRIMARY KEY CHECK (id = 1),
+            generation BIGINT NOT NULL
+        );
+        INSERT INTO data_generation (id, generation) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+        
+        -- Dimensión de rutas mantenida en cada inserción
+        CREATE TABLE IF NOT EXISTS routes (
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            observation_count BIGINT NOT NULL DEFAULT 0,
+            last_price DECIMAL(10, 2),
+            PRIMARY KEY (origin, destination)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_routes_activity ON routes(last_seen DESC);
+        
+        -- Atributos del itinerario como columnas tipadas (antes solo en JSONB)
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS duration_minutes INTEGER;
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS stops SMALLINT;
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS carrier_code VARCHAR(3);
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS departure_at TIMESTAMP;
+        ALTER TABLE flight_searches ADD COLUMN IF NOT EXISTS arrival_at TIMESTAMP;
+        
+        CREATE INDEX IF NOT EXISTS idx_route_stops
+            ON flight_searches(origin, destination, stops);
+        CREATE INDEX IF NOT EXISTS idx_route_duration
+            ON flight_searches(origin, destination, duration_minutes);
+        CREATE INDEX IF NOT EXISTS idx_route_departure_time
+            ON flight_searches(origin, destination, (departure_at::time));
+        CREATE INDEX IF NOT EXISTS idx_carrier_code ON flight_searches(carrier_code);
+        
+        -- Catálogo de rutas del monitor (ver route_catalog.py)
+        CREATE TABLE IF NOT EXISTS monitored_routes (
+            id SERIAL PRIMARY KEY,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            days_ahead JSONB NOT NULL DEFAULT '[30]',
+            return_days JSONB NOT NULL DEFAULT '[7]',
+            adults SMALLINT NOT NULL DEFAULT 1,
+            priority INTEGER NOT NULL DEFAULT 0,
+            target_price DECIMAL(10, 2),
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (origin, destination, adults)
+        );
+        
+        -- Estado del planificador adaptativo (ver scan_scheduler.py)
+        CREATE TABLE IF NOT EXISTS route_schedule (
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            adults SMALLINT NOT NULL,
+            days_ahead SMALLINT NOT NULL,
+            return_days SMALLINT NOT NULL,
+            next_scan_at TIMESTAMP NOT NULL,
+            last_scan_at TIMESTAMP,
+            scans INTEGER NOT NULL DEFAULT 0,
+            changes INTEGER NOT NULL DEFAULT 0,
+            change_rate REAL NOT NULL DEFAULT 0.5,
+            last_price DECIMAL(10, 2),
+            score REAL,
+            PRIMARY KEY (origin, destination, adults, days_ahead, return_days)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_route_schedule_next ON route_schedule(next_scan_at);
+        
+        -- Cola de búsquedas para varios workers del monitor (ver scan_worker.py)
+        CREATE TABLE IF NOT EXISTS scan_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults SMALLINT NOT NULL DEFAULT 1,
+            days_ahead SMALLINT NOT NULL,
+            return_days SMALLINT NOT NULL DEFAULT 0,
+            priority INTEGER NOT NULL DEFAULT 0,
+            target_price DECIMAL(10, 2),
+            score REAL,
+            change_rate REAL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            attempts SMALLINT NOT NULL DEFAULT 0,
+            max_attempts SMALLINT NOT NULL DEFAULT 3,
+            available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            worker_id VARCHAR(100),
+            lease_expires_at TIMESTAMP,
+            enqueued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            offers_found INTEGER,
+            offers_saved INTEGER,
+            min_price DECIMAL(10, 2),
+            changed BOOLEAN,
+            last_error TEXT
+        );
+        
+        -- Una sola búsqueda activa (pendiente o en curso) por clave del planificador
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_scan_jobs_active
+        ON scan_jobs(origin, destination, adults, days_ahead, return_days)
+        WHERE status IN ('pending', 'running');
+        
+        CREATE INDEX IF NOT EXISTS idx_scan_jobs_claim
+        ON scan_jobs(score DESC NULLS LAST, priority DESC, id)
+        WHERE status = 'pending';
+        
+        CREATE INDEX IF NOT EXISTS idx_scan_jobs_lease
+        ON scan_jobs(lease_expires_at)
+        WHERE status = 'running';
+        
+        CREATE INDEX IF NOT EXISTS idx_scan_jobs_finished
+        ON scan_jobs(finished_at)
+        WHERE status = 'done';
+        
+        -- Ejecuciones del monitor y estado de cada búsqueda (checkpoints)
+        CREATE TABLE IF NOT EXISTS monitor_runs (
+            id SERIAL PRIMARY KEY,
+            started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            status VARCHAR(12) NOT NULL DEFAULT 'running',
+            host VARCHAR(100),
+            resumed INTEGER NOT NULL DEFAULT 0,
+            jobs_planned INTEGER NOT NULL DEFAULT 0,
+            jobs_done INTEGER NOT NULL DEFAULT 0,
+            jobs_failed INTEGER NOT NULL DEFAULT 0,
+            jobs_skipped INTEGER NOT NULL DEFAULT 0,
+            offers_saved INTEGER NOT NULL DEFAULT 0
+        );
+        
+        -- Métricas para el historial de ejecuciones (ver run_report.py)
+        ALTER TABLE monitor_runs ADD COLUMN IF NOT EXISTS duration_seconds REAL NOT NULL DEFAULT 0;
+        ALTER TABLE monitor_runs ADD COLUMN IF NOT EXISTS api_calls INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE monitor_runs ADD COLUMN IF NOT EXISTS offers_found INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE monitor_runs ADD COLUMN IF NOT EXISTS changes INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE monitor_runs ADD COLUMN IF NOT EXISTS report JSONB;
+        
+        CREATE INDEX IF NOT EXISTS idx_monitor_runs_status ON monitor_runs(status, started_at);
+        
+        CREATE TABLE IF NOT EXISTS monitor_run_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            run_id INTEGER NOT NULL REFERENCES monitor_runs(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults SMALLINT NOT NULL,
+            days_ahead SMALLINT NOT NULL,
+            return_days SMALLINT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            target_price DECIMAL(10, 2),
+            score REAL,
+            change_rate REAL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            offers_found INTEGER,
+            offers_saved INTEGER,
+            min_price DECIMAL(10, 2),
+            error TEXT,
+            finished_at TIMESTAMP,
+            UNIQUE (run_id, origin, destination, adults, days_ahead, return_days)
+        );
+        
+        ALTER TABLE monitor_run_jobs ADD COLUMN IF NOT EXISTS http_status SMALLINT;
+        ALTER TABLE monitor_run_jobs ADD COLUMN IF NOT EXISTS fetch_ms INTEGER;
+        ALTER TABLE monitor_run_jobs ADD COLUMN IF NOT EXISTS latency_ms INTEGER;
+        
+        CREATE INDEX IF NOT EXISTS idx_monitor_run_jobs_run ON monitor_run_jobs(run_id, position);
+        CREATE INDEX IF NOT EXISTS idx_monitor_run_jobs_fresh
+        ON monitor_run_jobs(finished_at)
+        WHERE status = 'done';
+        
+        -- Llamadas a la API de Amadeus por día y origen (ver api_quota.py)
+        CREATE TABLE IF NOT EXISTS api_quota_usage (
+            day DATE NOT NULL,
+            source VARCHAR(20) NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (day, source)
+        );
+        
+        -- Vigilancias de precio objetivo y sus alertas (ver price_watches.py)
+        CREATE TABLE IF NOT EXISTS price_watches (
+            id SERIAL PRIMARY KEY,
+            owner VARCHAR(100) NOT NULL DEFAULT 'default',
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_from DATE NOT NULL,
+            departure_to DATE NOT NULL,
+            return_date DATE,
+            adults SMALLINT,
+            target_price DECIMAL(10, 2) NOT NULL,
+            currency VARCHAR(3) NOT NULL DEFAULT 'USD',
+            active BOOLEAN NOT NULL DEFAULT TRUE,
+            last_price DECIMAL(10, 2),
+            last_checked_at TIMESTAMP,
+            last_alert_price DECIMAL(10, 2),
+            last_triggered_at TIMESTAMP,
+            triggered_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CHECK (departure_to >= departure_from)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_watches_lookup
+        ON price_watches(origin, destination, departure_from)
+        WHERE active;
+        CREATE INDEX IF NOT EXISTS idx_price_watches_owner ON price_watches(owner, created_at);
+        
+        -- Serie (ver price_anomalies.series_key) del último precio y del último
+        -- aviso: un lote con otra fecha de la ventana no rearma la vigilancia
+        ALTER TABLE price_watches ADD COLUMN IF NOT EXISTS last_price_series VARCHAR(40);
+        ALTER TABLE price_watches ADD COLUMN IF NOT EXISTS last_alert_series VARCHAR(40);
+        
+        CREATE TABLE IF NOT EXISTS price_alerts (
+            id BIGSERIAL PRIMARY KEY,
+            watch_id INTEGER NOT NULL REFERENCES price_watches(id) ON DELETE CASCADE,
+            owner VARCHAR(100) NOT NULL,
+            search_id BIGINT,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults SMALLINT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            target_price DECIMAL(10, 2) NOT NULL,
+            previous_price DECIMAL(10, 2),
+            currency VARCHAR(3) NOT NULL,
+            airline VARCHAR(100),
+            triggered_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_watch ON price_alerts(watch_id, triggered_at);
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_owner ON price_alerts(owner, triggered_at);
+        
+        -- Una vigilancia por dueño y búsqueda: las duplicadas por altas
+        -- concurrentes anteriores al índice único se unen en la más antigua
+        -- (la activa, si hay) antes de crearlo
+        CREATE TEMP TABLE price_watch_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id
+        FROM (
+            SELECT id, FIRST_VALUE(id) OVER (
+                PARTITION BY owner, origin, destination, departure_from, departure_to,
+                             COALESCE(return_date, DATE '0001-01-01'), COALESCE(adults, 0), currency
+                ORDER BY active DESC, id
+            ) AS keep_id
+            FROM price_watches
+        ) ranked
+        WHERE id <> keep_id;
+        UPDATE price_alerts a SET watch_id = d.keep_id FROM price_watch_duplicates d WHERE a.watch_id = d.id;
+        DELETE FROM price_watches w USING price_watch_duplicates d WHERE w.id = d.id;
+        
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_price_watches_unique
+        ON price_watches(owner, origin, destination, departure_from, departure_to,
+                         (COALESCE(return_date, DATE '0001-01-01')), (COALESCE(adults, 0)), currency);
+        
+        -- Estado de las notificaciones de cada alerta (ver notifier.py)
+        ALTER TABLE price_alerts ADD COLUMN IF NOT EXISTS notified_at TIMESTAMP;
+        ALTER TABLE price_alerts ADD COLUMN IF NOT EXISTS notify_attempts INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE price_alerts ADD COLUMN IF NOT EXISTS notify_error TEXT;
+        
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_pending
+        ON price_alerts(triggered_at)
+        WHERE notified_at IS NULL;
+        
+        CREATE TABLE IF NOT EXISTS price_alert_deliveries (
+            alert_id BIGINT NOT NULL REFERENCES price_alerts(id) ON DELETE CASCADE,
+            channel VARCHAR(20) NOT NULL,
+            delivered_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (alert_id, channel)
+        );
+        
+        -- Caídas anómalas de precio (ver price_anomalies.py)
+        ALTER TABLE price_alerts ADD COLUMN IF NOT EXISTS kind VARCHAR(10) NOT NULL DEFAULT 'target';
+        
+        CREATE TABLE IF NOT EXISTS price_anomaly_state (
+            series_key VARCHAR(40) PRIMARY KEY,
+            departure_date DATE NOT NULL,
+            mean DOUBLE PRECISION NOT NULL,
+            variance DOUBLE PRECISION NOT NULL,
+            observations INTEGER NOT NULL,
+            last_anomaly_price DECIMAL(10, 2),
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_anomaly_state_departure ON price_anomaly_state(departure_date);
+        
+        CREATE TABLE IF NOT EXISTS price_anomalies (
+            id BIGSERIAL PRIMARY KEY,
+            detected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            search_id BIGINT,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults SMALLINT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            expected_price DECIMAL(10, 2) NOT NULL,
+            zscore REAL NOT NULL,
+            drop_pct REAL NOT NULL,
+            observations INTEGER NOT NULL,
+            currency VARCHAR(3) NOT NULL,
+            airline VARCHAR(100)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_anomalies_detected ON price_anomalies(detected_at);
+        CREATE INDEX IF NOT EXISTS idx_price_anomalies_route ON price_anomalies(origin, destination, detected_at);
+        
+        -- Sketches de cuantiles de precio por ruta, aerolínea y día (ver quantile_sketch.py)
+        CREATE TABLE IF NOT EXISTS price_sketches (
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            airline VARCHAR(100) NOT NULL,
+            day DATE NOT NULL,
+            observations INTEGER NOT NULL,
+            sketch BYTEA NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (origin, destination, airline, day)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_sketches_day ON price_sketches(day);
+        
+        -- Carga inicial desde el histórico (solo si la dimensión está vacía)
+        INSERT INTO routes (origin, destination, first_seen, last_seen, observation_count, last_price)
+        SELECT 
+            origin,
+            destination,
+            MIN(search_timestamp),
+            MAX(COALESCE(last_seen, search_timestamp)),
+            COUNT(*),
+            (ARRAY_AGG(price ORDER BY search_timestamp DESC))[1]
+        FROM flight_searches
+        WHERE NOT EXISTS (SELECT 1 FROM routes)
+        GROUP BY origin, destination
+        ON CONFLICT (origin, destination) DO NOTHING;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(create_table_query)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"Error creando tablas: {str(e)}")
+            raise
+    
+    def insert_flight_offer(
+        self,
+        origin: str,
+        destination: str,
+        departure_date: str,
+        return_date: Optional[str],
+        adults: int,
+        price: float,
+        currency: str,
+        airline: Optional[str],
+        flight_data: Dict,
+        change_only: bool = False
+    ) -> int:
+        """
+        Inserta una oferta de vuelo en la base de datos
+        
+        En modo `change_only` la oferta solo se agrega como nueva observación
+        si el precio o los asientos disponibles cambiaron respecto de la
+        última observación del mismo itinerario; si no cambiaron, solo se
+        actualiza `last_seen` de esa fila.
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            departure_date: Fecha de salida (YYYY-MM-DD)
+            return_date: Fecha de regreso (YYYY-MM-DD) o None
+            adults: Número de adultos
+            price: Precio del vuelo
+            currency: Moneda (USD, EUR, etc.)
+            airline: Nombre de la aerolínea
+            flight_data: Datos completos del vuelo en formato dict. Si incluye
+                `raw_data`, se guarda una única vez en `flight_payloads` y la
+                fila solo conserva el hash de referencia.
+            change_only: Guardar solo cambios de precio/disponibilidad
+            
+        Returns:
+            ID del registro insertado (o de la observación vigente si no hubo cambios)
+        """
+        offer = {
+            'origin': origin,
+            'destination': destination,
+            'departure_date': departure_date,
+            'return_date': return_date,
+            'adults': adults,
+            'price': price,
+            'currency': currency,
+            'airline': airline,
+            'flight_data': flight_data
+        }
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                flight_id, _ = self._write_offer(cursor, offer, change_only)
+                self._update_price_sketches(cursor, [(offer, flight_id)])
+                anomalies = self._detect_price_anomalies(cursor, [(offer, flight_id)])
+                self._evaluate_price_watches(cursor, [(offer, flight_id)], anomalies)
+                self._bump_generation(cursor)
+                
+                conn.commit()
+                cursor.close()
+            self._invalidate_cache()
+            
+            return flight_id
+            
+        except Exception as e:
+            print(f"Error insertando oferta: {str(e)}")
+            raise
+    
+    def insert_flight_offers(
+        self,
+        offers: List[Dict],
+        change_only: bool = False,
+        run_job_id: Optional[int] = None
+    ) -> int:
+        """
+        Inserta un lote de ofertas en una sola conexión y transacción
+        
+        Con `run_job_id` el lote es el resultado de una búsqueda de una
+        ejecución del monitor (`monitor_run_jobs`): la búsqueda se marca como
+        terminada en la misma transacción, y si ya estaba terminada (un
+        reintento después de una caída) no se inserta nada. Así un reintento
+        nunca duplica filas.
+        
+        Args:
+            offers: Lista de diccionarios con las mismas claves que los
+                argumentos de `insert_flight_offer` (origin, destination,
+                departure_date, return_date, adults, price, currency,
+                airline, flight_data)
+            change_only: Guardar solo cambios de precio/disponibilidad
+            run_job_id: Búsqueda de `monitor_run_jobs` a marcar como terminada
+            
+        Returns:
+            Número de filas nuevas insertadas (sin contar observaciones sin cambios)
+        """
+        if not offers and run_job_id is None:
+            return 0
+        
+        return self.insert_scan_results([(offers, run_job_id)], change_only)[0] or 0
+    
+    def insert_scan_results(
+        self,
+        results: List[Tuple[List[Dict], Optional[int]]],
+        change_only: bool = False
+    ) -> List[Optional[int]]:
+        """
+        Inserta los resultados de varias búsquedas en una sola transacción
+        
+        Lo usa el escritor del pipeline del monitor para agrupar búsquedas.
+        Cada búsqueda con `run_job_id` se marca como terminada en la misma
+        transacción (ver `insert_flight_offers`), y las ofertas del lote se
+        evalúan contra las vigilancias de precio (ver `price_watches.py`) y
+        el detector de caídas anómalas (ver `price_anomalies.py`) y se
+        agregan a los sketches de percentiles (ver `quantile_sketch.py`).
+        
+        Args:
+            results: Lista de tuplas (ofertas, run_job_id o None)
+            change_only: Guardar solo cambios de precio/disponibilidad
+            
+        Returns:
+            Filas nuevas insertadas por búsqueda, en el mismo orden (None si
+            la búsqueda ya estaba terminada y no se escribió nada)
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                written = []
+                inserted = [self._write_scan_result(cursor, offers, change_only, run_job_id, written)
+                            for offers, run_job_id in results]
+                self._update_price_sketches(cursor, written)
+                anomalies = self._detect_price_anomalies(cursor, written)
+                self._evaluate_price_watches(cursor, written, anomalies)
+                self._bump_generation(cursor)
+                
+                conn.commit()
+                cursor.close()
+            self._invalidate_cache()
+            
+            return inserted
+            
+        except Exception as e:
+            print(f"Error insertando lote de ofertas: {str(e)}")
+            raise
+    
+    def _write_scan_result(self, cursor, offers: List[Dict], change_only: bool,
+                           run_job_id: Optional[int], written: Optional[List] = None) -> Optional[int]:
+        """
+        Escribe las ofertas de una búsqueda y su checkpoint (sin hacer commit)
+        
+        Args:
+            written: Lista donde agregar las tuplas (oferta, ID de la fila)
+                escritas, para evaluar las vigilancias de precio
+        
+        Returns:
+            Filas nuevas insertadas, o None si la búsqueda ya estaba terminada
+        """
+        if run_job_id is not None:
+            # Bloquea la búsqueda: un reintento concurrente espera y la ve terminada
+            cursor.execute("SELECT status FROM monitor_run_jobs WHERE id = %s FOR UPDATE;", (run_job_id,))
+            row = cursor.fetchone()
+            if row is not None and row[0] == 'done':
+                return None
+        
+        inserted = 0
+        for offer in offers:
+            flight_id, is_new = self._write_offer(cursor, offer, change_only)
+            inserted += int(is_new)
+            if written is not None:
+                written.append((offer, flight_id))
+        
+        if run_job_id is not None:
+            cursor.execute("""
+            UPDATE monitor_run_jobs
+            SET status = 'done', offers_found = %s, offers_saved = %s, min_price = %s,
+                error = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s;
+            """, (len(offers), inserted,
+                  min((float(offer['price']) for offer in offers), default=None), run_job_id))
+            cursor.execute("""
+            UPDATE monitor_runs SET updated_at = CURRENT_TIMESTAMP
+            WHERE id = (SELECT run_id FROM monitor_run_jobs WHERE id = %s);
+            """, (run_job_id,))
+        
+        return inserted
+    
+    def _update_price_sketches(self, cursor, written: List[Tuple[Dict, int]]) -> int:
+        """
+        Agrega los precios del lote a los sketches del día (sin hacer commit)
+        
+        Cuenta todas las ofertas vistas, también las que `change_only` no
+        guardó como fila nueva. Los sketches del lote se crean si faltan y
+        se bloquean en orden de clave (dos escritores concurrentes no pierden
+        precios). Un error acá no pierde el lote: se revierte solo la
+        actualización.
+        
+        Args:
+            written: Tuplas (oferta, ID de la fila en `flight_searches`)
+            
+        Returns:
+            Número de sketches actualizados
+        """
+        groups = sketch_groups(offer for offer, _ in written)
+        if not groups:
+            return 0
+        
+        day = date.today()
+        keys = sorted(groups)
+        
+        create_query = """
+        INSERT INTO price_sketches (origin, destination, airline, day, observations, sketch)
+        VALUES %s
+        ON CONFLICT (origin, destination, airline, day) DO NOTHING;
+        """
+        
+        lock_query = """
+        SELECT s.origin, s.destination, s.airline, s.sketch
+        FROM price_sketches s
+        JOIN (VALUES %s) AS k (origin, destination, airline, day)
+          ON s.origin = k.origin
+         AND s.destination = k.destination
+         AND s.airline = k.airline
+         AND s.day = k.day
+        ORDER BY s.origin, s.destination, s.airline
+        FOR UPDATE OF s;
+        """
+        
+        update_query = """
+        UPDATE price_sketches s
+        SET observations = v.observations,
+            sketch = v.sketch,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v (origin, destination, airline, day, observations, sketch)
+        WHERE s.origin = v.origin
+          AND s.destination = v.destination
+          AND s.airline = v.airline
+          AND s.day = v.day;
+        """
+        
+        empty = KLLSketch().to_bytes()
+        
+        cursor.execute("SAVEPOINT price_sketches;")
+        try:
+            execute_values(cursor, create_query, [key + (day, 0, empty) for key in keys],
+                           template="(%s, %s, %s, %s::date, %s, %s::bytea)")
+            # Una sola página: el bloqueo en orden de clave vale para todo el lote
+            rows = execute_values(cursor, lock_query, [key + (day,) for key in keys],
+                                  template="(%s, %s, %s, %s::date)", page_size=len(keys), fetch=True)
+            
+            updates = []
+            for origin, destination, airline, data in rows:
+                sketch = KLLSketch.from_bytes(bytes(data))
+                sketch.extend(groups[(origin, destination, airline)])
+                updates.append((origin, destination, airline, day, sketch.count, sketch.to_bytes()))
+            execute_values(cursor, update_query, updates,
+                           template="(%s, %s, %s, %s::date, %s::integer, %s::bytea)")
+            cursor.execute("RELEASE SAVEPOINT price_sketches;")
+            return len(updates)
+            
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT price_sketches;")
+            print(f"Error actualizando sketches de precio: {str(e)}")
+            return 0
+    
+    def _detect_price_anomalies(self, cursor, written: List[Tuple[Dict, int]]) -> Dict[str, Dict]:
+        """
+        Actualiza el estado EWMA de las series del lote y registra las caídas anómalas (sin hacer commit)
+        
+        Los estados del lote se leen y bloquean con una sola consulta por
+        clave primaria, en orden de clave. Un error acá no pierde el lote:
+        se revierte solo la detección.
+        
+        Args:
+            written: Tuplas (oferta, ID de la fila en `flight_searches`)
+            
+        Returns:
+            Anomalías del lote por clave de serie (ver `price_anomalies.detect`)
+        """
+        observations = best_observations(written)
+        if not observations:
+            return {}
+        
+        state_query = """
+        SELECT series_key, mean, variance, observations, last_anomaly_price
+        FROM price_anomaly_state
+        WHERE series_key = ANY(%s)
+        ORDER BY series_key
+        FOR UPDATE;
+        """
+        
+        upsert_query = """
+        INSERT INTO price_anomaly_state
+        (series_key, departure_date, mean, variance, observations, last_anomaly_price, updated_at)
+        VALUES %s
+        ON CONFLICT (series_key) DO UPDATE
+        SET mean = EXCLUDED.mean,
+            variance = EXCLUDED.variance,
+            observations = EXCLUDED.observations,
+            last_anomaly_price = EXCLUDED.last_anomaly_price,
+            updated_at = EXCLUDED.updated_at;
+        """
+        
+        anomaly_query = """
+        INSERT INTO price_anomalies
+        (search_id, origin, destination, departure_date, return_date, adults, price,
+         expected_price, zscore, drop_pct, observations, currency, airline)
+        VALUES %s;
+        """
+        
+        cursor.execute("SAVEPOINT price_anomalies;")
+        try:
+            state_cursor = cursor.connection.cursor(cursor_factory=RealDictCursor)
+            state_cursor.execute(state_query, (sorted({series_key(obs) for obs in observations}),))
+            states = {row['series_key']: dict(row) for row in state_cursor.fetchall()}
+            state_cursor.close()
+            
+            new_states, anomalies = detect_anomalies(states, observations)
+            execute_values(cursor, upsert_query, [
+                (state['series_key'], state['departure_date'], state['mean'], state['variance'],
+                 state['observations'], state['last_anomaly_price'])
+                for state in sorted(new_states, key=lambda state: state['series_key'])
+            ], template="(%s, %s::date, %s, %s, %s, %s::numeric, CURRENT_TIMESTAMP)")
+            if anomalies:
+                execute_values(cursor, anomaly_query, [
+                    (a['search_id'], a['origin'], a['destination'], a['departure_date'], a['return_date'],
+                     a['adults'], a['price'], a['expected_price'], a['zscore'], a['drop_pct'],
+                     a['observations'], a['currency'], a['airline'])
+                    for a in anomalies
+                ])
+            cursor.execute("RELEASE SAVEPOINT price_anomalies;")
+            return {anomaly['series_key']: anomaly for anomaly in anomalies}
+            
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT price_anomalies;")
+            print(f"Error detectando anomalías de precio: {str(e)}")
+            return {}
+    
+    def _evaluate_price_watches(self, cursor, written: List[Tuple[Dict, int]],
+                                anomalies: Optional[Dict[str, Dict]] = None) -> int:
+        """
+        Evalúa las vigilancias de precio contra ofertas recién escritas (sin hacer commit)
+        
+        Las vigilancias que coinciden se buscan con una sola consulta por
+        índice y se bloquean en orden de ID (dos escritores concurrentes no
+        generan la misma alerta dos veces). Un error acá no pierde el lote:
+        se revierte solo la evaluación.
+        
+        Args:
+            written: Tuplas (oferta, ID de la fila en `flight_searches`)
+            anomalies: Caídas anómalas del lote (ver `_detect_price_anomalies`)
+            
+        Returns:
+            Número de alertas registradas
+        """
+        observations = best_observations(written)
+        if not observations:
+            return 0
+        
+        match_query = """
+        SELECT w.id AS watch_id, w.owner, w.target_price, w.last_price, w.last_price_series,
+               w.last_alert_price, w.last_alert_series, o.origin, o.destination, o.departure_date, o.return_date, o.adults,
+               o.currency, o.price, o.airline, o.search_id
+        FROM (VALUES %s) AS o (origin, destination, departure_date, return_date, adults,
+                               currency, price, airline, search_id, window_start)
+        JOIN price_watches w
+          ON w.active
+         AND w.origin = o.origin
+         AND w.destination = o.destination
+         AND w.departure_from BETWEEN o.window_start AND o.departure_date
+         AND w.departure_to >= o.departure_date
+         AND (w.return_date IS NULL OR w.return_date = o.return_date)
+         AND (w.adults IS NULL OR w.adults = o.adults)
+         AND w.currency = o.currency
+        ORDER BY w.id
+        FOR UPDATE OF w;
+        """
+        
+        update_query = """
+        UPDATE price_watches w
+        SET last_price = v.last_price,
+            last_price_series = v.last_price_series,
+            last_checked_at = CURRENT_TIMESTAMP,
+            last_alert_price = v.last_alert_price,
+            last_alert_series = v.last_alert_series,
+            triggered_count = w.triggered_count + CASE WHEN v.alerted THEN 1 ELSE 0 END,
+            last_triggered_at = CASE WHEN v.alerted THEN CURRENT_TIMESTAMP ELSE w.last_triggered_at END
+        FROM (VALUES %s) AS v (id, last_price, last_price_series, last_alert_price, last_alert_series, alerted)
+        WHERE w.id = v.id;
+        """
+        
+        alert_query = """
+        INSERT INTO price_alerts
+        (watch_id, owner, search_id, origin, destination, departure_date, return_date, adults,
+         price, target_price, previous_price, currency, airline, kind)
+        VALUES %s;
+        """
+        
+        rows = [
+            (obs['origin'], obs['destination'], obs['departure_date'], obs['return_date'], obs['adults'],
+             obs['currency'], obs['price'], obs['airline'], obs['search_id'], window_start(obs['departure_date']))
+            for obs in observations
+        ]
+        
+        cursor.execute("SAVEPOINT price_watches;")
+        try:
+            match_cursor = cursor.connection.cursor(cursor_factory=RealDictCursor)
+            # Una sola página: el bloqueo en orden de ID vale para todo el lote
+            matches = execute_values(
+                match_cursor, match_query, rows,
+                template="(%s, %s, %s::date, %s::date, %s::smallint, %s, %s::numeric, %s, %s::bigint, %s::date)",
+                page_size=len(rows), fetch=True
+            )
+            match_cursor.close()
+            
+            updates, alerts = evaluate_matches(matches, anomalies)
+            if updates:
+                execute_values(cursor, update_query,
+                               [(u['watch_id'], u['last_price'], u['last_price_series'], u['last_alert_price'],
+                                 u['last_alert_series'], u['alerted'])
+                                for u in updates],
+                               template="(%s::integer, %s::numeric, %s::varchar, %s::numeric, %s::varchar, %s::boolean)")
+            if alerts:
+                execute_values(cursor, alert_query, [
+                    (a['watch_id'], a['owner'], a['search_id'], a['origin'], a['destination'],
+                     a['departure_date'], a['return_date'], a['adults'], a['price'], a['target_price'],
+                     a['previous_price'], a['currency'], a['airline'], a['kind'])
+                    for a in alerts
+                ])
+            cursor.execute("RELEASE SAVEPOINT price_watches;")
+            return len(alerts)
+            
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT price_watches;")
+            print(f"Error evaluando vigilancias de precio: {str(e)}")
+            return 0
+    
+    def enqueue_flight_offers(self, offers: List[Dict], change_only: bool = False) -> int:
+        """
+        Encola ofertas para escritura diferida en segundo plano
+        
+        La cola (`write_queue.WriteBehindQueue`) se crea con el primer uso y
+        pertenece a esta instancia, por lo que todas las sesiones de la app
+        que comparten la base comparten también el escritor.
+        
+        Args:
+            offers: Lista de diccionarios con los campos de `insert_flight_offer`
+            change_only: Guardar solo cambios de precio/disponibilidad
+            
+        Returns:
+            Profundidad de la cola después de encolar
+        """
+        with self._write_queue_lock:
+            if self.write_queue is None:
+                self.write_queue = WriteBehindQueue(self)
+        
+        return self.write_queue.enqueue(offers, change_only)
+    
+    def write_queue_stats(self) -> Dict:
+        """
+        Obtiene las métricas de la cola de escritura diferida
+        
+        Returns:
+            Diccionario con profundidad, ofertas escritas/fallidas y latencia
+            de vaciado (vacío si la cola no se usó)
+        """
+        return self.write_queue.stats() if self.write_queue is not None else {}
+    
+    def _write_offer(self, cursor, offer: Dict, change_only: bool) -> Tuple[int, bool]:
+        """
+        Escribe una oferta usando un cursor abierto (sin hacer commit)
+        
+        Args:
+            cursor: Cursor de la transacción en curso
+            offer: Diccionario con los campos de `insert_flight_offer`
+            change_only: Guardar solo cambios de precio/disponibilidad
+            
+        Returns:
+            Tupla (ID de la fila, True si se insertó una fila nueva)
+        """
+        payload_query = """
+        INSERT INTO flight_payloads (payload_hash, payload)
+        VALUES (%s, %s)
+        ON CONFLICT (payload_hash) DO NOTHING;
+        """
+        
+        insert_query = """
+        INSERT INTO flight_searches 
+        (origin, destination, departure_date, return_date, adults, price, currency, airline,
+         flight_data, payload_hash, itinerary_fingerprint, bookable_seats, last_seen,
+         duration_minutes, stops, carrier_code, departure_at, arrival_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP,
+                %s, %s, %s, %s, %s)
+        RETURNING id;
+        """
+        
+        last_observation_query = """
+        SELECT id, price, bookable_seats
+        FROM flight_searches
+        WHERE itinerary_fingerprint = %s
+        ORDER BY id DESC
+        LIMIT 1
+        FOR UPDATE;
+        """
+        
+        touch_query = """
+        UPDATE flight_searches
+        SET last_seen = CURRENT_TIMESTAMP
+        WHERE id = %s;
+        """
+        
+        route_query = """
+        INSERT INTO routes (origin, destination, first_seen, last_seen, observation_count, last_price)
+        VALUES (%s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1, %s)
+        ON CONFLICT (origin, destination) DO UPDATE
+        SET last_seen = EXCLUDED.last_seen,
+            observation_count = routes.observation_count + 1,
+            last_price = EXCLUDED.last_price;
+        """
+        
+        origin = offer['origin']
+        destination = offer['destination']
+        price = offer['price']
+        
+        # El pipeline del monitor ya los calculó en su etapa de normalización
+        prepared = offer.get('prepared') or prepare_offer(offer)
+        fingerprint = prepared['fingerprint']
+        attributes = prepared['attributes']
+        bookable_seats = attributes['bookable_seats']
+        flight_data, raw_data, payload_hash = prepared['flight_data'], prepared['raw_data'], prepared['payload_hash']
+        
+        # Asegurar que airline no sea None
+        airline = offer.get('airline')
+        if airline is None or airline == '':
+            airline = 'N/A'
+        
+        if change_only:
+            self._execute(cursor, 'fs_last_observation', last_observation_query, (fingerprint,))
+            last = cursor.fetchone()
+            
+            if (last is not None
+                    and round(float(last[1]), 2) == round(float(price), 2)
+                    and last[2] == bookable_seats):
+                self._execute(cursor, 'fs_touch_observation', touch_query, (last[0],))
+                self._execute(cursor, 'fs_upsert_route', route_query, (origin, destination, price))
+                return last[0], False
+        
+        if payload_hash:
+            self._execute(cursor, 'fs_insert_payload', payload_query, (payload_hash, Json(raw_data)))
+        
+        self._execute(
+            cursor,
+            'fs_insert_search',
+            insert_query,
+            (origin, destination, offer['departure_date'], offer.get('return_date'),
+             offer.get('adults', 1), price, offer.get('currency', 'USD'), airline,
+             Json(flight_data), payload_hash, fingerprint, bookable_seats,
+             attributes['duration_minutes'], attributes['stops'],
+             attributes['carrier_code'], attributes['departure_at'],
+             attributes['arrival_at'])
+        )
+        
+        flight_id = cursor.fetchone()[0]
+        self._execute(cursor, 'fs_upsert_route', route_query, (origin, destination, price))
+        
+        return flight_id, True
+    
+    @cached_query
+    def get_recent_searches(self, limit: int = 100) -> List[Dict]:
+        """
+        Obtiene las búsquedas más recientes
+        
+        Args:
+            limit: Número máximo de registros a retornar
+            
+        Returns:
+            Lista de diccionarios con los datos de búsquedas
+        """
+        query = """
+        SELECT 
+            id,
+            search_timestamp,
+            origin,
+            destination,
+            departure_date,
+            return_date,
+            adults,
+            price,
+            currency,
+            airline,
+            created_at
+        FROM flight_searches
+        ORDER BY search_timestamp DESC
+        LIMIT %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (limit,))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo búsquedas recientes: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_unique_routes(self, order_by: str = 'route') -> List[Tuple[str, str]]:
+        """
+        Obtiene todas las rutas únicas (origen-destino) en la base de datos
+        
+        Lee la dimensión `routes`, que se mantiene en cada inserción, por lo
+        que el costo no depende del tamaño del histórico.
+        
+        Args:
+            order_by: 'route' (alfabético) o 'activity' (más recientes y con
+                más observaciones primero)
+        
+        Returns:
+            Lista de tuplas (origen, destino)
+        """
+        order_clauses = {
+            'route': 'origin, destination',
+            'activity': 'last_seen DESC, observation_count DESC'
+        }
+        
+        query = f"""
+        SELECT origin, destination
+        FROM routes
+        ORDER BY {order_clauses.get(order_by, order_clauses['route'])};
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                
+                routes = cursor.fetchall()
+                cursor.close()
+            
+            return routes if routes else []
+            
+        except Exception as e:
+            print(f"Error obteniendo rutas: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_route_summaries(self, order_by: str = 'activity') -> List[Dict]:
+        """
+        Obtiene la dimensión de rutas con su actividad
+        
+        Args:
+            order_by: 'route' (alfabético) o 'activity' (más recientes primero)
+        
+        Returns:
+            Lista de diccionarios con origin, destination, first_seen,
+            last_seen, observation_count y last_price
+        """
+        order_clauses = {
+            'route': 'origin, destination',
+            'activity': 'last_seen DESC, observation_count DESC'
+        }
+        
+        query = f"""
+        SELECT origin, destination, first_seen, last_seen, observation_count, last_price
+        FROM routes
+        ORDER BY {order_clauses.get(order_by, order_clauses['activity'])};
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query)
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo resumen de rutas: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_searches_by_route(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> List[Dict]:
+        """
+        Obtiene búsquedas para una ruta específica en los últimos N días
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+            
+        Returns:
+            Lista de diccionarios con los datos
+        """
+        query = """
+        SELECT 
+            id,
+            search_timestamp,
+            origin,
+            destination,
+            departure_date,
+            return_date,
+            adults,
+            price,
+            currency,
+            airline,
+            created_at
+        FROM flight_searches
+        WHERE origin = %s 
+          AND destination = %s
+          AND search_timestamp >= %s
+        ORDER BY search_timestamp DESC;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                
+                cutoff_date = datetime.now() - timedelta(days=days)
+                self._execute(cursor, 'fs_searches_by_route', query, (origin, destination, cutoff_date))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo búsquedas por ruta: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_filtered_searches(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30,
+        max_stops: Optional[int] = None,
+        max_duration_minutes: Optional[int] = None,
+        departure_time_from: Optional[Union[str, time]] = None,
+        departure_time_to: Optional[Union[str, time]] = None,
+        carrier_code: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Obtiene búsquedas de una ruta filtrando por atributos del itinerario
+        
+        Los filtros usan las columnas tipadas e indexadas, sin extraer datos
+        del JSONB fila por fila. Si `departure_time_from` es mayor que
+        `departure_time_to` el rango cruza la medianoche (ej: 22:00 a 06:00).
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+            max_stops: Máximo de escalas (0 = solo directos)
+            max_duration_minutes: Duración máxima del viaje de ida en minutos
+            departure_time_from: Hora de salida mínima ('HH:MM' o time)
+            departure_time_to: Hora de salida máxima ('HH:MM' o time)
+            carrier_code: Código IATA de la aerolínea operadora
+            
+        Returns:
+            Lista de diccionarios con los datos y los atributos tipados
+        """
+        conditions = [
+            "origin = %s",
+            "destination = %s",
+            "search_timestamp >= %s"
+        ]
+        params = [origin, destination, datetime.now() - timedelta(days=days)]
+        
+        if max_stops is not None:
+            conditions.append("stops <= %s")
+            params.append(max_stops)
+        
+        if max_duration_minutes is not None:
+            conditions.append("duration_minutes <= %s")
+            params.append(max_duration_minutes)
+        
+        if departure_time_from is not None and departure_time_to is not None:
+            joiner = 'AND' if str(departure_time_from) <= str(departure_time_to) else 'OR'
+            conditions.append(
+                f"(departure_at::time >= %s {joiner} departure_at::time <= %s)"
+            )
+            params.extend([departure_time_from, departure_time_to])
+        elif departure_time_from is not None:
+            conditions.append("departure_at::time >= %s")
+            params.append(departure_time_from)
+        elif departure_time_to is not None:
+            conditions.append("departure_at::time <= %s")
+            params.append(departure_time_to)
+        
+        if carrier_code:
+            conditions.append("carrier_code = %s")
+            params.append(carrier_code)
+        
+        query = f"""
+        SELECT 
+            id,
+            search_timestamp,
+            origin,
+            destination,
+            departure_date,
+            return_date,
+            adults,
+            price,
+            currency,
+            airline,
+            carrier_code,
+            stops,
+            duration_minutes,
+            departure_at,
+            arrival_at,
+            bookable_seats,
+            created_at
+        FROM flight_searches
+        WHERE {' AND '.join(conditions)}
+        ORDER BY search_timestamp DESC;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, params)
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo búsquedas filtradas: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_price_series(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> List[Dict]:
+        """
+        Reconstruye la serie temporal escalonada de precios de una ruta
+        
+        Cada observación vale desde `search_timestamp` hasta `last_seen`, por
+        lo que se devuelven dos puntos por observación (inicio y fin del
+        tramo). Graficada con `line_shape='hv'` agrupando por
+        `itinerary_fingerprint`, la serie es equivalente a guardar todas las
+        búsquedas aunque se hayan almacenado solo los cambios.
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+            
+        Returns:
+            Lista de puntos con timestamp, price, airline, departure_date e
+            itinerary_fingerprint, ordenados por itinerario y tiempo
+        """
+        query = """
+        SELECT 
+            search_timestamp,
+            COALESCE(last_seen, search_timestamp) AS last_seen,
+            price,
+            airline,
+            departure_date,
+            COALESCE(itinerary_fingerprint, id::text) AS itinerary_fingerprint
+        FROM flight_searches
+        WHERE origin = %s 
+          AND destination = %s
+          AND COALESCE(last_seen, search_timestamp) >= %s
+        ORDER BY itinerary_fingerprint, search_timestamp;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                
+                cutoff_date = datetime.now() - timedelta(days=days)
+                cursor.execute(query, (origin, destination, cutoff_date))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            points = []
+            for row in results:
+                point = {
+                    'timestamp': row['search_timestamp'],
+                    'price': row['price'],
+                    'airline': row['airline'],
+                    'departure_date': row['departure_date'],
+                    'itinerary_fingerprint': row['itinerary_fingerprint']
+                }
+                points.append(point)
+                if row['last_seen'] > row['search_timestamp']:
+                    points.append(dict(point, timestamp=row['last_seen']))
+            
+            return points
+            
+        except Exception as e:
+            print(f"Error obteniendo serie de precios: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_price_statistics(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> Dict:
+        """
+        Obtiene estadísticas de precios para una ruta
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+            
+        Returns:
+            Diccionario con estadísticas (min, max, avg, count)
+        """
+        query = """
+        SELECT 
+            MIN(price) as min_price,
+            MAX(price) as max_price,
+            AVG(price) as avg_price,
+            COUNT(*) as search_count
+        FROM flight_searches
+        WHERE origin = %s 
+          AND destination = %s
+          AND search_timestamp >= %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                
+                cutoff_date = datetime.now() - timedelta(days=days)
+                self._execute(cursor, 'fs_price_statistics', query, (origin, destination, cutoff_date))
+                
+                result = cursor.fetchone()
+                cursor.close()
+            
+            return dict(result) if result else {}
+            
+        except Exception as e:
+            print(f"Error obteniendo estadísticas: {str(e)}")
+            return {}
+    
+    @cached_query
+    def get_cheapest_by_airline(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> List[Dict]:
+        """
+        Obtiene el precio más barato por aerolínea para una ruta
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+            
+        Returns:
+            Lista con el precio mínimo por aerolínea
+        """
+        query = """
+        SELECT 
+            airline,
+            MIN(price) as min_price,
+            COUNT(*) as occurrences
+        FROM flight_searches
+        WHERE origin = %s 
+          AND destination = %s
+          AND search_timestamp >= %s
+          AND airline IS NOT NULL
+          AND airline != 'N/A'
+        GROUP BY airline
+        ORDER BY min_price ASC;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                
+                cutoff_date = datetime.now() - timedelta(days=days)
+                self._execute(cursor, 'fs_cheapest_by_airline', query, (origin, destination, cutoff_date))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo precios por aerolínea: {str(e)}")
+            return []
+    
+    @cached_query
+    def get_price_quantiles(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30,
+        quantiles: Tuple[float, ...] = DEFAULT_QUANTILES,
+        airline: Optional[str] = None
+    ) -> Dict:
+        """
+        Obtiene percentiles de precio de una ruta desde los sketches diarios
+        
+        Combina un sketch por día (ver `quantile_sketch.py`): el costo depende
+        de `days`, no de la cantidad de ofertas. Los percentiles tienen un
+        error de rango de a lo sumo `quantile_sketch.RANK_ERROR_BOUND`; el
+        mínimo y el máximo son exactos.
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás (por día de búsqueda)
+            quantiles: Percentiles entre 0 y 1
+            airline: Solo esta aerolínea (por defecto, todas)
+            
+        Returns:
+            Diccionario con count, min_price, max_price y p10, p50, etc.
+            (vacío si no hay datos)
+        """
+        query = """
+        SELECT sketch
+        FROM price_sketches
+        WHERE origin = %s
+          AND destination = %s
+          AND airline = %s
+          AND day >= %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                cutoff_day = date.today() - timedelta(days=days)
+                self._execute(cursor, 'ps_price_quantiles', query,
+                              (origin, destination, airline or ALL_AIRLINES, cutoff_day))
+                
+                rows = cursor.fetchall()
+                cursor.close()
+            
+            return summarize(merge_all(KLLSketch.from_bytes(bytes(row[0])) for row in rows), quantiles)
+            
+        except Exception as e:
+            print(f"Error obteniendo percentiles de precio: {str(e)}")
+            return {}
+    
+    @cached_query
+    def get_price_quantiles_by_airline(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30,
+        quantiles: Tuple[float, ...] = DEFAULT_QUANTILES
+    ) -> List[Dict]:
+        """
+        Obtiene percentiles de precio por aerolínea para una ruta (ver `get_price_quantiles`)
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás (por día de búsqueda)
+            quantiles: Percentiles entre 0 y 1
+            
+        Returns:
+            Lista con airline más los campos de `get_price_quantiles`, de
+            menor a mayor mediana estimada
+        """
+        query = """
+        SELECT airline, sketch
+        FROM price_sketches
+        WHERE origin = %s
+          AND destination = %s
+          AND day >= %s
+          AND airline NOT IN (%s, 'N/A');
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                cutoff_day = date.today() - timedelta(days=days)
+                self._execute(cursor, 'ps_price_quantiles_by_airline', query,
+                              (origin, destination, cutoff_day, ALL_AIRLINES))
+                
+                rows = cursor.fetchall()
+                cursor.close()
+            
+            sketches = {}
+            for airline, data in rows:
+                sketches.setdefault(airline, KLLSketch()).merge(KLLSketch.from_bytes(bytes(data)))
+            
+            results = [dict(summarize(sketch, quantiles), airline=airline) for airline, sketch in sketches.items()]
+            return sorted(results, key=lambda row: (row.get('p50', row['min_price']), row['airline']))
+            
+        except Exception as e:
+            print(f"Error obteniendo percentiles por aerolínea: {str(e)}")
+            return []
+    
+    def iter_flight_history(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        chunk_size: int = 10000,
+        seen_before: Optional[datetime] = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Recorre el histórico de búsquedas en bloques sin cargarlo entero en memoria
+        
+        Usa un cursor del lado del servidor, por lo que solo hay un bloque
+        de filas en memoria a la vez (pensado para exportaciones).
+        
+        Args:
+            origin: Filtrar por código IATA de origen (opcional)
+            destination: Filtrar por código IATA de destino (opcional)
+            date_from: Incluir búsquedas desde este momento (opcional)
+            date_to: Incluir búsquedas anteriores a este momento (opcional)
+            chunk_size: Filas por bloque
+            seen_before: Incluir solo observaciones vistas por última vez
+                (`last_seen`) antes de este momento (opcional, ver
+                `delete_old_searches`)
+            
+        Yields:
+            Listas de hasta `chunk_size` diccionarios ordenadas por id
+        """
+        conditions = []
+        params = []
+        
+        if origin:
+            conditions.append("origin = %s")
+            params.append(origin)
+        if destination:
+            conditions.append("destination = %s")
+            params.append(destination)
+        if date_from:
+            conditions.append("search_timestamp >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("search_timestamp < %s")
+            params.append(date_to)
+        if seen_before:
+            conditions.append("COALESCE(last_seen, search_timestamp) < %s")
+            params.append(seen_before)
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        query = f"""
+        SELECT 
+            id,
+            search_timestamp,
+            last_seen,
+            origin,
+            destination,
+            departure_date,
+            return_date,
+            adults,
+            price,
+            currency,
+            airline,
+            carrier_code,
+            stops,
+            duration_minutes,
+            departure_at,
+            arrival_at,
+            bookable_seats,
+            itinerary_fingerprint
+        FROM flight_searches
+        {where_clause}
+        ORDER BY id;
+        """
+        
+        with self._connection() as conn:
+            cursor = conn.cursor(name='flight_history_export', cursor_factory=RealDictCursor)
+            cursor.itersize = chunk_size
+            cursor.execute(query, params)
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+            
+            cursor.close()
+    
+    def delete_old_searches(
+        self,
+        days: int = 90,
+        before: Optional[datetime] = None,
+        max_id: Optional[int] = None
+    ) -> int:
+        """
+        Elimina búsquedas más antiguas que N días
+        
+        La antigüedad se mide por la última vez que se vio la observación
+        (`last_seen`): con `change_only`, un itinerario sin cambios conserva
+        su fila aunque `search_timestamp` sea viejo, y la próxima búsqueda
+        tiene contra qué comparar.
+        
+        Args:
+            days: Número de días (registros más antiguos se eliminan)
+            before: Fecha de corte explícita (reemplaza a `days`; un `date`
+                sin hora corta al inicio del día)
+            max_id: Solo eliminar filas con id menor o igual (para borrar
+                exactamente lo que ya se archivó)
+            
+        Returns:
+            Número de registros eliminados
+        """
+        query = """
+        DELETE FROM flight_searches
+        WHERE COALESCE(last_seen, search_timestamp) < %s
+          AND (%s IS NULL OR id <= %s);
+        """
+        
+        # Rutas sin actividad dentro del período conservado
+        routes_query = """
+        DELETE FROM routes
+        WHERE last_seen < %s;
+        """
+        
+        # Payloads que ya no referencia ninguna búsqueda
+        orphan_query = """
+        DELETE FROM flight_payloads p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM flight_searches s WHERE s.payload_hash = p.payload_hash
+        );
+        """
+        
+        # Estado del detector de anomalías de salidas que ya pasaron
+        anomaly_state_query = """
+        DELETE FROM price_anomaly_state
+        WHERE departure_date < CURRENT_DATE;
+        """
+        
+        # Sketches de percentiles de días fuera del período conservado
+        sketches_query = """
+        DELETE FROM price_sketches
+        WHERE day < %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                cutoff_date = before or datetime.now() - timedelta(days=days)
+                if not isinstance(cutoff_date, datetime):
+                    # Una fecha sin hora corta al inicio del día
+                    cutoff_date = datetime.combine(cutoff_date, time.min)
+                cursor.execute(query, (cutoff_date, max_id, max_id))
+                
+                deleted_count = cursor.rowcount
+                cursor.execute(routes_query, (cutoff_date,))
+                cursor.execute(orphan_query)
+                cursor.execute(anomaly_state_query)
+                cursor.execute(sketches_query, (cutoff_date.date(),))
+                self._bump_generation(cursor)
+                conn.commit()
+                cursor.close()
+            self._invalidate_cache()
+            
+            return deleted_count
+            
+        except Exception as e:
+            print(f"Error eliminando registros antiguos: {str(e)}")
+            return 0
+    
+    def get_flight_by_id(self, flight_id: int) -> Optional[Dict]:
+        """
+        Obtiene un vuelo específico por ID
+        
+        El `raw_data` guardado en `flight_payloads` se reincorpora a
+        `flight_data` junto con los campos propios de la respuesta que
+        quedaron en la fila, por lo que el resultado es igual al insertado.
+        
+        Args:
+            flight_id: ID del registro
+            
+        Returns:
+            Diccionario con los datos del vuelo o None
+        """
+        query = """
+        SELECT 
+            s.id,
+            s.search_timestamp,
+            s.origin,
+            s.destination,
+            s.departure_date,
+            s.return_date,
+            s.adults,
+            s.price,
+            s.currency,
+            s.airline,
+            CASE
+                WHEN p.payload IS NULL THEN s.flight_data - 'raw_data_local'
+                ELSE (s.flight_data - 'raw_data_local') || jsonb_build_object(
+                    'raw_data', p.payload || COALESCE(s.flight_data->'raw_data_local', '{}'::jsonb)
+                )
+            END AS flight_data,
+            s.created_at
+        FROM flight_searches s
+        LEFT JOIN flight_payloads p ON p.payload_hash = s.payload_hash
+        WHERE s.id = %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (flight_id,))
+                
+                result = cursor.fetchone()
+                cursor.close()
+            
+            return dict(result) if result else None
+            
+        except Exception as e:
+            print(f"Error obteniendo vuelo por ID: {str(e)}")
+            return None
+    
+    def migrate_raw_payloads(self, batch_size: int = 500) -> int:
+        """
+        Mueve los `raw_data` embebidos en filas antiguas a `flight_payloads`
+        
+        Procesa por lotes hasta que no queden filas sin migrar. El hash se
+        calcula igual que en `insert_flight_offer`, de modo que los payloads
+        históricos se deduplican junto con los nuevos.
+        
+        Args:
+            batch_size: Número de filas por lote (una transacción por lote)
+            
+        Returns:
+            Número de filas migradas
+        """
+        select_query = """
+        SELECT id, flight_data
+        FROM flight_searches
+        WHERE payload_hash IS NULL
+          AND flight_data ? 'raw_data'
+        ORDER BY id
+        LIMIT %s;
+        """
+        
+        payload_query = """
+        INSERT INTO flight_payloads (payload_hash, payload)
+        VALUES (%s, %s)
+        ON CONFLICT (payload_hash) DO NOTHING;
+        """
+        
+        update_query = """
+        UPDATE flight_searches
+        SET flight_data = %s,
+            payload_hash = %s
+        WHERE id = %s;
+        """
+        
+        migrated = 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                while True:
+                    cursor.execute(select_query, (batch_size,))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    
+                    for row_id, flight_data in rows:
+                        stripped, raw_data, payload_hash = split_raw_payload(flight_data)
+                        if payload_hash:
+                            cursor.execute(payload_query, (payload_hash, Json(raw_data)))
+                        cursor.execute(update_query, (Json(stripped), payload_hash, row_id))
+                    
+                    self._bump_generation(cursor)
+                    conn.commit()
+                    migrated += len(rows)
+                
+                cursor.close()
+            self._invalidate_cache()
+            
+            return migrated
+            
+        except Exception as e:
+            print(f"Error migrando payloads: {str(e)}")
+            return migrated
+    
+    def backfill_typed_columns(self, batch_size: int = 5000) -> int:
+        """
+        Completa las columnas tipadas de filas anteriores desde `flight_data`
+        
+        Actualiza por lotes (una transacción por lote) las filas que tienen
+        los atributos en el JSONB pero todavía no en las columnas. La
+        duración se interpreta igual que al insertar (`parse_duration_minutes`:
+        '10h 30m', '5h', '45m' o 'PT10H30M'), lo que también repara filas
+        completadas antes sin la duración de formatos parciales.
+        
+        Args:
+            batch_size: Número de filas por lote
+            
+        Returns:
+            Número de filas actualizadas
+        """
+        # Cada conversión se protege con un CASE (que evalúa en orden): un
+        # valor heredado mal formado queda en NULL en lugar de abortar el lote
+        duration = "btrim(flight_data->>'duration')"
+        pattern = r"'^(?:PT)?(?:(\d{1,6})[hH])?\s*(?:(\d{1,6})[mM])?$'"
+        parsed_duration = f"{duration} ~ {pattern} AND {duration} ~ '\\d'"
+        
+        def parsed_timestamp(field: str) -> str:
+            value = f"(flight_data->>'{field}')"
+            return rf"""CASE
+                WHEN {value} ~ '^[1-9]\d{{3}}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])([T ]([01]\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d{{1,6}})?)?)?$'
+                THEN CASE
+                    WHEN substring({value} from 9 for 2)::integer <= extract(
+                        day from (left({value}, 7) || '-01')::date + interval '1 month' - interval '1 day'
+                    )
+                    THEN {value}::timestamp
+                END
+            END"""
+        
+        query = rf"""
+        UPDATE flight_searches
+        SET 
+            stops = COALESCE(
+                stops,
+                CASE WHEN flight_data->>'stops' ~ '^\d{{1,4}}$' THEN (flight_data->>'stops')::smallint END
+            ),
+            carrier_code = CASE
+                WHEN flight_data->>'airline_code' ~ '^[A-Za-z0-9]{{1,3}}$' THEN flight_data->>'airline_code'
+            END,
+            duration_minutes = CASE
+                WHEN {parsed_duration} THEN
+                    COALESCE((regexp_match({duration}, {pattern}))[1]::integer, 0) * 60
+                    + COALESCE((regexp_match({duration}, {pattern}))[2]::integer, 0)
+            END,
+            departure_at = {parsed_timestamp('departure_time')},
+            arrival_at = {parsed_timestamp('arrival_time')},
+            bookable_seats = COALESCE(
+                bookable_seats,
+                CASE
+                    WHEN flight_data->>'number_of_bookable_seats' ~ '^\d{{1,4}}$'
+                    THEN (flight_data->>'number_of_bookable_seats')::smallint
+                END
+            )
+        WHERE id IN (
+            SELECT id
+            FROM flight_searches
+            WHERE (stops IS NULL AND flight_data->>'stops' ~ '^\d{{1,4}}$')
+               OR (duration_minutes IS NULL AND {parsed_duration})
+            ORDER BY id
+            LIMIT %s
+        );
+        """
+        
+        updated = 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                while True:
+                    cursor.execute(query, (batch_size,))
+                    batch_rows = cursor.rowcount
+                    if batch_rows > 0:
+                        self._bump_generation(cursor)
+                    conn.commit()
+                    if batch_rows <= 0:
+                        break
+                    updated += batch_rows
+                
+                cursor.close()
+            self._invalidate_cache()
+            
+            return updated
+            
+        except Exception as e:
+            print(f"Error completando columnas tipadas: {str(e)}")
+            return updated
+    
+    def backfill_price_sketches(self, chunk_size: int = 10000) -> int:
+        """
+        Arma los sketches de percentiles de precio desde el histórico
+        
+        Solo corre si `price_sketches` está vacía (instalaciones anteriores a
+        los sketches). Cuenta las filas guardadas: con `change_only`, un
+        precio repetido que no generó fila nueva no entra, a diferencia de la
+        actualización en línea.
+        
+        Args:
+            chunk_size: Filas leídas por bloque
+            
+        Returns:
+            Número de sketches creados
+        """
+        insert_query = """
+        INSERT INTO price_sketches (origin, destination, airline, day, observations, sketch)
+        VALUES %s
+        ON CONFLICT (origin, destination, airline, day) DO NOTHING;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM price_sketches);")
+                populated = cursor.fetchone()[0]
+                cursor.close()
+            if populated:
+                return 0
+            
+            sketches = build_sketches(self.iter_flight_history(chunk_size=chunk_size))
+            if not sketches:
+                return 0
+            
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, insert_query, [
+                    key + (sketch.count, sketch.to_bytes()) for key, sketch in sorted(sketches.items())
+                ], template="(%s, %s, %s, %s::date, %s, %s::bytea)")
+                self._bump_generation(cursor)
+                conn.commit()
+                cursor.close()
+            self._invalidate_cache()
+            
+            return len(sketches)
+            
+        except Exception as e:
+            print(f"Error armando sketches de precio: {str(e)}")
+            return 0
+    
+    def get_monitored_routes(self, enabled_only: bool = True) -> List[Dict]:
+        """
+        Obtiene el catálogo de rutas del monitor
+        
+        Args:
+            enabled_only: Solo las rutas habilitadas
+            
+        Returns:
+            Lista de rutas con origin, destination, days_ahead, return_days,
+            adults, priority, target_price y enabled (ver
+            `route_catalog.normalize_route`)
+        """
+        query = f"""
+        SELECT origin, destination, days_ahead, return_days, adults, priority, target_price, enabled
+        FROM monitored_routes
+        {'WHERE enabled' if enabled_only else ''}
+        ORDER BY priority DESC, origin, destination;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query)
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo rutas monitoreadas: {str(e)}")
+            return []
+    
+    def upsert_monitored_routes(self, routes: List[Dict]) -> int:
+        """
+        Inserta o actualiza rutas del catálogo (clave: origen, destino y adultos)
+        
+        Args:
+            routes: Rutas normalizadas (ver `route_catalog.validate_routes`)
+            
+        Returns:
+            Número de rutas guardadas
+        """
+        query = """
+        INSERT INTO monitored_routes
+        (origin, destination, days_ahead, return_days, adults, priority, target_price, enabled)
+        VALUES %s
+        ON CONFLICT (origin, destination, adults) DO UPDATE
+        SET days_ahead = EXCLUDED.days_ahead,
+            return_days = EXCLUDED.return_days,
+            priority = EXCLUDED.priority,
+            target_price = EXCLUDED.target_price,
+            enabled = EXCLUDED.enabled,
+            updated_at = CURRENT_TIMESTAMP;
+        """
+        
+        if not routes:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                # Un solo INSERT multi-fila por página: miles de rutas en pocas idas y vueltas
+                execute_values(cursor, query, [
+                    (route['origin'], route['destination'], Json(route['days_ahead']),
+                     Json(route['return_days']), route.get('adults', 1),
+                     route.get('priority', 0), route.get('target_price'),
+                     route.get('enabled', True))
+                    for route in routes
+                ])
+                conn.commit()
+                cursor.close()
+            
+            return len(routes)
+            
+        except Exception as e:
+            print(f"Error guardando rutas monitoreadas: {str(e)}")
+            raise
+    
+    def get_route_schedule(self, origin: Optional[str] = None, destination: Optional[str] = None) -> List[Dict]:
+        """
+        Obtiene el estado del planificador de búsquedas
+        
+        Args:
+            origin: Solo las búsquedas de esta ruta (junto con destination)
+            destination: Código IATA destino
+        
+        Returns:
+            Lista de filas de `route_schedule` (clave: origin, destination,
+            adults, days_ahead, return_days; 0 = solo ida)
+        """
+        route_filter = origin is not None and destination is not None
+        query = f"""
+        SELECT origin, destination, adults, days_ahead, return_days, next_scan_at,
+               last_scan_at, scans, changes, change_rate, last_price, score
+        FROM route_schedule
+        {'WHERE origin = %s AND destination = %s' if route_filter else ''};
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (origin, destination) if route_filter else None)
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo planificación de rutas: {str(e)}")
+            return []
+    
+    def record_route_scans(self, rows: List[Dict]) -> int:
+        """
+        Guarda el estado del planificador después de escanear búsquedas
+        
+        Args:
+            rows: Filas calculadas por `ScanScheduler.record`
+            
+        Returns:
+            Número de filas guardadas
+        """
+        query = """
+        INSERT INTO route_schedule
+        (origin, destination, adults, days_ahead, return_days, next_scan_at,
+         last_scan_at, scans, changes, change_rate, last_price, score)
+        VALUES %s
+        ON CONFLICT (origin, destination, adults, days_ahead, return_days) DO UPDATE
+        SET next_scan_at = EXCLUDED.next_scan_at,
+            last_scan_at = EXCLUDED.last_scan_at,
+            scans = EXCLUDED.scans,
+            changes = EXCLUDED.changes,
+            change_rate = EXCLUDED.change_rate,
+            last_price = EXCLUDED.last_price,
+            score = EXCLUDED.score;
+        """
+        
+        if not rows:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, query, [
+                    (row['origin'], row['destination'], row['adults'], row['days_ahead'],
+                     row['return_days'], row['next_scan_at'], row['last_scan_at'], row['scans'],
+                     row['changes'], row['change_rate'], row['last_price'], row['score'])
+                    for row in rows
+                ])
+                conn.commit()
+                cursor.close()
+            
+            return len(rows)
+            
+        except Exception as e:
+            print(f"Error guardando planificación de rutas: {str(e)}")
+            return 0
+    
+    def start_monitor_run(self, jobs: List[Dict], host: Optional[str] = None) -> Tuple[int, List[Dict]]:
+        """
+        Registra una nueva ejecución del monitor con sus búsquedas pendientes
+        
+        Args:
+            jobs: Búsquedas planificadas, en el orden en que se ejecutarán
+            host: Máquina que ejecuta el monitor
+            
+        Returns:
+            Tupla (ID de la ejecución, búsquedas con `run_job_id` agregado)
+        """
+        run_query = """
+        INSERT INTO monitor_runs (host, jobs_planned) VALUES (%s, %s) RETURNING id;
+        """
+        jobs_query = """
+        INSERT INTO monitor_run_jobs
+        (run_id, position, origin, destination, departure_date, return_date, adults,
+         days_ahead, return_days, priority, target_price, score, change_rate)
+        VALUES %s
+        ON CONFLICT (run_id, origin, destination, adults, days_ahead, return_days) DO NOTHING
+        RETURNING id, position;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(run_query, (host, len(jobs)))
+                run_id = cursor.fetchone()[0]
+                
+                ids = execute_values(cursor, jobs_query, [
+                    (run_id, position, job['origin'], job['destination'], job['departure_date'],
+                     job.get('return_date'), job.get('adults', 1), job['days_ahead'],
+                     job.get('return_days') or 0, job.get('priority', 0), job.get('target_price'),
+                     job.get('score'), job.get('change_rate'))
+                    for position, job in enumerate(jobs)
+                ], fetch=True) if jobs else []
+                
+                conn.commit()
+                cursor.close()
+            
+            run_job_ids = {position: run_job_id for run_job_id, position in ids}
+            return run_id, [dict(job, run_job_id=run_job_ids[position])
+                            for position, job in enumerate(jobs) if position in run_job_ids]
+            
+        except Exception as e:
+            print(f"Error registrando ejecución del monitor: {str(e)}")
+            raise
+    
+    def resume_monitor_run(
+        self,
+        max_age_hours: float = 12,
+        stale_minutes: float = 10,
+        host: Optional[str] = None
+    ) -> Tuple[Optional[int], List[Dict]]:
+        """
+        Retoma la última ejecución del monitor que no terminó
+        
+        Se retoma una ejecución interrumpida (SIGTERM) o una que figura en
+        curso pero no registró actividad en `stale_minutes` (proceso caído),
+        iniciada hace menos de `max_age_hours`. Una ejecución activa en otro
+        proceso no se toma.
+        
+        Args:
+            max_age_hours: Antigüedad máxima de la ejecución a retomar
+            stale_minutes: Minutos sin actividad para considerar caída una
+                ejecución en curso
+            host: Máquina que la retoma
+            
+        Returns:
+            Tupla (ID de la ejecución o None, búsquedas pendientes en su
+            orden original, con `run_job_id`)
+        """
+        run_query = """
+        UPDATE monitor_runs
+        SET status = 'running', updated_at = CURRENT_TIMESTAMP, resumed = resumed + 1,
+            host = COALESCE(%s, host)
+        WHERE id = (
+            SELECT id
+            FROM monitor_runs
+            WHERE started_at >= %s
+              AND (status = 'interrupted' OR (status = 'running' AND updated_at < %s))
+            ORDER BY started_at DESC
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id;
+        """
+        jobs_query = """
+        SELECT id as run_job_id, origin, destination, departure_date, return_date, adults,
+               days_ahead, return_days, priority, target_price, score, change_rate
+        FROM monitor_run_jobs
+        WHERE run_id = %s AND status = 'pending'
+        ORDER BY position;
+        """
+        
+        now = datetime.now()
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(run_query, (host, now - timedelta(hours=max_age_hours),
+                                           now - timedelta(minutes=stale_minutes)))
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.close()
+                    return None, []
+                
+                cursor.execute(jobs_query, (row['id'],))
+                results = cursor.fetchall()
+                conn.commit()
+                cursor.close()
+            
+            jobs = []
+            for result in results:
+                job = dict(result)
+                job['departure_date'] = job['departure_date'].isoformat()
+                job['return_date'] = job['return_date'].isoformat() if job['return_date'] else None
+                job['target_price'] = float(job['target_price']) if job['target_price'] is not None else None
+                jobs.append(job)
+            
+            return row['id'], jobs
+            
+        except Exception as e:
+            print(f"Error retomando ejecución del monitor: {str(e)}")
+            return None, []
+    
+    def mark_run_job(self, run_job_id: int, status: str, error: Optional[str] = None) -> bool:
+        """
+        Marca una búsqueda de una ejecución como fallida u omitida
+        
+        Las terminadas se marcan en `insert_flight_offers(run_job_id=...)`.
+        
+        Args:
+            run_job_id: ID en `monitor_run_jobs`
+            status: 'failed' o 'skipped'
+            error: Mensaje de error (o motivo de la omisión)
+            
+        Returns:
+            True si la búsqueda seguía pendiente
+        """
+        query = """
+        UPDATE monitor_run_jobs
+        SET status = %s, error = %s, finished_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status = 'pending';
+        """
+        touch_query = """
+        UPDATE monitor_runs SET updated_at = CURRENT_TIMESTAMP
+        WHERE id = (SELECT run_id FROM monitor_run_jobs WHERE id = %s);
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (status, str(error)[:1000] if error else None, run_job_id))
+                
+                updated = cursor.rowcount == 1
+                cursor.execute(touch_query, (run_job_id,))
+                conn.commit()
+                cursor.close()
+            
+            return updated
+            
+        except Exception as e:
+            print(f"Error actualizando búsqueda de la ejecución: {str(e)}")
+            return False
+    
+    def record_run_job_metrics(self, jobs: List[Dict]) -> int:
+        """
+        Guarda el código HTTP y los tiempos de las búsquedas de una ejecución
+        
+        Args:
+            jobs: Registros de `ScanPipeline.run` (run_job_id, http_status,
+                fetch_seconds y latency_seconds)
+            
+        Returns:
+            Número de búsquedas actualizadas
+        """
+        query = """
+        UPDATE monitor_run_jobs j
+        SET http_status = v.http_status, fetch_ms = v.fetch_ms, latency_ms = v.latency_ms
+        FROM (VALUES %s) AS v (id, http_status, fetch_ms, latency_ms)
+        WHERE j.id = v.id;
+        """
+        
+        rows = [
+            (job['run_job_id'], job['http_status'], round(job['fetch_seconds'] * 1000),
+             round(job['latency_seconds'] * 1000))
+            for job in jobs if job.get('run_job_id') is not None
+        ]
+        if not rows:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, query, rows,
+                               template="(%s::bigint, %s::smallint, %s::integer, %s::integer)")
+                updated = cursor.rowcount
+                conn.commit()
+                cursor.close()
+            
+            return updated
+            
+        except Exception as e:
+            print(f"Error guardando métricas de búsquedas: {str(e)}")
+            return 0
+    
+    def finish_monitor_run(
+        self,
+        run_id: int,
+        status: str = 'completed',
+        metrics: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Cierra una ejecución del monitor con sus totales
+        
+        Args:
+            run_id: ID de la ejecución
+            status: 'completed', 'interrupted' (se retoma en la próxima
+                ejecución) o 'failed'
+            metrics: Métricas de esta pasada (duration_seconds, api_calls,
+                changes y report); se suman a las de pasadas anteriores de
+                la misma ejecución y `report` reemplaza al anterior
+            
+        Returns:
+            Fila de `monitor_runs` actualizada (vacía si hay error)
+        """
+        query = """
+        UPDATE monitor_runs r
+        SET status = %s,
+            updated_at = CURRENT_TIMESTAMP,
+            finished_at = CASE WHEN %s = 'interrupted' THEN NULL ELSE CURRENT_TIMESTAMP END,
+            jobs_done = totals.done,
+            jobs_failed = totals.failed,
+            jobs_skipped = totals.skipped,
+            offers_saved = totals.offers_saved,
+            offers_found = totals.offers_found,
+            duration_seconds = r.duration_seconds + %s,
+            api_calls = r.api_calls + %s,
+            changes = r.changes + %s,
+            report = COALESCE(%s, r.report)
+        FROM (
+            SELECT COUNT(*) FILTER (WHERE status = 'done') as done,
+                   COUNT(*) FILTER (WHERE status = 'failed') as failed,
+                   COUNT(*) FILTER (WHERE status = 'skipped') as skipped,
+                   COALESCE(SUM(offers_saved), 0) as offers_saved,
+                   COALESCE(SUM(offers_found), 0) as offers_found
+            FROM monitor_run_jobs
+            WHERE run_id = %s
+        ) totals
+        WHERE r.id = %s
+        RETURNING r.*;
+        """
+        
+        metrics = metrics or {}
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (
+                    status, status, metrics.get('duration_seconds', 0), metrics.get('api_calls', 0),
+                    metrics.get('changes', 0),
+                    Json(metrics['report']) if metrics.get('report') is not None else None,
+                    run_id, run_id
+                ))
+                
+                result = cursor.fetchone()
+                conn.commit()
+                cursor.close()
+            
+            return dict(result) if result else {}
+            
+        except Exception as e:
+            print(f"Error cerrando ejecución del monitor: {str(e)}")
+            return {}
+    
+    def get_fresh_scan_keys(self, minutes: float) -> List[Tuple]:
+        """
+        Obtiene las búsquedas terminadas recientemente por cualquier ejecución
+        
+        Args:
+            minutes: Ventana de frescura en minutos
+            
+        Returns:
+            Lista de tuplas (origin, destination, adults, days_ahead,
+            return_days, departure_date ISO)
+        """
+        query = """
+        SELECT DISTINCT origin, destination, adults, days_ahead, return_days, departure_date
+        FROM monitor_run_jobs
+        WHERE status = 'done' AND finished_at >= %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (datetime.now() - timedelta(minutes=minutes),))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [tuple(row[:5]) + (row[5].isoformat(),) for row in results]
+            
+        except Exception as e:
+            print(f"Error obteniendo búsquedas recientes: {str(e)}")
+            return []
+    
+    def get_monitor_runs(self, limit: int = 20) -> List[Dict]:
+        """
+        Obtiene el historial de ejecuciones del monitor (más recientes primero)
+        
+        Args:
+            limit: Máximo de ejecuciones
+            
+        Returns:
+            Lista de filas de `monitor_runs`
+        """
+        query = """
+        SELECT id, started_at, updated_at, finished_at, status, host, resumed,
+               jobs_planned, jobs_done, jobs_failed, jobs_skipped, offers_saved,
+               offers_found, duration_seconds, api_calls, changes
+        FROM monitor_runs
+        ORDER BY started_at DESC
+        LIMIT %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (limit,))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo ejecuciones del monitor: {str(e)}")
+            return []
+    
+    def record_api_calls(self, calls: int, source: str = 'monitor') -> bool:
+        """
+        Suma llamadas a la API de Amadeus al contador del día
+        
+        Args:
+            calls: Número de llamadas realizadas
+            source: Origen de las llamadas ('monitor' o 'app')
+            
+        Returns:
+            True si se registraron
+        """
+        query = """
+        INSERT INTO api_quota_usage (day, source, calls, updated_at)
+        VALUES (CURRENT_DATE, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (day, source) DO UPDATE
+        SET calls = api_quota_usage.calls + EXCLUDED.calls,
+            updated_at = EXCLUDED.updated_at;
+        """
+        
+        if calls <= 0:
+            return True
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (source, calls))
+                conn.commit()
+                cursor.close()
+            
+            return True
+            
+        except Exception as e:
+            print(f"Error registrando llamadas a la API: {str(e)}")
+            return False
+    
+    def get_api_usage(self, since) -> List[Dict]:
+        """
+        Obtiene las llamadas a la API por día y origen
+        
+        Args:
+            since: Primer día incluido (date)
+            
+        Returns:
+            Lista de diccionarios con day, source y calls
+        """
+        query = """
+        SELECT day, source, calls
+        FROM api_quota_usage
+        WHERE day >= %s
+        ORDER BY day, source;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (since,))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo uso de la API: {str(e)}")
+            return []
+    
+    def get_scan_price_observations(self, since) -> List[Dict]:
+        """
+        Obtiene el precio mínimo de cada búsqueda terminada (ver indicators.py)
+        
+        Junta las búsquedas del monitor (`monitor_run_jobs`) y de los workers
+        (`scan_jobs`); solo incluye fechas de salida que no pasaron.
+        
+        Args:
+            since: Primer instante de fin incluido (datetime)
+            
+        Returns:
+            Lista de diccionarios con origin, destination, departure_date,
+            return_date, adults, timestamp y price, ordenada por timestamp
+        """
+        query = """
+        SELECT origin, destination, departure_date, return_date, adults,
+               finished_at AS timestamp, min_price AS price
+        FROM monitor_run_jobs
+        WHERE status = 'done' AND finished_at >= %s
+          AND min_price IS NOT NULL AND departure_date >= CURRENT_DATE
+        UNION ALL
+        SELECT origin, destination, departure_date, return_date, adults,
+               finished_at, min_price
+        FROM scan_jobs
+        WHERE status = 'done' AND finished_at >= %s
+          AND min_price IS NOT NULL AND departure_date >= CURRENT_DATE
+        ORDER BY timestamp;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (since, since))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo observaciones de precio: {str(e)}")
+            return []
+    
+    def create_price_watch(
+        self,
+        origin: str,
+        destination: str,
+        departure_from: str,
+        target_price: float,
+        departure_to: Optional[str] = None,
+        return_date: Optional[str] = None,
+        adults: Optional[int] = None,
+        currency: str = 'USD',
+        owner: str = 'default',
+        last_price: Optional[float] = None
+    ) -> Optional[int]:
+        """
+        Crea una vigilancia de precio objetivo
+        
+        Si el mismo dueño ya vigila la misma búsqueda, se actualiza su precio
+        objetivo y se reactiva en lugar de crear otra (un índice único evita
+        duplicados entre altas concurrentes).
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            departure_from: Primera fecha de salida vigilada (YYYY-MM-DD)
+            target_price: Precio objetivo
+            departure_to: Última fecha de salida vigilada (default la primera)
+            return_date: Fecha de regreso exacta (None para cualquiera)
+            adults: Número de adultos (None para cualquiera)
+            currency: Moneda del precio objetivo
+            owner: Dueño de la vigilancia
+            last_price: Último precio conocido (por ejemplo el de la búsqueda
+                que la originó)
+            
+        Returns:
+            ID de la vigilancia, o None si hubo un error
+            
+        Raises:
+            ValueError: Si los campos son inválidos (ver `price_watches.normalize_watch`)
+        """
+        watch = normalize_watch(origin, destination, departure_from, departure_to, return_date,
+                                adults, target_price, currency)
+        
+        upsert_query = """
+        INSERT INTO price_watches AS w
+        (owner, origin, destination, departure_from, departure_to, return_date, adults,
+         target_price, currency, last_price)
+        VALUES (%(owner)s, %(origin)s, %(destination)s, %(departure_from)s, %(departure_to)s,
+                %(return_date)s, %(adults)s, %(target_price)s, %(currency)s, %(last_price)s)
+        ON CONFLICT (owner, origin, destination, departure_from, departure_to,
+                     (COALESCE(return_date, DATE '0001-01-01')), (COALESCE(adults, 0)), currency)
+        DO UPDATE
+        SET target_price = EXCLUDED.target_price,
+            active = TRUE,
+            last_alert_price = NULL,
+            last_alert_series = NULL,
+            last_price = COALESCE(EXCLUDED.last_price, w.last_price),
+            last_price_series = CASE WHEN EXCLUDED.last_price IS NULL THEN w.last_price_series END
+        RETURNING id;
+        """
+        
+        params = dict(watch, owner=owner, last_price=last_price)
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(upsert_query, params)
+                row = cursor.fetchone()
+                conn.commit()
+                cursor.close()
+            
+            return row[0]
+            
+        except Exception as e:
+            print(f"Error creando vigilancia de precio: {str(e)}")
+            return None
+    
+    def get_price_watches(self, owner: Optional[str] = None, active_only: bool = True) -> List[Dict]:
+        """
+        Obtiene las vigilancias de precio
+        
+        Args:
+            owner: Filtrar por dueño (None para todas)
+            active_only: Solo vigilancias activas con fechas de salida por venir
+            
+        Returns:
+            Lista de filas de `price_watches`, las más nuevas primero
+        """
+        query = """
+        SELECT id, owner, origin, destination, departure_from, departure_to, return_date, adults,
+               target_price, currency, active, last_price, last_checked_at, last_alert_price,
+               last_triggered_at, triggered_count, created_at
+        FROM price_watches
+        WHERE (%(owner)s IS NULL OR owner = %(owner)s)
+          AND (NOT %(active_only)s OR (active AND departure_to >= CURRENT_DATE))
+        ORDER BY created_at DESC, id DESC;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, {'owner': owner, 'active_only': active_only})
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo vigilancias de precio: {str(e)}")
+            return []
+    
+    def delete_price_watch(self, watch_id: int) -> bool:
+        """
+        Elimina una vigilancia de precio y sus alertas
+        
+        Args:
+            watch_id: ID de la vigilancia
+            
+        Returns:
+            True si se eliminó
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM price_watches WHERE id = %s;", (watch_id,))
+                deleted = cursor.rowcount > 0
+                conn.commit()
+                cursor.close()
+            
+            return deleted
+            
+        except Exception as e:
+            print(f"Error eliminando vigilancia de precio: {str(e)}")
+            return False
+    
+    def get_price_alerts(self, owner: Optional[str] = None, limit: int = 50,
+                         since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Obtiene las alertas de precio registradas
+        
+        Args:
+            owner: Filtrar por dueño (None para todos)
+            limit: Máximo de alertas
+            since: Solo alertas posteriores a este momento
+            
+        Returns:
+            Lista de filas de `price_alerts`, las más recientes primero
+        """
+        query = """
+        SELECT id, watch_id, owner, search_id, origin, destination, departure_date, return_date,
+               adults, price, target_price, previous_price, currency, airline, kind, triggered_at
+        FROM price_alerts
+        WHERE (%(owner)s IS NULL OR owner = %(owner)s)
+          AND (%(since)s::timestamp IS NULL OR triggered_at >= %(since)s::timestamp)
+        ORDER BY triggered_at DESC, id DESC
+        LIMIT %(limit)s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, {'owner': owner, 'since': since, 'limit': limit})
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo alertas de precio: {str(e)}")
+            return []
+    
+    def get_price_anomalies(self, limit: int = 50, since: Optional[datetime] = None,
+                            origin: Optional[str] = None, destination: Optional[str] = None) -> List[Dict]:
+        """
+        Obtiene las caídas anómalas de precio detectadas (ver price_anomalies.py)
+        
+        Args:
+            limit: Máximo de anomalías
+            since: Solo anomalías posteriores a este momento
+            origin: Filtrar por origen (opcional)
+            destination: Filtrar por destino (opcional)
+            
+        Returns:
+            Lista de filas de `price_anomalies`, las más recientes primero
+        """
+        query = """
+        SELECT id, detected_at, search_id, origin, destination, departure_date, return_date, adults,
+               price, expected_price, zscore, drop_pct, observations, currency, airline
+        FROM price_anomalies
+        WHERE (%(since)s::timestamp IS NULL OR detected_at >= %(since)s::timestamp)
+          AND (%(origin)s::varchar IS NULL OR origin = %(origin)s)
+          AND (%(destination)s::varchar IS NULL OR destination = %(destination)s)
+        ORDER BY detected_at DESC, id DESC
+        LIMIT %(limit)s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, {'since': since, 'origin': origin, 'destination': destination,
+                                       'limit': limit})
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo anomalías de precio: {str(e)}")
+            return []
+    
+    def get_pending_alerts(self, limit: int = 1000, max_attempts: int = 5) -> List[Dict]:
+        """
+        Obtiene las alertas de precio sin notificar
+        
+        Args:
+            limit: Máximo de alertas
+            max_attempts: Despachos fallidos a partir de los cuales una alerta
+                se abandona
+            
+        Returns:
+            Lista de filas de `price_alerts` con notify_attempts y delivered
+            (canales que ya la entregaron), las más antiguas primero
+        """
+        query = """
+        SELECT a.id, a.watch_id, a.owner, a.search_id, a.origin, a.destination, a.departure_date,
+               a.return_date, a.adults, a.price, a.target_price, a.previous_price, a.currency,
+               a.airline, a.kind, a.triggered_at, a.notify_attempts,
+               COALESCE(ARRAY_AGG(d.channel) FILTER (WHERE d.channel IS NOT NULL), '{}') AS delivered
+        FROM price_alerts a
+        LEFT JOIN price_alert_deliveries d ON d.alert_id = a.id
+        WHERE a.notified_at IS NULL AND a.notify_attempts < %s
+        GROUP BY a.id
+        ORDER BY a.triggered_at, a.id
+        LIMIT %s;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (max_attempts, limit))
+                
+                results = cursor.fetchall()
+                cursor.close()
+            
+            return [dict(row) for row in results] if results else []
+            
+        except Exception as e:
+            print(f"Error obteniendo alertas pendientes: {str(e)}")
+            return []
+    
+    def record_alert_deliveries(self, deliveries: List[Tuple[int, str]]) -> int:
+        """
+        Registra entregas de alertas por canal
+        
+        Args:
+            deliveries: Tuplas (ID de la alerta, canal)
+            
+        Returns:
+            Número de entregas nuevas registradas
+        """
+        query = """
+        INSERT INTO price_alert_deliveries (alert_id, channel)
+        VALUES %s
+        ON CONFLICT (alert_id, channel) DO NOTHING;
+        """
+        
+        if not deliveries:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, query, deliveries)
+                recorded = cursor.rowcount
+                conn.commit()
+                cursor.close()
+            
+            return recorded
+            
+        except Exception as e:
+            print(f"Error registrando entregas de alertas: {str(e)}")
+            return 0
+    
+    def finish_alert_notifications(self, notified: List[int], failed: Dict[int, str]) -> int:
+        """
+        Cierra el despacho de un lote de alertas
+        
+        Args:
+            notified: Alertas entregadas por todos sus canales
+            failed: Alertas con algún envío fallido y su error (suman un
+                intento y se reintentan en el próximo despacho)
+            
+        Returns:
+            Número de alertas actualizadas
         """
+        if not notified and not failed:
+            return 0
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(create_table_query)
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                updated = 0
+                if notified:
+                    cursor.execute("""
+                    UPDATE price_alerts SET notified_at = CURRENT_TIMESTAMP, notify_error = NULL
+                    WHERE id = ANY(%s);
+                    """, (list(notified),))
+                    updated += cursor.rowcount
+                if failed:
+                    execute_values(cursor, """
+                    UPDATE price_alerts a
+                    SET notify_attempts = a.notify_attempts + 1, notify_error = v.error
+                    FROM (VALUES %s) AS v (id, error)
+                    WHERE a.id = v.id;
+                    """, list(failed.items()), template="(%s::bigint, %s)")
+                    updated += cursor.rowcount
+                conn.commit()
+                cursor.close()
+            
+            return updated
+            
         except Exception as e:
-            print(f"Error creando tablas: {str(e)}")
-            raise
+            print(f"Error actualizando notificaciones de alertas: {str(e)}")
+            return 0
     
-    def insert_flight_offer(
-        self,
-        origin: str,
-        destination: str,
-        departure_date: str,
-        return_date: Optional[str],
-        adults: int,
-        price: float,
-        currency: str,
-        airline: Optional[str],
-        flight_data: Dict
-    ) -> int:
+    def enqueue_scan_jobs(self, jobs: List[Dict], max_attempts: int = 3) -> int:
         """
-        Inserta una oferta de vuelo en la base de datos
+        Encola búsquedas para los workers del monitor
+        
+        Una búsqueda que ya está pendiente o en curso (misma clave del
+        planificador: ruta, adultos, anticipación y estadía) no se duplica.
         
         Args:
-            origin: Código IATA de origen
-            destination: Código IATA de destino
-            departure_date: Fecha de salida (YYYY-MM-DD)
-            return_date: Fecha de regreso (YYYY-MM-DD) o None
-            adults: Número de adultos
-            price: Precio del vuelo
-            currency: Moneda (USD, EUR, etc.)
-            airline: Nombre de la aerolínea
-            flight_data: Datos completos del vuelo en formato dict
+            jobs: Búsquedas planificadas (ver `route_catalog.plan_jobs` y
+                `ScanScheduler.plan`)
+            max_attempts: Intentos antes de marcar una búsqueda como fallida
             
         Returns:
-            ID del registro insertado
+            Número de búsquedas encoladas
         """
-        insert_query = """
-        INSERT INTO flight_searches 
-        (origin, destination, departure_date, return_date, adults, price, currency, airline, flight_data)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        query = """
+        INSERT INTO scan_jobs
+        (origin, destination, departure_date, return_date, adults, days_ahead,
+         return_days, priority, target_price, score, change_rate, max_attempts)
+        VALUES %s
+        ON CONFLICT (origin, destination, adults, days_ahead, return_days)
+        WHERE status IN ('pending', 'running') DO NOTHING
         RETURNING id;
         """
         
+        if not jobs:
+            return 0
+        
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            # Asegurar que airline no sea None
-            if airline is None or airline == '':
-                airline = 'N/A'
-            
-            cursor.execute(
-                insert_query,
-                (origin, destination, departure_date, return_date, adults, 
-                 price, currency, airline, Json(flight_data))
-            )
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                inserted = execute_values(cursor, query, [
+                    (job['origin'], job['destination'], job['departure_date'], job.get('return_date'),
+                     job.get('adults', 1), job['days_ahead'], job.get('return_days') or 0,
+                     job.get('priority', 0), job.get('target_price'), job.get('score'),
+                     job.get('change_rate'), max_attempts)
+                    for job in jobs
+                ], fetch=True)
+                conn.commit()
+                cursor.close()
             
-            flight_id = cursor.fetchone()[0]
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return flight_id
+            return len(inserted)
             
         except Exception as e:
-            print(f"Error insertando oferta: {str(e)}")
+            print(f"Error encolando búsquedas: {str(e)}")
             raise
     
-    def get_recent_searches(self, limit: int = 100) -> List[Dict]:
+    def claim_scan_jobs(self, worker_id: str, limit: int = 1, lease_seconds: int = 120) -> List[Dict]:
         """
-        Obtiene las búsquedas más recientes
+        Toma búsquedas pendientes de la cola para un worker
+        
+        `FOR UPDATE SKIP LOCKED` hace que cada worker tome filas distintas sin
+        esperar a los demás. La búsqueda queda asignada hasta que vence la
+        lease; el worker debe renovarla con `heartbeat_scan_jobs`.
         
         Args:
-            limit: Número máximo de registros a retornar
+            worker_id: Identificador único del worker
+            limit: Máximo de búsquedas a tomar
+            lease_seconds: Duración de la lease en segundos
             
         Returns:
-            Lista de diccionarios con los datos de búsquedas
+            Búsquedas tomadas (mayor score primero), con id y attempts
         """
         query = """
-        SELECT 
-            id,
-            search_timestamp,
-            origin,
-            destination,
-            departure_date,
-            return_date,
-            adults,
-            price,
-            currency,
-            airline,
-            created_at
-        FROM flight_searches
-        ORDER BY search_timestamp DESC
-        LIMIT %s;
+        UPDATE scan_jobs
+        SET status = 'running',
+            worker_id = %s,
+            attempts = attempts + 1,
+            started_at = CURRENT_TIMESTAMP,
+            lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+        WHERE id IN (
+            SELECT id
+            FROM scan_jobs
+            WHERE status = 'pending' AND available_at <= CURRENT_TIMESTAMP
+            ORDER BY score DESC NULLS LAST, priority DESC, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, origin, destination, departure_date, return_date, adults, days_ahead,
+                  return_days, priority, target_price, score, change_rate, attempts, max_attempts;
         """
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, (limit,))
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query, (worker_id, lease_seconds, limit))
+                
+                results = cursor.fetchall()
+                conn.commit()
+                cursor.close()
             
-            results = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            jobs = []
+            for row in results:
+                job = dict(row)
+                job['departure_date'] = job['departure_date'].isoformat()
+                job['return_date'] = job['return_date'].isoformat() if job['return_date'] else None
+                job['target_price'] = float(job['target_price']) if job['target_price'] is not None else None
+                jobs.append(job)
             
-            return [dict(row) for row in results] if results else []
+            jobs.sort(key=lambda job: (-(job['score'] or 0), -job['priority'], job['id']))
+            return jobs
             
         except Exception as e:
-            print(f"Error obteniendo búsquedas recientes: {str(e)}")
-            return []
+            print(f"Error tomando búsquedas de la cola: {str(e)}")
+            raise
     
-    def get_unique_routes(self) -> List[Tuple[str, str]]:
+    def heartbeat_scan_jobs(self, worker_id: str, job_ids: List[int], lease_seconds: int = 120) -> List[int]:
         """
-        Obtiene todas las rutas únicas (origen-destino) en la base de datos
+        Renueva la lease de las búsquedas en curso de un worker
         
+        Args:
+            worker_id: Identificador del worker
+            job_ids: Búsquedas que el worker está procesando
+            lease_seconds: Nueva duración de la lease desde ahora
+            
         Returns:
-            Lista de tuplas (origen, destino)
+            IDs que siguen asignados al worker (los que faltan fueron
+            recuperados por otro proceso después de vencer su lease)
         """
         query = """
-        SELECT DISTINCT origin, destination
-        FROM flight_searches
-        ORDER BY origin, destination;
+        UPDATE scan_jobs
+        SET lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+        WHERE id = ANY(%s) AND worker_id = %s AND status = 'running'
+        RETURNING id;
         """
         
+        if not job_ids:
+            return []
+        
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query)
-            
-            routes = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (lease_seconds, list(job_ids), worker_id))
+                
+                owned = [row[0] for row in cursor.fetchall()]
+                conn.commit()
+                cursor.close()
             
-            return routes if routes else []
+            return owned
             
         except Exception as e:
-            print(f"Error obteniendo rutas: {str(e)}")
-            return []
+            print(f"Error renovando lease de búsquedas: {str(e)}")
+            raise
     
-    def get_searches_by_route(
+    def complete_scan_job(
         self,
-        origin: str,
-        destination: str,
-        days: int = 30
-    ) -> List[Dict]:
+        job_id: int,
+        worker_id: str,
+        offers_found: int,
+        offers_saved: int,
+        min_price: Optional[float] = None,
+        changed: bool = False
+    ) -> bool:
         """
-        Obtiene búsquedas para una ruta específica en los últimos N días
+        Registra el resultado de una búsqueda terminada
         
         Args:
-            origin: Código IATA de origen
-            destination: Código IATA de destino
-            days: Número de días hacia atrás
+            job_id: ID de la búsqueda en la cola
+            worker_id: Worker que la procesó
+            offers_found: Ofertas devueltas por la API
+            offers_saved: Filas nuevas guardadas
+            min_price: Precio mínimo encontrado (o None)
+            changed: Si se detectó un cambio de precio/disponibilidad
             
         Returns:
-            Lista de diccionarios con los datos
+            True si la búsqueda seguía asignada al worker (False si su lease
+            venció y otro worker la recuperó)
         """
         query = """
-        SELECT 
-            id,
-            search_timestamp,
-            origin,
-            destination,
-            departure_date,
-            return_date,
-            adults,
-            price,
-            currency,
-            airline,
-            created_at
-        FROM flight_searches
-        WHERE origin = %s 
-          AND destination = %s
-          AND search_timestamp >= %s
-        ORDER BY search_timestamp DESC;
+        UPDATE scan_jobs
+        SET status = 'done',
+            finished_at = CURRENT_TIMESTAMP,
+            lease_expires_at = NULL,
+            offers_found = %s,
+            offers_saved = %s,
+            min_price = %s,
+            changed = %s,
+            last_error = NULL
+        WHERE id = %s AND worker_id = %s AND status = 'running';
         """
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (offers_found, offers_saved, min_price, changed, job_id, worker_id))
+                
+                updated = cursor.rowcount == 1
+                conn.commit()
+                cursor.close()
             
-            cutoff_date = datetime.now() - timedelta(days=days)
-            cursor.execute(query, (origin, destination, cutoff_date))
-            
-            results = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            
-            return [dict(row) for row in results] if results else []
+            return updated
             
         except Exception as e:
-            print(f"Error obteniendo búsquedas por ruta: {str(e)}")
-            return []
+            print(f"Error registrando resultado de búsqueda: {str(e)}")
+            raise
     
-    def get_price_statistics(
-        self,
-        origin: str,
-        destination: str,
-        days: int = 30
-    ) -> Dict:
+    def fail_scan_job(self, job_id: int, worker_id: str, error: str, retry_delay_seconds: int = 60) -> bool:
         """
-        Obtiene estadísticas de precios para una ruta
+        Registra el error de una búsqueda y la reprograma
+        
+        Vuelve a quedar pendiente después de `retry_delay_seconds` multiplicado
+        por el número de intentos, o queda como 'failed' si agotó sus intentos.
         
         Args:
-            origin: Código IATA de origen
-            destination: Código IATA de destino
-            days: Número de días hacia atrás
+            job_id: ID de la búsqueda en la cola
+            worker_id: Worker que la procesó
+            error: Mensaje de error
+            retry_delay_seconds: Espera base antes de reintentar
             
         Returns:
-            Diccionario con estadísticas (min, max, avg, count)
+            True si la búsqueda seguía asignada al worker
         """
         query = """
-        SELECT 
-            MIN(price) as min_price,
-            MAX(price) as max_price,
-            AVG(price) as avg_price,
-            COUNT(*) as search_count
-        FROM flight_searches
-        WHERE origin = %s 
-          AND destination = %s
-          AND search_timestamp >= %s;
+        UPDATE scan_jobs
+        SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+            available_at = CURRENT_TIMESTAMP + attempts * %s * INTERVAL '1 second',
+            finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP END,
+            worker_id = NULL,
+            lease_expires_at = NULL,
+            last_error = %s
+        WHERE id = %s AND worker_id = %s AND status = 'running';
         """
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (retry_delay_seconds, str(error)[:1000], job_id, worker_id))
+                
+                updated = cursor.rowcount == 1
+                conn.commit()
+                cursor.close()
             
-            cutoff_date = datetime.now() - timedelta(days=days)
-            cursor.execute(query, (origin, destination, cutoff_date))
+            return updated
             
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
+        except Exception as e:
+            print(f"Error registrando fallo de búsqueda: {str(e)}")
+            raise
+    
+    def release_scan_jobs(self, worker_id: str) -> int:
+        """
+        Devuelve a la cola las búsquedas en curso de un worker que se detiene
+        (sin contar el intento)
+        
+        Returns:
+            Número de búsquedas devueltas
+        """
+        query = """
+        UPDATE scan_jobs
+        SET status = 'pending',
+            attempts = GREATEST(attempts - 1, 0),
+            worker_id = NULL,
+            lease_expires_at = NULL
+        WHERE worker_id = %s AND status = 'running';
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (worker_id,))
+                
+                released = cursor.rowcount
+                conn.commit()
+                cursor.close()
             
-            return dict(result) if result else {}
+            return released
             
         except Exception as e:
-            print(f"Error obteniendo estadísticas: {str(e)}")
-            return {}
+            print(f"Error devolviendo búsquedas a la cola: {str(e)}")
+            return 0
     
-    def get_cheapest_by_airline(
-        self,
-        origin: str,
-        destination: str,
-        days: int = 30
-    ) -> List[Dict]:
+    def reclaim_expired_scan_jobs(self) -> int:
         """
-        Obtiene el precio más barato por aerolínea para una ruta
+        Recupera las búsquedas cuya lease venció (worker caído o colgado)
+        
+        Vuelven a quedar pendientes, o como 'failed' si agotaron sus intentos.
+        Cualquier worker puede ejecutarlo; las filas bloqueadas por otro que
+        también está recuperando se saltean.
         
-        Args:
-            origin: Código IATA de origen
-            destination: Código IATA de destino
-            days: Número de días hacia atrás
-            
         Returns:
-            Lista con el precio mínimo por aerolínea
+            Número de búsquedas recuperadas
         """
         query = """
-        SELECT 
-            airline,
-            MIN(price) as min_price,
-            COUNT(*) as occurrences
-        FROM flight_searches
-        WHERE origin = %s 
-          AND destination = %s
-          AND search_timestamp >= %s
-          AND airline IS NOT NULL
-          AND airline != 'N/A'
-        GROUP BY airline
-        ORDER BY min_price ASC;
+        UPDATE scan_jobs
+        SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+            finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP END,
+            last_error = 'Lease vencida (worker ' || COALESCE(worker_id, '?') || ')',
+            worker_id = NULL,
+            lease_expires_at = NULL
+        WHERE id IN (
+            SELECT id
+            FROM scan_jobs
+            WHERE status = 'running' AND lease_expires_at < CURRENT_TIMESTAMP
+            FOR UPDATE SKIP LOCKED
+        );
         """
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                
+                reclaimed = cursor.rowcount
+                conn.commit()
+                cursor.close()
             
-            cutoff_date = datetime.now() - timedelta(days=days)
-            cursor.execute(query, (origin, destination, cutoff_date))
+            return reclaimed
             
-            results = cursor.fetchall()
-            cursor.close()
-            conn.close()
+        except Exception as e:
+            print(f"Error recuperando búsquedas vencidas: {str(e)}")
+            return 0
+    
+    def get_active_scan_keys(self) -> List[Tuple]:
+        """
+        Obtiene las claves del planificador de las búsquedas pendientes o en curso
+        
+        Returns:
+            Lista de tuplas (origin, destination, adults, days_ahead, return_days)
+        """
+        query = """
+        SELECT origin, destination, adults, days_ahead, return_days
+        FROM scan_jobs
+        WHERE status IN ('pending', 'running');
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                
+                results = cursor.fetchall()
+                cursor.close()
             
-            return [dict(row) for row in results] if results else []
+            return [tuple(row) for row in results]
             
         except Exception as e:
-            print(f"Error obteniendo precios por aerolínea: {str(e)}")
+            print(f"Error obteniendo búsquedas activas: {str(e)}")
             return []
     
-    def delete_old_searches(self, days: int = 90) -> int:
+    def get_scan_queue_stats(self) -> Dict:
         """
-        Elimina búsquedas más antiguas que N días
+        Obtiene el estado de la cola de búsquedas
         
-        Args:
-            days: Número de días (registros más antiguos se eliminan)
-            
         Returns:
-            Número de registros eliminados
+            Diccionario con pending, running, done, failed, expired (en curso
+            con lease vencida), oldest_pending_seconds y la actividad de la
+            última hora: completed_last_hour, workers_last_hour
         """
         query = """
-        DELETE FROM flight_searches
-        WHERE search_timestamp < %s;
+        SELECT
+            COUNT(*) FILTER (WHERE status = 'pending') as pending,
+            COUNT(*) FILTER (WHERE status = 'running') as running,
+            COUNT(*) FILTER (WHERE status = 'done') as done,
+            COUNT(*) FILTER (WHERE status = 'failed') as failed,
+            COUNT(*) FILTER (WHERE status = 'running' AND lease_expires_at < CURRENT_TIMESTAMP) as expired,
+            EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(enqueued_at) FILTER (WHERE status = 'pending'))
+                as oldest_pending_seconds,
+            COUNT(*) FILTER (WHERE status = 'done' AND finished_at >= CURRENT_TIMESTAMP - INTERVAL '1 hour')
+                as completed_last_hour,
+            COUNT(DISTINCT worker_id) FILTER (WHERE started_at >= CURRENT_TIMESTAMP - INTERVAL '1 hour')
+                as workers_last_hour
+        FROM scan_jobs;
         """
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query)
+                
+                result = cursor.fetchone()
+                cursor.close()
             
-            cutoff_date = datetime.now() - timedelta(days=days)
-            cursor.execute(query, (cutoff_date,))
-            
-            deleted_count = cursor.rowcount
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return deleted_count
+            stats = dict(result) if result else {}
+            if stats.get('oldest_pending_seconds') is not None:
+                stats['oldest_pending_seconds'] = float(stats['oldest_pending_seconds'])
+            return stats
             
         except Exception as e:
-            print(f"Error eliminando registros antiguos: {str(e)}")
-            return 0
+            print(f"Error obteniendo estado de la cola: {str(e)}")
+            return {}
     
-    def get_flight_by_id(self, flight_id: int) -> Optional[Dict]:
+    def purge_scan_jobs(self, days: int = 7) -> int:
         """
-        Obtiene un vuelo específico por ID
+        Elimina las búsquedas terminadas (done o failed) de la cola
         
         Args:
-            flight_id: ID del registro
+            days: Conservar las terminadas en los últimos N días
             
         Returns:
-            Diccionario con los datos del vuelo o None
+            Número de filas eliminadas
         """
         query = """
-        SELECT 
-            id,
-            search_timestamp,
-            origin,
-            destination,
-            departure_date,
-            return_date,
-            adults,
-            price,
-            currency,
-            airline,
-            flight_data,
-            created_at
-        FROM flight_searches
-        WHERE id = %s;
+        DELETE FROM scan_jobs
+        WHERE status IN ('done', 'failed') AND finished_at < %s;
         """
         
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, (flight_id,))
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (datetime.now() - timedelta(days=days),))
+                
+                deleted = cursor.rowcount
+                conn.commit()
+                cursor.close()
             
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            return deleted
             
-            return dict(result) if result else None
+        except Exception as e:
+            print(f"Error eliminando búsquedas terminadas de la cola: {str(e)}")
+            return 0
+    
+    def get_database_summary(self) -> Dict:
+        """
+        Obtiene un resumen general de la base (usado por los scripts de
+        inicialización y prueba)
+        
+        Returns:
+            Diccionario con search_count, min_price, avg_price, max_price y
+            route_count (vacío si hay error)
+        """
+        query = """
+        SELECT
+            COUNT(*) as search_count,
+            MIN(price) as min_price,
+            AVG(price) as avg_price,
+            MAX(price) as max_price,
+            (SELECT COUNT(*) FROM routes) as route_count
+        FROM flight_searches;
+        """
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(query)
+                
+                result = cursor.fetchone()
+                cursor.close()
             
+            return dict(result) if result else {}
+        
         except Exception as e:
-            print(f"Error obteniendo vuelo por ID: {str(e)}")
-            return None
+            print(f"Error obteniendo resumen: {str(e)}")
+            return {}
     
     def test_connection(self) -> bool:
         """
@@ -431,12 +3615,11 @@ class Database:
             True si la conexión es exitosa, False en caso contrario
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1;")
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1;")
+                result = cursor.fetchone()
+                cursor.close()
             return result is not None
         except Exception as e:
             print(f"Error de conexión: {str(e)}")
@@ -0,0 +1,204 @@
+"""
+Exportación del histórico de búsquedas a formatos columnares (Parquet / Arrow IPC)
+
+Las filas se leen de la base en bloques (`iter_flight_history`) y cada bloque
+se escribe como un row group / record batch, por lo que la memoria usada no
+depende del tamaño del histórico.
+
+Uso desde la línea de comandos:
+    python export_data.py historial.parquet --origin EZE --destination MIA \\
+        --from 2025-01-01 --to 2025-07-01
+
+Usa las mismas variables de entorno que `monitor_script.py` (DB_BACKEND,
+DB_HOST, ...).
+"""
+
+import argparse
+import io
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+from typing import BinaryIO, Dict, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dependencia opcional
+    pa = None
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+
+def export_schema():
+    """
+    Esquema tipado de las columnas exportadas
+    
+    Returns:
+        pyarrow.Schema con una columna por atributo de `flight_searches`
+    """
+    _require_pyarrow()
+    return pa.schema([
+        ('id', pa.int64()),
+        ('search_timestamp', pa.timestamp('us')),
+        ('last_seen', pa.timestamp('us')),
+        ('origin', pa.string()),
+        ('destination', pa.string()),
+        ('departure_date', pa.date32()),
+        ('return_date', pa.date32()),
+        ('adults', pa.int16()),
+        ('price', pa.float64()),
+        ('currency', pa.string()),
+        ('airline', pa.string()),
+        ('carrier_code', pa.string()),
+        ('stops', pa.int16()),
+        ('duration_minutes', pa.int32()),
+        ('departure_at', pa.timestamp('us')),
+        ('arrival_at', pa.timestamp('us')),
+        ('bookable_seats', pa.int16()),
+        ('itinerary_fingerprint', pa.string())
+    ])
+
+
+def _require_pyarrow():
+    """Verifica que pyarrow esté instalado"""
+    if pa is None:
+        raise ImportError("La exportación requiere pyarrow: pip install pyarrow")
+
+
+def normalize_row(row: Dict) -> Dict:
+    """Convierte los valores de la base a tipos compatibles con Arrow"""
+    price = row.get('price')
+    if isinstance(price, Decimal):
+        row['price'] = float(price)
+    fingerprint = row.get('itinerary_fingerprint')
+    if fingerprint is not None:
+        row['itinerary_fingerprint'] = fingerprint.strip()
+    return row
+
+
+def export_flight_history(
+    db,
+    destination_file: Union[str, BinaryIO],
+    fmt: str = 'parquet',
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    chunk_size: int = 50000,
+    compression: str = 'zstd'
+) -> int:
+    """
+    Exporta búsquedas a Parquet o Arrow IPC en bloques
+    
+    Args:
+        db: Instancia de `Database` o `SQLiteDatabase`
+        destination_file: Ruta o archivo binario abierto de destino
+        fmt: 'parquet' o 'arrow' (Arrow IPC / Feather v2)
+        origin: Filtrar por origen (opcional)
+        destination: Filtrar por destino (opcional)
+        date_from: Búsquedas desde este momento (opcional)
+        date_to: Búsquedas anteriores a este momento (opcional)
+        chunk_size: Filas por row group / record batch
+        compression: Códec de compresión ('zstd', 'snappy', 'gzip' o 'none')
+    
+    Returns:
+        Número de filas exportadas
+    """
+    _require_pyarrow()
+    
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt} (usar {', '.join(EXPORT_FORMATS)})")
+    
+    schema = export_schema()
+    codec = None if compression == 'none' else compression
+    
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(destination_file, schema, compression=codec or 'none')
+    else:
+        options = pa_ipc.IpcWriteOptions(compression=codec if codec in ('zstd', 'lz4') else None)
+        writer = pa_ipc.new_file(destination_file, schema, options=options)
+    
+    total_rows = 0
+    
+    try:
+        for rows in db.iter_flight_history(
+            origin=origin,
+            destination=destination,
+            date_from=date_from,
+            date_to=date_to,
+            chunk_size=chunk_size
+        ):
+            batch = pa.RecordBatch.from_pylist([normalize_row(row) for row in rows], schema=schema)
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]), row_group_size=chunk_size)
+            else:
+                writer.write_batch(batch)
+            total_rows += len(rows)
+    finally:
+        writer.close()
+    
+    return total_rows
+
+
+def export_to_bytes(db, fmt: str = 'parquet', **filters) -> bytes:
+    """
+    Exporta a memoria (para los botones de descarga de la app)
+    
+    Args:
+        db: Instancia de base de datos
+        fmt: 'parquet' o 'arrow'
+        **filters: origin, destination, date_from, date_to
+    
+    Returns:
+        Contenido del archivo exportado
+    """
+    buffer = io.BytesIO()
+    export_flight_history(db, buffer, fmt=fmt, **filters)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el histórico de búsquedas de vuelos")
+    parser.add_argument('output', help="Archivo de salida (.parquet o .arrow)")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                        help="Formato (por defecto según la extensión del archivo)")
+    parser.add_argument('--origin', help="Código IATA de origen")
+    parser.add_argument('--destination', help="Código IATA de destino")
+    parser.add_argument('--from', dest='date_from', help="Fecha inicial (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='date_to', help="Fecha final exclusiva (YYYY-MM-DD)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Filas por bloque")
+    parser.add_argument('--compression', default='zstd', help="zstd, snappy, gzip, lz4 o none")
+    args = parser.parse_args()
+    
+    fmt = args.format or ('arrow' if args.output.endswith(('.arrow', '.feather')) else 'parquet')
+    
+    try:
+        from storage import create_database
+        db = create_database(os.environ)
+        
+        started = datetime.now()
+        rows = export_flight_history(
+            db,
+            args.output,
+            fmt=fmt,
+            origin=args.origin.upper() if args.origin else None,
+            destination=args.destination.upper() if args.destination else None,
+            date_from=datetime.strptime(args.date_from, '%Y-%m-%d') if args.date_from else None,
+            date_to=datetime.strptime(args.date_to, '%Y-%m-%d') if args.date_to else None,
+            chunk_size=args.chunk_size,
+            compression=args.compression
+        )
+        elapsed = (datetime.now() - started).total_seconds()
+        
+        print(f"✅ {rows} filas exportadas a {args.output} ({fmt}) en {elapsed:.1f}s")
+        return 0
+    
+    except Exception as e:
+        print(f"❌ Error exportando: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
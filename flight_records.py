@@ -0,0 +1,266 @@
+"""
+Utilidades para normalizar ofertas de vuelo antes de persistirlas
+
+Funciones sin dependencias de base de datos compartidas por los backends
+de almacenamiento (PostgreSQL y SQLite).
+"""
+
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import re
+
+
+# Campos del raw_data propios de cada respuesta de la API (Amadeus numera
+# las ofertas "1", "2", ... en cada búsqueda): no forman parte del contenido
+RESPONSE_LOCAL_FIELDS = ('id',)
+
+
+def payload_hash(payload: Dict) -> str:
+    """
+    Calcula el hash de contenido (SHA-256) de un payload JSON
+    
+    El JSON se serializa de forma canónica (claves ordenadas, sin espacios)
+    para que ofertas idénticas produzcan siempre el mismo hash.
+    
+    Args:
+        payload: Diccionario con los datos crudos de la oferta
+    
+    Returns:
+        Hash hexadecimal de 64 caracteres
+    """
+    canonical = json.dumps(
+        payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def split_raw_payload(flight_data: Dict) -> Tuple[Dict, Optional[Dict], Optional[str]]:
+    """
+    Separa el bloque `raw_data` de una oferta procesada
+    
+    Los campos propios de la respuesta (`RESPONSE_LOCAL_FIELDS`) se quitan
+    del payload compartido y quedan en la oferta, bajo `raw_data_local`,
+    para que la misma oferta vista en dos búsquedas comparta el payload.
+    
+    Args:
+        flight_data: Oferta procesada (puede incluir `raw_data`)
+    
+    Returns:
+        Tupla (oferta sin raw_data, raw_data o None, hash del raw_data o None)
+    """
+    if not isinstance(flight_data, dict) or flight_data.get('raw_data') is None:
+        stripped = flight_data
+        if isinstance(flight_data, dict) and 'raw_data' in flight_data:
+            stripped = {k: v for k, v in flight_data.items() if k != 'raw_data'}
+        return stripped, None, None
+    
+    stripped = {k: v for k, v in flight_data.items() if k != 'raw_data'}
+    raw_data = flight_data['raw_data']
+    if isinstance(raw_data, dict):
+        local = {k: raw_data[k] for k in RESPONSE_LOCAL_FIELDS if k in raw_data}
+        if local:
+            stripped['raw_data_local'] = local
+            raw_data = {k: v for k, v in raw_data.items() if k not in local}
+    return stripped, raw_data, payload_hash(raw_data)
+
+
+def join_raw_payload(flight_data: Dict, raw_data: Optional[Dict]) -> Dict:
+    """
+    Reincorpora el payload compartido a una oferta (inversa de `split_raw_payload`)
+    
+    Args:
+        flight_data: Oferta guardada (sin raw_data, puede incluir `raw_data_local`)
+        raw_data: Payload de `flight_payloads` o None
+    
+    Returns:
+        Oferta con `raw_data` completo (incluidos los campos propios de la respuesta)
+    """
+    flight_data = dict(flight_data or {})
+    local = flight_data.pop('raw_data_local', None) or {}
+    if raw_data is not None:
+        flight_data['raw_data'] = dict(raw_data, **local)
+    return flight_data
+
+
+def itinerary_fingerprint(
+    origin: str,
+    destination: str,
+    departure_date: str,
+    return_date: Optional[str],
+    adults: int,
+    flight_data: Dict
+) -> str:
+    """
+    Calcula la huella de un itinerario (independiente del precio)
+    
+    Dos ofertas con la misma huella son el mismo producto: mismas
+    aerolíneas, números de vuelo, horarios y clase tarifaria. Si la oferta
+    no trae `raw_data` (modo simulación) se usan los campos procesados.
+    
+    Args:
+        origin: Código IATA de origen
+        destination: Código IATA de destino
+        departure_date: Fecha de salida (YYYY-MM-DD)
+        return_date: Fecha de regreso (YYYY-MM-DD) o None
+        adults: Número de adultos
+        flight_data: Oferta procesada (con o sin `raw_data`)
+    
+    Returns:
+        Hash hexadecimal de 64 caracteres
+    """
+    flight_data = flight_data or {}
+    raw_data = flight_data.get('raw_data') or {}
+    
+    segments = []
+    for itinerary in raw_data.get('itineraries', []):
+        for segment in itinerary.get('segments', []):
+            segments.append([
+                segment.get('carrierCode'),
+                segment.get('number'),
+                segment.get('departure', {}).get('iataCode'),
+                segment.get('departure', {}).get('at'),
+                segment.get('arrival', {}).get('iataCode'),
+                segment.get('arrival', {}).get('at')
+            ])
+    
+    fare_classes = []
+    traveler_pricings = raw_data.get('travelerPricings', [])
+    if traveler_pricings:
+        for fare in traveler_pricings[0].get('fareDetailsBySegment', []):
+            fare_classes.append([fare.get('cabin'), fare.get('class')])
+    
+    if not segments:
+        # Oferta sin datos crudos: usar los campos procesados
+        segments.append([
+            flight_data.get('airline_code') or flight_data.get('airline'),
+            flight_data.get('departure_time'),
+            flight_data.get('arrival_time'),
+            flight_data.get('stops'),
+            flight_data.get('duration')
+        ])
+    
+    return payload_hash({
+        'route': [origin, destination, str(departure_date), str(return_date or ''), adults],
+        'segments': segments,
+        'fare_classes': fare_classes
+    })
+
+
+def parse_duration_minutes(duration: Optional[str]) -> Optional[int]:
+    """
+    Convierte una duración ('10h 30m' o ISO 8601 'PT10H30M') a minutos
+    
+    Args:
+        duration: Duración en formato procesado o ISO 8601
+    
+    Returns:
+        Minutos totales o None si no se puede interpretar
+    """
+    if not duration or not isinstance(duration, str):
+        return None
+    
+    match = re.fullmatch(r'(?:PT)?(?:(\d+)[hH])?\s*(?:(\d+)[mM])?', duration.strip())
+    if not match or not any(match.groups()):
+        return None
+    
+    hours, minutes = match.groups()
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Convierte un horario ISO 8601 de Amadeus a datetime
+    
+    Amadeus informa horarios locales del aeropuerto sin zona horaria, por
+    lo que se conservan como hora local.
+    
+    Args:
+        value: Horario en formato ISO 8601 (ej: '2025-11-05T10:30:00')
+    
+    Returns:
+        datetime o None si no se puede interpretar
+    """
+    if not value or not isinstance(value, str):
+        return None
+    
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def parse_count(value) -> Optional[int]:
+    """
+    Convierte un conteo (escalas, asientos) a entero
+    
+    Args:
+        value: Número o texto con dígitos
+    
+    Returns:
+        Entero no negativo o None si no se puede interpretar
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if 0 <= value <= 9999 else None
+    if isinstance(value, str) and re.fullmatch(r'\d{1,4}', value.strip()):
+        return int(value)
+    return None
+
+
+def typed_attributes(flight_data: Dict) -> Dict:
+    """
+    Extrae los atributos tipados del itinerario de una oferta procesada
+    
+    Args:
+        flight_data: Oferta procesada por `AmadeusClient` o la simulación
+    
+    Returns:
+        Diccionario con duration_minutes, stops, carrier_code, departure_at,
+        arrival_at y bookable_seats (None si el dato falta o no se puede
+        interpretar)
+    """
+    flight_data = flight_data or {}
+    
+    carrier_code = flight_data.get('airline_code')
+    if not carrier_code or carrier_code == 'N/A':
+        carrier_code = None
+    
+    return {
+        'duration_minutes': parse_duration_minutes(flight_data.get('duration')),
+        'stops': parse_count(flight_data.get('stops')),
+        'carrier_code': carrier_code,
+        'departure_at': parse_timestamp(flight_data.get('departure_time')),
+        'arrival_at': parse_timestamp(flight_data.get('arrival_time')),
+        'bookable_seats': parse_count(flight_data.get('number_of_bookable_seats'))
+    }
+
+
+def prepare_offer(offer: Dict) -> Dict:
+    """
+    Calcula los campos derivados de una oferta sin tocar la base
+    
+    Los backends lo llaman al escribir; el pipeline del monitor lo calcula
+    antes, en la etapa de normalización (clave `prepared` de la oferta), para
+    que el escritor solo ejecute SQL.
+    
+    Args:
+        offer: Diccionario con los campos de `insert_flight_offer`
+    
+    Returns:
+        Diccionario con fingerprint, attributes (ver `typed_attributes`),
+        flight_data (sin raw_data), raw_data y payload_hash
+    """
+    flight_data, raw_data, raw_hash = split_raw_payload(offer.get('flight_data'))
+    return {
+        'fingerprint': itinerary_fingerprint(
+            offer['origin'], offer['destination'], offer['departure_date'], offer.get('return_date'),
+            offer.get('adults', 1), offer.get('flight_data')
+        ),
+        'attributes': typed_attributes(offer.get('flight_data')),
+        'flight_data': flight_data,
+        'raw_data': raw_data,
+        'payload_hash': raw_hash
+    }
@@ -0,0 +1,370 @@
+"""
+Indicadores de trading sobre las series de precios del monitor
+
+Implementa los indicadores de `docs/GUIA_TRADING.md` para cada serie (ruta,
+fecha de salida, fecha de regreso y adultos), usando como observación el
+precio mínimo de cada búsqueda terminada del monitor:
+
+- Media y mediana móviles de las últimas `window` observaciones (default 5)
+- Volatilidad: desviación estándar móvil y coeficiente de variación
+- Bandas tipo Bollinger: media ± `band_width` desviaciones (default 2)
+- Momentum: variación del precio contra el primero de la ventana
+- Drawdown: distancia del precio al máximo de la serie (≤ 0)
+- Tendencia (BAJISTA/ALCISTA/LATERAL) y señal (COMPRAR/ESPERAR/MONITOREAR)
+
+Todo se calcula vectorizado con pandas/NumPy sobre todas las series a la
+vez. `IndicatorEngine` es incremental: guarda por serie solo las últimas
+`window` observaciones y el máximo y mínimo acumulados, y al llegar
+observaciones nuevas calcula únicamente esas filas, sin recalcular la
+historia. El dashboard mantiene un motor por proceso y en cada recarga
+solo lee las búsquedas terminadas desde la anterior.
+
+Simulación (equivalencia y tiempos del modo incremental contra recalcular):
+    python indicators.py --simulate --routes 300 --observations 60 --batches 10
+"""
+
+import argparse
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Columnas que identifican una serie de precios
+SERIES_KEY = ['origin', 'destination', 'departure_date', 'return_date', 'adults']
+
+DEFAULT_WINDOW = 5
+DEFAULT_BAND_WIDTH = 2.0
+# Distancia al mínimo/máximo de la serie que cuenta como "cerca" (ver la guía)
+SIGNAL_MARGIN = 0.05
+# Variación dentro de la ventana a partir de la cual hay tendencia
+TREND_THRESHOLD = 0.02
+
+SIGNAL_BUY = 'COMPRAR'
+SIGNAL_WAIT = 'ESPERAR'
+SIGNAL_WATCH = 'MONITOREAR'
+
+INDICATOR_COLUMNS = [
+    'mean', 'median', 'volatility', 'cv', 'band_upper', 'band_lower', 'momentum',
+    'running_max', 'running_min', 'drawdown', 'observations', 'trend', 'signal'
+]
+
+# Columnas del estado por serie (últimas observaciones)
+_TAIL_COLUMNS = SERIES_KEY + ['series', 'timestamp', 'price', 'running_max', 'running_min', 'observations']
+
+
+def observation_frame(observations: Union[pd.DataFrame, Iterable[Dict]]) -> pd.DataFrame:
+    """
+    Normaliza observaciones a un DataFrame con SERIES_KEY, series, timestamp y price
+    
+    Las fechas quedan como texto ISO y un regreso nulo como '' (las claves
+    nulas no agrupan en pandas); `series` concatena la clave en una sola
+    columna para agrupar y comparar rápido.
+    """
+    frame = observations.copy() if isinstance(observations, pd.DataFrame) else pd.DataFrame(list(observations))
+    if frame.empty:
+        return pd.DataFrame({column: pd.Series(dtype=object)
+                             for column in SERIES_KEY + ['series', 'timestamp', 'price']})
+    
+    frame = frame[SERIES_KEY + ['timestamp', 'price']]
+    frame['departure_date'] = frame['departure_date'].map(_date_text)
+    frame['return_date'] = frame['return_date'].map(lambda value: _date_text(value) or '')
+    frame['adults'] = frame['adults'].fillna(1).astype(int)
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    frame['price'] = frame['price'].astype(float)
+    frame = frame.dropna(subset=['price'])
+    frame.insert(len(SERIES_KEY), 'series', frame['origin'].str.cat(
+        [frame['destination'], frame['departure_date'], frame['return_date'], frame['adults'].astype(str)],
+        sep='|'
+    ))
+    return frame
+
+
+def _concat(kept: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+    """Concatena estado conservado y filas nuevas (sin avisos por DataFrames vacíos)"""
+    return pd.concat([kept, added], ignore_index=True) if len(kept) else added.reset_index(drop=True)
+
+
+def _date_text(value) -> Optional[str]:
+    """Fecha como 'YYYY-MM-DD' (None si no hay fecha)"""
+    if value is None or value == '' or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+
+def _compute(combined: pd.DataFrame, window: int, band_width: float) -> pd.DataFrame:
+    """
+    Calcula los indicadores de un DataFrame ordenado por serie y tiempo
+    
+    Además de series, timestamp y price espera peak_input y floor_input
+    (máximo/mínimo acumulado de las filas de estado, el precio en las
+    nuevas) y count_input (observaciones que aporta cada fila).
+    """
+    frame = combined.copy()
+    count = len(frame)
+    price = frame['price'].to_numpy(dtype=float)
+    index = np.arange(count)
+    
+    # Filas consecutivas de la misma serie (el DataFrame viene ordenado)
+    keys = frame['series'].to_numpy()
+    starts_series = np.ones(count, dtype=bool)
+    starts_series[1:] = keys[1:] != keys[:-1]
+    series = np.cumsum(starts_series) - 1
+    first_row = np.maximum.accumulate(np.where(starts_series, index, 0))
+    
+    # Matriz de ventanas (una fila por observación, NaN antes del inicio de su serie)
+    positions = index[:, None] + np.arange(1 - window, 1)[None, :]
+    valid = positions >= first_row[:, None]
+    windows = np.where(valid, price[np.clip(positions, 0, None)], np.nan)
+    sizes = valid.sum(axis=1)
+    
+    mean = np.nanmean(windows, axis=1)
+    squares = np.nansum((windows - mean[:, None]) ** 2, axis=1)
+    volatility = np.sqrt(np.divide(squares, sizes - 1, out=np.zeros(count), where=sizes > 1))
+    frame['mean'] = mean
+    frame['median'] = np.nanmedian(windows, axis=1)
+    frame['volatility'] = volatility
+    frame['cv'] = volatility / mean
+    frame['band_upper'] = mean + band_width * volatility
+    frame['band_lower'] = mean - band_width * volatility
+    
+    # Contra el primer precio de la ventana (el primero de la serie si es más corta)
+    frame['momentum'] = price / price[np.maximum(index - (window - 1), first_row)] - 1
+    
+    grouped = pd.DataFrame({'peak': frame['peak_input'].to_numpy(dtype=float),
+                            'floor': frame['floor_input'].to_numpy(dtype=float),
+                            'count': frame['count_input'].to_numpy(dtype=int)}).groupby(series)
+    frame['running_max'] = grouped['peak'].cummax().to_numpy()
+    frame['running_min'] = grouped['floor'].cummin().to_numpy()
+    frame['drawdown'] = price / frame['running_max'].to_numpy() - 1
+    frame['observations'] = grouped['count'].cumsum().to_numpy()
+    
+    flat = frame['running_max'].to_numpy() <= frame['running_min'].to_numpy()
+    near_min = price <= frame['running_min'].to_numpy() * (1 + SIGNAL_MARGIN)
+    near_max = price >= frame['running_max'].to_numpy() * (1 - SIGNAL_MARGIN)
+    below_band = price < frame['band_lower'].to_numpy()
+    above_band = price > frame['band_upper'].to_numpy()
+    frame['signal'] = np.select(
+        [flat, near_min | below_band, near_max | above_band],
+        [SIGNAL_WATCH, SIGNAL_BUY, SIGNAL_WAIT],
+        default=SIGNAL_WATCH
+    )
+    momentum = frame['momentum'].to_numpy()
+    frame['trend'] = np.select([momentum <= -TREND_THRESHOLD, momentum >= TREND_THRESHOLD],
+                               ['BAJISTA', 'ALCISTA'], default='LATERAL')
+    
+    return frame
+
+
+class IndicatorEngine:
+    """Indicadores por serie con actualización incremental (seguro entre hilos)"""
+    
+    def __init__(self, window: int = DEFAULT_WINDOW, band_width: float = DEFAULT_BAND_WIDTH):
+        """
+        Inicializa el motor
+        
+        Args:
+            window: Observaciones de las ventanas móviles
+            band_width: Desviaciones estándar de las bandas
+        """
+        self.window = max(int(window), 2)
+        self.band_width = band_width
+        self.tails = pd.DataFrame(columns=_TAIL_COLUMNS)
+        self.latest = pd.DataFrame(columns=SERIES_KEY + ['series', 'timestamp', 'price'] + INDICATOR_COLUMNS)
+        self.cursor: Optional[datetime] = None
+        self._lock = threading.Lock()
+    
+    def update(self, observations: Union[pd.DataFrame, Iterable[Dict]]) -> pd.DataFrame:
+        """
+        Incorpora observaciones nuevas
+        
+        Las observaciones anteriores o iguales a la última ya incorporada de
+        su serie se ignoran, así que se puede leer con solapamiento.
+        
+        Args:
+            observations: Filas con SERIES_KEY, timestamp y price
+        
+        Returns:
+            Indicadores de las observaciones incorporadas
+        """
+        new = observation_frame(observations)
+        if len(self.tails) and len(new):
+            last = self.tails.groupby('series', sort=False)['timestamp'].max()
+            previous = new['series'].map(last)
+            new = new[previous.isna() | (new['timestamp'] > previous)]
+        new = new.drop_duplicates(['series', 'timestamp'])
+        if new.empty:
+            return self.latest.iloc[0:0]
+        
+        new = new.assign(is_new=True, peak_input=new['price'], floor_input=new['price'], count_input=1)
+        
+        # Estado de las series afectadas: las últimas observaciones alcanzan
+        # para las ventanas móviles, y la última aporta el máximo, el mínimo y
+        # la cantidad acumulados
+        affected = self.tails['series'].isin(new['series'].unique()).to_numpy()
+        tails = self.tails[affected].sort_values(['series', 'timestamp'])
+        if len(tails):
+            is_last = tails.groupby('series', sort=False).cumcount(ascending=False).to_numpy() == 0
+            tails = tails.assign(is_new=False, peak_input=tails['running_max'].astype(float),
+                                 floor_input=tails['running_min'].astype(float),
+                                 count_input=np.where(is_last, tails['observations'].astype(int), 0))
+            combined = pd.concat([tails[new.columns], new], ignore_index=True)
+        else:
+            combined = new
+        combined = combined.sort_values(['series', 'timestamp'], kind='stable', ignore_index=True)
+        
+        result = _compute(combined, self.window, self.band_width)
+        added = result[result['is_new']].drop(columns=['is_new', 'peak_input', 'floor_input', 'count_input'])
+        
+        new_tails = result.groupby('series', sort=False).tail(self.window)[_TAIL_COLUMNS]
+        self.tails = _concat(self.tails[~affected], new_tails)
+        
+        latest = added.groupby('series', sort=False).tail(1)
+        self.latest = _concat(self.latest[~self.latest['series'].isin(latest['series']).to_numpy()], latest)
+        
+        return added.reset_index(drop=True)
+    
+    def series_latest(self, origin: str, destination: str, departure_date, return_date=None,
+                      adults: int = 1) -> Optional[Dict]:
+        """
+        Último valor de los indicadores de una serie
+
+        Returns:
+            Diccionario con la fila de `latest`, o None si la serie no tiene observaciones
+        """
+        key = '|'.join([origin, destination, _date_text(departure_date), _date_text(return_date) or '',
+                        str(int(adults or 1))])
+        with self._lock:
+            match = self.latest[self.latest['series'] == key]
+            return match.iloc[-1].to_dict() if len(match) else None
+
+    def expire(self, today: Optional[date] = None) -> int:
+        """
+        Descarta las series cuya fecha de salida ya pasó
+        
+        Returns:
+            Series descartadas
+        """
+        today_text = (today or date.today()).isoformat()
+        before = len(self.latest)
+        self.tails = self.tails[self.tails['departure_date'] >= today_text]
+        self.latest = self.latest[self.latest['departure_date'] >= today_text]
+        return before - len(self.latest)
+    
+    def refresh(self, db, days: int = 30, overlap_minutes: float = 10) -> pd.DataFrame:
+        """
+        Lee de la base las observaciones nuevas y actualiza los indicadores
+        
+        La primera vez lee los últimos `days` días; después, desde la última
+        lectura (con un solapamiento para las transacciones que terminaron
+        tarde; las repetidas se ignoran).
+        
+        Args:
+            db: Instancia de base de datos (ver `Database.get_scan_price_observations`)
+            days: Historia a cargar la primera vez
+            overlap_minutes: Solapamiento entre lecturas
+        
+        Returns:
+            Último valor de los indicadores de cada serie vigente
+        """
+        with self._lock:
+            now = datetime.now()
+            since = (self.cursor - timedelta(minutes=overlap_minutes) if self.cursor
+                     else now - timedelta(days=days))
+            self.update(db.get_scan_price_observations(since))
+            self.cursor = now
+            self.expire(now.date())
+            return self.latest.copy()
+
+
+def compute_indicators(observations: Union[pd.DataFrame, Iterable[Dict]], window: int = DEFAULT_WINDOW,
+                       band_width: float = DEFAULT_BAND_WIDTH) -> pd.DataFrame:
+    """Indicadores de todas las observaciones, calculados desde cero"""
+    return IndicatorEngine(window, band_width).update(observations)
+
+
+def _simulated_observations(routes: int, observations: int, seed: int = 7) -> pd.DataFrame:
+    """Series sintéticas: caminatas aleatorias de precios, una observación cada 2 horas"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1)
+    steps = rng.normal(0, 0.03, size=(routes, observations))
+    prices = 400 * np.exp(np.cumsum(steps, axis=1)) * rng.uniform(0.5, 2.0, size=(routes, 1))
+    return pd.DataFrame({
+        'origin': np.repeat([f"R{index:03d}" for index in range(routes)], observations),
+        'destination': 'SIM',
+        'departure_date': '2025-03-01',
+        'return_date': None,
+        'adults': 1,
+        'timestamp': np.tile([start + timedelta(hours=2 * step) for step in range(observations)], routes),
+        'price': prices.round(2).ravel()
+    })
+
+
+def simulate(routes: int = 300, observations: int = 60, batches: int = 10) -> Dict:
+    """
+    Compara actualizar incrementalmente contra recalcular todo en cada lote
+    
+    Returns:
+        Diccionario con full_seconds, incremental_seconds y max_difference
+        (entre los indicadores finales de ambos modos)
+    """
+    frame = _simulated_observations(routes, observations)
+    cuts = np.linspace(0, observations, batches + 1).astype(int)
+    timestamps = sorted(frame['timestamp'].unique())
+    warmup = frame[frame['timestamp'] < timestamps[cuts[1]]]
+    
+    engine = IndicatorEngine()
+    engine.update(warmup)
+    incremental_seconds = full_seconds = 0.0
+    full = None
+    for lower, upper in zip(cuts[1:-1], cuts[2:]):
+        batch = frame[(frame['timestamp'] >= timestamps[lower]) & (frame['timestamp'] <= timestamps[upper - 1])]
+        started = time.perf_counter()
+        engine.update(batch)
+        incremental_seconds += time.perf_counter() - started
+        
+        history = frame[frame['timestamp'] <= timestamps[upper - 1]]
+        started = time.perf_counter()
+        full = compute_indicators(history)
+        full_seconds += time.perf_counter() - started
+    
+    final = full.groupby(SERIES_KEY).tail(1).set_index(SERIES_KEY).sort_index()
+    latest = engine.latest.set_index(SERIES_KEY).sort_index()
+    numeric = ['mean', 'median', 'volatility', 'band_upper', 'band_lower', 'momentum', 'running_max',
+               'running_min', 'drawdown', 'observations']
+    difference = (final[numeric].astype(float) - latest[numeric].astype(float)).abs().to_numpy().max()
+    return {
+        'full_seconds': full_seconds,
+        'incremental_seconds': incremental_seconds,
+        'max_difference': float(difference),
+        'same_signals': bool((final['signal'] == latest['signal']).all())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indicadores de trading de las series de precios")
+    parser.add_argument('--simulate', action='store_true', help="Comparar incremental contra recalcular")
+    parser.add_argument('--routes', type=int, default=300, help="Series simuladas")
+    parser.add_argument('--observations', type=int, default=60, help="Observaciones por serie")
+    parser.add_argument('--batches', type=int, default=10, help="Lotes en que llegan las observaciones")
+    args = parser.parse_args()
+    
+    if not args.simulate:
+        parser.print_help()
+        return 0
+    
+    result = simulate(args.routes, args.observations, args.batches)
+    print(f"Recalculando todo: {result['full_seconds'] * 1000:>8.1f} ms")
+    print(f"Incremental:       {result['incremental_seconds'] * 1000:>8.1f} ms")
+    print(f"Diferencia máxima: {result['max_difference']:.2e} "
+          f"({'mismas' if result['same_signals'] else 'distintas'} señales)")
+    return 0 if result['max_difference'] < 1e-6 and result['same_signals'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
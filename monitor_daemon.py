@@ -0,0 +1,270 @@
+"""
+Modo daemon del monitor: un proceso permanente con programación interna
+
+En lugar de que cron inicie un proceso por ejecución (arranque del
+intérprete, imports, creación del esquema y autenticación con Amadeus en
+cada una), el daemon mantiene abiertos el pool de la base y el token de
+Amadeus y ejecuta una pasada del monitor cada MONITOR_INTERVAL_MINUTES.
+
+- SIGTERM/SIGINT terminan la búsqueda en curso, guardan el estado del
+  planificador y cierran las conexiones
+- Endpoint HTTP en localhost (MONITOR_HEALTH_PORT, default 8765):
+    /health   estado en JSON (503 si la base no responde o la última pasada
+              exitosa es demasiado antigua)
+    /metrics  métricas en formato de texto de Prometheus
+
+Uso:
+    python monitor_script.py --daemon
+"""
+
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from amadeus_client import AmadeusClient
+from api_quota import rate_limiter_from_config
+from monitor_script import run_monitor_cycle
+from storage import create_database
+
+
+class MonitorDaemon:
+    """Ejecuta pasadas del monitor periódicamente con conexiones persistentes"""
+    
+    def __init__(
+        self,
+        interval_minutes: float = 120,
+        health_host: str = '127.0.0.1',
+        health_port: int = 8765,
+        config=None
+    ):
+        """
+        Inicializa el daemon (las conexiones se abren en `run`)
+        
+        Args:
+            interval_minutes: Minutos entre el inicio de una pasada y la siguiente
+            health_host: Interfaz del endpoint de salud (solo localhost por defecto)
+            health_port: Puerto del endpoint (0 lo desactiva)
+            config: Configuración para `create_database` y las credenciales de
+                Amadeus (default las variables de entorno)
+        """
+        self.interval = interval_minutes * 60
+        self.health_host = health_host
+        self.health_port = health_port
+        self.config = config if config is not None else os.environ
+        
+        self.db = None
+        self.amadeus: Optional[AmadeusClient] = None
+        self._stop = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+        
+        self.started_at = time.time()
+        self.metrics_lock = threading.Lock()
+        self.counters = {
+            'cycles': 0, 'cycle_failures': 0, 'searches': 0, 'search_errors': 0,
+            'offers_saved': 0, 'price_changes': 0
+        }
+        self.running_cycle = False
+        self.last_cycle_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_cycle_at: Optional[float] = None
+        self.quota_remaining: Optional[int] = None
+    
+    def stop(self, signum=None, frame=None):
+        """Pide terminar después de la búsqueda en curso (handler de SIGTERM/SIGINT)"""
+        if signum is not None:
+            print(f"\n⏹️  Señal {signal.Signals(signum).name} recibida: terminando...")
+        self._stop.set()
+    
+    def _amadeus_client(self) -> AmadeusClient:
+        """Cliente de Amadeus persistente (renueva su token solo cuando vence)"""
+        if self.amadeus is None:
+            self.amadeus = AmadeusClient(
+                api_key=self.config.get('AMADEUS_API_KEY'),
+                api_secret=self.config.get('AMADEUS_API_SECRET'),
+                rate_limiter=rate_limiter_from_config(self.config)
+            )
+        return self.amadeus
+    
+    def run_cycle(self):
+        """Ejecuta una pasada del monitor y actualiza las métricas"""
+        started = time.time()
+        with self.metrics_lock:
+            self.running_cycle = True
+        print(f"\n🚀 Pasada del monitor - {datetime.now()}")
+        
+        try:
+            summary = run_monitor_cycle(self.db, self._amadeus_client(), should_stop=self._stop.is_set)
+            
+            with self.metrics_lock:
+                self.counters['cycles'] += 1
+                self.counters['searches'] += summary['searches']
+                self.counters['search_errors'] += summary['errors']
+                self.counters['offers_saved'] += summary['offers_saved']
+                self.counters['price_changes'] += summary['changes']
+                self.last_success_at = time.time()
+                self.last_error = None
+                self.quota_remaining = (summary.get('quota') or {}).get('remaining')
+        
+        except Exception as e:
+            # Ej. Amadeus no autentica: se reintenta en la próxima pasada con un cliente nuevo
+            self.amadeus = None
+            with self.metrics_lock:
+                self.counters['cycle_failures'] += 1
+                self.last_error = str(e)
+            print(f"❌ Error en la pasada del monitor: {str(e)}")
+        
+        finally:
+            with self.metrics_lock:
+                self.running_cycle = False
+                self.last_cycle_at = started
+                self.last_duration = time.time() - started
+    
+    def health(self) -> Tuple[int, Dict]:
+        """
+        Estado del daemon para el endpoint /health
+        
+        Returns:
+            Tupla (código HTTP, cuerpo): 503 si la base no responde o no hubo
+            una pasada exitosa en los últimos dos intervalos
+        """
+        database_ok = bool(self.db is not None and self.db.test_connection())
+        now = time.time()
+        
+        with self.metrics_lock:
+            reference = self.last_success_at or self.started_at
+            stale = now - reference > 2 * self.interval + 300
+            body = {
+                'status': 'ok' if database_ok and not stale else 'degraded',
+                'database': database_ok,
+                'running_cycle': self.running_cycle,
+                'uptime_seconds': round(now - self.started_at, 1),
+                'last_cycle_at': _iso(self.last_cycle_at),
+                'last_success_at': _iso(self.last_success_at),
+                'next_cycle_at': _iso(self.next_cycle_at),
+                'last_error': self.last_error,
+                'counters': dict(self.counters)
+            }
+        
+        return (200 if body['status'] == 'ok' else 503), body
+    
+    def metrics(self) -> str:
+        """Métricas en formato de texto de Prometheus para el endpoint /metrics"""
+        with self.metrics_lock:
+            counters = dict(self.counters)
+            gauges = {
+                'last_cycle_timestamp_seconds': self.last_cycle_at,
+                'last_success_timestamp_seconds': self.last_success_at,
+                'last_cycle_duration_seconds': self.last_duration,
+                'next_cycle_timestamp_seconds': self.next_cycle_at,
+                'cycle_running': int(self.running_cycle),
+                'api_quota_remaining': self.quota_remaining,
+                'uptime_seconds': time.time() - self.started_at
+            }
+        
+        if self.db is not None:
+            pool = self.db.pool_stats()
+            gauges['db_connections_in_use'] = pool['in_use']
+            gauges['db_connections_max'] = pool['max_connections']
+            cache = self.db.cache_stats()
+            if cache:
+                counters['query_cache_hits'] = cache['hits']
+                counters['query_cache_misses'] = cache['misses']
+        
+        lines = []
+        for name, value in counters.items():
+            lines.append(f"# TYPE flight_monitor_{name}_total counter")
+            lines.append(f"flight_monitor_{name}_total {value}")
+        for name, value in gauges.items():
+            if value is None:
+                continue
+            lines.append(f"# TYPE flight_monitor_{name} gauge")
+            lines.append(f"flight_monitor_{name} {value:.3f}" if isinstance(value, float)
+                         else f"flight_monitor_{name} {value}")
+        return "\n".join(lines) + "\n"
+    
+    def _start_health_server(self):
+        """Inicia el endpoint HTTP en un hilo en segundo plano"""
+        daemon = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    status, body = daemon.health()
+                    payload, content_type = json.dumps(body).encode(), 'application/json'
+                elif self.path == '/metrics':
+                    status = 200
+                    payload, content_type = daemon.metrics().encode(), 'text/plain; version=0.0.4'
+                else:
+                    status, payload, content_type = 404, b'Not found\n', 'text/plain'
+                
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                # Los sondeos de salud no ensucian el log del monitor
+                pass
+        
+        self._server = ThreadingHTTPServer((self.health_host, self.health_port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='health-server', daemon=True).start()
+        print(f"🩺 Salud y métricas en http://{self.health_host}:{self._server.server_port}/health y /metrics")
+    
+    def run(self) -> int:
+        """
+        Ejecuta pasadas hasta recibir SIGTERM/SIGINT
+        
+        Returns:
+            Código de salida (0 si terminó ordenadamente)
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        try:
+            self.db = create_database(self.config)
+        except Exception as e:
+            print(f"❌ Error inicializando la base de datos: {str(e)}")
+            return 1
+        
+        try:
+            if self.health_port:
+                self._start_health_server()
+            
+            print(f"✅ Daemon iniciado: una pasada cada {self.interval / 60:.0f} minutos")
+            next_cycle = time.time()
+            while not self._stop.is_set():
+                with self.metrics_lock:
+                    self.next_cycle_at = next_cycle
+                
+                # Esperar al próximo horario; SIGTERM interrumpe la espera
+                if self._stop.wait(max(next_cycle - time.time(), 0)):
+                    break
+                
+                self.run_cycle()
+                
+                # Los horarios se mantienen fijos; si una pasada se extendió más
+                # que el intervalo, la siguiente arranca de inmediato
+                next_cycle = max(next_cycle + self.interval, time.time())
+            
+            return 0
+        
+        finally:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+            self.db.close()
+            print(f"👋 Daemon detenido - {datetime.now()}")
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    """Timestamp Unix a ISO 8601 (o None)"""
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
@@ -0,0 +1,364 @@
+"""
+Pipeline del monitor: búsqueda → normalización → escritura en etapas concurrentes
+
+Antes cada búsqueda se hacía en serie (llamada a la API, procesamiento de
+las ofertas, escritura en la base) y la API quedaba ociosa mientras se
+escribía. El pipeline separa el trabajo en tres etapas unidas por colas
+acotadas:
+
+    fetch (MONITOR_FETCHERS hilos)  →  normalize (1 hilo)  →  write (1 hilo)
+      llamadas a Amadeus               ofertas procesadas,     varias búsquedas
+                                       fingerprints, hashes    por transacción
+
+- Las colas tienen tamaño fijo: si la base se atrasa, los fetchers se
+  bloquean en lugar de acumular respuestas en memoria (backpressure)
+- El escritor es el único que usa la base; agrupa hasta MONITOR_WRITE_BATCH
+  búsquedas (o lo que llegue en `batch_wait` segundos) en una transacción,
+  con el checkpoint de cada búsqueda en la misma transacción
+- Al final se informa el throughput de cada etapa, el tiempo bloqueado
+  esperando a la etapa siguiente y la ocupación de cada cola
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from flight_records import prepare_offer
+from scan_scheduler import ScanScheduler
+from scan_worker import offer_rows, scan_outcome
+
+# Marca de fin de una etapa
+_DONE = object()
+
+
+class ScanPipeline:
+    """Ejecuta las búsquedas de una pasada del monitor en etapas concurrentes"""
+    
+    STAGES = ('fetch', 'normalize', 'write')
+    
+    def __init__(
+        self,
+        db,
+        amadeus,
+        change_only: bool = True,
+        scheduler: Optional[ScanScheduler] = None,
+        states: Optional[Dict] = None,
+        fetchers: int = 4,
+        batch_size: int = 8,
+        batch_wait: float = 1.0,
+        queue_size: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        log: Callable[[str], None] = print
+    ):
+        """
+        Inicializa el pipeline
+        
+        Args:
+            db: Instancia de base de datos (con `insert_scan_results`)
+            amadeus: Cliente con `search_flights_raw` y `process_flight_offers`
+                (compartido entre los fetchers)
+            change_only: Guardar solo cambios de precio/disponibilidad
+            scheduler: Planificador (default `ScanScheduler()`)
+            states: Filas de `route_schedule` por `ScanScheduler.job_key`
+            fetchers: Hilos que llaman a la API en paralelo
+            batch_size: Máximo de búsquedas por transacción del escritor
+            batch_wait: Segundos máximos que el escritor espera para completar un lote
+            queue_size: Capacidad de cada cola (default el doble de fetchers)
+            should_stop: Función que indica si hay que dejar de iniciar búsquedas
+            log: Función para los mensajes de progreso
+        """
+        self.db = db
+        self.amadeus = amadeus
+        self.change_only = change_only
+        self.scheduler = scheduler or ScanScheduler()
+        self.states = states or {}
+        self.fetchers = max(int(fetchers), 1)
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_wait = batch_wait
+        self.queue_size = queue_size or 2 * self.fetchers
+        self.should_stop = should_stop
+        self.log = log
+        
+        self._abort = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, Dict] = {}
+        self.queues: Dict[str, Dict] = {}
+    
+    def _reset_stats(self):
+        """Estadísticas vacías por etapa y por cola"""
+        self.stats = {stage: {'items': 0, 'busy': 0.0, 'blocked': 0.0, 'idle': 0.0}
+                      for stage in self.STAGES}
+        self.stats['write']['batches'] = 0
+        self.queues = {name: {'max': 0, 'total': 0, 'samples': 0} for name in ('fetched', 'normalized')}
+    
+    def _account(self, stage: str, busy: float = 0.0, blocked: float = 0.0, idle: float = 0.0,
+                 items: int = 0):
+        """
+        Suma tiempo y elementos procesados a una etapa
+        
+        `blocked` es el tiempo esperando lugar en la cola siguiente (la etapa
+        siguiente es el cuello de botella) e `idle` el tiempo esperando
+        elementos de la anterior.
+        """
+        with self._stats_lock:
+            stats = self.stats[stage]
+            stats['items'] += items
+            stats['busy'] += busy
+            stats['blocked'] += blocked
+            stats['idle'] += idle
+    
+    def _sample(self, name: str, channel: queue.Queue):
+        """Registra la ocupación de una cola"""
+        size = channel.qsize()
+        with self._stats_lock:
+            occupancy = self.queues[name]
+            occupancy['max'] = max(occupancy['max'], size)
+            occupancy['total'] += size
+            occupancy['samples'] += 1
+    
+    def _put(self, stage: str, name: str, channel: queue.Queue, item):
+        """Encola un elemento esperando si la cola está llena (backpressure)"""
+        started = time.perf_counter()
+        while True:
+            try:
+                channel.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                # El escritor falló: no quedarse bloqueado para siempre
+                if self._abort.is_set():
+                    return
+        self._account(stage, blocked=time.perf_counter() - started)
+        self._sample(name, channel)
+    
+    def _fetch_loop(self, jobs: List[Dict], position: List[int], position_lock: threading.Lock,
+                    fetched: queue.Queue):
+        """Etapa fetch: toma la siguiente búsqueda y llama a la API"""
+        try:
+            while not self._abort.is_set():
+                if self.should_stop is not None and self.should_stop():
+                    break
+                with position_lock:
+                    if position[0] >= len(jobs):
+                        break
+                    job = jobs[position[0]]
+                    position[0] += 1
+                
+                started = time.perf_counter()
+                trace = {'started': started, 'http_status': 200}
+                try:
+                    item = (job, self.amadeus.search_flights_raw(
+                        origin=job['origin'],
+                        destination=job['destination'],
+                        departure_date=job['departure_date'],
+                        return_date=job['return_date'],
+                        adults=job['adults'],
+                        max_results=10
+                    ), None, trace)
+                except Exception as e:
+                    trace['http_status'] = getattr(e, 'status_code', None)
+                    item = (job, None, str(e), trace)
+                trace['fetch_seconds'] = time.perf_counter() - started
+                self._account('fetch', busy=trace['fetch_seconds'], items=1)
+                
+                self._put('fetch', 'fetched', fetched, item)
+        finally:
+            self._put('fetch', 'fetched', fetched, _DONE)
+    
+    def _normalize_loop(self, fetched: queue.Queue, normalized: queue.Queue):
+        """Etapa normalize: procesa las ofertas y precalcula los campos derivados"""
+        pending_fetchers = self.fetchers
+        while pending_fetchers and not self._abort.is_set():
+            waited = time.perf_counter()
+            try:
+                item = fetched.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            finally:
+                self._account('normalize', idle=time.perf_counter() - waited)
+            if item is _DONE:
+                pending_fetchers -= 1
+                continue
+            
+            job, raw_offers, error, trace = item
+            started = time.perf_counter()
+            offers, rows = [], []
+            if error is None:
+                try:
+                    offers = self.amadeus.process_flight_offers(raw_offers)
+                    rows = offer_rows(job, offers)
+                    for row in rows:
+                        row['prepared'] = prepare_offer(row)
+                except Exception as e:
+                    error = f"Error procesando ofertas: {str(e)}"
+            trace['normalize_seconds'] = time.perf_counter() - started
+            self._account('normalize', busy=trace['normalize_seconds'], items=1)
+            
+            self._put('normalize', 'normalized', normalized, (job, offers, rows, error, trace))
+        
+        self._put('normalize', 'normalized', normalized, _DONE)
+    
+    def _write_batch(self, batch: List, summary: Dict):
+        """Etapa write: guarda un lote de búsquedas y registra sus resultados"""
+        started = time.perf_counter()
+        
+        batch = list(batch)
+        searched = [index for index, item in enumerate(batch) if item[3] is None]
+        write_started = time.perf_counter()
+        try:
+            saved = self.db.insert_scan_results(
+                [(batch[index][2], batch[index][0].get('run_job_id')) for index in searched], self.change_only
+            )
+            results = dict(zip(searched, saved))
+        except Exception:
+            # Un lote fallido no arrastra a las demás búsquedas: se reintentan de a una
+            results = {}
+            for index in searched:
+                job, offers, rows, _, trace = batch[index]
+                try:
+                    results[index] = self.db.insert_scan_results([(rows, job.get('run_job_id'))],
+                                                                 self.change_only)[0]
+                except Exception as e:
+                    batch[index] = (job, offers, rows, f"Error guardando ofertas: {str(e)}", trace)
+        write_seconds = time.perf_counter() - write_started
+        
+        for index, (job, offers, rows, error, trace) in enumerate(batch):
+            summary['searches'] += 1
+            record = {
+                'run_job_id': job.get('run_job_id'),
+                'origin': job['origin'],
+                'destination': job['destination'],
+                'departure_date': job['departure_date'],
+                'return_date': job['return_date'],
+                'adults': job['adults'],
+                'status': 'failed' if error is not None else 'done',
+                'http_status': trace['http_status'],
+                'fetch_seconds': round(trace['fetch_seconds'], 4),
+                'normalize_seconds': round(trace.get('normalize_seconds', 0.0), 4),
+                'write_seconds': round(write_seconds, 4),
+                'batch_size': len(batch),
+                'latency_seconds': round(time.perf_counter() - trace['started'], 4),
+                'offers_found': len(offers),
+                'offers_saved': 0,
+                'unchanged': 0,
+                'min_price': None,
+                'changed': False,
+                'error': error
+            }
+            summary['jobs'].append(record)
+            
+            if error is not None:
+                summary['errors'] += 1
+                if job.get('run_job_id') is not None:
+                    self.db.mark_run_job(job['run_job_id'], 'failed', error)
+                self.log(f"   ❌ Error procesando ruta {job['origin']}-{job['destination']}: {error}")
+                continue
+            
+            # None: otra ejecución ya había guardado esta búsqueda
+            saved_count = results.get(index) or 0
+            outcome = scan_outcome(job, offers, saved_count, self.change_only, self.scheduler,
+                                   self.states.get(ScanScheduler.job_key(job)))
+            summary['scanned'].append(outcome['schedule_row'])
+            summary['offers_saved'] += outcome['offers_saved']
+            summary['changes'] += int(outcome['changed'])
+            # Con change_only, las ofertas sin cambios solo actualizan last_seen
+            record.update(offers_saved=outcome['offers_saved'], min_price=outcome['min_price'],
+                          unchanged=len(offers) - outcome['offers_saved'], changed=outcome['changed'])
+            self.log(f"   ✅ {job['origin']} → {job['destination']} ({job['departure_date']}): "
+                     f"{outcome['offers_saved']} ofertas guardadas"
+                     f"{' (cambio de precio)' if outcome['changed'] else ''}")
+        
+        self._account('write', busy=time.perf_counter() - started, items=len(batch))
+        with self._stats_lock:
+            self.stats['write']['batches'] += 1
+    
+    def run(self, jobs: List[Dict]) -> Dict:
+        """
+        Ejecuta las búsquedas (en el orden recibido) hasta terminar o hasta que
+        `should_stop` lo indique; lo ya buscado siempre se escribe
+        
+        Args:
+            jobs: Búsquedas planificadas (con `run_job_id` si pertenecen a una
+                ejecución del monitor)
+        
+        Returns:
+            Diccionario con searches, errors, offers_saved, changes, scanned
+            (filas para `record_route_scans`), jobs (tiempos, código HTTP y
+            ofertas de cada búsqueda), completed (si se buscaron todas),
+            elapsed y las estadísticas de etapas y colas
+        """
+        self._reset_stats()
+        self._abort.clear()
+        summary = {'searches': 0, 'errors': 0, 'offers_saved': 0, 'changes': 0, 'scanned': [], 'jobs': []}
+        
+        fetched: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        normalized: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        position, position_lock = [0], threading.Lock()
+        
+        threads = [
+            threading.Thread(target=self._fetch_loop, args=(jobs, position, position_lock, fetched),
+                             name=f"monitor-fetch-{index}", daemon=True)
+            for index in range(self.fetchers)
+        ]
+        threads.append(threading.Thread(target=self._normalize_loop, args=(fetched, normalized),
+                                        name='monitor-normalize', daemon=True))
+        
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        
+        # El escritor corre en este hilo: una excepción (o Ctrl+C) detiene las demás etapas
+        try:
+            done = False
+            while not done:
+                batch = []
+                deadline = None
+                while len(batch) < self.batch_size:
+                    timeout = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                    waited = time.perf_counter()
+                    try:
+                        item = normalized.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    finally:
+                        self._account('write', idle=time.perf_counter() - waited)
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = waited + self.batch_wait
+                
+                if batch:
+                    self._write_batch(batch, summary)
+        finally:
+            self._abort.set()
+            for thread in threads:
+                thread.join()
+        
+        summary['completed'] = position[0] >= len(jobs) and summary['searches'] == len(jobs)
+        summary['elapsed'] = time.perf_counter() - started
+        summary['stages'] = {stage: dict(stats) for stage, stats in self.stats.items()}
+        summary['queues'] = {name: dict(occupancy) for name, occupancy in self.queues.items()}
+        return summary
+    
+    def report(self, summary: Dict) -> str:
+        """Tabla con el throughput de cada etapa y la ocupación de las colas"""
+        elapsed = max(summary['elapsed'], 1e-9)
+        workers = {'fetch': self.fetchers, 'normalize': 1, 'write': 1}
+        
+        lines = [f"📊 Pipeline: {summary['searches']} búsquedas en {elapsed:.1f} s "
+                 f"({self.fetchers} fetchers, lotes de hasta {self.batch_size})",
+                 f"   {'etapa':<10} {'items':>6} {'items/s':>8} {'ocupación':>10} {'bloqueado':>10} {'ocioso':>8}"]
+        for stage in self.STAGES:
+            stats = summary['stages'][stage]
+            utilization = stats['busy'] / (elapsed * workers[stage])
+            lines.append(f"   {stage:<10} {stats['items']:>6} {stats['items'] / elapsed:>8.2f} "
+                         f"{utilization:>10.0%} {stats['blocked']:>9.1f}s {stats['idle']:>7.1f}s")
+        lines.append(f"   {summary['stages']['write']['batches']} lotes de escritura")
+        
+        for name, occupancy in summary['queues'].items():
+            average = occupancy['total'] / occupancy['samples'] if occupancy['samples'] else 0.0
+            lines.append(f"   cola {name:<10} máx {occupancy['max']}/{self.queue_size}, prom {average:.1f}")
+        
+        return "\n".join(lines)
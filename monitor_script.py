@@ -1,12 +1,187 @@
 """
 Script para monitoreo automático de vuelos
 Puede ejecutarse con cron o GitHub Actions
+
+Modos:
+    python monitor_script.py                         # una ejecución completa
+    python monitor_script.py --enqueue               # encolar búsquedas (PostgreSQL)
+    python monitor_script.py --worker --threads 4    # procesar la cola (ver scan_worker.py)
+    python monitor_script.py --daemon                # proceso permanente (ver monitor_daemon.py)
 """
 
-from database import Database
+from storage import create_database
 from amadeus_client import AmadeusClient
+from api_quota import ApiQuota, format_quota_report, rate_limiter_from_config
+from route_catalog import load_route_catalog, plan_jobs
+from scan_scheduler import ScanScheduler
+from monitor_pipeline import ScanPipeline
+from notifier import AlertDispatcher, format_dispatch_report
+from run_report import build_run_report, history_metrics, write_run_outputs
+from scan_worker import enqueue_due_jobs, run_workers, worker_identity
+import argparse
 import os
-from datetime import datetime, timedelta
+import sys
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+def run_monitor_cycle(db, amadeus, should_stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Ejecuta una pasada del monitor con conexiones ya abiertas
+    
+    La usan la ejecución única y el modo daemon (`monitor_daemon.py`), que
+    mantiene la base y el token de Amadeus entre pasadas.
+    
+    Args:
+        db: Instancia de base de datos
+        amadeus: Cliente de Amadeus
+        should_stop: Función que indica si hay que terminar antes de la
+            siguiente búsqueda (por ejemplo al recibir SIGTERM)
+    
+    Cada pasada queda registrada en `monitor_runs` con el estado de cada
+    búsqueda; si se interrumpe (SIGTERM, caída, timeout del runner) la
+    siguiente la retoma desde la primera búsqueda pendiente.
+    
+    Returns:
+        Diccionario con run_id, resumed, routes, jobs, searches, errors,
+        skipped, offers_saved, changes, deferred, quota, quota_skipped,
+        price_alerts (alertas de vigilancias de precio disparadas),
+        price_anomalies (caídas anómalas detectadas, ver `price_anomalies.py`),
+        notifications (ver `AlertDispatcher.dispatch`), pipeline (estadísticas de las etapas, ver `ScanPipeline.run`) y
+        report_files (reporte JSON y métricas escritos, ver `run_report.py`)
+    """
+    started_at = datetime.now()
+    
+    # Guardar solo cambios de precio/disponibilidad (MONITOR_CHANGE_ONLY=0 guarda todo)
+    change_only = os.getenv('MONITOR_CHANGE_ONLY', '1') != '0'
+    # Búsquedas terminadas hace menos de MONITOR_FRESHNESS_MINUTES no se repiten
+    freshness = float(os.getenv('MONITOR_FRESHNESS_MINUTES', 60))
+    fresh = set(db.get_fresh_scan_keys(freshness)) if freshness > 0 else set()
+    
+    def is_fresh(job):
+        return ScanScheduler.job_key(job) + (job['departure_date'],) in fresh
+    
+    scheduler = ScanScheduler()
+    schedule = db.get_route_schedule()
+    states = {ScanScheduler.job_key(row): row for row in schedule}
+    
+    summary = {'run_id': None, 'resumed': False, 'routes': 0, 'jobs': 0, 'searches': 0,
+               'errors': 0, 'skipped': 0, 'offers_saved': 0, 'changes': 0, 'deferred': 0,
+               'quota_skipped': 0, 'price_alerts': 0, 'price_anomalies': 0}
+    host = worker_identity()
+    
+    # Cuota mensual de Amadeus (AMADEUS_MONTHLY_QUOTA): las búsquedas que no
+    # entran se recortan, de menor a mayor valor (ver api_quota.py)
+    quota = ApiQuota.from_config(db, os.environ)
+    
+    # Una ejecución anterior interrumpida o caída se retoma donde quedó
+    run_id, jobs = db.resume_monitor_run(
+        max_age_hours=float(os.getenv('MONITOR_RESUME_HOURS', 12)), host=host
+    )
+    if run_id is not None:
+        summary['resumed'] = True
+        print(f"♻️  Retomando ejecución #{run_id}: {len(jobs)} búsquedas pendientes")
+        for job in [job for job in jobs if is_fresh(job)]:
+            db.mark_run_job(job['run_job_id'], 'skipped', 'reciente')
+            summary['skipped'] += 1
+        jobs = [job for job in jobs if not is_fresh(job)]
+        
+        jobs, quota_skipped, summary['quota'] = quota.fit(jobs)
+        for job in quota_skipped:
+            db.mark_run_job(job['run_job_id'], 'skipped', f"cuota de API: {job['skip_reason']}")
+    else:
+        # Rutas a monitorear: tabla monitored_routes, monitored_routes.json
+        # (MONITOR_ROUTES_FILE) o las rutas por defecto (ver route_catalog.py)
+        routes, route_errors, routes_source = load_route_catalog(db)
+        for error in route_errors:
+            print(f"⚠️  {error}")
+        
+        jobs = plan_jobs(routes)
+        summary['routes'] = len(routes)
+        print(f"🗺️  {len(routes)} rutas ({routes_source}) → {len(jobs)} búsquedas")
+        
+        summary['skipped'] = sum(1 for job in jobs if is_fresh(job))
+        jobs = [job for job in jobs if not is_fresh(job)]
+        
+        # Planificador adaptativo: solo las búsquedas vencidas de mayor valor, hasta
+        # MONITOR_API_BUDGET llamadas (MONITOR_SCHEDULER=0 busca todas, como antes)
+        if os.getenv('MONITOR_SCHEDULER', '1') != '0':
+            budget = int(os.getenv('MONITOR_API_BUDGET', 50))
+            jobs, plan = scheduler.plan(jobs, schedule, budget)
+            summary['deferred'] = plan['deferred']
+            print(f"📅 {plan['selected']} búsquedas elegidas de {plan['due']} vencidas "
+                  f"({plan['deferred']} postergadas, {plan['not_due']} al día)")
+        
+        # Las recortadas no entran en la ejecución: siguen vencidas para la próxima
+        jobs, quota_skipped, summary['quota'] = quota.fit(jobs)
+        run_id, jobs = db.start_monitor_run(jobs, host)
+    
+    summary['run_id'] = run_id
+    summary['jobs'] = len(jobs)
+    summary['quota_skipped'] = len(quota_skipped)
+    print(format_quota_report(summary['quota'], quota_skipped))
+    if summary['skipped']:
+        print(f"⏭️  {summary['skipped']} búsquedas omitidas (terminadas hace menos de {freshness:.0f} minutos)")
+    
+    # Búsquedas en paralelo (MONITOR_FETCHERS) y escritura en lotes de hasta
+    # MONITOR_WRITE_BATCH búsquedas por transacción (ver monitor_pipeline.py)
+    pipeline = ScanPipeline(
+        db, amadeus, change_only, scheduler, states,
+        fetchers=int(os.getenv('MONITOR_FETCHERS', 4)),
+        batch_size=int(os.getenv('MONITOR_WRITE_BATCH', 8)),
+        should_stop=should_stop
+    )
+    result = {'scanned': []}
+    status = 'interrupted'
+    
+    try:
+        print(f"\n🔍 Buscando {len(jobs)} búsquedas con {pipeline.fetchers} fetchers")
+        result = pipeline.run(jobs)
+        for key in ('searches', 'errors', 'offers_saved', 'changes'):
+            summary[key] += result[key]
+        summary['pipeline'] = {key: result[key] for key in ('elapsed', 'stages', 'queues')}
+        
+        if result['completed']:
+            status = 'completed'
+        else:
+            print("⏹️  Pasada interrumpida: las búsquedas restantes quedan para la próxima")
+        print(pipeline.report(result))
+        
+        # Notificaciones de las alertas de precio disparadas (ver notifier.py)
+        dispatcher = AlertDispatcher.from_config(db)
+        if dispatcher.channels:
+            summary['notifications'] = dispatcher.dispatch(flush=True)
+            print(format_dispatch_report(summary['notifications']))
+    
+    finally:
+        # También si el proceso se interrumpe: lo hecho queda registrado
+        quota.record(pipeline.stats.get('fetch', {}).get('items', 0), 'monitor')
+        db.record_route_scans(result['scanned'])
+        # Las vigilancias se evalúan al escribir cada lote (ver price_watches.py)
+        summary['price_alerts'] = len(db.get_price_alerts(since=started_at, limit=10000))
+        summary['price_anomalies'] = len(db.get_price_anomalies(since=started_at, limit=10000))
+        
+        # Reporte JSON, métricas de Prometheus e historial en monitor_runs (ver run_report.py)
+        jobs_report = result.get('jobs', [])
+        db.record_run_job_metrics(jobs_report)
+        report = build_run_report(summary, jobs_report, started_at, datetime.now(), status, host,
+                                  db.cache_stats())
+        db.finish_monitor_run(run_id, status, history_metrics(report))
+        summary['report_files'] = write_run_outputs(report)
+    
+    scanned = result['scanned']
+    print(f"\n🎉 Monitoreo completado: {summary['offers_saved']} ofertas guardadas en total "
+          f"(ejecución #{run_id}{', retomada' if summary['resumed'] else ''})")
+    if scanned:
+        print(f"📈 {summary['changes']} cambios en {len(scanned)} llamadas "
+              f"({summary['changes'] / len(scanned):.2f} cambios por llamada)")
+    if summary['price_alerts']:
+        print(f"🔔 {summary['price_alerts']} alertas de precio disparadas")
+    if summary['price_anomalies']:
+        print(f"⚡ {summary['price_anomalies']} caídas anómalas de precio detectadas")
+    if summary['report_files']:
+        print(f"🧾 Reporte de la pasada: {', '.join(summary['report_files'])}")
+    
+    return summary
 
 def monitor_flights():
     """Ejecuta el monitoreo de vuelos configurado"""
@@ -15,17 +190,13 @@ def monitor_flights():
     
     # Inicializar conexiones
     try:
-        db = Database(
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT', 5432)),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        # DB_BACKEND=sqlite permite ejecutar el monitor sin servidor PostgreSQL
+        db = create_database(os.environ)
         
         amadeus = AmadeusClient(
             api_key=os.getenv('AMADEUS_API_KEY'),
-            api_secret=os.getenv('AMADEUS_API_SECRET')
+            api_secret=os.getenv('AMADEUS_API_SECRET'),
+            rate_limiter=rate_limiter_from_config(os.environ)
         )
         
         print("✅ Conexiones inicializadas correctamente")
@@ -34,77 +205,108 @@ def monitor_flights():
         print(f"❌ Error inicializando conexiones: {str(e)}")
         return
     
-    # Configuración de rutas a monitorear
-    # Personaliza estas rutas según tus necesidades
-    routes = [
-        {
-            'origin': 'EZE',
-            'destination': 'MIA',
-            'days_ahead': 30,
-            'return_days': 7
-        },
-        {
-            'origin': 'EZE',
-            'destination': 'MAD',
-            'days_ahead': 45,
-            'return_days': 10
-        },
-        {
-            'origin': 'AEP',
-            'destination': 'SCL',
-            'days_ahead': 20,
-            'return_days': 5
-        }
-    ]
-    
-    total_saved = 0
-    
-    # Procesar cada ruta
-    for route in routes:
-        try:
-            print(f"\n🔍 Buscando: {route['origin']} → {route['destination']}")
-            
-            # Calcular fechas
-            departure = (datetime.now() + timedelta(days=route['days_ahead'])).strftime('%Y-%m-%d')
-            return_date = (datetime.now() + timedelta(days=route['days_ahead'] + route['return_days'])).strftime('%Y-%m-%d')
-            
-            # Buscar vuelos
-            offers = amadeus.search_flights(
-                origin=route['origin'],
-                destination=route['destination'],
-                departure_date=departure,
-                return_date=return_date,
-                adults=1,
-                max_results=10
-            )
+    try:
+        run_monitor_cycle(db, amadeus)
+    finally:
+        db.close()
+    
+    print(f"⏰ Finalizado: {datetime.now()}")
+
+def enqueue_flights():
+    """Productor: encola las búsquedas vencidas para los workers"""
+    
+    print(f"🚀 Encolando búsquedas - {datetime.now()}")
+    
+    try:
+        with create_database(os.environ) as db:
+            if not db.supports_job_queue:
+                print("❌ La cola de búsquedas requiere PostgreSQL; con SQLite ejecuta el monitor sin --enqueue")
+                return 1
             
-            # Guardar ofertas en la base de datos
-            saved_count = 0
-            for offer in offers:
-                try:
-                    db.insert_flight_offer(
-                        origin=route['origin'],
-                        destination=route['destination'],
-                        departure_date=departure,
-                        return_date=return_date,
-                        adults=1,
-                        price=offer['price'],
-                        currency=offer['currency'],
-                        airline=offer.get('airline', 'N/A'),
-                        flight_data=offer
-                    )
-                    saved_count += 1
-                except Exception as e:
-                    print(f"   ⚠️  Error guardando oferta: {str(e)}")
+            budget = int(os.getenv('MONITOR_API_BUDGET', 50))
+            enqueued, plan = enqueue_due_jobs(db, budget, quota=ApiQuota.from_config(db, os.environ))
+            for error in plan['errors']:
+                print(f"⚠️  {error}")
+            print(format_quota_report(plan['quota'], plan['quota_skipped']))
             
-            total_saved += saved_count
-            print(f"   ✅ {saved_count} ofertas guardadas")
+            stats = db.get_scan_queue_stats()
+        
+        print(f"🗺️  {plan['routes']} rutas → {plan['jobs']} búsquedas ({plan['queued']} ya en cola)")
+        print(f"📥 {enqueued} búsquedas encoladas de {plan['due']} vencidas ({plan['deferred']} postergadas)")
+        print(f"📊 Cola: {stats.get('pending', 0)} pendientes, {stats.get('running', 0)} en curso, "
+              f"{stats.get('failed', 0)} fallidas")
+        return 0
+        
+    except Exception as e:
+        print(f"❌ Error encolando búsquedas: {str(e)}")
+        return 1
+
+def work_queue(threads=1, max_jobs=None, forever=False):
+    """Worker: procesa búsquedas de la cola hasta vaciarla (o indefinidamente)"""
+    
+    print(f"🚀 Iniciando {threads} workers - {datetime.now()}")
+    
+    try:
+        # Una conexión por worker más una para las leases
+        os.environ.setdefault('DB_MAX_CONNECTIONS', str(threads + 2))
+        with create_database(os.environ) as db:
+            if not db.supports_job_queue:
+                print("❌ La cola de búsquedas requiere PostgreSQL; con SQLite ejecuta el monitor sin --worker")
+                return 1
             
-        except Exception as e:
-            print(f"   ❌ Error procesando ruta {route['origin']}-{route['destination']}: {str(e)}")
+            # Los workers de este proceso comparten el límite por segundo
+            rate_limiter = rate_limiter_from_config(os.environ)
+            results = run_workers(
+                db,
+                lambda: AmadeusClient(
+                    api_key=os.getenv('AMADEUS_API_KEY'),
+                    api_secret=os.getenv('AMADEUS_API_SECRET'),
+                    rate_limiter=rate_limiter
+                ),
+                threads=threads,
+                change_only=os.getenv('MONITOR_CHANGE_ONLY', '1') != '0',
+                quota=ApiQuota.from_config(db, os.environ),
+                max_jobs=max_jobs,
+                forever=forever
+            )
+        
+        totals = {key: sum(result.get(key, 0) for result in results)
+                  for key in ('done', 'failed', 'lost', 'reclaimed', 'offers_saved', 'changes')}
+        print(f"\n🎉 Workers terminados: {totals['done']} búsquedas completadas, "
+              f"{totals['failed']} con error, {totals['lost']} con lease perdida, "
+              f"{totals['reclaimed']} recuperadas")
+        print(f"📈 {totals['offers_saved']} ofertas guardadas, {totals['changes']} cambios de precio")
+        return 0 if totals['failed'] == 0 else 1
+        
+    except Exception as e:
+        print(f"❌ Error en los workers: {str(e)}")
+        return 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitoreo automático de vuelos")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue', action='store_true', help="Encolar búsquedas vencidas (PostgreSQL)")
+    mode.add_argument('--worker', action='store_true', help="Procesar búsquedas de la cola (PostgreSQL)")
+    mode.add_argument('--daemon', action='store_true',
+                      help="Proceso permanente con pasadas cada MONITOR_INTERVAL_MINUTES")
+    parser.add_argument('--threads', type=int, default=1, help="Workers en este proceso")
+    parser.add_argument('--max-jobs', type=int, help="Búsquedas máximas por worker")
+    parser.add_argument('--forever', action='store_true', help="Esperar búsquedas nuevas con la cola vacía")
+    args = parser.parse_args()
     
-    print(f"\n🎉 Monitoreo completado: {total_saved} ofertas guardadas en total")
-    print(f"⏰ Finalizado: {datetime.now()}")
+    if args.enqueue:
+        return enqueue_flights()
+    if args.worker:
+        return work_queue(args.threads, args.max_jobs, args.forever)
+    if args.daemon:
+        from monitor_daemon import MonitorDaemon
+        return MonitorDaemon(
+            interval_minutes=float(os.getenv('MONITOR_INTERVAL_MINUTES', 120)),
+            health_port=int(os.getenv('MONITOR_HEALTH_PORT', 8765))
+        ).run()
+    
+    monitor_flights()
+    return 0
 
 if __name__ == "__main__":
-    monitor_flights()
+    sys.exit(main())
@@ -0,0 +1,623 @@
+"""
+Envío de notificaciones de alertas de precio objetivo
+
+Consume las alertas pendientes de `price_alerts` (ver price_watches.py) y
+las envía por los canales configurados:
+
+- Webhook (NOTIFY_WEBHOOK_URL): POST JSON con el resumen de un usuario
+- Correo (NOTIFY_SMTP_HOST, NOTIFY_SMTP_PORT, NOTIFY_SMTP_USER,
+  NOTIFY_SMTP_PASSWORD, NOTIFY_SMTP_TLS, NOTIFY_EMAIL_FROM): al dueño de la
+  vigilancia si es una dirección de correo, si no a NOTIFY_EMAIL_TO
+- Archivo (NOTIFY_FILE): una línea JSON por resumen, útil para pruebas
+
+Las alertas de cada usuario se agrupan en un solo resumen por ventana
+(NOTIFY_WINDOW_MINUTES, default 15): el resumen sale cuando la alerta más
+antigua del usuario cumple la ventana, o en cuanto termina la pasada del
+monitor. Si una vigilancia disparó varias veces en la ventana, solo se
+informa su precio más bajo.
+
+Los envíos se hacen en paralelo (NOTIFY_WORKERS, default 4) y los errores
+transitorios (HTTP 429/5xx, errores de red, SMTP 4xx) se reintentan con
+espera exponencial (NOTIFY_RETRIES, default 3). Cada entrega por canal queda
+en `price_alert_deliveries`, así un reintento nunca repite un canal que ya
+entregó; una alerta que falla NOTIFY_MAX_ATTEMPTS veces (default 5) se
+abandona. Cada resumen lleva una clave de idempotencia (header
+`Idempotency-Key` del webhook, `Message-ID` del correo).
+
+Se mide la latencia desde que se disparó cada alerta hasta su entrega y los
+envíos fallidos por canal.
+
+Un solo proceso debe despachar a la vez (el monitor al final de cada pasada
+o este script desde cron).
+
+Uso:
+    python notifier.py              # despacha las alertas cuya ventana venció
+    python notifier.py --flush      # despacha todas las pendientes
+    python notifier.py --selftest   # prueba contra servidores HTTP y SMTP locales
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+DEFAULT_WINDOW_MINUTES = 15
+DEFAULT_RETRIES = 3
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_WORKERS = 4
+
+
+class NotificationError(Exception):
+    """Error de envío de una notificación"""
+    
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Channel:
+    """Canal de envío (subclases: webhook, correo y archivo)"""
+    
+    name = 'channel'
+    
+    def accepts(self, owner: str) -> bool:
+        """Si el canal sabe a dónde enviar los resúmenes de un usuario"""
+        return True
+    
+    def send(self, digest: Dict):
+        """
+        Envía un resumen
+        
+        Raises:
+            NotificationError: Si el envío falla (`retryable` indica si vale
+                la pena reintentar)
+        """
+        raise NotImplementedError
+
+
+class WebhookChannel(Channel):
+    """POST JSON a una URL (Slack, Discord, un servicio propio, etc.)"""
+    
+    name = 'webhook'
+    
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+    
+    def send(self, digest: Dict):
+        payload = {
+            'owner': digest['owner'],
+            'text': format_digest_text(digest),
+            'alerts': digest['alerts']
+        }
+        try:
+            response = requests.post(
+                self.url,
+                data=json.dumps(payload, default=str),
+                headers={'Content-Type': 'application/json', 'Idempotency-Key': digest['key']},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise NotificationError(f"webhook: {str(e)}")
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            raise NotificationError(f"webhook: HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise NotificationError(f"webhook: HTTP {response.status_code}", retryable=False)
+
+
+class SmtpChannel(Channel):
+    """Correo por SMTP"""
+    
+    name = 'email'
+    
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        sender: str = 'flight-scan@localhost',
+        default_recipient: Optional[str] = None,
+        use_tls: bool = True,
+        timeout: float = 15.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.default_recipient = default_recipient
+        self.use_tls = use_tls
+        self.timeout = timeout
+    
+    def recipient(self, owner: str) -> Optional[str]:
+        """Dirección del usuario (el dueño si es un correo, si no la de NOTIFY_EMAIL_TO)"""
+        return owner if '@' in owner else self.default_recipient
+    
+    def accepts(self, owner: str) -> bool:
+        return self.recipient(owner) is not None
+    
+    def send(self, digest: Dict):
+        message = EmailMessage()
+        count = len(digest['alerts'])
+        message['Subject'] = (f"✈️ {count} precio{'s' if count > 1 else ''} objetivo alcanzado"
+                              f"{'s' if count > 1 else ''}")
+        message['From'] = self.sender
+        message['To'] = self.recipient(digest['owner'])
+        message['Message-ID'] = f"<{digest['key']}@flight-scan>"
+        message.set_content(format_digest_text(digest))
+        
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.use_tls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or '')
+                smtp.send_message(message)
+        except smtplib.SMTPResponseException as e:
+            # 4xx es temporal (buzón ocupado, límite de envíos); 5xx es definitivo
+            raise NotificationError(f"email: SMTP {e.smtp_code}", retryable=400 <= e.smtp_code < 500)
+        except (smtplib.SMTPException, OSError) as e:
+            raise NotificationError(f"email: {str(e)}")
+
+
+class FileChannel(Channel):
+    """Agrega cada resumen como una línea JSON a un archivo"""
+    
+    name = 'file'
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def send(self, digest: Dict):
+        line = json.dumps(dict(digest, sent_at=datetime.now().isoformat(timespec='seconds')),
+                          default=str, ensure_ascii=False)
+        try:
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            raise NotificationError(f"file: {str(e)}")
+
+
+def channels_from_config(config=None) -> List[Channel]:
+    """Canales configurados en `config` (default el entorno)"""
+    config = config if config is not None else os.environ
+    channels = []
+    
+    if config.get('NOTIFY_WEBHOOK_URL'):
+        channels.append(WebhookChannel(config['NOTIFY_WEBHOOK_URL']))
+    if config.get('NOTIFY_SMTP_HOST'):
+        channels.append(SmtpChannel(
+            config['NOTIFY_SMTP_HOST'],
+            port=int(config.get('NOTIFY_SMTP_PORT', 587)),
+            username=config.get('NOTIFY_SMTP_USER'),
+            password=config.get('NOTIFY_SMTP_PASSWORD'),
+            sender=config.get('NOTIFY_EMAIL_FROM', 'flight-scan@localhost'),
+            default_recipient=config.get('NOTIFY_EMAIL_TO'),
+            use_tls=str(config.get('NOTIFY_SMTP_TLS', '1')) != '0'
+        ))
+    if config.get('NOTIFY_FILE'):
+        channels.append(FileChannel(config['NOTIFY_FILE']))
+    
+    return channels
+
+
+def build_digests(alerts: List[Dict]) -> List[Dict]:
+    """
+    Agrupa las alertas pendientes en un resumen por usuario
+    
+    Si una vigilancia disparó varias veces, el resumen muestra solo su
+    precio más bajo; las demás alertas se dan por notificadas con el resumen.
+    
+    Args:
+        alerts: Filas de `Database.get_pending_alerts`
+    
+    Returns:
+        Lista de resúmenes con owner, key (clave de idempotencia), alert_ids
+        (todas las alertas que cubre), alerts (las que se muestran) y
+        first_triggered_at
+    """
+    by_owner = defaultdict(list)
+    for alert in alerts:
+        by_owner[alert['owner']].append(alert)
+    
+    digests = []
+    for owner, owner_alerts in sorted(by_owner.items()):
+        best = {}
+        for alert in owner_alerts:
+            current = best.get(alert['watch_id'])
+            if current is None or float(alert['price']) < float(current['price']):
+                best[alert['watch_id']] = alert
+        
+        alert_ids = sorted(alert['id'] for alert in owner_alerts)
+        shown = sorted(best.values(), key=lambda alert: (alert['origin'], alert['destination'],
+                                                         str(alert['departure_date'])))
+        digests.append({
+            'owner': owner,
+            'key': hashlib.sha256(f"{owner}:{','.join(map(str, alert_ids))}".encode()).hexdigest()[:32],
+            'alert_ids': alert_ids,
+            'first_triggered_at': min(alert['triggered_at'] for alert in owner_alerts),
+            'alerts': [
+                dict({key: alert[key] for key in ('watch_id', 'origin', 'destination', 'departure_date',
+                                                  'return_date', 'adults', 'price', 'target_price',
+                                                  'previous_price', 'currency', 'airline', 'triggered_at')},
+                     kind=alert.get('kind') or 'target')
+                for alert in shown
+            ]
+        })
+    return digests
+
+
+def format_digest_text(digest: Dict) -> str:
+    """Texto legible de un resumen (cuerpo del correo y del webhook)"""
+    lines = [f"🎯 Alertas de precio ({len(digest['alerts'])}):"]
+    for alert in digest['alerts']:
+        trip = f"{alert['departure_date']}" + (f" → {alert['return_date']}" if alert['return_date'] else "")
+        if alert.get('kind') == 'anomaly':
+            # previous_price es el precio esperado de la serie (ver price_anomalies.py)
+            detail = (f"⚡ caída anómala, se esperaba {float(alert['previous_price']):.2f}; "
+                      f"objetivo {float(alert['target_price']):.2f}")
+        else:
+            previous = (f", antes {float(alert['previous_price']):.2f}"
+                        if alert['previous_price'] is not None else "")
+            detail = f"objetivo {float(alert['target_price']):.2f}{previous}"
+        lines.append(
+            f"- {alert['origin']} → {alert['destination']} ({trip}): {alert['currency']} "
+            f"{float(alert['price']):.2f} con {alert['airline']} ({detail})"
+        )
+    return "\n".join(lines)
+
+
+class AlertDispatcher:
+    """Despacha las alertas pendientes por todos los canales configurados"""
+    
+    def __init__(
+        self,
+        db,
+        channels: List[Channel],
+        window_minutes: float = DEFAULT_WINDOW_MINUTES,
+        retries: int = DEFAULT_RETRIES,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        workers: int = DEFAULT_WORKERS,
+        backoff_seconds: float = 1.0
+    ):
+        """
+        Inicializa el despachador
+        
+        Args:
+            db: Instancia de base de datos (con `get_pending_alerts`,
+                `record_alert_deliveries` y `finish_alert_notifications`)
+            channels: Canales de envío
+            window_minutes: Minutos que se acumulan las alertas de un usuario
+            retries: Reintentos de un envío con error transitorio
+            max_attempts: Despachos fallidos tras los que se abandona una alerta
+            workers: Envíos simultáneos
+            backoff_seconds: Espera antes del primer reintento (se duplica)
+        """
+        self.db = db
+        self.channels = channels
+        self.window = timedelta(minutes=window_minutes)
+        self.retries = max(int(retries), 0)
+        self.max_attempts = max(int(max_attempts), 1)
+        self.workers = max(int(workers), 1)
+        self.backoff_seconds = backoff_seconds
+    
+    @classmethod
+    def from_config(cls, db, config=None) -> 'AlertDispatcher':
+        """Crea el despachador con los canales y parámetros NOTIFY_* de `config` (default el entorno)"""
+        config = config if config is not None else os.environ
+        return cls(
+            db,
+            channels_from_config(config),
+            window_minutes=float(config.get('NOTIFY_WINDOW_MINUTES', DEFAULT_WINDOW_MINUTES)),
+            retries=int(config.get('NOTIFY_RETRIES', DEFAULT_RETRIES)),
+            max_attempts=int(config.get('NOTIFY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+            workers=int(config.get('NOTIFY_WORKERS', DEFAULT_WORKERS))
+        )
+    
+    def _deliver(self, channel: Channel, digest: Dict) -> Tuple[bool, Optional[str], int, float]:
+        """
+        Envía un resumen por un canal con reintentos
+        
+        Returns:
+            Tupla (entregado, error, intentos, segundos)
+        """
+        started = time.perf_counter()
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            try:
+                channel.send(digest)
+                return True, None, attempt + 1, time.perf_counter() - started
+            except NotificationError as e:
+                error = str(e)
+                if not e.retryable:
+                    return False, error, attempt + 1, time.perf_counter() - started
+            except Exception as e:
+                error = f"{channel.name}: {str(e)}"
+        return False, error, self.retries + 1, time.perf_counter() - started
+    
+    def dispatch(self, now: Optional[datetime] = None, flush: bool = False, limit: int = 1000) -> Dict:
+        """
+        Envía los resúmenes de las alertas pendientes
+        
+        Args:
+            now: Momento del despacho (default ahora)
+            flush: Enviar también los usuarios cuya ventana no venció
+            limit: Máximo de alertas pendientes a considerar
+        
+        Returns:
+            Estadísticas: pending, held (alertas que esperan su ventana),
+            digests, notified, failed, abandoned, latency_seconds (p50, p95 y
+            max desde el disparo hasta la entrega) y por canal sent, failed,
+            retries y send_seconds
+        """
+        now = now or datetime.now()
+        stats = {
+            'pending': 0, 'held': 0, 'digests': 0, 'notified': 0, 'failed': 0, 'abandoned': 0,
+            'latency_seconds': None,
+            'channels': {channel.name: {'sent': 0, 'failed': 0, 'retries': 0, 'send_seconds': 0.0}
+                         for channel in self.channels}
+        }
+        if not self.channels:
+            return stats
+        
+        alerts = self.db.get_pending_alerts(limit=limit, max_attempts=self.max_attempts)
+        stats['pending'] = len(alerts)
+        
+        digests = []
+        for digest in build_digests(alerts):
+            if not flush and now - digest['first_triggered_at'] < self.window:
+                stats['held'] += len(digest['alert_ids'])
+                continue
+            digests.append(digest)
+        
+        # Canales que todavía deben cada alerta (los ya entregados no se repiten)
+        delivered = {alert['id']: set(alert['delivered']) for alert in alerts}
+        tasks = []
+        for digest in digests:
+            for channel in self.channels:
+                if not channel.accepts(digest['owner']):
+                    continue
+                if all(channel.name in delivered[alert_id] for alert_id in digest['alert_ids']):
+                    continue
+                tasks.append((channel, digest))
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            outcomes = list(executor.map(lambda task: (task, self._deliver(*task)), tasks))
+        
+        deliveries, errors = [], defaultdict(list)
+        for (channel, digest), (ok, error, attempts, seconds) in outcomes:
+            channel_stats = stats['channels'][channel.name]
+            channel_stats['retries'] += attempts - 1
+            channel_stats['send_seconds'] = round(channel_stats['send_seconds'] + seconds, 4)
+            if ok:
+                channel_stats['sent'] += 1
+                deliveries.extend((alert_id, channel.name) for alert_id in digest['alert_ids'])
+                for alert_id in digest['alert_ids']:
+                    delivered[alert_id].add(channel.name)
+            else:
+                channel_stats['failed'] += 1
+                print(f"Error enviando notificación a {digest['owner']}: {error}")
+                for alert_id in digest['alert_ids']:
+                    errors[alert_id].append(error)
+        
+        self.db.record_alert_deliveries(deliveries)
+        
+        notified, failed, latencies = [], {}, []
+        delivered_at = datetime.now()
+        triggered = {alert['id']: alert['triggered_at'] for alert in alerts}
+        attempts = {alert['id']: int(alert['notify_attempts']) for alert in alerts}
+        for digest in digests:
+            owed = [channel.name for channel in self.channels if channel.accepts(digest['owner'])]
+            for alert_id in digest['alert_ids']:
+                if alert_id in errors:
+                    failed[alert_id] = '; '.join(errors[alert_id])
+                    stats['abandoned'] += int(attempts[alert_id] + 1 >= self.max_attempts)
+                elif all(name in delivered[alert_id] for name in owed):
+                    notified.append(alert_id)
+                    latencies.append((delivered_at - triggered[alert_id]).total_seconds())
+        
+        self.db.finish_alert_notifications(notified, failed)
+        
+        latencies.sort()
+        stats.update(
+            digests=len(digests),
+            notified=len(notified),
+            failed=len(failed),
+            latency_seconds={
+                'p50': round(latencies[len(latencies) // 2], 3),
+                'p95': round(latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)], 3),
+                'max': round(latencies[-1], 3)
+            } if latencies else None
+        )
+        return stats
+
+
+def format_dispatch_report(stats: Dict) -> str:
+    """Resumen legible de un despacho (ver `AlertDispatcher.dispatch`)"""
+    lines = [f"🔔 Notificaciones: {stats['notified']} alertas notificadas en {stats['digests']} resúmenes "
+             f"({stats['held']} esperando su ventana, {stats['failed']} con error)"]
+    for name, channel in stats['channels'].items():
+        lines.append(f"   {name:<8} {channel['sent']} enviados, {channel['failed']} fallidos, "
+                     f"{channel['retries']} reintentos, {channel['send_seconds']:.2f} s")
+    if stats['latency_seconds']:
+        latency = stats['latency_seconds']
+        lines.append(f"   Latencia desde el disparo: p50 {latency['p50']:.0f} s, p95 {latency['p95']:.0f} s, "
+                     f"máx. {latency['max']:.0f} s")
+    if stats['abandoned']:
+        lines.append(f"   ⚠️  {stats['abandoned']} alertas abandonadas tras agotar los intentos")
+    return "\n".join(lines)
+
+
+class _FakeHttpSink:
+    """Servidor HTTP local que guarda los POST recibidos (para --selftest)"""
+    
+    def __init__(self, fail_first: int = 0):
+        self.received = []
+        self.fail_first = fail_first
+        sink = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if sink.fail_first > 0:
+                    sink.fail_first -= 1
+                    self.send_response(503)
+                else:
+                    sink.received.append((self.headers.get('Idempotency-Key'), json.loads(body)))
+                    self.send_response(200)
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+
+
+class _FakeSmtpSink:
+    """Servidor SMTP local mínimo que guarda los mensajes recibidos (para --selftest)"""
+    
+    def __init__(self):
+        self.received = []
+        sink = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(b"220 fake-smtp\r\n")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip().upper()
+                    if command.startswith(('EHLO', 'HELO')):
+                        self.wfile.write(b"250 fake-smtp\r\n")
+                    elif command == 'DATA':
+                        self.wfile.write(b"354 end with .\r\n")
+                        data = []
+                        for data_line in self.rfile:
+                            if data_line.rstrip(b"\r\n") == b".":
+                                break
+                            data.append(data_line)
+                        sink.received.append(b"".join(data).decode('utf-8', 'replace'))
+                        self.wfile.write(b"250 queued\r\n")
+                    elif command == 'QUIT':
+                        self.wfile.write(b"221 bye\r\n")
+                        return
+                    else:
+                        self.wfile.write(b"250 ok\r\n")
+        
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+
+
+def selftest() -> int:
+    """
+    Despacha alertas sintéticas contra servidores HTTP y SMTP locales
+    
+    Usa una base SQLite temporal; el webhook falla con 503 en el primer
+    intento para ejercitar los reintentos, y un segundo despacho verifica
+    que no se repite nada.
+    """
+    import tempfile
+    from sqlite_database import SQLiteDatabase
+    
+    http_sink, smtp_sink = _FakeHttpSink(fail_first=1), _FakeSmtpSink()
+    directory = tempfile.mkdtemp(prefix='notifier-')
+    db = SQLiteDatabase(os.path.join(directory, 'selftest.db'))
+    try:
+        departure = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+        for owner, target in (('ana@example.com', 500), ('equipo', 450)):
+            db.create_price_watch('EZE', 'MIA', departure, target, owner=owner, adults=1)
+            db.create_price_watch('EZE', 'MAD', departure, target, owner=owner, adults=1)
+        for destination, prices in (('MIA', (470, 440)), ('MAD', (430,))):
+            for index, price in enumerate(prices):
+                db.insert_flight_offers([{
+                    'origin': 'EZE', 'destination': destination, 'departure_date': departure,
+                    'return_date': None, 'adults': 1, 'price': price, 'currency': 'USD',
+                    'airline': 'Selftest', 'flight_data': {'flight_number': f"ST{index}"}
+                }])
+        
+        channels = [
+            WebhookChannel(http_sink.url, timeout=5),
+            SmtpChannel('127.0.0.1', smtp_sink.port, sender='alertas@example.com',
+                        default_recipient='equipo@example.com', use_tls=False),
+            FileChannel(os.path.join(directory, 'notifications.jsonl'))
+        ]
+        dispatcher = AlertDispatcher(db, channels, backoff_seconds=0.05)
+        first = dispatcher.dispatch(flush=True)
+        second = dispatcher.dispatch(flush=True)
+        print(format_dispatch_report(first))
+        
+        checks = {
+            'un resumen por usuario': first['digests'] == 2,
+            'webhook reintentado y entregado': (first['channels']['webhook']['retries'] >= 1
+                                                and len(http_sink.received) == 2),
+            'correos entregados': len(smtp_sink.received) == 2,
+            'todas las alertas notificadas': first['notified'] == first['pending'] > 0,
+            'sin duplicados al repetir': second['pending'] == 0 and len(http_sink.received) == 2
+        }
+        for name, ok in checks.items():
+            print(f"   {'✅' if ok else '❌'} {name}")
+        return 0 if all(checks.values()) else 1
+    finally:
+        db.close()
+        http_sink.close()
+        smtp_sink.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notificaciones de alertas de precio objetivo")
+    parser.add_argument('--flush', action='store_true', help="Enviar sin esperar la ventana de agrupación")
+    parser.add_argument('--selftest', action='store_true', help="Probar contra servidores locales")
+    args = parser.parse_args()
+    
+    if args.selftest:
+        return selftest()
+    
+    from storage import create_database
+    
+    try:
+        with create_database(os.environ) as db:
+            dispatcher = AlertDispatcher.from_config(db)
+            if not dispatcher.channels:
+                print("ℹ️  Sin canales configurados (NOTIFY_WEBHOOK_URL, NOTIFY_SMTP_HOST o NOTIFY_FILE)")
+                return 0
+            stats = dispatcher.dispatch(flush=args.flush)
+    except Exception as e:
+        print(f"❌ Error despachando notificaciones: {str(e)}")
+        return 1
+    
+    print(format_dispatch_report(stats))
+    return 0 if not stats['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Detección en línea de caídas anómalas de precio (ofertas, tarifas erróneas)
+
+Por cada serie (ruta, salida, regreso, adultos y moneda) se guarda en
+`price_anomaly_state` una media y una varianza con decaimiento exponencial
+(EWMA) del precio más barato de cada lote, más la cantidad de observaciones:
+unos pocos números por serie, sin guardar ni releer la historia.
+
+Al escribir cada lote de ofertas (`insert_scan_results`), en la misma
+transacción:
+
+1. El lote se reduce a la oferta más barata por serie (`best_observations`)
+2. Cada observación se compara contra el estado de su serie: es anómala si
+   la serie ya tiene MIN_OBSERVATIONS observaciones, el precio está
+   Z_THRESHOLD desviaciones o más por debajo de la media y la caída es de al
+   menos MIN_DROP
+3. El estado se actualiza en O(1); el precio entra acotado a media ±
+   Z_THRESHOLD desviaciones, así que una tarifa errónea no infla la varianza
+4. Las anomalías quedan en `price_anomalies` y, para las vigilancias de
+   precio que cubren la serie, como alertas `anomaly` en `price_alerts`
+   (las despacha `notifier.py` igual que las de precio objetivo)
+
+Una serie avisa una vez por caída: de nuevo solo si el precio baja todavía
+más o si vuelve a la normalidad y cae otra vez.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Peso de cada observación nueva en la media y la varianza
+ALPHA = 0.2
+# Desviaciones bajo la media a partir de las cuales una caída es anómala
+Z_THRESHOLD = 3.0
+# Caída mínima contra la media (evita avisos en series casi constantes)
+MIN_DROP = 0.15
+# Observaciones previas necesarias antes de avisar
+MIN_OBSERVATIONS = 5
+# Desviación mínima como fracción de la media (series sin variación)
+MIN_RELATIVE_STD = 0.02
+
+
+def series_key(observation: Dict) -> str:
+    """Clave de la serie de una observación de `best_observations`"""
+    return '|'.join([
+        observation['origin'], observation['destination'], str(observation['departure_date']),
+        str(observation['return_date'] or ''), str(observation['adults']), observation['currency']
+    ])
+
+
+def update_state(state: Optional[Dict], price: float) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Incorpora un precio al estado de una serie
+    
+    Args:
+        state: Estado con mean, variance, observations y last_anomaly_price
+            (None si la serie es nueva)
+        price: Precio más barato del lote
+    
+    Returns:
+        Tupla (estado nuevo, anomalía con expected_price, zscore, drop_pct y
+        observations, o None)
+    """
+    if state is None:
+        return {'mean': price, 'variance': 0.0, 'observations': 1, 'last_anomaly_price': None}, None
+    
+    mean = float(state['mean'])
+    std = max(math.sqrt(max(float(state['variance']), 0.0)), mean * MIN_RELATIVE_STD)
+    zscore = (price - mean) / std if std > 0 else 0.0
+    drop = 1 - price / mean if mean > 0 else 0.0
+    last_anomaly = state.get('last_anomaly_price')
+    last_anomaly = float(last_anomaly) if last_anomaly is not None else None
+    
+    anomaly = None
+    unusual = state['observations'] >= MIN_OBSERVATIONS and zscore <= -Z_THRESHOLD and drop >= MIN_DROP
+    if unusual and (last_anomaly is None or price < last_anomaly):
+        anomaly = {
+            'expected_price': round(mean, 2),
+            'zscore': round(zscore, 2),
+            'drop_pct': round(drop * 100, 1),
+            'observations': int(state['observations'])
+        }
+        last_anomaly = price
+    elif not unusual:
+        # De vuelta a la normalidad: la próxima caída vuelve a avisar
+        last_anomaly = None
+    
+    # EWMA con el precio acotado (una tarifa errónea no arrastra la media ni la varianza)
+    bounded = min(max(price, mean - Z_THRESHOLD * std), mean + Z_THRESHOLD * std)
+    difference = bounded - mean
+    increment = ALPHA * difference
+    return {
+        'mean': mean + increment,
+        'variance': (1 - ALPHA) * (float(state['variance']) + difference * increment),
+        'observations': int(state['observations']) + 1,
+        'last_anomaly_price': last_anomaly
+    }, anomaly
+
+
+def detect(states: Dict[str, Dict], observations: Iterable[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Evalúa un lote de observaciones contra los estados de sus series
+    
+    Args:
+        states: Estados actuales por `series_key` (solo las series del lote)
+        observations: Observaciones de `best_observations`
+    
+    Returns:
+        Tupla (estados nuevos con series_key y departure_date, anomalías con
+        los campos de la observación más los de `update_state`)
+    """
+    new_states, anomalies = [], []
+    for observation in observations:
+        key = series_key(observation)
+        state, anomaly = update_state(states.get(key), float(observation['price']))
+        new_states.append(dict(state, series_key=key, departure_date=observation['departure_date']))
+        if anomaly:
+            anomalies.append(dict(observation, series_key=key, **anomaly))
+    return new_states, anomalies
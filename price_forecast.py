@@ -0,0 +1,582 @@
+"""
+Pronóstico "comprar ahora o esperar" para ofertas de vuelos
+
+Un modelo entrenado offline con el histórico de `flight_searches` (exportado
+con `export_data.py`) estima, para cada oferta:
+
+- La probabilidad de que la tarifa de esa ruta y fechas baje más de
+  `drop_threshold` (default 1%) antes de la salida
+- El ahorro esperado: probabilidad × ahorro estimado si baja
+
+Features por oferta: días a la salida, día de la semana de la salida, ruta y
+aerolínea (hashing en buckets fijos, sin vocabulario que crezca con los
+datos) y tendencia reciente (precio contra la media de las últimas
+TREND_WINDOW búsquedas de la serie, la misma media que muestra
+`indicators.py`).
+
+La probabilidad es una regresión logística y el ahorro una regresión ridge,
+ambas entrenadas con NumPy en CPU. El modelo se guarda como un JSON de pocos
+KB (pesos y normalización, sin pickle) y la inferencia es un producto
+matricial sobre el lote completo: la app puntúa todas las ofertas de una
+búsqueda de una vez.
+
+Entrenamiento y evaluación:
+    python export_data.py historial.parquet
+    python price_forecast.py train historial.parquet --output price_model.json
+    python price_forecast.py simulate
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from indicators import SIGNAL_BUY, SIGNAL_WAIT
+
+MODEL_VERSION = 1
+
+# Bajada mínima (fracción del precio) que cuenta como "el precio bajó"
+DEFAULT_DROP_THRESHOLD = 0.01
+# Búsquedas previas de la serie que forman la media de la tendencia
+TREND_WINDOW = 5
+# Buckets del hashing de rutas y aerolíneas
+ROUTE_BUCKETS = 64
+AIRLINE_BUCKETS = 32
+# Probabilidad desde la que se recomienda esperar (si además el ahorro esperado
+# supera drop_threshold)
+WAIT_PROBABILITY = 0.5
+
+NUMERIC_FEATURES = ['days_to_departure', 'log_days_to_departure', 'trend', 'has_history']
+
+
+def _bucket(text: str, buckets: int) -> int:
+    """Bucket estable de un texto (crc32, igual en todos los procesos)"""
+    return zlib.crc32(text.encode('utf-8')) % buckets
+
+
+def _day_numbers(values) -> np.ndarray:
+    """Fechas (date, datetime, Timestamp o texto ISO) como días desde 1970-01-01"""
+    return pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+
+def _sigmoid(values: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -35, 35)))
+
+
+class PriceForecaster:
+    """Modelo de bajada de precio y ahorro esperado (ver `train`)"""
+    
+    def __init__(
+        self,
+        drop_weights: np.ndarray,
+        savings_weights: np.ndarray,
+        feature_mean: np.ndarray,
+        feature_std: np.ndarray,
+        route_buckets: int = ROUTE_BUCKETS,
+        airline_buckets: int = AIRLINE_BUCKETS,
+        drop_threshold: float = DEFAULT_DROP_THRESHOLD,
+        metadata: Optional[Dict] = None
+    ):
+        """
+        Inicializa el modelo con sus parámetros entrenados
+        
+        Args:
+            drop_weights: Pesos de la regresión logística (uno por feature)
+            savings_weights: Pesos de la regresión del ahorro (fracción del precio)
+            feature_mean: Media de las features numéricas del entrenamiento
+            feature_std: Desviación de las features numéricas del entrenamiento
+            route_buckets: Buckets del hashing de rutas
+            airline_buckets: Buckets del hashing de aerolíneas
+            drop_threshold: Bajada mínima con que se entrenó la etiqueta
+            metadata: Métricas y datos del entrenamiento
+        """
+        self.drop_weights = np.asarray(drop_weights, dtype=float)
+        self.savings_weights = np.asarray(savings_weights, dtype=float)
+        self.feature_mean = np.asarray(feature_mean, dtype=float)
+        self.feature_std = np.asarray(feature_std, dtype=float)
+        self.route_buckets = int(route_buckets)
+        self.airline_buckets = int(airline_buckets)
+        self.drop_threshold = float(drop_threshold)
+        self.metadata = metadata or {}
+        self._route_cache: Dict[str, int] = {}
+        self._airline_cache: Dict[str, int] = {}
+    
+    @property
+    def feature_count(self) -> int:
+        return len(NUMERIC_FEATURES) + 7 + self.route_buckets + self.airline_buckets + 1
+    
+    def _route_index(self, origin: str, destination: str) -> int:
+        key = f"{origin}-{destination}"
+        index = self._route_cache.get(key)
+        if index is None:
+            index = self._route_cache[key] = _bucket(key, self.route_buckets)
+        return index
+    
+    def _airline_index(self, airline: str) -> int:
+        index = self._airline_cache.get(airline)
+        if index is None:
+            index = self._airline_cache[airline] = _bucket(airline, self.airline_buckets)
+        return index
+    
+    def design_matrix(
+        self,
+        days_to_departure: np.ndarray,
+        departure_day: np.ndarray,
+        route_index: np.ndarray,
+        airline_index: np.ndarray,
+        trend: np.ndarray,
+        has_history: np.ndarray
+    ) -> np.ndarray:
+        """
+        Arma la matriz de features del modelo
+        
+        Args:
+            days_to_departure: Días entre la búsqueda y la salida
+            departure_day: Fecha de salida en días desde 1970-01-01
+            route_index: Bucket de la ruta
+            airline_index: Bucket de la aerolínea
+            trend: Precio contra la media reciente de la serie, menos 1
+            has_history: 1 si la serie tiene búsquedas previas
+        
+        Returns:
+            Matriz (ofertas × feature_count)
+        """
+        count = len(days_to_departure)
+        days = np.maximum(np.asarray(days_to_departure, dtype=float), 0)
+        numeric = np.column_stack([days, np.log1p(days), np.clip(trend, -1, 1), has_history])
+        
+        matrix = np.zeros((count, self.feature_count))
+        matrix[:, :len(NUMERIC_FEATURES)] = (numeric - self.feature_mean) / self.feature_std
+        rows = np.arange(count)
+        offset = len(NUMERIC_FEATURES)
+        # 1970-01-01 fue jueves: lunes = 0
+        matrix[rows, offset + (np.asarray(departure_day) + 3) % 7] = 1
+        offset += 7
+        matrix[rows, offset + np.asarray(route_index)] = 1
+        offset += self.route_buckets
+        matrix[rows, offset + np.asarray(airline_index)] = 1
+        matrix[:, -1] = 1
+        return matrix
+    
+    def predict(
+        self,
+        offers: Union[pd.DataFrame, Iterable[Dict]],
+        today: Optional[date] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Puntúa un lote de ofertas
+        
+        Args:
+            offers: Ofertas con origin, destination, departure_date, airline y
+                price; `recent_mean` (media reciente de la serie, ver
+                `IndicatorEngine.series_latest`) es opcional
+            today: Fecha de la búsqueda (default hoy)
+        
+        Returns:
+            Diccionario con arrays drop_probability, expected_savings y
+            recommendation (COMPRAR/ESPERAR), en el orden de las ofertas
+        """
+        records = offers.to_dict('records') if isinstance(offers, pd.DataFrame) else list(offers)
+        if not records:
+            empty = np.zeros(0)
+            return {'drop_probability': empty, 'expected_savings': empty,
+                    'recommendation': np.zeros(0, dtype=object)}
+        
+        price = np.array([float(offer['price']) for offer in records])
+        departure = np.array([str(offer['departure_date'])[:10] for offer in records],
+                             dtype='datetime64[D]').astype(np.int64)
+        today_day = np.datetime64(today or date.today(), 'D').astype(np.int64)
+        recent_mean = np.array([offer.get('recent_mean') or np.nan for offer in records], dtype=float)
+        has_history = ~np.isnan(recent_mean)
+        
+        matrix = self.design_matrix(
+            departure - today_day,
+            departure,
+            np.array([self._route_index(offer['origin'], offer['destination']) for offer in records]),
+            np.array([self._airline_index(offer.get('airline') or 'N/A') for offer in records]),
+            np.where(has_history, price / np.where(has_history, recent_mean, 1) - 1, 0),
+            has_history.astype(float)
+        )
+        probability = _sigmoid(matrix @ self.drop_weights)
+        expected_fraction = probability * np.clip(matrix @ self.savings_weights, 0, 1)
+        # Esperar solo si la bajada es probable y el ahorro esperado supera el umbral
+        wait = (probability >= WAIT_PROBABILITY) & (expected_fraction >= self.drop_threshold)
+        return {
+            'drop_probability': probability,
+            'expected_savings': expected_fraction * price,
+            'recommendation': np.where(wait, SIGNAL_WAIT, SIGNAL_BUY)
+        }
+    
+    def to_dict(self) -> Dict:
+        """Parámetros del modelo serializables a JSON"""
+        def rounded(values):
+            return [float(f"{value:.6g}") for value in values]
+        
+        return {
+            'version': MODEL_VERSION,
+            'drop_threshold': self.drop_threshold,
+            'route_buckets': self.route_buckets,
+            'airline_buckets': self.airline_buckets,
+            'trend_window': TREND_WINDOW,
+            'numeric_features': NUMERIC_FEATURES,
+            'feature_mean': rounded(self.feature_mean),
+            'feature_std': rounded(self.feature_std),
+            'drop_weights': rounded(self.drop_weights),
+            'savings_weights': rounded(self.savings_weights),
+            'metadata': self.metadata
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PriceForecaster':
+        """Reconstruye el modelo desde `to_dict`"""
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"Versión de modelo no soportada: {data.get('version')}")
+        return cls(
+            drop_weights=data['drop_weights'],
+            savings_weights=data['savings_weights'],
+            feature_mean=data['feature_mean'],
+            feature_std=data['feature_std'],
+            route_buckets=data['route_buckets'],
+            airline_buckets=data['airline_buckets'],
+            drop_threshold=data['drop_threshold'],
+            metadata=data.get('metadata')
+        )
+    
+    def save(self, path: str):
+        """Guarda el modelo como JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'), default=str)
+    
+    @classmethod
+    def load(cls, path: str) -> 'PriceForecaster':
+        """Carga un modelo guardado con `save`"""
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def forecaster_from_config(config=None) -> Optional[PriceForecaster]:
+    """
+    Carga el modelo de PRICE_MODEL_FILE (default `price_model.json`)
+    
+    Args:
+        config: Mapeo de configuración (`st.secrets` u `os.environ`)
+    
+    Returns:
+        PriceForecaster, o None si no hay modelo entrenado
+    """
+    config = config if config is not None else os.environ
+    path = config.get('PRICE_MODEL_FILE', 'price_model.json')
+    if not path or not os.path.exists(path):
+        return None
+    
+    try:
+        return PriceForecaster.load(path)
+    except Exception as e:
+        print(f"Error cargando el modelo de precios: {str(e)}")
+        return None
+
+
+def load_training_data(path: str) -> pd.DataFrame:
+    """
+    Lee un export del histórico (.parquet, .arrow/.feather o .csv)
+    
+    Args:
+        path: Archivo generado por `export_data.py` (o un CSV con las mismas columnas)
+    
+    Returns:
+        DataFrame con las columnas del export
+    """
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    if path.endswith(('.arrow', '.feather')):
+        import pyarrow.ipc as pa_ipc
+        with pa_ipc.open_file(path) as reader:
+            return reader.read_pandas()
+    return pd.read_parquet(path)
+
+
+def training_frame(history: pd.DataFrame, drop_threshold: float = DEFAULT_DROP_THRESHOLD) -> pd.DataFrame:
+    """
+    Etiqueta cada oferta del histórico con lo que pasó después
+    
+    Una serie es (ruta, salida, regreso, adultos) y cada búsqueda aporta su
+    precio mínimo. Para cada oferta:
+    
+    - trend: precio contra la media de las TREND_WINDOW búsquedas previas de la serie
+    - future_min: mínimo de las búsquedas posteriores de la serie
+    - dropped: si future_min quedó más de `drop_threshold` debajo del precio
+    - savings_fraction: (precio - future_min) / precio, 0 si no bajó
+    
+    Las ofertas sin búsquedas posteriores (el final de cada serie) no tienen
+    etiqueta y se descartan.
+    
+    Args:
+        history: Filas de `flight_searches` (ver `load_training_data`)
+        drop_threshold: Bajada mínima que cuenta como bajada
+    
+    Returns:
+        DataFrame con las features y etiquetas
+    """
+    frame = history[['search_timestamp', 'origin', 'destination', 'departure_date', 'return_date',
+                     'adults', 'price', 'airline']].dropna(subset=['price', 'departure_date']).copy()
+    frame['price'] = frame['price'].astype(float)
+    frame['search_timestamp'] = pd.to_datetime(frame['search_timestamp'])
+    frame['departure_day'] = _day_numbers(frame['departure_date'])
+    frame['search_day'] = frame['search_timestamp'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    frame['series'] = (frame['origin'] + '|' + frame['destination'] + '|' + frame['departure_day'].astype(str)
+                       + '|' + frame['return_date'].map(lambda value: str(value)[:10] if pd.notna(value) else '')
+                       + '|' + frame['adults'].fillna(1).astype(int).astype(str))
+    
+    # Precio mínimo de cada búsqueda de la serie, en orden
+    scans = (frame.groupby(['series', 'search_timestamp'], sort=True)['price'].min()
+             .rename('scan_price').reset_index())
+    grouped = scans.groupby('series', sort=False)['scan_price']
+    scans['recent_mean'] = grouped.transform(
+        lambda prices: prices.shift(1).rolling(TREND_WINDOW, min_periods=1).mean())
+    scans['future_min'] = (scans.iloc[::-1].groupby('series', sort=False)['scan_price'].cummin()
+                           .iloc[::-1].groupby(scans['series']).shift(-1))
+    
+    frame = frame.merge(scans[['series', 'search_timestamp', 'recent_mean', 'future_min']],
+                        on=['series', 'search_timestamp'], how='left')
+    frame = frame.dropna(subset=['future_min'])
+    
+    frame['has_history'] = frame['recent_mean'].notna().astype(float)
+    frame['trend'] = (frame['price'] / frame['recent_mean'] - 1).fillna(0)
+    frame['days_to_departure'] = frame['departure_day'] - frame['search_day']
+    frame['dropped'] = frame['future_min'] < frame['price'] * (1 - drop_threshold)
+    frame['savings_fraction'] = np.where(frame['dropped'], 1 - frame['future_min'] / frame['price'], 0.0)
+    frame['route_index'] = (frame['origin'] + '-' + frame['destination']).map(
+        lambda route: _bucket(route, ROUTE_BUCKETS))
+    frame['airline_index'] = frame['airline'].fillna('N/A').map(lambda airline: _bucket(airline, AIRLINE_BUCKETS))
+    return frame.sort_values('search_timestamp', ignore_index=True)
+
+
+def _fit_logistic(matrix: np.ndarray, labels: np.ndarray, l2: float, iterations: int = 25) -> np.ndarray:
+    """Regresión logística con L2 por Newton (IRLS); el intercepto no se regulariza"""
+    weights = np.zeros(matrix.shape[1])
+    penalty = np.full(matrix.shape[1], l2)
+    penalty[-1] = 0
+    for _ in range(iterations):
+        probability = _sigmoid(matrix @ weights)
+        gradient = matrix.T @ (probability - labels) + penalty * weights
+        hessian = (matrix * (probability * (1 - probability))[:, None]).T @ matrix + np.diag(penalty + 1e-9)
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return weights
+
+
+def _fit_ridge(matrix: np.ndarray, targets: np.ndarray, l2: float) -> np.ndarray:
+    """Regresión ridge por ecuaciones normales; el intercepto no se regulariza"""
+    penalty = np.full(matrix.shape[1], l2)
+    penalty[-1] = 1e-9
+    return np.linalg.solve(matrix.T @ matrix + np.diag(penalty), matrix.T @ targets)
+
+
+def _auc(labels: np.ndarray, scores: np.ndarray) -> Optional[float]:
+    """Área bajo la curva ROC por rangos (None si hay una sola clase)"""
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        return None
+    ranks = pd.Series(scores).rank().to_numpy()
+    return float((ranks[labels == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def train(
+    history: pd.DataFrame,
+    drop_threshold: float = DEFAULT_DROP_THRESHOLD,
+    l2: float = 1.0,
+    holdout: float = 0.2
+) -> Tuple[PriceForecaster, Dict]:
+    """
+    Entrena el modelo con el histórico
+    
+    Las últimas `holdout` ofertas (por fecha de búsqueda) se reservan para
+    medir; después se reentrena con todo.
+    
+    Args:
+        history: Filas de `flight_searches` (ver `load_training_data`)
+        drop_threshold: Bajada mínima que cuenta como bajada
+        l2: Regularización de ambas regresiones
+        holdout: Fracción reservada para evaluación
+    
+    Returns:
+        Tupla (modelo, métricas de evaluación)
+    """
+    frame = training_frame(history, drop_threshold)
+    if len(frame) < 10 or frame['dropped'].nunique() < 2:
+        raise ValueError("El histórico no tiene suficientes búsquedas repetidas para entrenar")
+    
+    numeric = np.column_stack([
+        frame['days_to_departure'].clip(lower=0), np.log1p(frame['days_to_departure'].clip(lower=0)),
+        frame['trend'].clip(-1, 1), frame['has_history']
+    ]).astype(float)
+    feature_mean = numeric.mean(axis=0)
+    feature_std = numeric.std(axis=0)
+    feature_std[feature_std == 0] = 1
+    
+    def fit(rows: np.ndarray) -> PriceForecaster:
+        model = PriceForecaster(np.zeros(0), np.zeros(0), feature_mean, feature_std, drop_threshold=drop_threshold)
+        matrix = design(model, rows)
+        labels = frame['dropped'].to_numpy()[rows].astype(float)
+        model.drop_weights = _fit_logistic(matrix, labels, l2)
+        dropped = labels == 1
+        model.savings_weights = _fit_ridge(matrix[dropped], frame['savings_fraction'].to_numpy()[rows][dropped], l2)
+        return model
+    
+    def design(model: PriceForecaster, rows: np.ndarray) -> np.ndarray:
+        return model.design_matrix(
+            frame['days_to_departure'].to_numpy()[rows], frame['departure_day'].to_numpy()[rows],
+            frame['route_index'].to_numpy()[rows], frame['airline_index'].to_numpy()[rows],
+            frame['trend'].to_numpy()[rows], frame['has_history'].to_numpy()[rows]
+        )
+    
+    split = int(len(frame) * (1 - holdout))
+    metrics = {'rows': int(len(frame)), 'drop_rate': float(frame['dropped'].mean())}
+    
+    test_rows = np.arange(split, len(frame))
+    if 0 < split and len(test_rows) and frame['dropped'].iloc[:split].nunique() == 2:
+        model = fit(np.arange(split))
+        matrix = design(model, test_rows)
+        labels = frame['dropped'].to_numpy()[test_rows].astype(float)
+        probability = _sigmoid(matrix @ model.drop_weights)
+        price = frame['price'].to_numpy()[test_rows]
+        expected = probability * np.clip(matrix @ model.savings_weights, 0, 1) * price
+        actual = frame['savings_fraction'].to_numpy()[test_rows] * price
+        clipped = np.clip(probability, 1e-7, 1 - 1e-7)
+        metrics.update({
+            'holdout_rows': int(len(test_rows)),
+            'log_loss': float(-np.mean(labels * np.log(clipped) + (1 - labels) * np.log(1 - clipped))),
+            'brier': float(np.mean((probability - labels) ** 2)),
+            'auc': _auc(labels, probability),
+            'accuracy': float(np.mean((probability >= WAIT_PROBABILITY) == labels)),
+            'savings_mae': float(np.mean(np.abs(expected - actual)))
+        })
+    
+    model = fit(np.arange(len(frame)))
+    model.metadata = {'trained_at': datetime.now().isoformat(timespec='seconds'), **metrics}
+    return model, metrics
+
+
+def benchmark(model: PriceForecaster, batch_size: int = 100, repeats: int = 200) -> Dict:
+    """
+    Mide la inferencia por lotes con ofertas sintéticas
+    
+    Returns:
+        Diccionario con batch_size, batch_ms y per_offer_us (mediana)
+    """
+    rng = np.random.default_rng(3)
+    today = date.today()
+    offers = [{
+        'origin': 'EZE', 'destination': ['MIA', 'MAD', 'JFK'][index % 3],
+        'departure_date': (today + timedelta(days=int(rng.integers(1, 120)))).isoformat(),
+        'airline': ['AA', 'IB', 'LA', 'DL'][index % 4], 'price': float(rng.uniform(300, 1500)),
+        'recent_mean': float(rng.uniform(300, 1500)) if index % 2 else None
+    } for index in range(batch_size)]
+    
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict(offers, today)
+        timings.append(time.perf_counter() - started)
+    median = float(np.median(timings))
+    return {'batch_size': batch_size, 'batch_ms': median * 1000, 'per_offer_us': median / batch_size * 1e6}
+
+
+def _simulated_history(series: int = 400, seed: int = 11) -> pd.DataFrame:
+    """
+    Histórico sintético con patrones conocidos
+    
+    Los precios bajan hasta unas tres semanas antes de la salida y después
+    suben, las salidas de viernes y domingo son más caras y la volatilidad
+    depende de la aerolínea.
+    """
+    rng = np.random.default_rng(seed)
+    routes = [('EZE', 'MIA'), ('EZE', 'MAD'), ('GRU', 'JFK'), ('SCL', 'LIM'), ('BOG', 'MEX')]
+    airlines = {'AA': 0.02, 'IB': 0.04, 'LA': 0.03, 'DL': 0.015}
+    start = datetime(2025, 1, 1)
+    rows = []
+    for index in range(series):
+        origin, destination = routes[index % len(routes)]
+        departure = start + timedelta(days=int(rng.integers(40, 150)))
+        weekend = 1.15 if departure.weekday() in (4, 6) else 1.0
+        base = rng.uniform(300, 1200) * weekend
+        for day in range(0, (departure - start).days, int(rng.integers(2, 5))):
+            searched = start + timedelta(days=day, hours=int(rng.integers(0, 24)))
+            days_left = (departure - searched).days
+            curve = 1 + 0.004 * max(days_left - 21, 0) + 0.02 * max(21 - days_left, 0)
+            for airline, noise in airlines.items():
+                rows.append({
+                    'search_timestamp': searched, 'origin': origin, 'destination': destination,
+                    'departure_date': departure.date(), 'return_date': None, 'adults': 1,
+                    'price': round(base * curve * (1 + rng.normal(0, noise)), 2), 'airline': airline
+                })
+    return pd.DataFrame(rows)
+
+
+def format_metrics(metrics: Dict) -> str:
+    """Resumen legible de las métricas de entrenamiento"""
+    lines = [f"Ofertas etiquetadas: {metrics['rows']} (bajó después el {metrics['drop_rate']:.1%})"]
+    if 'holdout_rows' in metrics:
+        auc = f"{metrics['auc']:.3f}" if metrics['auc'] is not None else "n/d"
+        lines.append(f"Evaluación sobre las {metrics['holdout_rows']} más recientes: AUC {auc}, "
+                     f"log-loss {metrics['log_loss']:.3f}, Brier {metrics['brier']:.3f}, "
+                     f"acierto {metrics['accuracy']:.1%}")
+        lines.append(f"Error medio del ahorro esperado: {metrics['savings_mae']:.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modelo de pronóstico de precios (comprar o esperar)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    train_parser = subparsers.add_parser('train', help="Entrenar con un export del histórico")
+    train_parser.add_argument('input', help="Export de export_data.py (.parquet, .arrow o .csv)")
+    train_parser.add_argument('--output', default='price_model.json', help="Archivo del modelo")
+    train_parser.add_argument('--drop-threshold', type=float, default=DEFAULT_DROP_THRESHOLD,
+                              help="Bajada mínima (fracción) que cuenta como bajada")
+    train_parser.add_argument('--l2', type=float, default=1.0, help="Regularización")
+    
+    simulate_parser = subparsers.add_parser('simulate', help="Entrenar y medir con datos sintéticos")
+    simulate_parser.add_argument('--series', type=int, default=400, help="Series sintéticas")
+    args = parser.parse_args()
+    
+    try:
+        started = time.perf_counter()
+        if args.command == 'train':
+            history = load_training_data(args.input)
+            model, metrics = train(history, args.drop_threshold, args.l2)
+            model.save(args.output)
+            print(f"✅ Modelo guardado en {args.output} ({os.path.getsize(args.output) / 1024:.1f} KB, "
+                  f"{time.perf_counter() - started:.1f}s)")
+        else:
+            model, metrics = train(_simulated_history(args.series))
+            print(f"Entrenado en {time.perf_counter() - started:.1f}s "
+                  f"({len(json.dumps(model.to_dict())) / 1024:.1f} KB serializado)")
+        
+        print(format_metrics(metrics))
+        for batch_size in (1, 100, 1000):
+            result = benchmark(model, batch_size)
+            print(f"Inferencia de {batch_size:>4} ofertas: {result['batch_ms']:.3f} ms "
+                  f"({result['per_offer_us']:.1f} µs por oferta)")
+        
+        if args.command == 'simulate':
+            return 0 if metrics.get('auc') and metrics['auc'] > 0.6 else 1
+        return 0
+    
+    except Exception as e:
+        print(f"❌ Error entrenando el modelo: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Vigilancias de precio objetivo evaluadas al guardar ofertas
+
+Una vigilancia (tabla `price_watches`) pide avisar cuando una ruta baje de
+un precio objetivo para una fecha de salida o una ventana de fechas (hasta
+MAX_WATCH_WINDOW_DAYS días), opcionalmente con fecha de regreso y número de
+adultos fijos. Se guardan en la base, así que sobreviven a la sesión del
+navegador y las evalúan tanto la app como el monitor.
+
+La evaluación ocurre en la misma transacción que inserta cada lote de
+ofertas (`insert_scan_results`):
+
+1. El lote se reduce a la oferta más barata por clave (origen, destino,
+   salida, regreso, adultos, moneda): miles de ofertas se vuelven decenas
+   de observaciones
+2. Las vigilancias activas que coinciden con cada observación se buscan por
+   índice (`origin, destination, departure_from`), acotando la ventana a
+   `departure_from BETWEEN salida - MAX_WATCH_WINDOW_DAYS AND salida`; nunca
+   se recorren todas las vigilancias
+3. Cada vigilancia se queda con la observación más barata que la cubre, se
+   actualiza su último precio y, si está en o bajo el objetivo y es más
+   barata que el último aviso, se registra una alerta en `price_alerts`
+
+Una vigilancia avisa una vez por precio: vuelve a avisar solo si el precio
+baja todavía más, o si la serie que disparó el aviso (misma fecha de salida,
+regreso y adultos) sube por encima del objetivo y después vuelve a bajar.
+Como cada lote trae solo algunas fechas de la ventana, una fecha más cara en
+otro lote no rearma la vigilancia, y `last_price` es el precio más barato
+conocido de la ventana (se reemplaza cuando el lote trae la serie que lo
+fijó). Además avisa (alerta `anomaly`) cuando la serie que vigila tiene una
+caída anómala, aunque no llegue al objetivo (ver `price_anomalies.py`).
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from price_anomalies import series_key
+
+# Ventana máxima de fechas de salida de una vigilancia (acota la búsqueda por índice)
+MAX_WATCH_WINDOW_DAYS = 30
+
+
+def _date_text(value) -> Optional[str]:
+    """Fecha como 'YYYY-MM-DD' (None si no hay fecha)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+
+def normalize_watch(
+    origin: str,
+    destination: str,
+    departure_from,
+    departure_to=None,
+    return_date=None,
+    adults: Optional[int] = None,
+    target_price: float = 0.0,
+    currency: str = 'USD'
+) -> Dict:
+    """
+    Valida y normaliza los campos de una vigilancia nueva
+    
+    Args:
+        origin: Código IATA de origen
+        destination: Código IATA de destino
+        departure_from: Primera fecha de salida vigilada
+        departure_to: Última fecha de salida vigilada (default la primera)
+        return_date: Fecha de regreso exacta (None para cualquiera)
+        adults: Número de adultos (None para cualquiera)
+        target_price: Precio objetivo
+        currency: Moneda del precio objetivo
+    
+    Returns:
+        Diccionario con los campos de `price_watches`
+    
+    Raises:
+        ValueError: Si algún campo es inválido
+    """
+    origin, destination = str(origin).strip().upper(), str(destination).strip().upper()
+    if len(origin) != 3 or len(destination) != 3 or origin == destination:
+        raise ValueError(f"Ruta inválida: {origin} → {destination}")
+    
+    start = date.fromisoformat(_date_text(departure_from))
+    end = date.fromisoformat(_date_text(departure_to)) if departure_to else start
+    if end < start:
+        raise ValueError("La ventana de salida termina antes de empezar")
+    if (end - start).days > MAX_WATCH_WINDOW_DAYS:
+        raise ValueError(f"La ventana de salida no puede superar {MAX_WATCH_WINDOW_DAYS} días")
+    
+    if float(target_price) <= 0:
+        raise ValueError("El precio objetivo debe ser mayor que cero")
+    
+    return {
+        'origin': origin,
+        'destination': destination,
+        'departure_from': start.isoformat(),
+        'departure_to': end.isoformat(),
+        'return_date': _date_text(return_date),
+        'adults': int(adults) if adults else None,
+        'target_price': round(float(target_price), 2),
+        'currency': (currency or 'USD').upper()
+    }
+
+
+def best_observations(written: Iterable[Tuple[Dict, Optional[int]]]) -> List[Dict]:
+    """
+    Reduce un lote a la oferta más barata por clave de vigilancia
+    
+    Args:
+        written: Tuplas (oferta, ID de la fila en `flight_searches`)
+    
+    Returns:
+        Lista de observaciones con origin, destination, departure_date,
+        return_date, adults, currency, price, airline y search_id
+    """
+    best = {}
+    for offer, search_id in written:
+        key = (
+            offer['origin'], offer['destination'], _date_text(offer['departure_date']),
+            _date_text(offer.get('return_date')), int(offer.get('adults') or 1),
+            offer.get('currency') or 'USD'
+        )
+        price = float(offer['price'])
+        if key in best and best[key]['price'] <= price:
+            continue
+        best[key] = {
+            'origin': key[0],
+            'destination': key[1],
+            'departure_date': key[2],
+            'return_date': key[3],
+            'adults': key[4],
+            'currency': key[5],
+            'price': price,
+            'airline': offer.get('airline') or 'N/A',
+            'search_id': search_id
+        }
+    return list(best.values())
+
+
+def evaluate_matches(matches: Iterable[Dict],
+                     anomalies: Optional[Dict[str, Dict]] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Decide qué vigilancias disparan una alerta
+    
+    Args:
+        matches: Pares vigilancia-observación: campos de la observación más
+            watch_id, owner, target_price, last_price, last_price_series,
+            last_alert_price y last_alert_series
+        anomalies: Caídas anómalas del lote por clave de serie (ver
+            `price_anomalies.py`); avisan a las vigilancias que cubren la
+            serie aunque el precio no llegue al objetivo
+    
+    Returns:
+        Tupla (actualizaciones por vigilancia con watch_id, last_price,
+        last_price_series, last_alert_price, last_alert_series y alerted;
+        alertas a insertar en `price_alerts`, con kind 'target' o 'anomaly')
+    """
+    by_watch = {}
+    for match in matches:
+        by_watch.setdefault(match['watch_id'], {})[series_key(match)] = match
+    
+    updates, alerts = [], []
+    for watch_id, observed in sorted(by_watch.items()):
+        key, match = min(observed.items(), key=lambda item: float(item[1]['price']))
+        price = float(match['price'])
+        target = float(match['target_price'])
+        last_price = float(match['last_price']) if match['last_price'] is not None else None
+        last_alert = float(match['last_alert_price']) if match['last_alert_price'] is not None else None
+        price_series = match.get('last_price_series')
+        alert_series = match.get('last_alert_series')
+        
+        # La serie que disparó el último aviso volvió a estar sobre el
+        # objetivo: la vigilancia se rearma (sin serie registrada, avisos
+        # anteriores a este campo, se usa la más barata del lote)
+        alerted_now = observed.get(alert_series) if alert_series else match
+        if last_alert is not None and alerted_now is not None and float(alerted_now['price']) > target:
+            last_alert, alert_series = None, None
+        
+        alerted = price <= target and (last_alert is None or price < last_alert)
+        if alerted:
+            last_alert, alert_series = price, key
+        
+        # Precio más barato conocido de la ventana: el del lote, salvo que el
+        # anterior sea de una serie que el lote no trae y siga siendo menor
+        if price_series and price_series not in observed and last_price is not None and last_price <= price:
+            new_price, new_series = last_price, price_series
+        else:
+            new_price, new_series = price, key
+        
+        updates.append({
+            'watch_id': watch_id,
+            'last_price': new_price,
+            'last_price_series': new_series,
+            'last_alert_price': last_alert,
+            'last_alert_series': alert_series,
+            'alerted': alerted
+        })
+        anomaly = (anomalies or {}).get(key) if not alerted else None
+        if alerted or anomaly:
+            alerts.append({
+                'kind': 'target' if alerted else 'anomaly',
+                'watch_id': watch_id,
+                'owner': match['owner'],
+                'search_id': match['search_id'],
+                'origin': match['origin'],
+                'destination': match['destination'],
+                'departure_date': match['departure_date'],
+                'return_date': match['return_date'],
+                'adults': match['adults'],
+                'price': price,
+                'target_price': target,
+                # En las anomalías, el precio esperado de la serie
+                'previous_price': anomaly['expected_price'] if anomaly else last_price,
+                'currency': match['currency'],
+                'airline': match['airline']
+            })
+    return updates, alerts
+
+
+def window_start(departure_date: str) -> str:
+    """Primera `departure_from` que puede cubrir una fecha de salida"""
+    return (date.fromisoformat(departure_date) - timedelta(days=MAX_WATCH_WINDOW_DAYS)).isoformat()
@@ -0,0 +1,387 @@
+"""
+Sketches de cuantiles KLL para percentiles de precio por ruta y aerolínea
+
+Un sketch KLL (Karnin, Lang y Liberty, 2016) resume una secuencia de precios
+en unos pocos cientos de valores, sin importar cuántos precios vio, y
+responde cualquier percentil con un error de rango acotado. Dos sketches se
+combinan (`merge`) con el mismo error, así que se guardan por día y se
+juntan al consultar.
+
+En la base (`price_sketches`) hay un sketch por ruta, aerolínea y día de
+búsqueda, más uno por ruta y día con todas las aerolíneas
+(`airline = ALL_AIRLINES`). Se actualizan en la transacción de cada lote
+de ofertas (`insert_scan_results`), con todas las ofertas que vio la
+búsqueda (también las que `change_only` no guardó como fila nueva), y
+`Database.get_price_quantiles` combina los sketches del período: su costo
+depende de los días consultados, no de la cantidad de ofertas.
+
+Precisión: con k = DEFAULT_K (200) el error de rango normalizado queda por
+debajo de RANK_ERROR_BOUND (1,65%) con 99% de confianza: el p50 devuelto es
+un precio cuyo rango real está entre el p48,35 y el p51,65. Con menos de
+unos k precios por día el sketch no compacta y es exacto. Los precios se
+guardan en centavos enteros (exactos hasta 42.949.672,95). La verificación
+contra percentiles exactos (varias distribuciones, orden adversario y
+combinación de 30 días) se corre con:
+    python quantile_sketch.py --selfcheck
+"""
+
+import argparse
+import math
+import random
+import struct
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_K = 200
+# Error de rango normalizado con 99% de confianza para DEFAULT_K
+RANK_ERROR_BOUND = 0.0165
+# Sketch de la ruta con todas las aerolíneas
+ALL_AIRLINES = '*'
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+_FORMAT_VERSION = 1
+# Versión, k, cantidad de precios, mínimo y máximo (centavos), niveles
+_HEADER = struct.Struct('<BHQIIB')
+# Cada nivel retiene a lo sumo k elementos: entra en un uint16
+_LEVEL_SIZE = struct.Struct('<H')
+# Decrecimiento de la capacidad de los niveles inferiores
+_CAPACITY_DECAY = 2 / 3
+
+_random = random.Random()
+
+
+class KLLSketch:
+    """Sketch de cuantiles KLL de precios (en centavos enteros)"""
+    
+    def __init__(self, k: int = DEFAULT_K):
+        """
+        Inicializa un sketch vacío
+        
+        Args:
+            k: Capacidad del nivel superior (más grande, más preciso y más pesado)
+        """
+        self.k = int(k)
+        self.count = 0
+        self.min_value: Optional[int] = None
+        self.max_value: Optional[int] = None
+        # levels[h] guarda elementos de peso 2**h
+        self.levels: List[List[int]] = [[]]
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    @property
+    def retained(self) -> int:
+        """Elementos guardados (acotado por ~3k)"""
+        return sum(len(level) for level in self.levels)
+    
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * _CAPACITY_DECAY ** depth)), 2)
+    
+    def update(self, price: float):
+        """Agrega un precio"""
+        self.extend([price])
+    
+    def extend(self, prices: Iterable[float]):
+        """Agrega varios precios"""
+        cents = [int(round(float(price) * 100)) for price in prices]
+        if not cents:
+            return
+        self.levels[0].extend(cents)
+        self.count += len(cents)
+        low, high = min(cents), max(cents)
+        self.min_value = low if self.min_value is None else min(self.min_value, low)
+        self.max_value = high if self.max_value is None else max(self.max_value, high)
+        self._compress()
+    
+    def merge(self, other: 'KLLSketch'):
+        """Incorpora otro sketch (el resultado tiene la misma garantía de error)"""
+        if not other.count:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        self.max_value = other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+        self._compress()
+    
+    def _compress(self):
+        """Compacta niveles llenos hasta que el sketch entra en su capacidad total"""
+        while True:
+            full = next((level for level, items in enumerate(self.levels)
+                         if len(items) >= self._capacity(level)), None)
+            if full is None:
+                return
+            if full + 1 == len(self.levels):
+                self.levels.append([])
+            
+            # Se ordenan y pasa al nivel siguiente uno de cada par (posición
+            # al azar), con el doble de peso; con cantidad impar queda uno
+            items = sorted(self.levels[full])
+            kept = [items.pop()] if len(items) % 2 else []
+            self.levels[full + 1].extend(items[_random.getrandbits(1)::2])
+            self.levels[full] = kept
+    
+    def _weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Elementos ordenados con su peso acumulado"""
+        values = np.concatenate([np.asarray(items, dtype=np.int64) for items in self.levels])
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], np.cumsum(weights[order])
+    
+    def quantiles(self, fractions: Sequence[float]) -> List[Optional[float]]:
+        """
+        Precios en los percentiles pedidos
+        
+        Args:
+            fractions: Percentiles entre 0 y 1 (0 es el mínimo y 1 el máximo exactos)
+        
+        Returns:
+            Precios (None si el sketch está vacío)
+        """
+        if not self.count:
+            return [None for _ in fractions]
+        values, cumulative = self._weighted()
+        result = []
+        for fraction in fractions:
+            if fraction <= 0:
+                result.append(self.min_value / 100)
+            elif fraction >= 1:
+                result.append(self.max_value / 100)
+            else:
+                index = int(np.searchsorted(cumulative, fraction * self.count, side='left'))
+                result.append(int(values[min(index, len(values) - 1)]) / 100)
+        return result
+    
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Precio en un percentil (ver `quantiles`)"""
+        return self.quantiles([fraction])[0]
+    
+    def rank(self, price: float) -> float:
+        """Fracción estimada de precios menores o iguales a `price`"""
+        if not self.count:
+            return 0.0
+        values, cumulative = self._weighted()
+        index = int(np.searchsorted(values, int(round(price * 100)), side='right'))
+        return float(cumulative[index - 1]) / self.count if index else 0.0
+    
+    def to_bytes(self) -> bytes:
+        """Serialización compacta (cabecera y centavos como uint32)"""
+        header = _HEADER.pack(_FORMAT_VERSION, self.k, self.count, self.min_value or 0, self.max_value or 0,
+                              len(self.levels))
+        sizes = b''.join(_LEVEL_SIZE.pack(len(items)) for items in self.levels)
+        values = np.concatenate([np.asarray(items, dtype=np.uint32) for items in self.levels])
+        return header + sizes + values.astype('<u4').tobytes()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KLLSketch':
+        """Reconstruye un sketch de `to_bytes`"""
+        version, k, count, min_value, max_value, level_count = _HEADER.unpack_from(data, 0)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Versión de sketch no soportada: {version}")
+        sketch = cls(k)
+        sketch.count = count
+        sketch.min_value = min_value if count else None
+        sketch.max_value = max_value if count else None
+        
+        offset = _HEADER.size
+        sizes = [_LEVEL_SIZE.unpack_from(data, offset + index * _LEVEL_SIZE.size)[0]
+                 for index in range(level_count)]
+        offset += level_count * _LEVEL_SIZE.size
+        values = np.frombuffer(data, dtype='<u4', offset=offset).astype(np.int64).tolist()
+        sketch.levels = []
+        for size in sizes:
+            sketch.levels.append(values[:size])
+            values = values[size:]
+        return sketch
+
+
+def merge_all(sketches: Iterable[KLLSketch], k: int = DEFAULT_K) -> KLLSketch:
+    """Combina varios sketches (por ejemplo, los días de un período) en uno nuevo"""
+    merged = KLLSketch(k)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def quantile_label(fraction: float) -> str:
+    """Nombre de un percentil en los resultados (0.1 → 'p10', 0.999 → 'p99.9')"""
+    return f"p{fraction * 100:g}"
+
+
+def summarize(sketch: KLLSketch, fractions: Sequence[float] = DEFAULT_QUANTILES) -> Dict:
+    """
+    Resultado de `Database.get_price_quantiles`
+    
+    Returns:
+        Diccionario con count, min_price, max_price y un pN por percentil
+        (vacío si no hay precios)
+    """
+    if not sketch.count:
+        return {}
+    result = {'count': sketch.count, 'min_price': sketch.min_value / 100, 'max_price': sketch.max_value / 100}
+    result.update(zip((quantile_label(fraction) for fraction in fractions), sketch.quantiles(fractions)))
+    return result
+
+
+def sketch_groups(offers: Iterable[Dict]) -> Dict[Tuple[str, str, str], List[float]]:
+    """
+    Agrupa los precios de un lote por sketch a actualizar
+    
+    Returns:
+        Precios por (origin, destination, airline), incluyendo ALL_AIRLINES por ruta
+    """
+    groups = defaultdict(list)
+    for offer in offers:
+        price = float(offer['price'])
+        airline = (offer.get('airline') or 'N/A')[:100]
+        groups[(offer['origin'], offer['destination'], airline)].append(price)
+        groups[(offer['origin'], offer['destination'], ALL_AIRLINES)].append(price)
+    return groups
+
+
+def build_sketches(chunks: Iterable[List[Dict]]) -> Dict[Tuple[str, str, str, date], KLLSketch]:
+    """
+    Arma los sketches diarios desde el histórico (ver `iter_flight_history`)
+    
+    Returns:
+        Sketches por (origin, destination, airline, día de búsqueda)
+    """
+    sketches = {}
+    for rows in chunks:
+        pending = defaultdict(list)
+        for row in rows:
+            timestamp = row['search_timestamp']
+            day = timestamp.date() if isinstance(timestamp, datetime) else date.fromisoformat(str(timestamp)[:10])
+            for (origin, destination, airline), prices in sketch_groups([row]).items():
+                pending[(origin, destination, airline, day)].extend(prices)
+        for key, prices in pending.items():
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = KLLSketch()
+            sketch.extend(prices)
+    return sketches
+
+
+def max_rank_error(sketch: KLLSketch, exact_sorted: np.ndarray, fractions: Sequence[float]) -> float:
+    """
+    Error de rango normalizado máximo contra los datos exactos
+    
+    Para cada percentil q, el precio devuelto tiene en los datos un rango real
+    entre [menores, menores o iguales]; el error es la distancia de q a ese
+    intervalo.
+    """
+    count = len(exact_sorted)
+    worst = 0.0
+    cents = np.round(exact_sorted * 100).astype(np.int64)
+    for fraction, value in zip(fractions, sketch.quantiles(fractions)):
+        target = int(round(value * 100))
+        below = np.searchsorted(cents, target, side='left') / count
+        at_most = np.searchsorted(cents, target, side='right') / count
+        worst = max(worst, below - fraction, fraction - at_most, 0.0)
+    return worst
+
+
+def selfcheck(count: int = 100000, trials: int = 5, seed: int = 5) -> Dict:
+    """
+    Verifica la precisión contra percentiles exactos
+    
+    Casos: precios lognormales, bimodales (dos tarifas), uniformes, llegando
+    ordenados de forma ascendente (el peor orden para la compactación) y la
+    combinación de 30 sketches diarios; cada uno `trials` veces.
+    
+    Returns:
+        Diccionario con el error máximo por caso, el tamaño serializado, los
+        tiempos de actualización y consulta, y passed
+    """
+    _random.seed(seed)
+    rng = np.random.default_rng(seed)
+    fractions = [index / 100 for index in range(1, 100)]
+    generators = {
+        'lognormal': lambda: np.round(rng.lognormal(6.3, 0.35, count), 2),
+        'bimodal': lambda: np.round(np.concatenate([rng.normal(450, 30, count // 2),
+                                                    rng.normal(900, 60, count - count // 2)]), 2),
+        'uniforme': lambda: np.round(rng.uniform(200, 1500, count), 2),
+        'ordenado': lambda: np.sort(np.round(rng.lognormal(6.3, 0.35, count), 2))
+    }
+    
+    errors = {}
+    size = 0
+    update_seconds = 0.0
+    for name, generate in generators.items():
+        worst = 0.0
+        for _ in range(trials):
+            prices = np.maximum(generate(), 0.01)
+            sketch = KLLSketch()
+            started = time.perf_counter()
+            for chunk in np.array_split(prices, 100):
+                sketch.extend(chunk.tolist())
+            update_seconds += time.perf_counter() - started
+            sketch = KLLSketch.from_bytes(sketch.to_bytes())
+            size = max(size, len(sketch.to_bytes()))
+            worst = max(worst, max_rank_error(sketch, np.sort(prices), fractions))
+        errors[name] = worst
+    
+    # 30 días combinados al consultar
+    worst = 0.0
+    query_seconds = 0.0
+    for _ in range(trials):
+        days = [np.maximum(np.round(rng.lognormal(6.3 + 0.01 * day, 0.3, count // 30), 2), 0.01)
+                for day in range(30)]
+        daily = []
+        for prices in days:
+            sketch = KLLSketch()
+            sketch.extend(prices.tolist())
+            daily.append(sketch.to_bytes())
+        started = time.perf_counter()
+        merged = merge_all(KLLSketch.from_bytes(data) for data in daily)
+        summarize(merged)
+        query_seconds = max(query_seconds, time.perf_counter() - started)
+        worst = max(worst, max_rank_error(merged, np.sort(np.concatenate(days)), fractions))
+    errors['30 días combinados'] = worst
+    
+    return {
+        'count': count,
+        'trials': trials,
+        'errors': errors,
+        'bound': RANK_ERROR_BOUND,
+        'bytes': size,
+        'update_us_per_price': update_seconds / (len(generators) * trials * count) * 1e6,
+        'query_ms_30_days': query_seconds * 1000,
+        'passed': all(error <= RANK_ERROR_BOUND for error in errors.values())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sketches de cuantiles KLL de precios")
+    parser.add_argument('--selfcheck', action='store_true', help="Verificar la precisión contra valores exactos")
+    parser.add_argument('--count', type=int, default=100000, help="Precios por caso")
+    parser.add_argument('--trials', type=int, default=5, help="Repeticiones por caso")
+    args = parser.parse_args()
+    
+    if not args.selfcheck:
+        parser.print_help()
+        return 0
+    
+    result = selfcheck(args.count, args.trials)
+    print(f"Error de rango máximo ({result['trials']} repeticiones de {result['count']} precios, "
+          f"cota {result['bound']:.2%}):")
+    for name, error in result['errors'].items():
+        print(f"   {'✅' if error <= result['bound'] else '❌'} {name}: {error:.3%}")
+    print(f"Sketch serializado: {result['bytes']} bytes")
+    print(f"Actualización: {result['update_us_per_price']:.2f} µs por precio; "
+          f"consulta de 30 días: {result['query_ms_30_days']:.2f} ms")
+    return 0 if result['passed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
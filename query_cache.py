@@ -0,0 +1,215 @@
+"""
+Caché de resultados de consultas con invalidación por generación de datos
+
+Los métodos de lectura de `Database` / `SQLiteDatabase` decorados con
+`cached_query` se sirven desde memoria mientras no cambien los datos. Un
+"token de generación" barato detecta escrituras hechas por otros procesos
+(por ejemplo el monitor o el archivado): un contador de una fila
+(`data_generation`) que cada escritura incrementa en su misma transacción,
+más el máximo id de `flight_searches` y la actividad de la dimensión `routes`
+para procesos que todavía no lo incrementan. Las escrituras propias invalidan
+la caché al instante.
+"""
+
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+
+def _estimate_size(value) -> int:
+    """
+    Estima el tamaño en memoria de un resultado (listas/dicts/tuplas de escalares)
+    
+    Args:
+        value: Resultado de una consulta
+    
+    Returns:
+        Tamaño aproximado en bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+class QueryCache:
+    """Caché LRU acotada por memoria, compartida por todos los hilos"""
+    
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, generation_ttl: float = 2.0):
+        """
+        Inicializa la caché
+        
+        Args:
+            max_bytes: Memoria máxima aproximada ocupada por los resultados
+            generation_ttl: Segundos durante los que se reutiliza el último
+                token de generación sin volver a consultarlo en la base
+        """
+        self.max_bytes = max_bytes
+        self.generation_ttl = generation_ttl
+        
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, object, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._generation = None
+        self._generation_checked_at = 0.0
+        self._local_version = 0
+        
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._generation_checks = 0
+        self._saved_seconds = 0.0
+    
+    def current_generation(self, fetch_generation: Callable[[], Hashable]) -> Hashable:
+        """
+        Devuelve el token de generación vigente, consultándolo como máximo
+        una vez cada `generation_ttl` segundos
+        
+        Args:
+            fetch_generation: Función que lee el token desde la base de datos
+        
+        Returns:
+            Token de generación (combinado con la versión local de escrituras)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is not None and now - self._generation_checked_at < self.generation_ttl:
+                return (self._local_version, self._generation)
+        
+        generation = fetch_generation()
+        
+        with self._lock:
+            self._generation = generation
+            self._generation_checked_at = now
+            self._generation_checks += 1
+            return (self._local_version, generation)
+    
+    def get(self, key: Hashable, generation: Hashable) -> Tuple[bool, object]:
+        """
+        Busca un resultado válido para la generación indicada
+        
+        Returns:
+            Tupla (encontrado, valor)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                self._saved_seconds += entry[3]
+                return True, entry[1]
+            
+            if entry is not None:
+                # Entrada de una generación anterior
+                self._bytes -= entry[2]
+                del self._entries[key]
+            
+            self._misses += 1
+            return False, None
+    
+    def put(self, key: Hashable, generation: Hashable, value, cost_seconds: float):
+        """
+        Guarda un resultado, desalojando los menos usados si se excede la memoria
+        
+        Args:
+            key: Clave (método + argumentos)
+            generation: Generación con la que se calculó el resultado
+            value: Resultado de la consulta
+            cost_seconds: Tiempo que tomó la consulta (ahorro por cada acierto)
+        """
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if generation[0] != self._local_version:
+                # Hubo una escritura mientras se ejecutaba la consulta
+                return
+            
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            
+            self._entries[key] = (generation, value, size, cost_seconds)
+            self._bytes += size
+            
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+    
+    def invalidate(self):
+        """Descarta todos los resultados (llamado después de cada escritura propia)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._local_version += 1
+            self._generation = None
+            self._invalidations += 1
+    
+    def stats(self) -> Dict:
+        """
+        Obtiene las métricas de la caché
+        
+        Returns:
+            Diccionario con hits, misses, hit_rate, entries, bytes,
+            invalidations, generation_checks y saved_seconds (tiempo de
+            consulta ahorrado por los aciertos)
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'invalidations': self._invalidations,
+                'generation_checks': self._generation_checks,
+                'saved_seconds': self._saved_seconds
+            }
+
+
+def cached_query(method):
+    """
+    Decorador para métodos de lectura de la base de datos
+    
+    Usa `self.query_cache` (si es None no cachea) y `self._data_generation()`.
+    No se cachean resultados vacíos, que también son los que devuelven los
+    métodos ante un error de conexión. Los resultados cacheados se comparten
+    entre llamadas, por lo que no deben modificarse.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'query_cache', None)
+        if cache is None:
+            return method(self, *args, **kwargs)
+        
+        try:
+            generation = cache.current_generation(self._data_generation)
+        except Exception as e:
+            print(f"Error leyendo generación de datos (sin caché): {str(e)}")
+            return method(self, *args, **kwargs)
+        
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        
+        hit, value = cache.get(key, generation)
+        if hit:
+            return value
+        
+        started = time.perf_counter()
+        value = method(self, *args, **kwargs)
+        if value:
+            cache.put(key, generation, value, time.perf_counter() - started)
+        
+        return value
+    
+    return wrapper
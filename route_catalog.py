@@ -0,0 +1,280 @@
+"""
+Catálogo de rutas monitoreadas y planificación de búsquedas
+
+Las rutas se definen en un archivo JSON (MONITOR_ROUTES_FILE, default
+`monitored_routes.json`) o en la tabla `monitored_routes` de la base. Cada
+ruta tiene:
+
+    {
+        "origin": "EZE",
+        "destination": "MIA",
+        "days_ahead": [30, 60],            # o 30, o {"from": 20, "to": 60, "step": 10}
+        "return_days": [7, 14],            # o 7, o null para solo ida
+        "adults": 1,
+        "priority": 10,                    # mayor = se busca primero
+        "target_price": 650,               # opcional: precio objetivo vigilado
+        "enabled": true
+    }
+
+`plan_jobs` expande cada ruta en búsquedas concretas (una por combinación de
+anticipación y duración de estadía), con las fechas calculadas para hoy.
+
+Uso desde la línea de comandos:
+    python route_catalog.py --file monitored_routes.json          # validar y planificar
+    python route_catalog.py --file monitored_routes.json --import # copiar a la base
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from airports import AirportIndex
+
+DEFAULT_ROUTES_FILE = 'monitored_routes.json'
+
+# Rutas que monitoreaba el script antes del catálogo (sin archivo ni tabla)
+DEFAULT_ROUTES = [
+    {'origin': 'EZE', 'destination': 'MIA', 'days_ahead': 30, 'return_days': 7},
+    {'origin': 'EZE', 'destination': 'MAD', 'days_ahead': 45, 'return_days': 10},
+    {'origin': 'AEP', 'destination': 'SCL', 'days_ahead': 20, 'return_days': 5}
+]
+
+# Límites de la API de Amadeus para búsquedas
+MAX_DAYS_AHEAD = 360
+MAX_ADULTS = 9
+
+
+def _expand_days(value, allow_none: bool = False) -> List[Optional[int]]:
+    """
+    Normaliza una especificación de días a una lista ordenada sin duplicados
+    
+    Acepta un entero, una lista de enteros o un rango {"from", "to", "step"}.
+    """
+    if value is None:
+        return [None] if allow_none else []
+    if isinstance(value, dict):
+        step = int(value.get('step', 1))
+        if step <= 0:
+            raise ValueError(f"step debe ser positivo: {value}")
+        return list(range(int(value['from']), int(value['to']) + 1, step))
+    if isinstance(value, (list, tuple)):
+        days = sorted({int(v) for v in value if v is not None})
+        if allow_none and (not days or None in value):
+            days.append(None)
+        return days
+    return [int(value)]
+
+
+def normalize_route(entry: Dict) -> Dict:
+    """
+    Completa una ruta con los valores por defecto y normaliza sus campos
+    
+    Args:
+        entry: Ruta tal como viene del archivo o de la tabla
+    
+    Returns:
+        Ruta con origin, destination, days_ahead (lista), return_days (lista,
+        [None] para solo ida), adults, priority, target_price (o None) y enabled
+    
+    Raises:
+        ValueError: Si un campo tiene un formato inválido
+    """
+    return {
+        'origin': str(entry.get('origin', '')).strip().upper(),
+        'destination': str(entry.get('destination', '')).strip().upper(),
+        'days_ahead': _expand_days(entry.get('days_ahead', 30)),
+        'return_days': _expand_days(entry.get('return_days', 7), allow_none=True),
+        'adults': int(entry.get('adults') or 1),
+        'priority': int(entry.get('priority') or 0),
+        'target_price': float(entry['target_price']) if entry.get('target_price') is not None else None,
+        'enabled': bool(entry.get('enabled', True))
+    }
+
+
+def validate_routes(
+    entries: Iterable[Dict],
+    airport_index: Optional[AirportIndex] = None
+) -> Tuple[List[Dict], List[str]]:
+    """
+    Normaliza y valida las rutas contra el índice de aeropuertos
+    
+    Las rutas deshabilitadas se descartan sin error; las duplicadas
+    (mismo origen, destino y adultos) se combinan con la última definición.
+    
+    Args:
+        entries: Rutas sin normalizar
+        airport_index: Índice de aeropuertos (default `AirportIndex.load()`)
+    
+    Returns:
+        Tupla (rutas válidas, mensajes de error de las rutas descartadas)
+    """
+    if airport_index is None:
+        airport_index = AirportIndex.load()
+    valid: Dict[Tuple[str, str, int], Dict] = {}
+    errors = []
+    
+    for position, entry in enumerate(entries, 1):
+        try:
+            route = normalize_route(entry)
+        except (TypeError, ValueError, KeyError) as e:
+            errors.append(f"Ruta {position}: formato inválido ({e})")
+            continue
+        
+        if not route['enabled']:
+            continue
+        
+        label = f"Ruta {position} ({route['origin']}-{route['destination']})"
+        if not airport_index.is_valid(route['origin']):
+            errors.append(f"{label}: origen desconocido")
+        elif not airport_index.is_valid(route['destination']):
+            errors.append(f"{label}: destino desconocido")
+        elif route['origin'] == route['destination']:
+            errors.append(f"{label}: origen y destino iguales")
+        elif not route['days_ahead'] or not all(1 <= d <= MAX_DAYS_AHEAD for d in route['days_ahead']):
+            errors.append(f"{label}: days_ahead debe estar entre 1 y {MAX_DAYS_AHEAD}")
+        elif any(r is not None and r < 1 for r in route['return_days']):
+            errors.append(f"{label}: return_days debe ser positivo")
+        elif not 1 <= route['adults'] <= MAX_ADULTS:
+            errors.append(f"{label}: adults debe estar entre 1 y {MAX_ADULTS}")
+        else:
+            valid[(route['origin'], route['destination'], route['adults'])] = route
+    
+    return list(valid.values()), errors
+
+
+def plan_jobs(routes: Iterable[Dict], today: Optional[date] = None) -> List[Dict]:
+    """
+    Expande las rutas validadas en búsquedas concretas
+    
+    Args:
+        routes: Rutas normalizadas (salida de `validate_routes`)
+        today: Fecha base (default hoy)
+    
+    Returns:
+        Lista de búsquedas con origin, destination, departure_date,
+        return_date (None si es solo ida), adults, priority y target_price,
+        más days_ahead y return_days (la ventana relativa, estable entre
+        días), ordenada por prioridad descendente
+    """
+    today = today or date.today()
+    # Las mismas anticipaciones se repiten en miles de rutas: formatear una vez
+    dates: Dict[int, str] = {}
+    
+    def day(offset: int) -> str:
+        text = dates.get(offset)
+        if text is None:
+            text = dates[offset] = (today + timedelta(days=offset)).isoformat()
+        return text
+    
+    jobs = []
+    for route in routes:
+        for days_ahead in route['days_ahead']:
+            departure_date = day(days_ahead)
+            for return_days in route['return_days']:
+                jobs.append({
+                    'origin': route['origin'],
+                    'destination': route['destination'],
+                    'departure_date': departure_date,
+                    'return_date': day(days_ahead + return_days) if return_days else None,
+                    'adults': route['adults'],
+                    'priority': route['priority'],
+                    'target_price': route['target_price'],
+                    'days_ahead': days_ahead,
+                    'return_days': return_days
+                })
+    
+    jobs.sort(key=lambda job: -job['priority'])
+    return jobs
+
+
+def load_routes_file(path: str) -> List[Dict]:
+    """
+    Lee las rutas de un archivo JSON
+    
+    Args:
+        path: Archivo con una lista de rutas o un objeto {"routes": [...]}
+    
+    Returns:
+        Lista de rutas sin normalizar
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['routes'] if isinstance(data, dict) else data
+
+
+def load_route_catalog(
+    db=None,
+    path: Optional[str] = None,
+    airport_index: Optional[AirportIndex] = None
+) -> Tuple[List[Dict], List[str], str]:
+    """
+    Carga y valida las rutas a monitorear
+    
+    Orden de precedencia: tabla `monitored_routes` (si tiene rutas
+    habilitadas), archivo JSON (si existe) y por último `DEFAULT_ROUTES`.
+    
+    Args:
+        db: Instancia de base de datos (opcional)
+        path: Archivo de rutas (default MONITOR_ROUTES_FILE o monitored_routes.json)
+        airport_index: Índice de aeropuertos (default `AirportIndex.load()`)
+    
+    Returns:
+        Tupla (rutas válidas, errores, origen de las rutas)
+    """
+    path = path or os.getenv('MONITOR_ROUTES_FILE', DEFAULT_ROUTES_FILE)
+    
+    entries, source = [], ''
+    if db is not None:
+        entries, source = db.get_monitored_routes(), 'tabla monitored_routes'
+    if not entries and os.path.exists(path):
+        entries, source = load_routes_file(path), path
+    if not entries:
+        entries, source = DEFAULT_ROUTES, 'rutas por defecto'
+    
+    routes, errors = validate_routes(entries, airport_index)
+    return routes, errors, source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valida y planifica el catálogo de rutas")
+    parser.add_argument('--file', default=os.getenv('MONITOR_ROUTES_FILE', DEFAULT_ROUTES_FILE),
+                        help="Archivo JSON de rutas")
+    parser.add_argument('--import', dest='import_routes', action='store_true',
+                        help="Copiar las rutas válidas a la tabla monitored_routes")
+    args = parser.parse_args()
+    
+    try:
+        started = time.perf_counter()
+        airport_index = AirportIndex.load()
+        index_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        routes, errors = validate_routes(load_routes_file(args.file), airport_index)
+        jobs = plan_jobs(routes)
+        plan_seconds = time.perf_counter() - started
+        
+        print(f"Índice de aeropuertos: {airport_index.source} ({len(airport_index)} aeropuertos, "
+              f"{index_seconds * 1000:.0f} ms)")
+        print(f"✅ {len(routes)} rutas válidas → {len(jobs)} búsquedas ({plan_seconds * 1000:.0f} ms)")
+        for error in errors:
+            print(f"   ⚠️  {error}")
+        
+        if args.import_routes:
+            from storage import create_database
+            with create_database(os.environ) as db:
+                saved = db.upsert_monitored_routes(routes)
+            print(f"💾 {saved} rutas guardadas en monitored_routes")
+        
+        return 0
+    
+    except Exception as e:
+        print(f"❌ Error cargando rutas: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Reporte estructurado y métricas de cada pasada del monitor
+
+Al terminar cada pasada, `monitor_script.py` escribe:
+
+- Un reporte JSON (MONITOR_REPORT_FILE, default `monitor_report.json`) con
+  los totales, la cuota de la API, las estadísticas del pipeline y, por
+  cada búsqueda, tiempos, código HTTP, ofertas encontradas, filas escritas
+  y ofertas sin cambios (con change_only solo actualizan `last_seen`)
+- Un snapshot en formato de texto de Prometheus (MONITOR_METRICS_FILE,
+  default `monitor_metrics.prom`) para el textfile collector de
+  node_exporter o para subirlo como artefacto
+- Los totales en `monitor_runs` (duración, llamadas, ofertas, cambios y el
+  reporte sin el detalle por búsqueda), para graficar el historial
+
+Una cadena vacía en MONITOR_REPORT_FILE o MONITOR_METRICS_FILE desactiva
+ese archivo.
+"""
+
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Límites de los buckets del histograma de latencia de la API (segundos)
+FETCH_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 15.0)
+
+
+def build_run_report(
+    summary: Dict,
+    jobs: List[Dict],
+    started_at: datetime,
+    finished_at: datetime,
+    status: str,
+    host: Optional[str] = None,
+    cache_stats: Optional[Dict] = None
+) -> Dict:
+    """
+    Arma el reporte de una pasada del monitor
+    
+    Args:
+        summary: Resumen de `run_monitor_cycle`
+        jobs: Registros por búsqueda de `ScanPipeline.run`
+        started_at: Inicio de la pasada
+        finished_at: Fin de la pasada
+        status: Estado con que se cerró la ejecución
+        host: Identificador del proceso
+        cache_stats: Métricas de la caché de consultas (ver `Database.cache_stats`)
+    
+    Returns:
+        Diccionario serializable a JSON
+    """
+    fetch_times = sorted(job['fetch_seconds'] for job in jobs)
+    http_statuses = defaultdict(int)
+    for job in jobs:
+        http_statuses[str(job['http_status']) if job['http_status'] is not None else 'none'] += 1
+    
+    quota = summary.get('quota') or {}
+    report = {
+        'run_id': summary.get('run_id'),
+        'status': status,
+        'resumed': summary.get('resumed', False),
+        'host': host,
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'finished_at': finished_at.isoformat(timespec='seconds'),
+        'duration_seconds': round((finished_at - started_at).total_seconds(), 3),
+        'totals': {
+            'routes': summary.get('routes', 0),
+            'jobs': summary.get('jobs', 0),
+            'searches': summary.get('searches', 0),
+            'errors': summary.get('errors', 0),
+            'skipped': summary.get('skipped', 0),
+            'deferred': summary.get('deferred', 0),
+            'quota_skipped': summary.get('quota_skipped', 0),
+            'api_calls': len(jobs),
+            'offers_found': sum(job['offers_found'] for job in jobs),
+            'offers_saved': summary.get('offers_saved', 0),
+            'unchanged': sum(job['unchanged'] for job in jobs),
+            'changes': summary.get('changes', 0),
+            'price_alerts': summary.get('price_alerts', 0),
+            'price_anomalies': summary.get('price_anomalies', 0)
+        },
+        'http_statuses': dict(http_statuses),
+        'fetch_seconds': {
+            'p50': _percentile(fetch_times, 0.5),
+            'p95': _percentile(fetch_times, 0.95),
+            'max': fetch_times[-1] if fetch_times else None
+        },
+        'quota': {key: quota.get(key) for key in ('limit', 'used', 'remaining', 'projected', 'forecast',
+                                                  'allowed', 'reasons')} if quota else None,
+        'notifications': summary.get('notifications'),
+        'pipeline': summary.get('pipeline'),
+        'query_cache': cache_stats or None,
+        'jobs': jobs
+    }
+    # Redondeos y tipos de la base (Decimal, date) a JSON plano
+    return json.loads(json.dumps(report, default=str))
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Percentil por rango más cercano de una lista ordenada (None si está vacía)"""
+    if not values:
+        return None
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def render_metrics(report: Dict) -> str:
+    """
+    Métricas de una pasada en formato de texto de Prometheus
+    
+    Args:
+        report: Reporte de `build_run_report`
+    
+    Returns:
+        Texto con gauges de totales, histograma de latencia de la API y
+        contadores por ruta
+    """
+    lines = []
+    
+    def metric(name: str, kind: str, help_text: str, samples):
+        lines.append(f"# HELP flight_monitor_{name} {help_text}")
+        lines.append(f"# TYPE flight_monitor_{name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"flight_monitor_{name}{{{label_text}}} {value}" if label_text
+                         else f"flight_monitor_{name} {value}")
+    
+    finished = datetime.fromisoformat(report['finished_at'])
+    metric('last_run_timestamp_seconds', 'gauge', "Fin de la última pasada",
+           [({}, f"{finished.timestamp():.0f}")])
+    metric('last_run_duration_seconds', 'gauge', "Duración de la última pasada",
+           [({}, report['duration_seconds'])])
+    metric('last_run_completed', 'gauge', "1 si la última pasada terminó todas sus búsquedas",
+           [({}, int(report['status'] == 'completed'))])
+    for name, value in report['totals'].items():
+        metric(f"last_run_{name}", 'gauge', f"Total de {name} en la última pasada", [({}, value)])
+    
+    if report['quota'] and report['quota']['remaining'] is not None:
+        metric('api_quota_remaining', 'gauge', "Llamadas restantes de la cuota mensual",
+               [({}, report['quota']['remaining'])])
+    
+    notifications = report.get('notifications')
+    if notifications:
+        channels = sorted(notifications['channels'].items())
+        metric('last_run_notifications_sent', 'gauge', "Resúmenes de alertas enviados por canal",
+               [({'channel': name}, channel['sent']) for name, channel in channels])
+        metric('last_run_notifications_failed', 'gauge', "Envíos de alertas fallidos por canal",
+               [({'channel': name}, channel['failed']) for name, channel in channels])
+        if notifications['latency_seconds']:
+            metric('last_run_alert_latency_seconds', 'gauge',
+                   "Latencia de las alertas desde el disparo hasta la entrega",
+                   [({'quantile': key}, notifications['latency_seconds'][key]) for key in ('p50', 'p95', 'max')])
+    
+    metric('last_run_http_responses', 'gauge', "Respuestas de la API por código HTTP",
+           [({'code': code}, count) for code, count in sorted(report['http_statuses'].items())])
+    
+    # Histograma acumulado de la latencia de las llamadas a la API
+    jobs = report['jobs']
+    buckets = [({'le': str(bound)}, sum(1 for job in jobs if job['fetch_seconds'] <= bound))
+               for bound in FETCH_BUCKETS]
+    buckets.append(({'le': '+Inf'}, len(jobs)))
+    lines.append("# HELP flight_monitor_last_run_fetch_seconds Latencia de las búsquedas en la API")
+    lines.append("# TYPE flight_monitor_last_run_fetch_seconds histogram")
+    for labels, count in buckets:
+        lines.append(f'flight_monitor_last_run_fetch_seconds_bucket{{le="{labels["le"]}"}} {count}')
+    lines.append(f"flight_monitor_last_run_fetch_seconds_sum {sum(job['fetch_seconds'] for job in jobs):.4f}")
+    lines.append(f"flight_monitor_last_run_fetch_seconds_count {len(jobs)}")
+    
+    routes = defaultdict(lambda: {'searches': 0, 'errors': 0, 'offers_found': 0, 'offers_saved': 0})
+    for job in jobs:
+        route = routes[(job['origin'], job['destination'])]
+        route['searches'] += 1
+        route['errors'] += int(job['status'] == 'failed')
+        route['offers_found'] += job['offers_found']
+        route['offers_saved'] += job['offers_saved']
+    for name in ('searches', 'errors', 'offers_found', 'offers_saved'):
+        metric(f"last_run_route_{name}", 'gauge', f"{name} por ruta en la última pasada",
+               [({'origin': origin, 'destination': destination}, totals[name])
+                for (origin, destination), totals in sorted(routes.items())])
+    
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: str, text: str):
+    """Escribe un archivo de forma atómica (quien lo lee nunca ve uno a medias)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def write_run_outputs(report: Dict, config=None) -> List[str]:
+    """
+    Escribe el reporte JSON y el snapshot de métricas
+    
+    Args:
+        report: Reporte de `build_run_report`
+        config: Mapeo con MONITOR_REPORT_FILE y MONITOR_METRICS_FILE
+            (default `os.environ`)
+    
+    Returns:
+        Rutas de los archivos escritos
+    """
+    config = config if config is not None else os.environ
+    written = []
+    
+    report_file = config.get('MONITOR_REPORT_FILE', 'monitor_report.json')
+    metrics_file = config.get('MONITOR_METRICS_FILE', 'monitor_metrics.prom')
+    
+    try:
+        if report_file:
+            _write_atomic(report_file, json.dumps(report, indent=2, ensure_ascii=False))
+            written.append(report_file)
+        if metrics_file:
+            _write_atomic(metrics_file, render_metrics(report))
+            written.append(metrics_file)
+    except Exception as e:
+        print(f"Error escribiendo el reporte de la pasada: {str(e)}")
+    
+    return written
+
+
+def history_metrics(report: Dict) -> Dict:
+    """Métricas de la pasada para `finish_monitor_run` (el reporte sin el detalle por búsqueda)"""
+    return {
+        'duration_seconds': report['duration_seconds'],
+        'api_calls': report['totals']['api_calls'],
+        'changes': report['totals']['changes'],
+        'report': {key: value for key, value in report.items() if key != 'jobs'}
+    }
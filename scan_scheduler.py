@@ -0,0 +1,322 @@
+"""
+Planificador adaptativo de búsquedas del monitor
+
+En lugar de buscar todas las rutas en cada ejecución, cada búsqueda del
+catálogo (ruta + ventana de anticipación/estadía) tiene un próximo horario
+de escaneo según su valor esperado:
+
+    score = tasa de cambios × urgencia × cercanía al precio objetivo × prioridad
+
+- tasa de cambios: promedio exponencial de si el escaneo anterior detectó un
+  cambio de precio (las búsquedas nuevas heredan la tasa de su ruta)
+- urgencia: crece a medida que se acerca la fecha de salida
+- precio objetivo: si el último precio está a menos de 15% del objetivo
+  vigilado, la búsqueda se escanea hasta 3 veces más seguido
+
+El intervalo hasta el próximo escaneo es `base_interval / score`, acotado
+entre `min_interval` y `max_interval`. En cada ejecución se ordenan las
+búsquedas vencidas por score (más un factor por atraso, para que ninguna
+quede postergada indefinidamente) y se gasta el presupuesto de llamadas
+(MONITOR_API_BUDGET) en las de mayor valor. El estado se guarda en la tabla
+`route_schedule`.
+
+Simulación contra el escaneo uniforme:
+    python scan_scheduler.py --simulate --routes 300 --budget 40 --days 14
+"""
+
+import argparse
+import math
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Distancia relativa al precio objetivo a partir de la cual se acelera el escaneo
+TARGET_PROXIMITY = 0.15
+
+
+class ScanScheduler:
+    """Asigna próximos escaneos y elige las búsquedas de mayor valor por ejecución"""
+    
+    def __init__(
+        self,
+        base_interval_hours: float = 6.0,
+        min_interval_hours: float = 1.0,
+        max_interval_hours: float = 48.0,
+        smoothing: float = 0.3,
+        prior_rate: float = 0.5
+    ):
+        """
+        Inicializa el planificador
+        
+        Args:
+            base_interval_hours: Intervalo de una búsqueda con score 1
+            min_interval_hours: Intervalo mínimo entre escaneos de una búsqueda
+            max_interval_hours: Intervalo máximo (las rutas estables se
+                siguen escaneando al menos con esta frecuencia)
+            smoothing: Peso del último resultado en la tasa de cambios
+            prior_rate: Tasa de cambios supuesta para rutas sin historial
+        """
+        self.base_interval = timedelta(hours=base_interval_hours)
+        self.min_interval = timedelta(hours=min_interval_hours)
+        self.max_interval = timedelta(hours=max_interval_hours)
+        self.smoothing = smoothing
+        self.prior_rate = prior_rate
+    
+    @staticmethod
+    def job_key(job: Dict) -> Tuple:
+        """Clave estable de una búsqueda del catálogo (no depende de la fecha de hoy)"""
+        return (
+            job['origin'], job['destination'], int(job.get('adults', 1)),
+            int(job['days_ahead']), int(job.get('return_days') or 0)
+        )
+    
+    def score(self, job: Dict, change_rate: float, last_price: Optional[float]) -> float:
+        """
+        Valor esperado de escanear una búsqueda ahora
+        
+        Args:
+            job: Búsqueda planificada (ver `route_catalog.plan_jobs`)
+            change_rate: Probabilidad estimada de detectar un cambio de precio
+            last_price: Último precio mínimo observado (o None)
+        
+        Returns:
+            Score (1 equivale al intervalo base)
+        """
+        urgency = 1 + 2 / (1 + int(job['days_ahead']) / 7)
+        
+        target_boost = 1.0
+        target = job.get('target_price')
+        if target and last_price is not None:
+            gap = (float(last_price) - float(target)) / float(target)
+            target_boost = 1 + 2 * max(0.0, min(1.0, 1 - gap / TARGET_PROXIMITY))
+        
+        priority = 1 + max(int(job.get('priority') or 0), 0) / 10
+        
+        return max(change_rate, 0.01) * urgency * target_boost * priority
+    
+    def interval(self, score: float) -> timedelta:
+        """Intervalo hasta el próximo escaneo para un score"""
+        interval = self.base_interval / max(score, 1e-6)
+        return max(self.min_interval, min(self.max_interval, interval))
+    
+    def _route_rates(self, states: Iterable[Dict]) -> Dict[Tuple[str, str], float]:
+        """Tasa de cambios promedio por ruta (para búsquedas sin historial)"""
+        totals = defaultdict(lambda: [0.0, 0])
+        for state in states:
+            total = totals[(state['origin'], state['destination'])]
+            total[0] += float(state['change_rate'])
+            total[1] += 1
+        return {route: rate / count for route, (rate, count) in totals.items()}
+    
+    def plan(
+        self,
+        jobs: List[Dict],
+        schedule: List[Dict],
+        budget: int,
+        now: Optional[datetime] = None
+    ) -> Tuple[List[Dict], Dict]:
+        """
+        Elige las búsquedas a ejecutar en esta corrida
+        
+        Args:
+            jobs: Búsquedas del catálogo
+            schedule: Filas de `route_schedule` (ver `Database.get_route_schedule`)
+            budget: Máximo de búsquedas (llamadas a la API) de esta corrida
+            now: Momento de la planificación (default ahora)
+        
+        Returns:
+            Tupla (búsquedas elegidas, ordenadas por valor, con `score` y
+            `change_rate` agregados; resumen con due, selected, deferred y
+            not_due)
+        """
+        now = now or datetime.now()
+        states = {
+            (row['origin'], row['destination'], int(row['adults']),
+             int(row['days_ahead']), int(row['return_days'])): row
+            for row in schedule
+        }
+        route_rates = self._route_rates(schedule)
+        
+        candidates = []
+        not_due = 0
+        for job in jobs:
+            state = states.get(self.job_key(job))
+            if state is not None and state['next_scan_at'] > now:
+                not_due += 1
+                continue
+            
+            if state is not None:
+                rate = float(state['change_rate'])
+                last_price = state['last_price']
+            else:
+                rate = route_rates.get((job['origin'], job['destination']), self.prior_rate)
+                last_price = None
+            
+            score = self.score(job, rate, last_price)
+            value = score
+            if state is not None:
+                # Factor de atraso: una búsqueda postergada gana valor con el tiempo
+                overdue = (now - state['next_scan_at']) / self.interval(score)
+                value *= 1 + max(overdue, 0.0)
+            
+            candidates.append((value, dict(job, score=score, change_rate=rate)))
+        
+        candidates.sort(key=lambda candidate: -candidate[0])
+        selected = [job for _, job in candidates[:max(budget, 0)]]
+        
+        return selected, {
+            'due': len(candidates),
+            'selected': len(selected),
+            'deferred': len(candidates) - len(selected),
+            'not_due': not_due
+        }
+    
+    def record(
+        self,
+        job: Dict,
+        state: Optional[Dict],
+        min_price: Optional[float],
+        changed: bool,
+        now: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Calcula el nuevo estado de una búsqueda después de escanearla
+        
+        Args:
+            job: Búsqueda ejecutada
+            state: Fila previa de `route_schedule` (o None)
+            min_price: Precio mínimo encontrado (None si no hubo ofertas)
+            changed: Si el escaneo detectó un cambio de precio/disponibilidad
+            now: Momento del escaneo (default ahora)
+        
+        Returns:
+            Fila para `Database.record_route_scans`
+        """
+        now = now or datetime.now()
+        if state:
+            previous_rate = float(state['change_rate'])
+        else:
+            previous_rate = float(job['change_rate']) if job.get('change_rate') is not None else self.prior_rate
+        rate = (1 - self.smoothing) * previous_rate + self.smoothing * (1.0 if changed else 0.0)
+        
+        last_price = min_price if min_price is not None else (state['last_price'] if state else None)
+        score = self.score(job, rate, last_price)
+        
+        origin, destination, adults, days_ahead, return_days = self.job_key(job)
+        return {
+            'origin': origin,
+            'destination': destination,
+            'adults': adults,
+            'days_ahead': days_ahead,
+            'return_days': return_days,
+            'next_scan_at': now + self.interval(score),
+            'last_scan_at': now,
+            'scans': (int(state['scans']) if state else 0) + 1,
+            'changes': (int(state['changes']) if state else 0) + int(changed),
+            'change_rate': rate,
+            'last_price': last_price,
+            'score': score
+        }
+
+
+def _simulated_jobs(routes: int, rng: random.Random) -> Tuple[List[Dict], Dict[Tuple, float]]:
+    """Búsquedas sintéticas con una tasa real de cambios por hora (pocas muy volátiles)"""
+    jobs, hourly_rates = [], {}
+    for index in range(routes):
+        job = {
+            'origin': f"R{index}",
+            'destination': 'SIM',
+            'adults': 1,
+            'days_ahead': rng.choice([7, 14, 30, 60, 90]),
+            'return_days': 7,
+            'priority': 0,
+            'target_price': None
+        }
+        jobs.append(job)
+        # Cambios por hora: la mayoría de las rutas casi no se mueven
+        hourly_rates[ScanScheduler.job_key(job)] = rng.betavariate(0.4, 4.0) * (1.5 if job['days_ahead'] <= 14 else 0.5)
+    return jobs, hourly_rates
+
+
+def simulate(routes: int = 300, budget: int = 40, days: int = 14, run_hours: float = 2.0,
+             seed: int = 7) -> Dict[str, Dict]:
+    """
+    Compara cambios detectados por llamada: escaneo uniforme vs adaptativo
+    
+    Los cambios de precio de cada búsqueda siguen un proceso de Poisson con
+    su propia tasa; un escaneo detecta un cambio si hubo al menos uno desde
+    el escaneo anterior de esa búsqueda.
+    
+    Returns:
+        Diccionario {'flat': {...}, 'adaptive': {...}} con calls, changes y
+        changes_per_call
+    """
+    rng = random.Random(seed)
+    jobs, hourly_rates = _simulated_jobs(routes, rng)
+    start = datetime(2025, 1, 1)
+    runs = int(days * 24 / run_hours)
+    results = {}
+    
+    for policy in ('flat', 'adaptive'):
+        scheduler = ScanScheduler()
+        outcome_rng = random.Random(seed + 1)
+        last_scan = {ScanScheduler.job_key(job): start for job in jobs}
+        schedule: Dict[Tuple, Dict] = {}
+        cursor = 0
+        calls = changes = 0
+        
+        for run in range(runs):
+            now = start + timedelta(hours=run * run_hours)
+            if policy == 'flat':
+                selected = [jobs[(cursor + i) % len(jobs)] for i in range(min(budget, len(jobs)))]
+                cursor += len(selected)
+            else:
+                selected, _ = scheduler.plan(jobs, list(schedule.values()), budget, now)
+            
+            for job in selected:
+                key = ScanScheduler.job_key(job)
+                hours = (now - last_scan[key]).total_seconds() / 3600
+                changed = outcome_rng.random() < 1 - math.exp(-hourly_rates[key] * hours)
+                last_scan[key] = now
+                calls += 1
+                changes += int(changed)
+                if policy == 'adaptive':
+                    schedule[key] = scheduler.record(job, schedule.get(key), 100.0, changed, now)
+        
+        results[policy] = {
+            'calls': calls,
+            'changes': changes,
+            'changes_per_call': changes / calls if calls else 0.0
+        }
+    
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planificador adaptativo de búsquedas")
+    parser.add_argument('--simulate', action='store_true', help="Comparar contra escaneo uniforme")
+    parser.add_argument('--routes', type=int, default=300, help="Búsquedas simuladas")
+    parser.add_argument('--budget', type=int, default=40, help="Llamadas por ejecución")
+    parser.add_argument('--days', type=int, default=14, help="Días simulados")
+    args = parser.parse_args()
+    
+    if not args.simulate:
+        parser.print_help()
+        return 0
+    
+    results = simulate(args.routes, args.budget, args.days)
+    for policy, label in (('flat', 'Uniforme'), ('adaptive', 'Adaptativo')):
+        result = results[policy]
+        print(f"{label:<12} {result['calls']:>6} llamadas  {result['changes']:>6} cambios  "
+              f"{result['changes_per_call']:.3f} cambios/llamada")
+    
+    flat = results['flat']['changes_per_call']
+    if flat:
+        print(f"\nMejora: {results['adaptive']['changes_per_call'] / flat:.2f}x cambios por llamada")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
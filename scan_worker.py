@@ -0,0 +1,392 @@
+"""
+Workers del monitor coordinados por una cola en PostgreSQL
+
+Un proceso productor planifica las búsquedas vencidas (catálogo de rutas +
+`ScanScheduler`) y las encola en la tabla `scan_jobs`; cualquier cantidad de
+workers (procesos, hilos o runners en distintas máquinas) las toman con
+`FOR UPDATE SKIP LOCKED`, de modo que nunca procesan la misma búsqueda dos
+veces y no se bloquean entre sí.
+
+Cada búsqueda tomada tiene una lease que el worker renueva en segundo plano;
+si el worker muere, la lease vence y otro worker la recupera
+(`reclaim_expired_scan_jobs`). Los errores se reintentan con espera creciente
+hasta `max_attempts`.
+
+Uso (ver `monitor_script.py`):
+    python monitor_script.py --enqueue               # productor
+    python monitor_script.py --worker --threads 4    # workers
+
+Requiere PostgreSQL: el backend SQLite no tiene cola de búsquedas.
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from api_quota import ApiQuota
+from route_catalog import load_route_catalog, plan_jobs
+from scan_scheduler import ScanScheduler
+
+
+def worker_identity(index: Optional[int] = None) -> str:
+    """Identificador único de un worker: host, PID y número de hilo"""
+    identity = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{identity}:{index}" if index is not None else identity
+
+
+def scan_job(
+    db,
+    amadeus,
+    job: Dict,
+    change_only: bool = True,
+    scheduler: Optional[ScanScheduler] = None,
+    state: Optional[Dict] = None
+) -> Dict:
+    """
+    Ejecuta una búsqueda: consulta la API, guarda las ofertas en un lote y
+    calcula el nuevo estado del planificador
+    
+    Si la búsqueda pertenece a una ejecución del monitor (`run_job_id`), el
+    lote y el checkpoint se guardan en la misma transacción.
+    
+    Args:
+        db: Instancia de base de datos
+        amadeus: Cliente con `search_flights` (ver `AmadeusClient`)
+        job: Búsqueda planificada
+        change_only: Guardar solo cambios de precio/disponibilidad
+        scheduler: Planificador (default `ScanScheduler()`)
+        state: Fila previa de `route_schedule` de la búsqueda (o None)
+    
+    Returns:
+        Diccionario con offers_found, offers_saved, min_price, changed y
+        schedule_row (fila para `record_route_scans`)
+    """
+    offers = amadeus.search_flights(
+        origin=job['origin'],
+        destination=job['destination'],
+        departure_date=job['departure_date'],
+        return_date=job['return_date'],
+        adults=job['adults'],
+        max_results=10
+    )
+    
+    # Guardar ofertas en la base de datos (un lote por búsqueda)
+    saved_count = db.insert_flight_offers(offer_rows(job, offers), change_only=change_only,
+                                          run_job_id=job.get('run_job_id'))
+    
+    return scan_outcome(job, offers, saved_count, change_only, scheduler, state)
+
+
+def offer_rows(job: Dict, offers: List[Dict]) -> List[Dict]:
+    """Filas para `insert_flight_offers` a partir de las ofertas procesadas de una búsqueda"""
+    return [
+        {
+            'origin': job['origin'],
+            'destination': job['destination'],
+            'departure_date': job['departure_date'],
+            'return_date': job['return_date'],
+            'adults': job['adults'],
+            'price': offer['price'],
+            'currency': offer['currency'],
+            'airline': offer.get('airline', 'N/A'),
+            'flight_data': offer
+        }
+        for offer in offers
+    ]
+
+
+def scan_outcome(
+    job: Dict,
+    offers: List[Dict],
+    saved_count: int,
+    change_only: bool = True,
+    scheduler: Optional[ScanScheduler] = None,
+    state: Optional[Dict] = None
+) -> Dict:
+    """
+    Resultado de una búsqueda ya guardada (ver `scan_job`)
+    
+    Returns:
+        Diccionario con offers_found, offers_saved, min_price, changed y
+        schedule_row
+    """
+    scheduler = scheduler or ScanScheduler()
+    
+    # Cambio detectado: filas nuevas con change_only, o nuevo precio mínimo
+    min_price = min((float(offer['price']) for offer in offers), default=None)
+    if change_only:
+        changed = saved_count > 0
+    else:
+        last_price = state['last_price'] if state else None
+        changed = min_price is not None and (last_price is None or abs(min_price - float(last_price)) >= 0.01)
+    
+    return {
+        'offers_found': len(offers),
+        'offers_saved': saved_count,
+        'min_price': min_price,
+        'changed': changed,
+        'schedule_row': scheduler.record(job, state, min_price, changed)
+    }
+
+
+def enqueue_due_jobs(
+    db,
+    budget: int,
+    scheduler: Optional[ScanScheduler] = None,
+    quota: Optional[ApiQuota] = None
+) -> Tuple[int, Dict]:
+    """
+    Productor: planifica las búsquedas vencidas de mayor valor y las encola
+    
+    Las búsquedas que ya están en la cola (pendientes o en curso) no se
+    vuelven a elegir, para no gastar el presupuesto en duplicados.
+    
+    Args:
+        db: Instancia de `Database` (PostgreSQL)
+        budget: Máximo de búsquedas a encolar
+        scheduler: Planificador (default `ScanScheduler()`)
+        quota: Cuota de la API; las búsquedas que no entran no se encolan
+    
+    Returns:
+        Tupla (búsquedas encoladas, resumen del planificador con routes,
+        jobs, queued, errors, quota (reporte de `ApiQuota.fit`, o None) y
+        quota_skipped además de los campos de `ScanScheduler.plan`)
+    """
+    scheduler = scheduler or ScanScheduler()
+    
+    routes, route_errors, _ = load_route_catalog(db)
+    jobs = plan_jobs(routes)
+    
+    active = set(db.get_active_scan_keys())
+    candidates = [job for job in jobs if ScanScheduler.job_key(job) not in active]
+    
+    selected, plan = scheduler.plan(candidates, db.get_route_schedule(), budget)
+    
+    quota_report, quota_skipped = None, []
+    if quota is not None:
+        # Las búsquedas ya encoladas cuentan contra la cuota aunque no se hayan hecho
+        selected, quota_skipped, quota_report = quota.fit(selected, reserved=len(active))
+    
+    enqueued = db.enqueue_scan_jobs(selected)
+    
+    plan.update(routes=len(routes), jobs=len(jobs), queued=len(active), errors=route_errors,
+                quota=quota_report, quota_skipped=quota_skipped)
+    return enqueued, plan
+
+
+class ScanWorker:
+    """Toma búsquedas de la cola `scan_jobs`, las ejecuta y registra el resultado"""
+    
+    def __init__(
+        self,
+        db,
+        amadeus,
+        worker_id: Optional[str] = None,
+        change_only: bool = True,
+        lease_seconds: int = 120,
+        scheduler: Optional[ScanScheduler] = None,
+        log: Callable[[str], None] = print,
+        quota: Optional[ApiQuota] = None
+    ):
+        """
+        Inicializa el worker
+        
+        Args:
+            db: Instancia de `Database` (puede compartirse entre workers)
+            amadeus: Cliente de la API (uno por worker)
+            worker_id: Identificador único (default host:pid)
+            change_only: Guardar solo cambios de precio/disponibilidad
+            lease_seconds: Duración de la lease; se renueva cada tercio
+            scheduler: Planificador para el estado de `route_schedule`
+            log: Función para los mensajes de progreso
+            quota: Cuota donde registrar las llamadas a la API (None no
+                registra, por ejemplo con un cliente simulado)
+        """
+        if not getattr(db, 'supports_job_queue', False):
+            raise RuntimeError("La cola de búsquedas requiere PostgreSQL (DB_BACKEND = \"postgres\")")
+        
+        self.db = db
+        self.amadeus = amadeus
+        self.worker_id = worker_id or worker_identity()
+        self.change_only = change_only
+        self.lease_seconds = lease_seconds
+        self.scheduler = scheduler or ScanScheduler()
+        self.log = log
+        self.quota = quota
+        
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_reclaim = float('-inf')
+        self.stats = {'claimed': 0, 'done': 0, 'failed': 0, 'lost': 0, 'reclaimed': 0,
+                      'offers_saved': 0, 'changes': 0}
+    
+    def stop(self):
+        """Pide al worker que termine después de la búsqueda en curso"""
+        self._stop.set()
+    
+    def _heartbeat_loop(self):
+        """Renueva las leases de las búsquedas en curso hasta que el worker termina"""
+        interval = max(self.lease_seconds / 3, 1.0)
+        while not self._stop.wait(interval):
+            with self._held_lock:
+                job_ids = list(self._held)
+            if not job_ids:
+                continue
+            try:
+                # Las que ya no devuelve fueron recuperadas por otro worker;
+                # `complete_scan_job` lo detecta al terminar
+                self.db.heartbeat_scan_jobs(self.worker_id, job_ids, self.lease_seconds)
+            except Exception:
+                continue
+    
+    def _reclaim(self):
+        """Recupera búsquedas con lease vencida (a lo sumo cada media lease)"""
+        now = time.monotonic()
+        if now - self._last_reclaim < self.lease_seconds / 2:
+            return
+        self._last_reclaim = now
+        reclaimed = self.db.reclaim_expired_scan_jobs()
+        if reclaimed:
+            self.stats['reclaimed'] += reclaimed
+            self.log(f"♻️  {reclaimed} búsquedas con lease vencida vuelven a la cola")
+    
+    def process(self, job: Dict):
+        """Ejecuta una búsqueda tomada de la cola y registra su resultado"""
+        states = self.db.get_route_schedule(job['origin'], job['destination'])
+        key = ScanScheduler.job_key(job)
+        state = next((row for row in states if ScanScheduler.job_key(row) == key), None)
+        
+        try:
+            outcome = scan_job(self.db, self.amadeus, job, self.change_only, self.scheduler, state)
+        except Exception as e:
+            self.db.fail_scan_job(job['id'], self.worker_id, str(e))
+            self.stats['failed'] += 1
+            self.log(f"   ❌ {job['origin']}-{job['destination']} (intento {job['attempts']}): {str(e)}")
+            return
+        finally:
+            # Los intentos fallidos también consumen cuota de la API
+            if self.quota is not None:
+                self.quota.record(1, 'monitor')
+        
+        if not self.db.complete_scan_job(job['id'], self.worker_id, outcome['offers_found'],
+                                         outcome['offers_saved'], outcome['min_price'], outcome['changed']):
+            # La lease venció y otro worker la tomó: las ofertas ya quedaron
+            # guardadas (change_only las deduplica), solo se descarta el estado
+            self.stats['lost'] += 1
+            return
+        
+        self.db.record_route_scans([outcome['schedule_row']])
+        self.stats['done'] += 1
+        self.stats['offers_saved'] += outcome['offers_saved']
+        self.stats['changes'] += int(outcome['changed'])
+        self.log(f"   ✅ {job['origin']} → {job['destination']} ({job['departure_date']}): "
+                 f"{outcome['offers_saved']} ofertas guardadas")
+    
+    def run(self, max_jobs: Optional[int] = None, forever: bool = False, idle_sleep: float = 10.0) -> Dict:
+        """
+        Procesa búsquedas de la cola
+        
+        Args:
+            max_jobs: Máximo de búsquedas a procesar (None sin límite)
+            forever: Seguir esperando búsquedas nuevas cuando la cola está
+                vacía (si no, termina al vaciarse)
+            idle_sleep: Segundos de espera con la cola vacía
+        
+        Returns:
+            Estadísticas del worker (claimed, done, failed, lost, reclaimed,
+            offers_saved, changes)
+        """
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name=f"heartbeat-{self.worker_id}",
+                                     daemon=True)
+        heartbeat.start()
+        
+        try:
+            while not self._stop.is_set():
+                if max_jobs is not None and self.stats['claimed'] >= max_jobs:
+                    break
+                
+                try:
+                    self._reclaim()
+                    jobs = self.db.claim_scan_jobs(self.worker_id, 1, self.lease_seconds)
+                except Exception as e:
+                    # Base caída momentáneamente: un worker permanente reintenta
+                    if not forever:
+                        raise
+                    self.log(f"⚠️  Error leyendo la cola de búsquedas: {str(e)}")
+                    self._stop.wait(idle_sleep)
+                    continue
+                
+                if not jobs:
+                    if not forever:
+                        break
+                    self._stop.wait(idle_sleep)
+                    continue
+                
+                job = jobs[0]
+                self.stats['claimed'] += 1
+                with self._held_lock:
+                    self._held.add(job['id'])
+                try:
+                    self.process(job)
+                finally:
+                    with self._held_lock:
+                        self._held.discard(job['id'])
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            # Si se interrumpió en medio de una búsqueda, devolverla a la cola
+            self.db.release_scan_jobs(self.worker_id)
+        
+        return self.stats
+
+
+def run_workers(
+    db,
+    amadeus_factory: Callable[[], object],
+    threads: int = 1,
+    change_only: bool = True,
+    lease_seconds: int = 120,
+    quota: Optional[ApiQuota] = None,
+    **options
+) -> List[Dict]:
+    """
+    Ejecuta varios workers en hilos de este proceso compartiendo el pool de `db`
+    
+    Args:
+        db: Instancia de `Database` (con max_connections >= threads + 1)
+        amadeus_factory: Crea un cliente de la API por worker
+        threads: Número de workers
+        change_only: Guardar solo cambios de precio/disponibilidad
+        lease_seconds: Duración de la lease de cada búsqueda
+        quota: Cuota donde registrar las llamadas a la API (ver `ScanWorker`)
+        **options: Argumentos de `ScanWorker.run` (max_jobs, forever, idle_sleep)
+    
+    Returns:
+        Estadísticas de cada worker
+    """
+    workers = [
+        ScanWorker(db, amadeus_factory(), worker_identity(index), change_only, lease_seconds, quota=quota)
+        for index in range(threads)
+    ]
+    results: List[Dict] = [{} for _ in workers]
+    
+    def target(index: int):
+        results[index] = workers[index].run(**options)
+    
+    pool = [threading.Thread(target=target, args=(index,), name=workers[index].worker_id)
+            for index in range(threads)]
+    try:
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
+        for thread in pool:
+            thread.join()
+    
+    return results
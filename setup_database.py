@@ -43,15 +43,25 @@ def main():
         print("Puedes ejecutar ahora: streamlit run app.py")
         print()
         
+        # Mover raw_data de registros antiguos a la tabla deduplicada
+        migrated = db.migrate_raw_payloads()
+        if migrated:
+            print(f"Payloads migrados a flight_payloads: {migrated}")
+        
+        # Completar columnas tipadas (escalas, duración, horarios) de registros antiguos
+        backfilled = db.backfill_typed_columns()
+        if backfilled:
+            print(f"Registros con columnas tipadas completadas: {backfilled}")
+        
+        # Sketches de percentiles de precio desde el histórico (instalaciones anteriores)
+        sketched = db.backfill_price_sketches()
+        if sketched:
+            print(f"Sketches de percentiles armados desde el histórico: {sketched}")
+        
         # Mostrar estadísticas si hay datos
-        try:
-            import psycopg2
-            with db.conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM flight_searches")
-                count = cur.fetchone()[0]
-                print(f"Registros existentes en la base: {count}")
-        except:
-            pass
+        summary = db.get_database_summary()
+        if summary:
+            print(f"Registros existentes en la base: {summary['search_count']}")
         
         db.close()
         return 0
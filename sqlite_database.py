@@ -0,0 +1,2023 @@
+import queue
+import sqlite3
+import threading
+import time as time_module
+from contextlib import contextmanager
+from datetime import datetime, timedelta, date, time
+from typing import List, Dict, Iterator, Optional, Tuple, Union
+import json
+from flight_records import join_raw_payload, prepare_offer, typed_attributes
+from price_anomalies import detect as detect_anomalies, series_key
+from price_watches import best_observations, evaluate_matches, normalize_watch, window_start
+from quantile_sketch import (
+    ALL_AIRLINES, DEFAULT_QUANTILES, KLLSketch, build_sketches, merge_all, sketch_groups, summarize
+)
+from query_cache import QueryCache, cached_query
+from write_queue import WriteBehindQueue
+
+# Conversores explícitos para columnas declaradas DATE / TIMESTAMP
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()[:10]))
+
+
+def _time_of_day(value: Union[str, time]) -> str:
+    """Normaliza una hora ('HH:MM', 'HH:MM:SS' o time) a 'HH:MM:SS'"""
+    text = value.strftime('%H:%M:%S') if isinstance(value, time) else str(value)
+    return text if len(text) >= 8 else f"{text}:00"
+
+
+class SQLiteDatabase:
+    """
+    Backend embebido (archivo SQLite) con la misma API que `Database`
+    
+    Permite ejecutar la app, el monitor o pruebas locales sin un servidor
+    PostgreSQL. Se selecciona con `DB_BACKEND = "sqlite"` (ver `storage.py`).
+    
+    No incluye la cola de búsquedas de los workers (`scan_jobs`): SQLite no
+    tiene `FOR UPDATE SKIP LOCKED` y serializa las escrituras, así que el
+    monitor con este backend se ejecuta en un solo proceso.
+    """
+    
+    # Ver scan_worker.py: los workers necesitan PostgreSQL
+    supports_job_queue = False
+    
+    def __init__(
+        self,
+        path: str,
+        cache_max_mb: float = 32,
+        max_connections: int = 5,
+        statement_timeout_ms: int = 30000,
+        pool_timeout: float = 30.0
+    ):
+        """
+        Inicializa la base de datos embebida
+        
+        Las conexiones se reutilizan desde un pool acotado y cada una es
+        usada por un solo hilo a la vez, por lo que la instancia puede
+        compartirse entre hilos (ver `Database`).
+        
+        Args:
+            path: Ruta del archivo SQLite (':memory:' no se recomienda porque
+                cada conexión del pool vería una base distinta)
+            cache_max_mb: Memoria máxima de la caché de consultas en MB
+                (0 desactiva la caché)
+            max_connections: Conexiones simultáneas máximas
+            statement_timeout_ms: Tiempo máximo de cada sentencia en
+                milisegundos (0 sin límite); se interrumpe con
+                `sqlite3.OperationalError: interrupted`
+            pool_timeout: Segundos máximos de espera por una conexión libre
+        """
+        self.path = path
+        self.max_connections = max_connections
+        self.statement_timeout = statement_timeout_ms / 1000.0
+        self.pool_timeout = pool_timeout
+        
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._pool_lock = threading.Lock()
+        self._open_count = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._closed = False
+        
+        self.query_cache = QueryCache(int(cache_max_mb * 1024 * 1024)) if cache_max_mb > 0 else None
+        self.write_queue = None
+        self._write_queue_lock = threading.Lock()
+        self._create_tables()
+    
+    def _open_connection(self):
+        """Abre una nueva conexión al archivo SQLite"""
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                               timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        
+        with self._pool_lock:
+            self._open_count += 1
+        return conn
+    
+    @contextmanager
+    def _connection(self, statement_timeout: bool = True):
+        """
+        Toma una conexión del pool durante el bloque `with` (ver `Database._connection`)
+        
+        Args:
+            statement_timeout: Aplicar `statement_timeout_ms` a las sentencias
+                del bloque (se desactiva para lecturas por bloques)
+        
+        Yields:
+            Conexión sqlite3 de uso exclusivo del hilo actual
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("La base de datos está cerrada")
+        
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise sqlite3.OperationalError(
+                f"No hay conexiones libres después de {self.pool_timeout}s "
+                f"(máximo {self.max_connections})"
+            )
+        
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open_connection()
+            
+            with self._pool_lock:
+                self._in_use += 1
+                self._checkouts += 1
+            
+            if statement_timeout and self.statement_timeout > 0:
+                # SQLite no tiene statement_timeout: el progress handler
+                # interrumpe la sentencia cuando vence el plazo, que se
+                # reinicia al comenzar cada sentencia (trace callback)
+                deadline = [0.0]
+                
+                def start_statement(_sql):
+                    deadline[0] = time_module.monotonic() + self.statement_timeout
+                
+                conn.set_trace_callback(start_statement)
+                conn.set_progress_handler(lambda: time_module.monotonic() > deadline[0], 10000)
+            
+            yield conn
+        finally:
+            if conn is not None:
+                conn.set_trace_callback(None)
+                conn.set_progress_handler(None, 0)
+                if conn.in_transaction:
+                    conn.rollback()
+                
+                with self._pool_lock:
+                    self._in_use -= 1
+                    closed = self._closed
+                    if not closed:
+                        self._idle.put(conn)
+                
+                if closed:
+                    self._close_connection(conn)
+            self._slots.release()
+    
+    def close(self):
+        """Vacía la cola de escritura y cierra todas las conexiones (idempotente)"""
+        if self._closed:
+            return
+        
+        if self.write_queue is not None:
+            self.write_queue.shutdown()
+        
+        # Las conexiones en uso se cierran al devolverse al pool
+        with self._pool_lock:
+            self._closed = True
+        while True:
+            try:
+                self._close_connection(self._idle.get_nowait())
+            except queue.Empty:
+                break
+    
+    def _close_connection(self, conn):
+        """Cierra una conexión del pool"""
+        conn.close()
+        with self._pool_lock:
+            self._open_count -= 1
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def pool_stats(self) -> Dict:
+        """Obtiene el estado del pool de conexiones (ver `Database.pool_stats`)"""
+        with self._pool_lock:
+            return {
+                'in_use': self._in_use,
+                'open_connections': self._open_count,
+                'max_connections': self.max_connections,
+                'checkouts': self._checkouts,
+                'closed': self._closed
+            }
+    
+    def _data_generation(self) -> Tuple:
+        """Lee el token de generación de datos (ver `Database._data_generation`)"""
+        with self._connection() as conn:
+            generation = conn.execute("""
+                SELECT
+                    (SELECT generation FROM data_generation WHERE id = 1),
+                    (SELECT COALESCE(MAX(id), 0) FROM flight_searches),
+                    (SELECT MAX(last_seen) FROM routes),
+                    (SELECT COUNT(*) FROM routes);
+            """).fetchone()
+        
+        return tuple(generation)
+    
+    def _bump_generation(self, conn):
+        """Incrementa el contador de generación de datos (ver `Database._bump_generation`)"""
+        conn.execute("UPDATE data_generation SET generation = generation + 1 WHERE id = 1;")
+    
+    def _invalidate_cache(self):
+        """Descarta los resultados cacheados después de una escritura propia"""
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+    
+    def cache_stats(self) -> Dict:
+        """Obtiene las métricas de la caché de consultas (ver `Database.cache_stats`)"""
+        return self.query_cache.stats() if self.query_cache is not None else {}
+    
+    def _create_tables(self):
+        """Crea las tablas necesarias si no existen"""
+        create_table_query = """
+        CREATE TABLE IF NOT EXISTS flight_searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            search_timestamp TIMESTAMP NOT NULL,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults INTEGER DEFAULT 1,
+            price REAL NOT NULL,
+            currency VARCHAR(3) DEFAULT 'USD',
+            airline VARCHAR(100),
+            flight_data TEXT,
+            payload_hash CHAR(64),
+            itinerary_fingerprint CHAR(64),
+            bookable_seats INTEGER,
+            last_seen TIMESTAMP,
+            duration_minutes INTEGER,
+            stops INTEGER,
+            carrier_code VARCHAR(3),
+            departure_at TIMESTAMP,
+            arrival_at TIMESTAMP,
+            created_at TIMESTAMP NOT NULL
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_origin_dest ON flight_searches(origin, destination);
+        CREATE INDEX IF NOT EXISTS idx_search_timestamp ON flight_searches(search_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_departure_date ON flight_searches(departure_date);
+        CREATE INDEX IF NOT EXISTS idx_payload_hash ON flight_searches(payload_hash);
+        CREATE INDEX IF NOT EXISTS idx_fingerprint
+            ON flight_searches(itinerary_fingerprint, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_seen
+            ON flight_searches(COALESCE(last_seen, search_timestamp));
+        CREATE INDEX IF NOT EXISTS idx_route_stops
+            ON flight_searches(origin, destination, stops);
+        CREATE INDEX IF NOT EXISTS idx_route_duration
+            ON flight_searches(origin, destination, duration_minutes);
+        
+        CREATE TABLE IF NOT EXISTS flight_payloads (
+            payload_hash CHAR(64) PRIMARY KEY,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP
+        );
+        
+        -- Contador de generación de datos para invalidar cachés (ver _data_generation)
+        CREATE TABLE IF NOT EXISTS data_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO data_generation (id, generation) VALUES (1, 0);
+        
+        CREATE TABLE IF NOT EXISTS routes (
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            observation_count INTEGER NOT NULL DEFAULT 0,
+            last_price REAL,
+            PRIMARY KEY (origin, destination)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_routes_activity ON routes(last_seen DESC);
+        
+        CREATE TABLE IF NOT EXISTS monitored_routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            days_ahead TEXT NOT NULL DEFAULT '[30]',
+            return_days TEXT NOT NULL DEFAULT '[7]',
+            adults INTEGER NOT NULL DEFAULT 1,
+            priority INTEGER NOT NULL DEFAULT 0,
+            target_price REAL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP,
+            UNIQUE (origin, destination, adults)
+        );
+        
+        CREATE TABLE IF NOT EXISTS route_schedule (
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            adults INTEGER NOT NULL,
+            days_ahead INTEGER NOT NULL,
+            return_days INTEGER NOT NULL,
+            next_scan_at TIMESTAMP NOT NULL,
+            last_scan_at TIMESTAMP,
+            scans INTEGER NOT NULL DEFAULT 0,
+            changes INTEGER NOT NULL DEFAULT 0,
+            change_rate REAL NOT NULL DEFAULT 0.5,
+            last_price REAL,
+            score REAL,
+            PRIMARY KEY (origin, destination, adults, days_ahead, return_days)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_route_schedule_next ON route_schedule(next_scan_at);
+        
+        CREATE TABLE IF NOT EXISTS monitor_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP,
+            status VARCHAR(12) NOT NULL DEFAULT 'running',
+            host VARCHAR(100),
+            resumed INTEGER NOT NULL DEFAULT 0,
+            jobs_planned INTEGER NOT NULL DEFAULT 0,
+            jobs_done INTEGER NOT NULL DEFAULT 0,
+            jobs_failed INTEGER NOT NULL DEFAULT 0,
+            jobs_skipped INTEGER NOT NULL DEFAULT 0,
+            offers_saved INTEGER NOT NULL DEFAULT 0,
+            duration_seconds REAL NOT NULL DEFAULT 0,
+            api_calls INTEGER NOT NULL DEFAULT 0,
+            offers_found INTEGER NOT NULL DEFAULT 0,
+            changes INTEGER NOT NULL DEFAULT 0,
+            report TEXT
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_monitor_runs_status ON monitor_runs(status, started_at);
+        
+        CREATE TABLE IF NOT EXISTS monitor_run_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES monitor_runs(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults INTEGER NOT NULL,
+            days_ahead INTEGER NOT NULL,
+            return_days INTEGER NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            target_price REAL,
+            score REAL,
+            change_rate REAL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            offers_found INTEGER,
+            offers_saved INTEGER,
+            min_price REAL,
+            error TEXT,
+            finished_at TIMESTAMP,
+            http_status INTEGER,
+            fetch_ms INTEGER,
+            latency_ms INTEGER,
+            UNIQUE (run_id, origin, destination, adults, days_ahead, return_days)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_monitor_run_jobs_run ON monitor_run_jobs(run_id, position);
+        CREATE INDEX IF NOT EXISTS idx_monitor_run_jobs_fresh
+        ON monitor_run_jobs(finished_at)
+        WHERE status = 'done';
+        
+        CREATE TABLE IF NOT EXISTS api_quota_usage (
+            day DATE NOT NULL,
+            source VARCHAR(20) NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (day, source)
+        );
+        
+        CREATE TABLE IF NOT EXISTS price_watches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner VARCHAR(100) NOT NULL DEFAULT 'default',
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_from DATE NOT NULL,
+            departure_to DATE NOT NULL,
+            return_date DATE,
+            adults INTEGER,
+            target_price REAL NOT NULL,
+            currency VARCHAR(3) NOT NULL DEFAULT 'USD',
+            active INTEGER NOT NULL DEFAULT 1,
+            last_price REAL,
+            last_checked_at TIMESTAMP,
+            last_alert_price REAL,
+            last_triggered_at TIMESTAMP,
+            triggered_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL,
+            last_price_series VARCHAR(40),
+            last_alert_series VARCHAR(40),
+            CHECK (departure_to >= departure_from)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_watches_lookup
+        ON price_watches(origin, destination, departure_from)
+        WHERE active = 1;
+        CREATE INDEX IF NOT EXISTS idx_price_watches_owner ON price_watches(owner, created_at);
+        
+        CREATE TABLE IF NOT EXISTS price_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            watch_id INTEGER NOT NULL REFERENCES price_watches(id) ON DELETE CASCADE,
+            owner VARCHAR(100) NOT NULL,
+            search_id INTEGER,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults INTEGER NOT NULL,
+            price REAL NOT NULL,
+            target_price REAL NOT NULL,
+            previous_price REAL,
+            currency VARCHAR(3) NOT NULL,
+            airline VARCHAR(100),
+            triggered_at TIMESTAMP NOT NULL,
+            notified_at TIMESTAMP,
+            notify_attempts INTEGER NOT NULL DEFAULT 0,
+            notify_error TEXT,
+            kind VARCHAR(10) NOT NULL DEFAULT 'target'
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_watch ON price_alerts(watch_id, triggered_at);
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_owner ON price_alerts(owner, triggered_at);
+        
+        CREATE TABLE IF NOT EXISTS price_alert_deliveries (
+            alert_id INTEGER NOT NULL REFERENCES price_alerts(id) ON DELETE CASCADE,
+            channel VARCHAR(20) NOT NULL,
+            delivered_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (alert_id, channel)
+        );
+        
+        CREATE TABLE IF NOT EXISTS price_anomaly_state (
+            series_key VARCHAR(40) PRIMARY KEY,
+            departure_date DATE NOT NULL,
+            mean REAL NOT NULL,
+            variance REAL NOT NULL,
+            observations INTEGER NOT NULL,
+            last_anomaly_price REAL,
+            updated_at TIMESTAMP NOT NULL
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_anomaly_state_departure ON price_anomaly_state(departure_date);
+        
+        CREATE TABLE IF NOT EXISTS price_anomalies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            detected_at TIMESTAMP NOT NULL,
+            search_id INTEGER,
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            adults INTEGER NOT NULL,
+            price REAL NOT NULL,
+            expected_price REAL NOT NULL,
+            zscore REAL NOT NULL,
+            drop_pct REAL NOT NULL,
+            observations INTEGER NOT NULL,
+            currency VARCHAR(3) NOT NULL,
+            airline VARCHAR(100)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_anomalies_detected ON price_anomalies(detected_at);
+        CREATE INDEX IF NOT EXISTS idx_price_anomalies_route ON price_anomalies(origin, destination, detected_at);
+        
+        CREATE TABLE IF NOT EXISTS price_sketches (
+            origin VARCHAR(3) NOT NULL,
+            destination VARCHAR(3) NOT NULL,
+            airline VARCHAR(100) NOT NULL,
+            day DATE NOT NULL,
+            observations INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (origin, destination, airline, day)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_price_sketches_day ON price_sketches(day);
+        """
+        
+        # Columnas agregadas a tablas existentes (SQLite no tiene ADD COLUMN IF NOT EXISTS)
+        added_columns = [
+            ('monitor_runs', 'duration_seconds', 'REAL NOT NULL DEFAULT 0'),
+            ('monitor_runs', 'api_calls', 'INTEGER NOT NULL DEFAULT 0'),
+            ('monitor_runs', 'offers_found', 'INTEGER NOT NULL DEFAULT 0'),
+            ('monitor_runs', 'changes', 'INTEGER NOT NULL DEFAULT 0'),
+            ('monitor_runs', 'report', 'TEXT'),
+            ('monitor_run_jobs', 'http_status', 'INTEGER'),
+            ('monitor_run_jobs', 'fetch_ms', 'INTEGER'),
+            ('monitor_run_jobs', 'latency_ms', 'INTEGER'),
+            ('price_alerts', 'notified_at', 'TIMESTAMP'),
+            ('price_alerts', 'notify_attempts', 'INTEGER NOT NULL DEFAULT 0'),
+            ('price_alerts', 'notify_error', 'TEXT'),
+            ('price_alerts', 'kind', "VARCHAR(10) NOT NULL DEFAULT 'target'"),
+            ('price_watches', 'last_price_series', 'VARCHAR(40)'),
+            ('price_watches', 'last_alert_series', 'VARCHAR(40)')
+        ]
+        
+        try:
+            with self._connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL;")
+                conn.executescript(create_table_query)
+                for table, column, definition in added_columns:
+                    existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table});")}
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition};")
+                conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_price_alerts_pending
+                ON price_alerts(triggered_at)
+                WHERE notified_at IS NULL;
+                """)
+                
+                # Una vigilancia por dueño y búsqueda (ver `Database._create_tables`)
+                duplicates = [(row['keep_id'], row['id']) for row in conn.execute("""
+                SELECT id, keep_id
+                FROM (
+                    SELECT id, FIRST_VALUE(id) OVER (
+                        PARTITION BY owner, origin, destination, departure_from, departure_to,
+                                     COALESCE(return_date, ''), COALESCE(adults, 0), currency
+                        ORDER BY active DESC, id
+                    ) AS keep_id
+                    FROM price_watches
+                )
+                WHERE id <> keep_id;
+                """)]
+                conn.executemany("UPDATE price_alerts SET watch_id = ? WHERE watch_id = ?;", duplicates)
+                conn.executemany("DELETE FROM price_watches WHERE id = ?;", [(id_,) for _, id_ in duplicates])
+                conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_price_watches_unique
+                ON price_watches(owner, origin, destination, departure_from, departure_to,
+                                 COALESCE(return_date, ''), COALESCE(adults, 0), currency);
+                """)
+                conn.commit()
+        except Exception as e:
+            print(f"Error creando tablas: {str(e)}")
+            raise
+    
+    def insert_flight_offer(
+        self,
+        origin: str,
+        destination: str,
+        departure_date: str,
+        return_date: Optional[str],
+        adults: int,
+        price: float,
+        currency: str,
+        airline: Optional[str],
+        flight_data: Dict,
+        change_only: bool = False
+    ) -> int:
+        """
+        Inserta una oferta de vuelo (ver `Database.insert_flight_offer`)
+        
+        Returns:
+            ID del registro insertado (o de la observación vigente si no hubo cambios)
+        """
+        offer = {
+            'origin': origin,
+            'destination': destination,
+            'departure_date': departure_date,
+            'return_date': return_date,
+            'adults': adults,
+            'price': price,
+            'currency': currency,
+            'airline': airline,
+            'flight_data': flight_data
+        }
+        
+        try:
+            with self._connection() as conn:
+                flight_id, _ = self._write_offer(conn, offer, change_only)
+                self._update_price_sketches(conn, [(offer, flight_id)])
+                anomalies = self._detect_price_anomalies(conn, [(offer, flight_id)])
+                self._evaluate_price_watches(conn, [(offer, flight_id)], anomalies)
+                self._bump_generation(conn)
+                conn.commit()
+            self._invalidate_cache()
+            
+            return flight_id
+        
+        except Exception as e:
+            print(f"Error insertando oferta: {str(e)}")
+            raise
+    
+    def insert_flight_offers(
+        self,
+        offers: List[Dict],
+        change_only: bool = False,
+        run_job_id: Optional[int] = None
+    ) -> int:
+        """
+        Inserta un lote de ofertas en una sola transacción
+        
+        Args:
+            offers: Lista de diccionarios con los campos de `insert_flight_offer`
+            change_only: Guardar solo cambios de precio/disponibilidad
+            run_job_id: Búsqueda de `monitor_run_jobs` a marcar como terminada
+                en la misma transacción (ver `Database.insert_flight_offers`)
+        
+        Returns:
+            Número de filas nuevas insertadas
+        """
+        if not offers and run_job_id is None:
+            return 0
+        
+        return self.insert_scan_results([(offers, run_job_id)], change_only)[0] or 0
+    
+    def insert_scan_results(
+        self,
+        results: List[Tuple[List[Dict], Optional[int]]],
+        change_only: bool = False
+    ) -> List[Optional[int]]:
+        """Inserta los resultados de varias búsquedas en una transacción (ver `Database.insert_scan_results`)"""
+        try:
+            with self._connection() as conn:
+                written = []
+                inserted = [self._write_scan_result(conn, offers, change_only, run_job_id, written)
+                            for offers, run_job_id in results]
+                self._update_price_sketches(conn, written)
+                anomalies = self._detect_price_anomalies(conn, written)
+                self._evaluate_price_watches(conn, written, anomalies)
+                
+                self._bump_generation(conn)
+                conn.commit()
+            self._invalidate_cache()
+            
+            return inserted
+        
+        except Exception as e:
+            print(f"Error insertando lote de ofertas: {str(e)}")
+            raise
+    
+    def _write_scan_result(self, conn, offers: List[Dict], change_only: bool,
+                           run_job_id: Optional[int], written: Optional[List] = None) -> Optional[int]:
+        """Escribe las ofertas de una búsqueda y su checkpoint (None si ya estaba terminada)"""
+        now = datetime.now()
+        if run_job_id is not None:
+            # Escritura primero: toma el lock de escritura antes de leer el estado
+            conn.execute("""
+            UPDATE monitor_runs SET updated_at = ?
+            WHERE id = (SELECT run_id FROM monitor_run_jobs WHERE id = ?);
+            """, (now, run_job_id))
+            row = conn.execute("SELECT status FROM monitor_run_jobs WHERE id = ?;", (run_job_id,)).fetchone()
+            if row is not None and row['status'] == 'done':
+                return None
+        
+        inserted = 0
+        for offer in offers:
+            flight_id, is_new = self._write_offer(conn, offer, change_only)
+            inserted += int(is_new)
+            if written is not None:
+                written.append((offer, flight_id))
+        
+        if run_job_id is not None:
+            conn.execute("""
+            UPDATE monitor_run_jobs
+            SET status = 'done', offers_found = ?, offers_saved = ?, min_price = ?,
+                error = NULL, finished_at = ?
+            WHERE id = ?;
+            """, (len(offers), inserted,
+                  min((float(offer['price']) for offer in offers), default=None), now, run_job_id))
+        
+        return inserted
+    
+    def _update_price_sketches(self, conn, written: List[Tuple[Dict, int]]) -> int:
+        """Agrega los precios del lote a los sketches del día (ver `Database._update_price_sketches`)"""
+        groups = sketch_groups(offer for offer, _ in written)
+        if not groups:
+            return 0
+        
+        day = date.today()
+        keys = sorted(groups)
+        
+        try:
+            sketches = {(row['origin'], row['destination'], row['airline']): KLLSketch.from_bytes(row['sketch'])
+                        for row in conn.execute(f"""
+            SELECT origin, destination, airline, sketch
+            FROM price_sketches
+            WHERE day = ?
+              AND (origin, destination, airline) IN (VALUES {', '.join(['(?, ?, ?)'] * len(keys))});
+            """, [day] + [value for key in keys for value in key])}
+            
+            now = datetime.now()
+            rows = []
+            for key in keys:
+                sketch = sketches.get(key) or KLLSketch()
+                sketch.extend(groups[key])
+                rows.append(key + (day, sketch.count, sketch.to_bytes(), now))
+            conn.executemany("""
+            INSERT INTO price_sketches (origin, destination, airline, day, observations, sketch, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (origin, destination, airline, day) DO UPDATE
+            SET observations = excluded.observations,
+                sketch = excluded.sketch,
+                updated_at = excluded.updated_at;
+            """, rows)
+            return len(rows)
+        
+        except Exception as e:
+            print(f"Error actualizando sketches de precio: {str(e)}")
+            return 0
+    
+    def _detect_price_anomalies(self, conn, written: List[Tuple[Dict, int]]) -> Dict[str, Dict]:
+        """
+        Actualiza el estado EWMA de las series del lote y registra las caídas anómalas
+        (ver `Database._detect_price_anomalies`)
+        """
+        observations = best_observations(written)
+        if not observations:
+            return {}
+        
+        keys = sorted({series_key(obs) for obs in observations})
+        
+        try:
+            states = {row['series_key']: dict(row) for row in conn.execute(f"""
+            SELECT series_key, mean, variance, observations, last_anomaly_price
+            FROM price_anomaly_state
+            WHERE series_key IN ({', '.join('?' * len(keys))});
+            """, keys)}
+            
+            new_states, anomalies = detect_anomalies(states, observations)
+            now = datetime.now()
+            conn.executemany("""
+            INSERT INTO price_anomaly_state
+            (series_key, departure_date, mean, variance, observations, last_anomaly_price, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (series_key) DO UPDATE
+            SET mean = excluded.mean,
+                variance = excluded.variance,
+                observations = excluded.observations,
+                last_anomaly_price = excluded.last_anomaly_price,
+                updated_at = excluded.updated_at;
+            """, [(state['series_key'], state['departure_date'], state['mean'], state['variance'],
+                   state['observations'], state['last_anomaly_price'], now) for state in new_states])
+            conn.executemany("""
+            INSERT INTO price_anomalies
+            (detected_at, search_id, origin, destination, departure_date, return_date, adults, price,
+             expected_price, zscore, drop_pct, observations, currency, airline)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """, [(now, a['search_id'], a['origin'], a['destination'], a['departure_date'], a['return_date'],
+                   a['adults'], a['price'], a['expected_price'], a['zscore'], a['drop_pct'],
+                   a['observations'], a['currency'], a['airline']) for a in anomalies])
+            return {anomaly['series_key']: anomaly for anomaly in anomalies}
+        
+        except Exception as e:
+            print(f"Error detectando anomalías de precio: {str(e)}")
+            return {}
+    
+    def _evaluate_price_watches(self, conn, written: List[Tuple[Dict, int]],
+                                anomalies: Optional[Dict[str, Dict]] = None) -> int:
+        """
+        Evalúa las vigilancias de precio contra ofertas recién escritas (ver `Database._evaluate_price_watches`)
+        
+        Una consulta por índice por cada observación del lote (ya reducido a
+        la oferta más barata por clave); el lock de escritura de SQLite ya
+        serializa a los escritores.
+        """
+        match_query = """
+        SELECT id AS watch_id, owner, target_price, last_price, last_price_series,
+               last_alert_price, last_alert_series
+        FROM price_watches
+        WHERE active = 1
+          AND origin = ? AND destination = ?
+          AND departure_from BETWEEN ? AND ?
+          AND departure_to >= ?
+          AND (return_date IS NULL OR return_date = ?)
+          AND (adults IS NULL OR adults = ?)
+          AND currency = ?;
+        """
+        
+        try:
+            matches = []
+            for obs in best_observations(written):
+                for row in conn.execute(match_query, (
+                    obs['origin'], obs['destination'], window_start(obs['departure_date']),
+                    obs['departure_date'], obs['departure_date'], obs['return_date'], obs['adults'],
+                    obs['currency']
+                )):
+                    matches.append(dict(obs, **dict(row)))
+            
+            updates, alerts = evaluate_matches(matches, anomalies)
+            now = datetime.now()
+            conn.executemany("""
+            UPDATE price_watches
+            SET last_price = ?, last_price_series = ?, last_checked_at = ?,
+                last_alert_price = ?, last_alert_series = ?,
+                triggered_count = triggered_count + ?,
+                last_triggered_at = CASE WHEN ? THEN ? ELSE last_triggered_at END
+            WHERE id = ?;
+            """, [(u['last_price'], u['last_price_series'], now, u['last_alert_price'], u['last_alert_series'],
+                   int(u['alerted']), int(u['alerted']), now, u['watch_id']) for u in updates])
+            conn.executemany("""
+            INSERT INTO price_alerts
+            (watch_id, owner, search_id, origin, destination, departure_date, return_date, adults,
+             price, target_price, previous_price, currency, airline, kind, triggered_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """, [(a['watch_id'], a['owner'], a['search_id'], a['origin'], a['destination'],
+                   a['departure_date'], a['return_date'], a['adults'], a['price'], a['target_price'],
+                   a['previous_price'], a['currency'], a['airline'], a['kind'], now) for a in alerts])
+            return len(alerts)
+        
+        except Exception as e:
+            print(f"Error evaluando vigilancias de precio: {str(e)}")
+            return 0
+    
+    def enqueue_flight_offers(self, offers: List[Dict], change_only: bool = False) -> int:
+        """
+        Encola ofertas para escritura diferida en segundo plano
+        
+        La cola (`write_queue.WriteBehindQueue`) se crea con el primer uso y
+        pertenece a esta instancia, por lo que todas las sesiones de la app
+        que comparten la base comparten también el escritor.
+        
+        Args:
+            offers: Lista de diccionarios con los campos de `insert_flight_offer`
+            change_only: Guardar solo cambios de precio/disponibilidad
+            
+        Returns:
+            Profundidad de la cola después de encolar
+        """
+        with self._write_queue_lock:
+            if self.write_queue is None:
+                self.write_queue = WriteBehindQueue(self)
+        
+        return self.write_queue.enqueue(offers, change_only)
+    
+    def write_queue_stats(self) -> Dict:
+        """
+        Obtiene las métricas de la cola de escritura diferida
+        
+        Returns:
+            Diccionario con profundidad, ofertas escritas/fallidas y latencia
+            de vaciado (vacío si la cola no se usó)
+        """
+        return self.write_queue.stats() if self.write_queue is not None else {}
+    
+    def _write_offer(self, conn, offer: Dict, change_only: bool) -> Tuple[int, bool]:
+        """
+        Escribe una oferta en la transacción en curso (sin hacer commit)
+        
+        Returns:
+            Tupla (ID de la fila, True si se insertó una fila nueva)
+        """
+        now = datetime.now()
+        origin = offer['origin']
+        destination = offer['destination']
+        price = offer['price']
+        
+        # El pipeline del monitor ya los calculó en su etapa de normalización
+        prepared = offer.get('prepared') or prepare_offer(offer)
+        fingerprint = prepared['fingerprint']
+        attributes = prepared['attributes']
+        bookable_seats = attributes['bookable_seats']
+        flight_data, raw_data, payload_hash = prepared['flight_data'], prepared['raw_data'], prepared['payload_hash']
+        
+        airline = offer.get('airline')
+        if airline is None or airline == '':
+            airline = 'N/A'
+        
+        route_query = """
+        INSERT INTO routes (origin, destination, first_seen, last_seen, observation_count, last_price)
+        VALUES (?, ?, ?, ?, 1, ?)
+        ON CONFLICT (origin, destination) DO UPDATE
+        SET last_seen = excluded.last_seen,
+            observation_count = routes.observation_count + 1,
+            last_price = excluded.last_price;
+        """
+        
+        if change_only:
+            last = conn.execute(
+                """
+                SELECT id, price, bookable_seats
+                FROM flight_searches
+                WHERE itinerary_fingerprint = ?
+                ORDER BY id DESC
+                LIMIT 1;
+                """,
+                (fingerprint,)
+            ).fetchone()
+            
+            if (last is not None
+                    and round(float(last['price']), 2) == round(float(price), 2)
+                    and last['bookable_seats'] == bookable_seats):
+                conn.execute("UPDATE flight_searches SET last_seen = ? WHERE id = ?;", (now, last['id']))
+                conn.execute(route_query, (origin, destination, now, now, price))
+                return last['id'], False
+        
+        if payload_hash:
+            conn.execute(
+                "INSERT OR IGNORE INTO flight_payloads (payload_hash, payload, created_at) VALUES (?, ?, ?);",
+                (payload_hash, json.dumps(raw_data, default=str), now)
+            )
+        
+        cursor = conn.execute(
+            """
+            INSERT INTO flight_searches
+            (search_timestamp, origin, destination, departure_date, return_date, adults, price,
+             currency, airline, flight_data, payload_hash, itinerary_fingerprint, bookable_seats,
+             last_seen, duration_minutes, stops, carrier_code, departure_at, arrival_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """,
+            (now, origin, destination, str(offer['departure_date']),
+             str(offer['return_date']) if offer.get('return_date') else None,
+             offer.get('adults', 1), float(price), offer.get('currency', 'USD'), airline,
+             json.dumps(flight_data, default=str), payload_hash, fingerprint, bookable_seats,
+             now, attributes['duration_minutes'], attributes['stops'],
+             attributes['carrier_code'], attributes['departure_at'],
+             attributes['arrival_at'], now)
+        )
+        conn.execute(route_query, (origin, destination, now, now, price))
+        
+        return cursor.lastrowid, True
+    
+    @cached_query
+    def get_recent_searches(self, limit: int = 100) -> List[Dict]:
+        """
+        Obtiene las búsquedas más recientes
+        
+        Args:
+            limit: Número máximo de registros a retornar
+        
+        Returns:
+            Lista de diccionarios con los datos de búsquedas
+        """
+        query = """
+        SELECT id, search_timestamp, origin, destination, departure_date, return_date,
+               adults, price, currency, airline, created_at
+        FROM flight_searches
+        ORDER BY search_timestamp DESC
+        LIMIT ?;
+        """
+        return self._fetch_all(query, (limit,), "Error obteniendo búsquedas recientes")
+    
+    @cached_query
+    def get_unique_routes(self, order_by: str = 'route') -> List[Tuple[str, str]]:
+        """
+        Obtiene todas las rutas únicas desde la dimensión `routes`
+        
+        Args:
+            order_by: 'route' (alfabético) o 'activity' (más recientes primero)
+        
+        Returns:
+            Lista de tuplas (origen, destino)
+        """
+        rows = self.get_route_summaries(order_by=order_by)
+        return [(row['origin'], row['destination']) for row in rows]
+    
+    @cached_query
+    def get_route_summaries(self, order_by: str = 'activity') -> List[Dict]:
+        """
+        Obtiene la dimensión de rutas con su actividad
+        
+        Args:
+            order_by: 'route' (alfabético) o 'activity' (más recientes primero)
+        
+        Returns:
+            Lista de diccionarios con origin, destination, first_seen,
+            last_seen, observation_count y last_price
+        """
+        order_clauses = {
+            'route': 'origin, destination',
+            'activity': 'last_seen DESC, observation_count DESC'
+        }
+        
+        query = f"""
+        SELECT origin, destination, first_seen, last_seen, observation_count, last_price
+        FROM routes
+        ORDER BY {order_clauses.get(order_by, order_clauses['activity'])};
+        """
+        return self._fetch_all(query, (), "Error obteniendo resumen de rutas")
+    
+    @cached_query
+    def get_searches_by_route(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> List[Dict]:
+        """
+        Obtiene búsquedas para una ruta específica en los últimos N días
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+        
+        Returns:
+            Lista de diccionarios con los datos
+        """
+        query = """
+        SELECT id, search_timestamp, origin, destination, departure_date, return_date,
+               adults, price, currency, airline, created_at
+        FROM flight_searches
+        WHERE origin = ? AND destination = ? AND search_timestamp >= ?
+        ORDER BY search_timestamp DESC;
+        """
+        cutoff_date = datetime.now() - timedelta(days=days)
+        return self._fetch_all(
+            query, (origin, destination, cutoff_date), "Error obteniendo búsquedas por ruta"
+        )
+    
+    @cached_query
+    def get_filtered_searches(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30,
+        max_stops: Optional[int] = None,
+        max_duration_minutes: Optional[int] = None,
+        departure_time_from: Optional[Union[str, time]] = None,
+        departure_time_to: Optional[Union[str, time]] = None,
+        carrier_code: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Obtiene búsquedas de una ruta filtrando por atributos del itinerario
+        (ver `Database.get_filtered_searches`)
+        """
+        conditions = ["origin = ?", "destination = ?", "search_timestamp >= ?"]
+        params = [origin, destination, datetime.now() - timedelta(days=days)]
+        
+        if max_stops is not None:
+            conditions.append("stops <= ?")
+            params.append(max_stops)
+        
+        if max_duration_minutes is not None:
+            conditions.append("duration_minutes <= ?")
+            params.append(max_duration_minutes)
+        
+        if departure_time_from is not None and departure_time_to is not None:
+            start, end = _time_of_day(departure_time_from), _time_of_day(departure_time_to)
+            joiner = 'AND' if start <= end else 'OR'
+            conditions.append(f"(time(departure_at) >= ? {joiner} time(departure_at) <= ?)")
+            params.extend([start, end])
+        elif departure_time_from is not None:
+            conditions.append("time(departure_at) >= ?")
+            params.append(_time_of_day(departure_time_from))
+        elif departure_time_to is not None:
+            conditions.append("time(departure_at) <= ?")
+            params.append(_time_of_day(departure_time_to))
+        
+        if carrier_code:
+            conditions.append("carrier_code = ?")
+            params.append(carrier_code)
+        
+        query = f"""
+        SELECT id, search_timestamp, origin, destination, departure_date, return_date,
+               adults, price, currency, airline, carrier_code, stops, duration_minutes,
+               departure_at, arrival_at, bookable_seats, created_at
+        FROM flight_searches
+        WHERE {' AND '.join(conditions)}
+        ORDER BY search_timestamp DESC;
+        """
+        return self._fetch_all(query, params, "Error obteniendo búsquedas filtradas")
+    
+    @cached_query
+    def get_price_series(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> List[Dict]:
+        """
+        Reconstruye la serie temporal escalonada de precios de una ruta
+        (ver `Database.get_price_series`)
+        """
+        query = """
+        SELECT search_timestamp,
+               COALESCE(last_seen, search_timestamp) AS "last_seen [TIMESTAMP]",
+               price, airline, departure_date,
+               COALESCE(itinerary_fingerprint, CAST(id AS TEXT)) AS fingerprint
+        FROM flight_searches
+        WHERE origin = ? AND destination = ? AND COALESCE(last_seen, search_timestamp) >= ?
+        ORDER BY fingerprint, search_timestamp;
+        """
+        cutoff_date = datetime.now() - timedelta(days=days)
+        rows = self._fetch_all(
+            query, (origin, destination, cutoff_date), "Error obteniendo serie de precios"
+        )
+        
+        points = []
+        for row in rows:
+            point = {
+                'timestamp': row['search_timestamp'],
+                'price': row['price'],
+                'airline': row['airline'],
+                'departure_date': row['departure_date'],
+                'itinerary_fingerprint': row['fingerprint']
+            }
+            points.append(point)
+            if row['last_seen'] > row['search_timestamp']:
+                points.append(dict(point, timestamp=row['last_seen']))
+        
+        return points
+    
+    @cached_query
+    def get_price_statistics(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> Dict:
+        """
+        Obtiene estadísticas de precios para una ruta
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+        
+        Returns:
+            Diccionario con estadísticas (min, max, avg, count)
+        """
+        query = """
+        SELECT MIN(price) AS min_price, MAX(price) AS max_price,
+               AVG(price) AS avg_price, COUNT(*) AS search_count
+        FROM flight_searches
+        WHERE origin = ? AND destination = ? AND search_timestamp >= ?;
+        """
+        cutoff_date = datetime.now() - timedelta(days=days)
+        rows = self._fetch_all(
+            query, (origin, destination, cutoff_date), "Error obteniendo estadísticas"
+        )
+        return rows[0] if rows else {}
+    
+    @cached_query
+    def get_cheapest_by_airline(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30
+    ) -> List[Dict]:
+        """
+        Obtiene el precio más barato por aerolínea para una ruta
+        
+        Args:
+            origin: Código IATA de origen
+            destination: Código IATA de destino
+            days: Número de días hacia atrás
+        
+        Returns:
+            Lista con el precio mínimo por aerolínea
+        """
+        query = """
+        SELECT airline, MIN(price) AS min_price, COUNT(*) AS occurrences
+        FROM flight_searches
+        WHERE origin = ? AND destination = ? AND search_timestamp >= ?
+          AND airline IS NOT NULL AND airline != 'N/A'
+        GROUP BY airline
+        ORDER BY min_price ASC;
+        """
+        cutoff_date = datetime.now() - timedelta(days=days)
+        return self._fetch_all(
+            query, (origin, destination, cutoff_date), "Error obteniendo precios por aerolínea"
+        )
+    
+    @cached_query
+    def get_price_quantiles(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30,
+        quantiles: Tuple[float, ...] = DEFAULT_QUANTILES,
+        airline: Optional[str] = None
+    ) -> Dict:
+        """Obtiene percentiles de precio de una ruta desde los sketches diarios (ver `Database.get_price_quantiles`)"""
+        query = """
+        SELECT sketch
+        FROM price_sketches
+        WHERE origin = ? AND destination = ? AND airline = ? AND day >= ?;
+        """
+        cutoff_day = date.today() - timedelta(days=days)
+        rows = self._fetch_all(
+            query, (origin, destination, airline or ALL_AIRLINES, cutoff_day), "Error obteniendo percentiles de precio"
+        )
+        return summarize(merge_all(KLLSketch.from_bytes(row['sketch']) for row in rows), quantiles)
+    
+    @cached_query
+    def get_price_quantiles_by_airline(
+        self,
+        origin: str,
+        destination: str,
+        days: int = 30,
+        quantiles: Tuple[float, ...] = DEFAULT_QUANTILES
+    ) -> List[Dict]:
+        """Obtiene percentiles de precio por aerolínea para una ruta (ver `Database.get_price_quantiles_by_airline`)"""
+        query = """
+        SELECT airline, sketch
+        FROM price_sketches
+        WHERE origin = ? AND destination = ? AND day >= ?
+          AND airline NOT IN (?, 'N/A');
+        """
+        cutoff_day = date.today() - timedelta(days=days)
+        rows = self._fetch_all(
+            query, (origin, destination, cutoff_day, ALL_AIRLINES), "Error obteniendo percentiles por aerolínea"
+        )
+        
+        sketches = {}
+        for row in rows:
+            sketches.setdefault(row['airline'], KLLSketch()).merge(KLLSketch.from_bytes(row['sketch']))
+        
+        results = [dict(summarize(sketch, quantiles), airline=airline) for airline, sketch in sketches.items()]
+        return sorted(results, key=lambda row: (row.get('p50', row['min_price']), row['airline']))
+    
+    def iter_flight_history(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        chunk_size: int = 10000,
+        seen_before: Optional[datetime] = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Recorre el histórico de búsquedas en bloques
+        (ver `Database.iter_flight_history`)
+        """
+        conditions = []
+        params = []
+        
+        if origin:
+            conditions.append("origin = ?")
+            params.append(origin)
+        if destination:
+            conditions.append("destination = ?")
+            params.append(destination)
+        if date_from:
+            conditions.append("search_timestamp >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("search_timestamp < ?")
+            params.append(date_to)
+        if seen_before:
+            conditions.append("COALESCE(last_seen, search_timestamp) < ?")
+            params.append(seen_before)
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        query = f"""
+        SELECT id, search_timestamp, last_seen, origin, destination, departure_date,
+               return_date, adults, price, currency, airline, carrier_code, stops,
+               duration_minutes, departure_at, arrival_at, bookable_seats,
+               itinerary_fingerprint
+        FROM flight_searches
+        {where_clause}
+        ORDER BY id;
+        """
+        
+        # Sin límite de tiempo: la consulta queda abierta mientras se consumen los bloques
+        with self._connection(statement_timeout=False) as conn:
+            cursor = conn.execute(query, params)
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+            
+            cursor.close()
+    
+    def delete_old_searches(
+        self,
+        days: int = 90,
+        before: Optional[datetime] = None,
+        max_id: Optional[int] = None
+    ) -> int:
+        """
+        Elimina búsquedas más antiguas que N días (ver `Database.delete_old_searches`)
+        
+        Returns:
+            Número de registros eliminados
+        """
+        try:
+            with self._connection() as conn:
+                
+                cutoff_date = before or datetime.now() - timedelta(days=days)
+                if not isinstance(cutoff_date, datetime):
+                    # Una fecha sin hora corta al inicio del día
+                    cutoff_date = datetime.combine(cutoff_date, time.min)
+                cursor = conn.execute(
+                    "DELETE FROM flight_searches "
+                    "WHERE COALESCE(last_seen, search_timestamp) < ? AND (? IS NULL OR id <= ?);",
+                    (cutoff_date, max_id, max_id)
+                )
+                deleted_count = cursor.rowcount
+                
+                conn.execute("DELETE FROM routes WHERE last_seen < ?;", (cutoff_date,))
+                conn.execute("DELETE FROM price_anomaly_state WHERE departure_date < ?;", (date.today(),))
+                conn.execute("DELETE FROM price_sketches WHERE day < ?;", (cutoff_date.date(),))
+                conn.execute("""
+                    DELETE FROM flight_payloads
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM flight_searches s
+                        WHERE s.payload_hash = flight_payloads.payload_hash
+                    );
+                """)
+                
+                self._bump_generation(conn)
+                conn.commit()
+            self._invalidate_cache()
+            
+            return deleted_count
+        
+        except Exception as e:
+            print(f"Error eliminando registros antiguos: {str(e)}")
+            return 0
+    
+    def get_flight_by_id(self, flight_id: int) -> Optional[Dict]:
+        """
+        Obtiene un vuelo específico por ID, con su `raw_data` reincorporado
+        
+        Args:
+            flight_id: ID del registro
+        
+        Returns:
+            Diccionario con los datos del vuelo o None
+        """
+        query = """
+        SELECT s.id, s.search_timestamp, s.origin, s.destination, s.departure_date,
+               s.return_date, s.adults, s.price, s.currency, s.airline, s.flight_data,
+               p.payload, s.created_at
+        FROM flight_searches s
+        LEFT JOIN flight_payloads p ON p.payload_hash = s.payload_hash
+        WHERE s.id = ?;
+        """
+        rows = self._fetch_all(query, (flight_id,), "Error obteniendo vuelo por ID")
+        if not rows:
+            return None
+        
+        row = rows[0]
+        flight_data = json.loads(row['flight_data']) if row['flight_data'] else {}
+        payload = row.pop('payload')
+        row['flight_data'] = join_raw_payload(flight_data, json.loads(payload) if payload else None)
+        
+        return row
+    
+    def migrate_raw_payloads(self, batch_size: int = 500) -> int:
+        """El backend embebido siempre guarda los payloads separados: no hay nada que migrar"""
+        return 0
+    
+    def backfill_typed_columns(self, batch_size: int = 5000) -> int:
+        """
+        Completa las columnas tipadas vacías desde `flight_data`
+        (ver `Database.backfill_typed_columns`)
+        
+        Las inserciones ya las completan; esto repara filas escritas por
+        versiones anteriores (por ejemplo duraciones '5h' o '45m').
+        
+        Returns:
+            Número de filas actualizadas
+        """
+        select_query = """
+        SELECT id, flight_data, stops, duration_minutes, carrier_code, departure_at, arrival_at
+        FROM flight_searches
+        WHERE id > ?
+          AND flight_data IS NOT NULL
+          AND (stops IS NULL OR duration_minutes IS NULL OR carrier_code IS NULL
+               OR departure_at IS NULL OR arrival_at IS NULL)
+        ORDER BY id
+        LIMIT ?;
+        """
+        columns = ('stops', 'duration_minutes', 'carrier_code', 'departure_at', 'arrival_at')
+        
+        updated, last_id = 0, 0
+        try:
+            while True:
+                with self._connection() as conn:
+                    rows = conn.execute(select_query, (last_id, batch_size)).fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1]['id']
+                    
+                    changes = []
+                    for row in rows:
+                        attributes = typed_attributes(json.loads(row['flight_data']))
+                        if any(row[c] is None and attributes[c] is not None for c in columns):
+                            changes.append(tuple(attributes[c] for c in columns) + (row['id'],))
+                    if not changes:
+                        continue
+                    
+                    conn.executemany("""
+                    UPDATE flight_searches
+                    SET stops = COALESCE(stops, ?),
+                        duration_minutes = COALESCE(duration_minutes, ?),
+                        carrier_code = COALESCE(carrier_code, ?),
+                        departure_at = COALESCE(departure_at, ?),
+                        arrival_at = COALESCE(arrival_at, ?)
+                    WHERE id = ?;
+                    """, changes)
+                    self._bump_generation(conn)
+                    conn.commit()
+                    updated += len(changes)
+            self._invalidate_cache()
+            
+            return updated
+        
+        except Exception as e:
+            print(f"Error completando columnas tipadas: {str(e)}")
+            return updated
+    
+    def backfill_price_sketches(self, chunk_size: int = 10000) -> int:
+        """
+        Arma los sketches de percentiles de precio desde el histórico
+        (ver `Database.backfill_price_sketches`)
+        
+        Returns:
+            Número de sketches creados
+        """
+        try:
+            with self._connection() as conn:
+                if conn.execute("SELECT 1 FROM price_sketches LIMIT 1;").fetchone():
+                    return 0
+            
+            sketches = build_sketches(self.iter_flight_history(chunk_size=chunk_size))
+            if not sketches:
+                return 0
+            
+            now = datetime.now()
+            with self._connection() as conn:
+                conn.executemany("""
+                INSERT INTO price_sketches (origin, destination, airline, day, observations, sketch, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (origin, destination, airline, day) DO NOTHING;
+                """, [key + (sketch.count, sketch.to_bytes(), now) for key, sketch in sorted(sketches.items())])
+                self._bump_generation(conn)
+                conn.commit()
+            self._invalidate_cache()
+            
+            return len(sketches)
+        
+        except Exception as e:
+            print(f"Error armando sketches de precio: {str(e)}")
+            return 0
+    
+    def get_monitored_routes(self, enabled_only: bool = True) -> List[Dict]:
+        """Obtiene el catálogo de rutas del monitor (ver `Database.get_monitored_routes`)"""
+        query = f"""
+        SELECT origin, destination, days_ahead, return_days, adults, priority, target_price, enabled
+        FROM monitored_routes
+        {'WHERE enabled = 1' if enabled_only else ''}
+        ORDER BY priority DESC, origin, destination;
+        """
+        routes = self._fetch_all(query, (), "Error obteniendo rutas monitoreadas")
+        for route in routes:
+            route['days_ahead'] = json.loads(route['days_ahead'])
+            route['return_days'] = json.loads(route['return_days'])
+            route['enabled'] = bool(route['enabled'])
+        return routes
+    
+    def upsert_monitored_routes(self, routes: List[Dict]) -> int:
+        """
+        Inserta o actualiza rutas del catálogo (ver `Database.upsert_monitored_routes`)
+        
+        Returns:
+            Número de rutas guardadas
+        """
+        query = """
+        INSERT INTO monitored_routes
+        (origin, destination, days_ahead, return_days, adults, priority, target_price,
+         enabled, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (origin, destination, adults) DO UPDATE
+        SET days_ahead = excluded.days_ahead,
+            return_days = excluded.return_days,
+            priority = excluded.priority,
+            target_price = excluded.target_price,
+            enabled = excluded.enabled,
+            updated_at = excluded.updated_at;
+        """
+        
+        if not routes:
+            return 0
+        
+        try:
+            now = datetime.now()
+            with self._connection() as conn:
+                conn.executemany(query, [
+                    (route['origin'], route['destination'], json.dumps(route['days_ahead']),
+                     json.dumps(route['return_days']), route.get('adults', 1),
+                     route.get('priority', 0), route.get('target_price'),
+                     int(route.get('enabled', True)), now)
+                    for route in routes
+                ])
+                conn.commit()
+            
+            return len(routes)
+        
+        except Exception as e:
+            print(f"Error guardando rutas monitoreadas: {str(e)}")
+            raise
+    
+    def get_route_schedule(self, origin: Optional[str] = None, destination: Optional[str] = None) -> List[Dict]:
+        """Obtiene el estado del planificador de búsquedas (ver `Database.get_route_schedule`)"""
+        route_filter = origin is not None and destination is not None
+        query = f"""
+        SELECT origin, destination, adults, days_ahead, return_days, next_scan_at,
+               last_scan_at, scans, changes, change_rate, last_price, score
+        FROM route_schedule
+        {'WHERE origin = ? AND destination = ?' if route_filter else ''};
+        """
+        return self._fetch_all(query, (origin, destination) if route_filter else (),
+                               "Error obteniendo planificación de rutas")
+    
+    def record_route_scans(self, rows: List[Dict]) -> int:
+        """
+        Guarda el estado del planificador (ver `Database.record_route_scans`)
+        
+        Returns:
+            Número de filas guardadas
+        """
+        query = """
+        INSERT INTO route_schedule
+        (origin, destination, adults, days_ahead, return_days, next_scan_at,
+         last_scan_at, scans, changes, change_rate, last_price, score)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (origin, destination, adults, days_ahead, return_days) DO UPDATE
+        SET next_scan_at = excluded.next_scan_at,
+            last_scan_at = excluded.last_scan_at,
+            scans = excluded.scans,
+            changes = excluded.changes,
+            change_rate = excluded.change_rate,
+            last_price = excluded.last_price,
+            score = excluded.score;
+        """
+        
+        if not rows:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                conn.executemany(query, [
+                    (row['origin'], row['destination'], row['adults'], row['days_ahead'],
+                     row['return_days'], row['next_scan_at'], row['last_scan_at'], row['scans'],
+                     row['changes'], row['change_rate'], row['last_price'], row['score'])
+                    for row in rows
+                ])
+                conn.commit()
+            
+            return len(rows)
+        
+        except Exception as e:
+            print(f"Error guardando planificación de rutas: {str(e)}")
+            return 0
+    
+    def start_monitor_run(self, jobs: List[Dict], host: Optional[str] = None) -> Tuple[int, List[Dict]]:
+        """Registra una nueva ejecución del monitor (ver `Database.start_monitor_run`)"""
+        now = datetime.now()
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO monitor_runs (started_at, updated_at, host, jobs_planned) VALUES (?, ?, ?, ?);",
+                    (now, now, host, len(jobs))
+                )
+                run_id = cursor.lastrowid
+                
+                planned = []
+                for position, job in enumerate(jobs):
+                    cursor = conn.execute("""
+                    INSERT OR IGNORE INTO monitor_run_jobs
+                    (run_id, position, origin, destination, departure_date, return_date, adults,
+                     days_ahead, return_days, priority, target_price, score, change_rate)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+                    """, (run_id, position, job['origin'], job['destination'], job['departure_date'],
+                          job.get('return_date'), job.get('adults', 1), job['days_ahead'],
+                          job.get('return_days') or 0, job.get('priority', 0), job.get('target_price'),
+                          job.get('score'), job.get('change_rate')))
+                    if cursor.rowcount == 1:
+                        planned.append(dict(job, run_job_id=cursor.lastrowid))
+                
+                conn.commit()
+            
+            return run_id, planned
+        
+        except Exception as e:
+            print(f"Error registrando ejecución del monitor: {str(e)}")
+            raise
+    
+    def resume_monitor_run(
+        self,
+        max_age_hours: float = 12,
+        stale_minutes: float = 10,
+        host: Optional[str] = None
+    ) -> Tuple[Optional[int], List[Dict]]:
+        """Retoma la última ejecución del monitor que no terminó (ver `Database.resume_monitor_run`)"""
+        now = datetime.now()
+        try:
+            with self._connection() as conn:
+                row = conn.execute("""
+                SELECT id FROM monitor_runs
+                WHERE started_at >= ?
+                  AND (status = 'interrupted' OR (status = 'running' AND updated_at < ?))
+                ORDER BY started_at DESC
+                LIMIT 1;
+                """, (now - timedelta(hours=max_age_hours), now - timedelta(minutes=stale_minutes))).fetchone()
+                if row is None:
+                    return None, []
+                
+                conn.execute("""
+                UPDATE monitor_runs
+                SET status = 'running', updated_at = ?, resumed = resumed + 1, host = COALESCE(?, host)
+                WHERE id = ?;
+                """, (now, host, row['id']))
+                results = conn.execute("""
+                SELECT id as run_job_id, origin, destination, departure_date, return_date, adults,
+                       days_ahead, return_days, priority, target_price, score, change_rate
+                FROM monitor_run_jobs
+                WHERE run_id = ? AND status = 'pending'
+                ORDER BY position;
+                """, (row['id'],)).fetchall()
+                conn.commit()
+            
+            jobs = []
+            for result in results:
+                job = dict(result)
+                job['departure_date'] = job['departure_date'].isoformat()
+                job['return_date'] = job['return_date'].isoformat() if job['return_date'] else None
+                jobs.append(job)
+            
+            return row['id'], jobs
+        
+        except Exception as e:
+            print(f"Error retomando ejecución del monitor: {str(e)}")
+            return None, []
+    
+    def mark_run_job(self, run_job_id: int, status: str, error: Optional[str] = None) -> bool:
+        """Marca una búsqueda de una ejecución como fallida u omitida (ver `Database.mark_run_job`)"""
+        now = datetime.now()
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute("""
+                UPDATE monitor_run_jobs SET status = ?, error = ?, finished_at = ?
+                WHERE id = ? AND status = 'pending';
+                """, (status, str(error)[:1000] if error else None, now, run_job_id))
+                updated = cursor.rowcount == 1
+                conn.execute("""
+                UPDATE monitor_runs SET updated_at = ?
+                WHERE id = (SELECT run_id FROM monitor_run_jobs WHERE id = ?);
+                """, (now, run_job_id))
+                conn.commit()
+            
+            return updated
+        
+        except Exception as e:
+            print(f"Error actualizando búsqueda de la ejecución: {str(e)}")
+            return False
+    
+    def record_run_job_metrics(self, jobs: List[Dict]) -> int:
+        """
+        Guarda el código HTTP y los tiempos de las búsquedas (ver `Database.record_run_job_metrics`)
+        
+        Returns:
+            Número de búsquedas actualizadas
+        """
+        rows = [
+            (job['http_status'], round(job['fetch_seconds'] * 1000), round(job['latency_seconds'] * 1000),
+             job['run_job_id'])
+            for job in jobs if job.get('run_job_id') is not None
+        ]
+        if not rows:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                conn.executemany("""
+                UPDATE monitor_run_jobs SET http_status = ?, fetch_ms = ?, latency_ms = ?
+                WHERE id = ?;
+                """, rows)
+                conn.commit()
+            
+            return len(rows)
+        
+        except Exception as e:
+            print(f"Error guardando métricas de búsquedas: {str(e)}")
+            return 0
+    
+    def finish_monitor_run(
+        self,
+        run_id: int,
+        status: str = 'completed',
+        metrics: Optional[Dict] = None
+    ) -> Dict:
+        """Cierra una ejecución del monitor con sus totales (ver `Database.finish_monitor_run`)"""
+        now = datetime.now()
+        metrics = metrics or {}
+        try:
+            with self._connection() as conn:
+                totals = conn.execute("""
+                SELECT SUM(status = 'done') as done, SUM(status = 'failed') as failed,
+                       SUM(status = 'skipped') as skipped, COALESCE(SUM(offers_saved), 0) as offers_saved,
+                       COALESCE(SUM(offers_found), 0) as offers_found
+                FROM monitor_run_jobs
+                WHERE run_id = ?;
+                """, (run_id,)).fetchone()
+                conn.execute("""
+                UPDATE monitor_runs
+                SET status = ?, updated_at = ?, finished_at = ?, jobs_done = ?, jobs_failed = ?,
+                    jobs_skipped = ?, offers_saved = ?, offers_found = ?,
+                    duration_seconds = duration_seconds + ?, api_calls = api_calls + ?,
+                    changes = changes + ?, report = COALESCE(?, report)
+                WHERE id = ?;
+                """, (status, now, None if status == 'interrupted' else now, totals['done'] or 0,
+                      totals['failed'] or 0, totals['skipped'] or 0, totals['offers_saved'],
+                      totals['offers_found'], metrics.get('duration_seconds', 0), metrics.get('api_calls', 0),
+                      metrics.get('changes', 0),
+                      json.dumps(metrics['report'], default=str) if metrics.get('report') is not None else None,
+                      run_id))
+                result = conn.execute("SELECT * FROM monitor_runs WHERE id = ?;", (run_id,)).fetchone()
+                conn.commit()
+            
+            return dict(result) if result else {}
+        
+        except Exception as e:
+            print(f"Error cerrando ejecución del monitor: {str(e)}")
+            return {}
+    
+    def get_fresh_scan_keys(self, minutes: float) -> List[Tuple]:
+        """Obtiene las búsquedas terminadas recientemente (ver `Database.get_fresh_scan_keys`)"""
+        query = """
+        SELECT DISTINCT origin, destination, adults, days_ahead, return_days, departure_date
+        FROM monitor_run_jobs
+        WHERE status = 'done' AND finished_at >= ?;
+        """
+        rows = self._fetch_all(query, (datetime.now() - timedelta(minutes=minutes),),
+                               "Error obteniendo búsquedas recientes")
+        return [(row['origin'], row['destination'], row['adults'], row['days_ahead'],
+                 row['return_days'], row['departure_date'].isoformat()) for row in rows]
+    
+    def get_monitor_runs(self, limit: int = 20) -> List[Dict]:
+        """Obtiene el historial de ejecuciones del monitor (ver `Database.get_monitor_runs`)"""
+        query = """
+        SELECT id, started_at, updated_at, finished_at, status, host, resumed,
+               jobs_planned, jobs_done, jobs_failed, jobs_skipped, offers_saved,
+               offers_found, duration_seconds, api_calls, changes
+        FROM monitor_runs
+        ORDER BY started_at DESC
+        LIMIT ?;
+        """
+        return self._fetch_all(query, (limit,), "Error obteniendo ejecuciones del monitor")
+    
+    def record_api_calls(self, calls: int, source: str = 'monitor') -> bool:
+        """Suma llamadas a la API al contador del día (ver `Database.record_api_calls`)"""
+        query = """
+        INSERT INTO api_quota_usage (day, source, calls, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, source) DO UPDATE
+        SET calls = calls + excluded.calls,
+            updated_at = excluded.updated_at;
+        """
+        
+        if calls <= 0:
+            return True
+        
+        try:
+            now = datetime.now()
+            with self._connection() as conn:
+                conn.execute(query, (now.date(), source, calls, now))
+                conn.commit()
+            
+            return True
+        
+        except Exception as e:
+            print(f"Error registrando llamadas a la API: {str(e)}")
+            return False
+    
+    def get_api_usage(self, since) -> List[Dict]:
+        """Obtiene las llamadas a la API por día y origen (ver `Database.get_api_usage`)"""
+        query = """
+        SELECT day, source, calls
+        FROM api_quota_usage
+        WHERE day >= ?
+        ORDER BY day, source;
+        """
+        return self._fetch_all(query, (since,), "Error obteniendo uso de la API")
+    
+    def get_scan_price_observations(self, since) -> List[Dict]:
+        """Obtiene el precio mínimo de cada búsqueda terminada (ver `Database.get_scan_price_observations`)"""
+        query = """
+        SELECT origin, destination, departure_date, return_date, adults,
+               finished_at AS timestamp, min_price AS price
+        FROM monitor_run_jobs
+        WHERE status = 'done' AND finished_at >= ?
+          AND min_price IS NOT NULL AND departure_date >= ?
+        ORDER BY finished_at;
+        """
+        return self._fetch_all(query, (since, date.today()), "Error obteniendo observaciones de precio")
+    
+    def create_price_watch(
+        self,
+        origin: str,
+        destination: str,
+        departure_from: str,
+        target_price: float,
+        departure_to: Optional[str] = None,
+        return_date: Optional[str] = None,
+        adults: Optional[int] = None,
+        currency: str = 'USD',
+        owner: str = 'default',
+        last_price: Optional[float] = None
+    ) -> Optional[int]:
+        """Crea (o reactiva) una vigilancia de precio objetivo (ver `Database.create_price_watch`)"""
+        watch = normalize_watch(origin, destination, departure_from, departure_to, return_date,
+                                adults, target_price, currency)
+        params = dict(watch, owner=owner, last_price=last_price, now=datetime.now())
+        
+        try:
+            with self._connection() as conn:
+                conn.execute("""
+                INSERT INTO price_watches
+                (owner, origin, destination, departure_from, departure_to, return_date, adults,
+                 target_price, currency, last_price, created_at)
+                VALUES (:owner, :origin, :destination, :departure_from, :departure_to,
+                        :return_date, :adults, :target_price, :currency, :last_price, :now)
+                ON CONFLICT (owner, origin, destination, departure_from, departure_to,
+                             COALESCE(return_date, ''), COALESCE(adults, 0), currency)
+                DO UPDATE
+                SET target_price = excluded.target_price,
+                    active = 1,
+                    last_alert_price = NULL,
+                    last_alert_series = NULL,
+                    last_price = COALESCE(excluded.last_price, last_price),
+                    last_price_series = CASE WHEN excluded.last_price IS NULL THEN last_price_series END;
+                """, params)
+                # Con el lock de escritura tomado por el INSERT
+                watch_id = conn.execute("""
+                SELECT id FROM price_watches
+                WHERE owner = :owner AND origin = :origin AND destination = :destination
+                  AND departure_from = :departure_from AND departure_to = :departure_to
+                  AND return_date IS :return_date AND adults IS :adults AND currency = :currency;
+                """, params).fetchone()['id']
+                conn.commit()
+            
+            return watch_id
+        
+        except Exception as e:
+            print(f"Error creando vigilancia de precio: {str(e)}")
+            return None
+    
+    def get_price_watches(self, owner: Optional[str] = None, active_only: bool = True) -> List[Dict]:
+        """Obtiene las vigilancias de precio (ver `Database.get_price_watches`)"""
+        query = """
+        SELECT id, owner, origin, destination, departure_from, departure_to, return_date, adults,
+               target_price, currency, active, last_price, last_checked_at, last_alert_price,
+               last_triggered_at, triggered_count, created_at
+        FROM price_watches
+        WHERE (? IS NULL OR owner = ?)
+          AND (NOT ? OR (active = 1 AND departure_to >= ?))
+        ORDER BY created_at DESC, id DESC;
+        """
+        rows = self._fetch_all(query, (owner, owner, active_only, date.today()),
+                               "Error obteniendo vigilancias de precio")
+        return [dict(row, active=bool(row['active'])) for row in rows]
+    
+    def delete_price_watch(self, watch_id: int) -> bool:
+        """Elimina una vigilancia de precio y sus alertas (ver `Database.delete_price_watch`)"""
+        try:
+            with self._connection() as conn:
+                conn.execute("""
+                DELETE FROM price_alert_deliveries
+                WHERE alert_id IN (SELECT id FROM price_alerts WHERE watch_id = ?);
+                """, (watch_id,))
+                conn.execute("DELETE FROM price_alerts WHERE watch_id = ?;", (watch_id,))
+                deleted = conn.execute("DELETE FROM price_watches WHERE id = ?;", (watch_id,)).rowcount > 0
+                conn.commit()
+            
+            return deleted
+        
+        except Exception as e:
+            print(f"Error eliminando vigilancia de precio: {str(e)}")
+            return False
+    
+    def get_price_alerts(self, owner: Optional[str] = None, limit: int = 50,
+                         since: Optional[datetime] = None) -> List[Dict]:
+        """Obtiene las alertas de precio registradas (ver `Database.get_price_alerts`)"""
+        query = """
+        SELECT id, watch_id, owner, search_id, origin, destination, departure_date, return_date,
+               adults, price, target_price, previous_price, currency, airline, kind, triggered_at
+        FROM price_alerts
+        WHERE (? IS NULL OR owner = ?)
+          AND (? IS NULL OR triggered_at >= ?)
+        ORDER BY triggered_at DESC, id DESC
+        LIMIT ?;
+        """
+        return self._fetch_all(query, (owner, owner, since, since, limit),
+                               "Error obteniendo alertas de precio")
+    
+    def get_price_anomalies(self, limit: int = 50, since: Optional[datetime] = None,
+                            origin: Optional[str] = None, destination: Optional[str] = None) -> List[Dict]:
+        """Obtiene las caídas anómalas de precio detectadas (ver `Database.get_price_anomalies`)"""
+        query = """
+        SELECT id, detected_at, search_id, origin, destination, departure_date, return_date, adults,
+               price, expected_price, zscore, drop_pct, observations, currency, airline
+        FROM price_anomalies
+        WHERE (? IS NULL OR detected_at >= ?)
+          AND (? IS NULL OR origin = ?)
+          AND (? IS NULL OR destination = ?)
+        ORDER BY detected_at DESC, id DESC
+        LIMIT ?;
+        """
+        return self._fetch_all(query, (since, since, origin, origin, destination, destination, limit),
+                               "Error obteniendo anomalías de precio")
+    
+    def get_pending_alerts(self, limit: int = 1000, max_attempts: int = 5) -> List[Dict]:
+        """Obtiene las alertas de precio sin notificar (ver `Database.get_pending_alerts`)"""
+        query = """
+        SELECT a.id, a.watch_id, a.owner, a.search_id, a.origin, a.destination, a.departure_date,
+               a.return_date, a.adults, a.price, a.target_price, a.previous_price, a.currency,
+               a.airline, a.kind, a.triggered_at, a.notify_attempts,
+               (SELECT GROUP_CONCAT(d.channel) FROM price_alert_deliveries d
+                WHERE d.alert_id = a.id) AS delivered
+        FROM price_alerts a
+        WHERE a.notified_at IS NULL AND a.notify_attempts < ?
+        ORDER BY a.triggered_at, a.id
+        LIMIT ?;
+        """
+        rows = self._fetch_all(query, (max_attempts, limit), "Error obteniendo alertas pendientes")
+        return [dict(row, delivered=row['delivered'].split(',') if row['delivered'] else []) for row in rows]
+    
+    def record_alert_deliveries(self, deliveries: List[Tuple[int, str]]) -> int:
+        """Registra entregas de alertas por canal (ver `Database.record_alert_deliveries`)"""
+        if not deliveries:
+            return 0
+        
+        try:
+            now = datetime.now()
+            with self._connection() as conn:
+                recorded = conn.executemany(
+                    "INSERT OR IGNORE INTO price_alert_deliveries (alert_id, channel, delivered_at) VALUES (?, ?, ?);",
+                    [(alert_id, channel, now) for alert_id, channel in deliveries]
+                ).rowcount
+                conn.commit()
+            
+            return recorded
+        
+        except Exception as e:
+            print(f"Error registrando entregas de alertas: {str(e)}")
+            return 0
+    
+    def finish_alert_notifications(self, notified: List[int], failed: Dict[int, str]) -> int:
+        """Cierra el despacho de un lote de alertas (ver `Database.finish_alert_notifications`)"""
+        if not notified and not failed:
+            return 0
+        
+        try:
+            now = datetime.now()
+            with self._connection() as conn:
+                updated = conn.executemany(
+                    "UPDATE price_alerts SET notified_at = ?, notify_error = NULL WHERE id = ?;",
+                    [(now, alert_id) for alert_id in notified]
+                ).rowcount
+                updated += conn.executemany(
+                    "UPDATE price_alerts SET notify_attempts = notify_attempts + 1, notify_error = ? WHERE id = ?;",
+                    [(error, alert_id) for alert_id, error in failed.items()]
+                ).rowcount
+                conn.commit()
+            
+            return updated
+        
+        except Exception as e:
+            print(f"Error actualizando notificaciones de alertas: {str(e)}")
+            return 0
+    
+    def get_database_summary(self) -> Dict:
+        """Obtiene un resumen general de la base (ver `Database.get_database_summary`)"""
+        query = """
+        SELECT
+            COUNT(*) as search_count,
+            MIN(price) as min_price,
+            AVG(price) as avg_price,
+            MAX(price) as max_price,
+            (SELECT COUNT(*) FROM routes) as route_count
+        FROM flight_searches;
+        """
+        rows = self._fetch_all(query, (), "Error obteniendo resumen")
+        return rows[0] if rows else {}
+    
+    def test_connection(self) -> bool:
+        """
+        Prueba la conexión a la base de datos
+        
+        Returns:
+            True si la conexión es exitosa, False en caso contrario
+        """
+        try:
+            with self._connection() as conn:
+                result = conn.execute("SELECT 1;").fetchone()
+            return result is not None
+        except Exception as e:
+            print(f"Error de conexión: {str(e)}")
+            return False
+    
+    def _fetch_all(self, query: str, params, error_message: str) -> List[Dict]:
+        """
+        Ejecuta una consulta de lectura y devuelve las filas como diccionarios
+        
+        Args:
+            query: Consulta SQL con placeholders '?'
+            params: Parámetros de la consulta
+            error_message: Prefijo del mensaje si la consulta falla
+        
+        Returns:
+            Lista de diccionarios (vacía si hay error)
+        """
+        try:
+            with self._connection() as conn:
+                results = conn.execute(query, tuple(params)).fetchall()
+            
+            return [dict(row) for row in results] if results else []
+        
+        except Exception as e:
+            print(f"{error_message}: {str(e)}")
+            return []
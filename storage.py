@@ -0,0 +1,57 @@
+"""
+Selección del backend de almacenamiento según la configuración
+
+- DB_BACKEND = "postgres" (default): `database.Database` sobre PostgreSQL
+- DB_BACKEND = "sqlite": `sqlite_database.SQLiteDatabase` sobre un archivo
+  local (DB_PATH, default "flight_scan.db"), sin servidor ni red
+
+La configuración puede venir de `st.secrets` o de `os.environ`; ambos
+exponen la misma interfaz de diccionario.
+"""
+
+from typing import Mapping
+
+
+def create_database(config: Mapping):
+    """
+    Crea la instancia de base de datos indicada por la configuración
+    
+    Args:
+        config: Mapeo con DB_BACKEND y los parámetros del backend elegido
+            (DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD para PostgreSQL;
+            DB_PATH para SQLite) y opcionalmente DB_CACHE_MB (memoria de la
+            caché de consultas, 0 la desactiva), DB_MAX_CONNECTIONS (tamaño
+            del pool), DB_STATEMENT_TIMEOUT_MS (límite por sentencia) y
+            DB_PREPARED_STATEMENTS (0 desactiva las sentencias preparadas
+            de PostgreSQL)
+    
+    Returns:
+        Instancia de `Database` o `SQLiteDatabase`
+    """
+    backend = str(config.get('DB_BACKEND', 'postgres')).lower()
+    
+    if backend == 'sqlite':
+        # Import diferido: el backend embebido no requiere psycopg2
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(
+            path=config.get('DB_PATH', 'flight_scan.db'),
+            cache_max_mb=float(config.get('DB_CACHE_MB', 32)),
+            max_connections=int(config.get('DB_MAX_CONNECTIONS', 5)),
+            statement_timeout_ms=int(config.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+        )
+    
+    if backend in ('postgres', 'postgresql'):
+        from database import Database
+        return Database(
+            host=config['DB_HOST'],
+            port=int(config.get('DB_PORT', 5432)),
+            database=config['DB_NAME'],
+            user=config['DB_USER'],
+            password=config['DB_PASSWORD'],
+            cache_max_mb=float(config.get('DB_CACHE_MB', 32)),
+            max_connections=int(config.get('DB_MAX_CONNECTIONS', 10)),
+            statement_timeout_ms=int(config.get('DB_STATEMENT_TIMEOUT_MS', 30000)),
+            prepared_statements=str(config.get('DB_PREPARED_STATEMENTS', '1')).lower() not in ('0', 'false')
+        )
+    
+    raise ValueError(f"Backend de base de datos no soportado: {backend}")
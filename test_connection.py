@@ -3,10 +3,32 @@ Script para probar las conexiones a PostgreSQL y Amadeus
 Útil para verificar que todo esté configurado correctamente
 """
 
+import json
 import os
 import sys
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+def local_test_db_config():
+    """
+    Configuración de la base propia de las pruebas que escriben o toman
+    búsquedas de la cola (TEST_DB_HOST, TEST_DB_PORT, TEST_DB_NAME,
+    TEST_DB_USER, TEST_DB_PASSWORD)
+    
+    No tiene valores por defecto: sin TEST_DB_HOST y TEST_DB_NAME devuelve
+    None y las pruebas se omiten, para no correrlas contra la base de producción.
+    """
+    if not os.getenv('TEST_DB_HOST') or not os.getenv('TEST_DB_NAME'):
+        return None
+    return {
+        'host': os.environ['TEST_DB_HOST'],
+        'port': int(os.getenv('TEST_DB_PORT', 5432)),
+        'database': os.environ['TEST_DB_NAME'],
+        'user': os.getenv('TEST_DB_USER', 'postgres'),
+        'password': os.getenv('TEST_DB_PASSWORD', '')
+    }
+
 def test_database_connection():
     """Prueba la conexión a PostgreSQL"""
     print("\n" + "="*60)
@@ -28,30 +50,21 @@ def test_database_connection():
         db = Database(**db_config)
         
         # Contar registros
-        with db.conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM flight_searches")
-            count = cur.fetchone()[0]
+        stats = db.get_database_summary()
+        if not stats:
+            raise RuntimeError("No se pudo leer el resumen de la base")
+        count = stats['search_count']
         
         print(f"✅ Conexión exitosa")
         print(f"📊 Registros en base de datos: {count}")
         
         # Obtener estadísticas básicas
         if count > 0:
-            with db.conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        MIN(price) as min_price,
-                        AVG(price) as avg_price,
-                        MAX(price) as max_price,
-                        COUNT(DISTINCT origin || '-' || destination) as routes
-                    FROM flight_searches
-                """)
-                stats = cur.fetchone()
-                print(f"\nEstadísticas:")
-                print(f"  Precio mínimo: ${stats[0]:.2f}")
-                print(f"  Precio promedio: ${stats[1]:.2f}")
-                print(f"  Precio máximo: ${stats[2]:.2f}")
-                print(f"  Rutas únicas: {stats[3]}")
+            print(f"\nEstadísticas:")
+            print(f"  Precio mínimo: ${stats['min_price']:.2f}")
+            print(f"  Precio promedio: ${stats['avg_price']:.2f}")
+            print(f"  Precio máximo: ${stats['max_price']:.2f}")
+            print(f"  Rutas únicas: {stats['route_count']}")
         
         db.close()
         return True
@@ -60,6 +73,516 @@ def test_database_connection():
         print(f"❌ Error: {e}")
         return False
 
+def test_schema_creation():
+    """
+    Prueba que `Database()` cree el esquema completo sobre una base vacía y
+    que volver a abrirla (migraciones) no falle
+    
+    Crea una base temporaria en el servidor de pruebas (ver
+    `local_test_db_config`) y la elimina al terminar.
+    """
+    print("\n" + "="*60)
+    print("PROBANDO CREACIÓN DEL ESQUEMA EN POSTGRESQL")
+    print("="*60)
+    
+    db_config = local_test_db_config()
+    if db_config is None:
+        print("⏭️  Sin base de pruebas local (TEST_DB_HOST y TEST_DB_NAME); prueba omitida")
+        return True
+    
+    try:
+        import psycopg2
+        from database import Database
+        
+        fresh_name = f"{db_config['database']}_schema_{os.getpid()}"
+        admin = psycopg2.connect(**db_config)
+        admin.autocommit = True
+        try:
+            with admin.cursor() as cur:
+                cur.execute(f'CREATE DATABASE "{fresh_name}"')
+            
+            fresh_config = dict(db_config, database=fresh_name)
+            with Database(**fresh_config, cache_max_mb=0) as db:
+                with db._connection() as conn:
+                    cur = conn.cursor()
+                    cur.execute("""
+                        SELECT COUNT(*) FROM pg_indexes
+                        WHERE indexname IN ('idx_price_watches_unique', 'idx_price_alerts_pending', 'idx_seen')
+                    """)
+                    indexes = cur.fetchone()[0]
+                    cur.close()
+            with Database(**fresh_config, cache_max_mb=0):
+                pass
+        finally:
+            with admin.cursor() as cur:
+                cur.execute(f'DROP DATABASE IF EXISTS "{fresh_name}"')
+            admin.close()
+        
+        if indexes != 3:
+            print(f"❌ Faltan índices en el esquema nuevo ({indexes} de 3)")
+            return False
+        
+        print("✅ Esquema creado sobre una base vacía y reabierto sin errores")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error creando el esquema: {str(e)}")
+        return False
+
+def test_concurrent_access(threads=32, operations=25, max_connections=5):
+    """
+    Prueba de concurrencia: muchos hilos comparten una instancia de Database
+    (como las sesiones de Streamlit) y al cerrar no deben quedar conexiones
+    abiertas ni en el pool ni en el servidor
+    """
+    print("\n" + "="*60)
+    print("PROBANDO ACCESO CONCURRENTE")
+    print("="*60)
+    
+    try:
+        import threading
+        import psycopg2
+        from database import Database
+        
+        db_config = local_test_db_config()
+        if db_config is None:
+            print("⏭️  Sin base de pruebas local (TEST_DB_HOST y TEST_DB_NAME); prueba omitida")
+            return True
+        application_name = f"flight_scan_test_{os.getpid()}"
+        
+        def server_connections():
+            """Cuenta las conexiones de esta prueba vistas por el servidor"""
+            conn = psycopg2.connect(**db_config)
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT COUNT(*) FROM pg_stat_activity WHERE application_name = %s",
+                (application_name,)
+            )
+            count = cur.fetchone()[0]
+            conn.close()
+            return count
+        
+        errors = []
+        peak = [0]
+        peak_lock = threading.Lock()
+        
+        # Sin caché para que cada operación llegue a la base
+        with Database(**db_config, cache_max_mb=0, max_connections=max_connections,
+                      application_name=application_name) as db:
+            routes = db.get_unique_routes() or [('EZE', 'MIA')]
+            start = threading.Barrier(threads)
+            
+            def worker(index):
+                start.wait()
+                for i in range(operations):
+                    origin, destination = routes[(index + i) % len(routes)]
+                    try:
+                        if i % 4 == 0:
+                            ok = db.test_connection()
+                        elif i % 4 == 1:
+                            ok = isinstance(db.get_price_statistics(origin, destination), dict)
+                        elif i % 4 == 2:
+                            ok = isinstance(db.get_searches_by_route(origin, destination, days=7), list)
+                        else:
+                            ok = bool(db.get_database_summary())
+                        if not ok:
+                            errors.append(f"hilo {index}: operación {i} sin resultado")
+                    except Exception as e:
+                        errors.append(f"hilo {index}: {e}")
+                    
+                    in_use = db.pool_stats()['in_use']
+                    with peak_lock:
+                        peak[0] = max(peak[0], in_use)
+            
+            started = datetime.now()
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = (datetime.now() - started).total_seconds()
+            
+            stats = db.pool_stats()
+            open_while_running = server_connections()
+        
+        open_after_close = server_connections()
+        
+        total = threads * operations
+        print(f"Operaciones: {total} en {threads} hilos ({elapsed:.1f}s, {total / elapsed:.0f} op/s)")
+        print(f"Conexiones: pico en uso {peak[0]}/{max_connections}, "
+              f"préstamos {stats['checkouts']}, en uso al terminar {stats['in_use']}")
+        print(f"Conexiones en el servidor: {open_while_running} antes de cerrar, {open_after_close} después")
+        
+        problems = list(errors[:5])
+        if stats['in_use'] != 0:
+            problems.append(f"{stats['in_use']} conexiones sin devolver al pool")
+        if open_while_running > max_connections:
+            problems.append(f"{open_while_running} conexiones abiertas (máximo {max_connections})")
+        if open_after_close != 0:
+            problems.append(f"{open_after_close} conexiones abiertas después de close()")
+        
+        if problems:
+            print(f"❌ {len(errors)} errores")
+            for problem in problems:
+                print(f"  - {problem}")
+            return False
+        
+        print("✅ Sin errores ni conexiones perdidas")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+def test_job_queue(workers=4, jobs=40, work_seconds=0.1):
+    """
+    Prueba de la cola de búsquedas (scan_jobs): varios workers no deben
+    procesar la misma búsqueda dos veces, el rendimiento debe crecer con la
+    cantidad de workers y una búsqueda con lease vencida debe recuperarse
+    
+    Corre contra la base de pruebas (ver `local_test_db_config`) con una ruta
+    ficticia (ZZQ → ZZR) y un cliente de API simulado, sin registrar cuota;
+    se omite si la cola de esa base tiene otras búsquedas pendientes.
+    """
+    print("\n" + "="*60)
+    print("PROBANDO COLA DE BÚSQUEDAS")
+    print("="*60)
+    
+    try:
+        import threading
+        import time
+        from database import Database
+        from scan_worker import ScanWorker
+        
+        db_config = local_test_db_config()
+        if db_config is None:
+            print("⏭️  Sin base de pruebas local (TEST_DB_HOST y TEST_DB_NAME); prueba omitida")
+            return True
+        
+        class SimulatedClient:
+            """Simula la latencia de la API sin devolver ofertas"""
+            def search_flights(self, **kwargs):
+                time.sleep(work_seconds)
+                return []
+        
+        def test_jobs():
+            today = datetime.now().date()
+            return [{
+                'origin': 'ZZQ', 'destination': 'ZZR', 'adults': 1,
+                'departure_date': (today + timedelta(days=days)).isoformat(), 'return_date': None,
+                'days_ahead': days, 'return_days': None, 'priority': 0, 'target_price': None
+            } for days in range(1, jobs + 1)]
+        
+        def cleanup(db):
+            with db._connection() as conn:
+                cur = conn.cursor()
+                cur.execute("DELETE FROM scan_jobs WHERE origin = 'ZZQ'")
+                cur.execute("DELETE FROM route_schedule WHERE origin = 'ZZQ'")
+                conn.commit()
+        
+        def drain(db, count):
+            """Procesa la cola con `count` workers y devuelve (segundos, completadas por worker)"""
+            pool = [ScanWorker(db, SimulatedClient(), f"test-{os.getpid()}-{n}", log=lambda _: None)
+                    for n in range(count)]
+            threads = [threading.Thread(target=worker.run) for worker in pool]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return time.perf_counter() - started, [worker.stats['done'] for worker in pool]
+        
+        with Database(**db_config, cache_max_mb=0, max_connections=workers + 2) as db:
+            cleanup(db)
+            stats = db.get_scan_queue_stats()
+            if stats.get('pending') or stats.get('running'):
+                print(f"⏭️  La cola tiene {stats['pending']} búsquedas pendientes y {stats['running']} en curso; "
+                      f"ejecuta la prueba contra una base local")
+                return True
+            
+            problems = []
+            
+            # Rendimiento con 1 worker y con varios
+            enqueued = db.enqueue_scan_jobs(test_jobs())
+            duplicate = db.enqueue_scan_jobs(test_jobs())
+            if enqueued != jobs or duplicate != 0:
+                problems.append(f"encoladas {enqueued} y {duplicate} duplicadas (esperado {jobs} y 0)")
+            single_seconds, single_done = drain(db, 1)
+            
+            db.enqueue_scan_jobs(test_jobs())
+            multi_seconds, multi_done = drain(db, workers)
+            
+            if sum(single_done) != jobs or sum(multi_done) != jobs:
+                problems.append(f"completadas {sum(single_done)} y {sum(multi_done)} (esperado {jobs})")
+            with db._connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM scan_jobs "
+                            "WHERE origin = 'ZZQ' AND status = 'done'")
+                done_rows, distinct_rows = cur.fetchone()
+            if done_rows != 2 * jobs or distinct_rows != done_rows:
+                problems.append(f"{done_rows} filas terminadas (esperado {2 * jobs})")
+            
+            speedup = single_seconds / multi_seconds
+            print(f"1 worker: {jobs / single_seconds:.1f} búsquedas/s; "
+                  f"{workers} workers: {jobs / multi_seconds:.1f} búsquedas/s ({speedup:.1f}x)")
+            print(f"Reparto entre workers: {multi_done}")
+            if speedup < workers * 0.6:
+                problems.append(f"aceleración {speedup:.1f}x con {workers} workers")
+            
+            # Recuperación de una búsqueda con lease vencida
+            db.enqueue_scan_jobs(test_jobs()[:1])
+            ghost = db.claim_scan_jobs('test-ghost', 1, lease_seconds=1)
+            time.sleep(1.5)
+            reclaimed = db.reclaim_expired_scan_jobs()
+            retried = db.claim_scan_jobs('test-retry', 1, lease_seconds=60)
+            late = db.complete_scan_job(ghost[0]['id'], 'test-ghost', 0, 0) if ghost else True
+            finished = db.complete_scan_job(retried[0]['id'], 'test-retry', 0, 0) if retried else False
+            
+            print(f"Lease vencida: {reclaimed} recuperadas, reintento {'✅' if finished else '❌'}, "
+                  f"resultado tardío {'rechazado ✅' if not late else 'aceptado ❌'}")
+            if not (ghost and reclaimed >= 1 and retried and retried[0]['id'] == ghost[0]['id']
+                    and retried[0]['attempts'] == 2 and finished and not late):
+                problems.append("la búsqueda con lease vencida no se recuperó correctamente")
+            
+            cleanup(db)
+        
+        if problems:
+            print("❌ Problemas en la cola:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return False
+        
+        print("✅ Sin búsquedas duplicadas ni perdidas")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+@contextmanager
+def sqlite_test_db():
+    """Base SQLite temporaria (sin caché) para las pruebas de reglas de almacenamiento"""
+    from sqlite_database import SQLiteDatabase
+    
+    with tempfile.TemporaryDirectory() as directory:
+        with SQLiteDatabase(os.path.join(directory, 'test.db'), cache_max_mb=0) as db:
+            yield db
+
+def insert_test_offer(db, price, change_only=True, departure_date=None, **flight_data):
+    """Inserta una oferta de la ruta ficticia ZZQ → ZZR y devuelve su ID"""
+    departure_date = departure_date or (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    flight_data = dict({'airline_code': 'ZZ', 'departure_time': f"{departure_date}T10:00:00",
+                        'stops': 0, 'duration': '5h 0m'}, **flight_data)
+    return db.insert_flight_offer('ZZQ', 'ZZR', departure_date, None, 1, price, 'USD', 'Test Air',
+                                  flight_data, change_only=change_only)
+
+def check_retention_keeps_seen_rows(db):
+    """
+    Con `change_only`, una observación vieja pero vista hace poco (last_seen)
+    sobrevive a `delete_old_searches` y la siguiente búsqueda sin cambios la
+    sigue reutilizando
+    """
+    problems = []
+    seen_id = insert_test_offer(db, 500.0)
+    stale_id = insert_test_offer(db, 450.0, departure_time='2030-01-01T22:00:00')
+    
+    old = datetime.now() - timedelta(days=120)
+    with db._connection() as conn:
+        conn.execute("UPDATE flight_searches SET search_timestamp = ?, last_seen = ?;", (old, old))
+        conn.commit()
+    
+    if insert_test_offer(db, 500.0) != seen_id:
+        problems.append("la oferta sin cambios no reutilizó su observación")
+    deleted = db.delete_old_searches(days=90)
+    if deleted != 1:
+        problems.append(f"{deleted} filas eliminadas (esperado 1, la observación {stale_id})")
+    if db.get_flight_by_id(seen_id) is None:
+        problems.append("se eliminó la observación vista hace poco")
+    if insert_test_offer(db, 500.0) != seen_id:
+        problems.append("después de la limpieza, la oferta sin cambios generó una fila nueva")
+    if db.delete_old_searches(before=(datetime.now() + timedelta(days=1)).date()) != 1:
+        problems.append("una fecha de corte sin hora (date) no eliminó la observación restante")
+    return problems
+
+def check_watch_window_batches(db):
+    """
+    Una vigilancia con ventana de varias fechas avisa una sola vez por la
+    fecha barata aunque los lotes (una fecha por lote, como el monitor)
+    alternen con una fecha más cara, y no se duplica con altas concurrentes
+    """
+    import threading
+    
+    problems = []
+    cheap = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    expensive = (datetime.now() + timedelta(days=32)).strftime('%Y-%m-%d')
+    watch_id = db.create_price_watch('ZZQ', 'ZZR', cheap, 400.0, departure_to=expensive, owner='test')
+    
+    insert_test_offer(db, 350.0, departure_date=cheap)
+    insert_test_offer(db, 600.0, departure_date=expensive)
+    insert_test_offer(db, 350.0, departure_date=cheap, change_only=False)
+    alerts = db.get_price_alerts(owner='test')
+    if len(alerts) != 1:
+        problems.append(f"{len(alerts)} alertas (esperado 1 por la fecha barata)")
+    watch = next((w for w in db.get_price_watches(owner='test') if w['id'] == watch_id), None)
+    if watch is None or float(watch['last_price']) != 350.0:
+        problems.append(f"último precio {watch and watch['last_price']} (esperado 350, el más barato de la ventana)")
+    
+    # La fecha que avisó vuelve a subir: se rearma y avisa al bajar de nuevo
+    insert_test_offer(db, 450.0, departure_date=cheap)
+    insert_test_offer(db, 380.0, departure_date=cheap)
+    if len(db.get_price_alerts(owner='test')) != 2:
+        problems.append("la vigilancia no se rearmó cuando la fecha que avisó subió del objetivo")
+    
+    created = []
+    start = threading.Barrier(8)
+    
+    def create():
+        start.wait()
+        created.append(db.create_price_watch('ZZQ', 'ZZR', expensive, 300.0, owner='concurrent'))
+    
+    threads = [threading.Thread(target=create) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    watches = db.get_price_watches(owner='concurrent')
+    if len(watches) != 1 or set(created) != {watches[0]['id'] if watches else None}:
+        problems.append(f"{len(watches)} vigilancias tras 8 altas concurrentes (esperado 1)")
+    return problems
+
+# Reglas de almacenamiento verificadas contra una base SQLite temporaria
+def check_cache_sees_foreign_deletes(db):
+    """
+    Una instancia con caché sobre la misma base ve las limpiezas hechas por
+    otro proceso aunque no cambien el máximo id ni la dimensión de rutas
+    """
+    from sqlite_database import SQLiteDatabase
+    
+    problems = []
+    stale_id = insert_test_offer(db, 450.0, departure_time='2030-01-01T22:00:00')
+    insert_test_offer(db, 500.0)
+    old = datetime.now() - timedelta(days=120)
+    with db._connection() as conn:
+        conn.execute("UPDATE flight_searches SET search_timestamp = ?, last_seen = ? WHERE id = ?;",
+                     (old, old, stale_id))
+        conn.commit()
+    
+    with SQLiteDatabase(db.path) as reader:
+        reader.query_cache.generation_ttl = 0
+        if len(reader.get_recent_searches()) != 2:
+            problems.append("la lectura inicial no devolvió las 2 observaciones")
+        if db.delete_old_searches(days=90) != 1:
+            problems.append("la limpieza no eliminó la observación vieja")
+        if any(row['id'] == stale_id for row in reader.get_recent_searches()):
+            problems.append("la caché siguió sirviendo la observación eliminada por otra instancia")
+    return problems
+
+def check_payload_ignores_offer_id(db):
+    """
+    Dos ofertas que solo difieren en el `id` de la respuesta comparten una
+    fila de `flight_payloads`, y cada una recupera su propio `id`
+    """
+    problems = []
+    raw_data = {'type': 'flight-offer', 'price': {'total': '500.00', 'currency': 'USD'},
+                'itineraries': [{'segments': [{'carrierCode': 'ZZ', 'number': '100'}]}]}
+    ids = [insert_test_offer(db, 500.0, change_only=False, raw_data=dict(raw_data, id=offer_id))
+           for offer_id in ('1', '7')]
+    
+    with db._connection() as conn:
+        payloads = conn.execute("SELECT COUNT(*) FROM flight_payloads;").fetchone()[0]
+    if payloads != 1:
+        problems.append(f"{payloads} payloads guardados (esperado 1)")
+    for flight_id, offer_id in zip(ids, ('1', '7')):
+        flight = db.get_flight_by_id(flight_id)
+        if flight is None or flight['flight_data'].get('raw_data') != dict(raw_data, id=offer_id):
+            problems.append(f"la observación {flight_id} no recuperó su raw_data con id {offer_id}")
+    return problems
+
+def check_backfill_partial_durations(db):
+    """
+    `backfill_typed_columns` interpreta duraciones de solo horas o solo
+    minutos igual que la ingesta
+    """
+    problems = []
+    expected = {}
+    for hour, duration, minutes in ((8, '5h', 300), (9, '45m', 45), (10, '10h 30m', 630), (11, 'N/A', None)):
+        flight_id = insert_test_offer(db, 500.0 + hour, departure_time=f'2030-01-01T{hour:02d}:00:00',
+                                      duration=duration)
+        expected[flight_id] = (duration, minutes)
+    
+    with db._connection() as conn:
+        conn.execute("UPDATE flight_searches SET duration_minutes = NULL;")
+        conn.commit()
+    
+    updated = db.backfill_typed_columns()
+    if updated != 3:
+        problems.append(f"{updated} filas completadas (esperado 3)")
+    with db._connection() as conn:
+        stored = dict(conn.execute("SELECT id, duration_minutes FROM flight_searches;").fetchall())
+    for flight_id, (duration, minutes) in expected.items():
+        if stored.get(flight_id) != minutes:
+            problems.append(f"duración '{duration}' → {stored.get(flight_id)} (esperado {minutes})")
+    return problems
+
+def check_backfill_skips_malformed(db):
+    """
+    Un valor heredado mal formado (asientos, escalas, horarios) queda en NULL
+    sin impedir que `backfill_typed_columns` complete el resto del lote
+    """
+    problems = []
+    broken_id = insert_test_offer(db, 500.0, departure_time='2030-01-01T08:00:00', duration='5h')
+    valid_id = insert_test_offer(db, 510.0, departure_time='2030-01-01T09:00:00', duration='45m')
+    
+    with db._connection() as conn:
+        flight_data = json.loads(conn.execute("SELECT flight_data FROM flight_searches WHERE id = ?;",
+                                              (broken_id,)).fetchone()[0])
+        flight_data.update(stops='directo', number_of_bookable_seats='muchos',
+                           departure_time='2030-02-30T08:00:00', arrival_time='mañana')
+        conn.execute("UPDATE flight_searches SET flight_data = ? WHERE id = ?;", (json.dumps(flight_data), broken_id))
+        conn.execute("UPDATE flight_searches SET duration_minutes = NULL, stops = NULL, departure_at = NULL;")
+        conn.commit()
+    
+    updated = db.backfill_typed_columns()
+    if updated != 2:
+        problems.append(f"{updated} filas completadas (esperado 2)")
+    with db._connection() as conn:
+        stored = {row['id']: row for row in conn.execute(
+            "SELECT id, duration_minutes, stops, departure_at FROM flight_searches;")}
+    if stored[broken_id]['duration_minutes'] != 300 or stored[broken_id]['departure_at'] is not None:
+        problems.append("la fila con datos mal formados no quedó con duración 300 y salida NULL")
+    if stored[valid_id]['duration_minutes'] != 45 or stored[valid_id]['stops'] != 0:
+        problems.append("la fila válida del mismo lote no se completó")
+    return problems
+
+STORAGE_CHECKS = [
+    ("Retención por last_seen", check_retention_keeps_seen_rows),
+    ("Vigilancias con ventana de fechas", check_watch_window_batches),
+    ("Caché ante limpiezas de otro proceso", check_cache_sees_foreign_deletes),
+    ("Payload sin el id de la respuesta", check_payload_ignores_offer_id),
+    ("Backfill de duraciones parciales", check_backfill_partial_durations),
+    ("Backfill con datos heredados mal formados", check_backfill_skips_malformed)
+]
+
+def test_storage_rules():
+    """Prueba reglas de almacenamiento sobre SQLite (no requiere servidores)"""
+    print("\n" + "="*60)
+    print("PROBANDO REGLAS DE ALMACENAMIENTO (SQLITE)")
+    print("="*60)
+    
+    ok = True
+    for name, check in STORAGE_CHECKS:
+        try:
+            with sqlite_test_db() as db:
+                problems = check(db)
+        except Exception as e:
+            problems = [f"error: {e}"]
+        
+        print(f"{'✅' if not problems else '❌'} {name}")
+        for problem in problems:
+            print(f"  - {problem}")
+        ok = ok and not problems
+    return ok
+
 def test_amadeus_connection():
     """Prueba la conexión a la API de Amadeus"""
     print("\n" + "="*60)
@@ -192,14 +715,26 @@ def main():
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     results = {
+        'storage': False,
         'database': False,
+        'schema': False,
+        'concurrency': False,
+        'job_queue': False,
         'amadeus': False,
         'workflow': False
     }
     
+    # Prueba 0: Reglas de almacenamiento (SQLite temporaria)
+    results['storage'] = test_storage_rules()
+    
     # Prueba 1: Base de datos
     results['database'] = test_database_connection()
     
+    # Prueba 1b: Esquema, acceso concurrente y cola (contra la base de pruebas TEST_DB_*)
+    results['schema'] = test_schema_creation()
+    results['concurrency'] = test_concurrent_access()
+    results['job_queue'] = test_job_queue()
+    
     # Prueba 2: API Amadeus
     results['amadeus'] = test_amadeus_connection()
     
@@ -214,12 +749,16 @@ def main():
     print("\n" + "="*60)
     print("RESUMEN DE PRUEBAS")
     print("="*60)
+    print(f"Almacenamiento:  {'✅ PASS' if results['storage'] else '❌ FAIL'}")
     print(f"PostgreSQL:      {'✅ PASS' if results['database'] else '❌ FAIL'}")
+    print(f"Esquema:         {'✅ PASS' if results['schema'] else '❌ FAIL'}")
+    print(f"Concurrencia:    {'✅ PASS' if results['concurrency'] else '❌ FAIL'}")
+    print(f"Cola búsquedas:  {'✅ PASS' if results['job_queue'] else '❌ FAIL'}")
     print(f"Amadeus API:     {'✅ PASS' if results['amadeus'] else '❌ FAIL'}")
     print(f"Flujo completo:  {'✅ PASS' if results['workflow'] else '⏭️  SKIP'}")
     print("="*60)
     
-    if all([results['database'], results['amadeus']]):
+    if all([results['storage'], results['database'], results['schema'], results['concurrency'], results['job_queue'], results['amadeus']]):
         print("\n🎉 ¡Todo está configurado correctamente!")
         print("Puedes ejecutar: streamlit run app.py")
         return 0
@@ -0,0 +1,202 @@
+"""
+Cola de escritura diferida (write-behind) para ofertas de vuelo
+
+El camino de la petición (por ejemplo una búsqueda en la app) encola las
+ofertas y retorna de inmediato; un hilo en segundo plano las agrupa y las
+escribe con `insert_flight_offers` cuando se junta un lote o vence el
+intervalo de vaciado, reintentando ante fallos transitorios.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from typing import Dict, List
+
+
+class WriteBehindQueue:
+    """Cola acotada con un hilo escritor que persiste ofertas por lotes"""
+    
+    def __init__(
+        self,
+        db,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_queue: int = 10000
+    ):
+        """
+        Inicializa la cola y arranca el hilo escritor
+        
+        Args:
+            db: Instancia de base de datos con `insert_flight_offers`
+            batch_size: Ofertas máximas por escritura
+            flush_interval: Segundos máximos que una oferta espera en la cola
+            max_retries: Reintentos por lote ante errores
+            retry_backoff: Espera inicial entre reintentos (se duplica en cada uno)
+            max_queue: Capacidad de la cola; `enqueue` bloquea si está llena
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        
+        self._enqueued = 0
+        self._written = 0
+        self._failed = 0
+        self._retries = 0
+        self._flushes = 0
+        self._flush_seconds_total = 0.0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+        
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+        atexit.register(self.shutdown)
+    
+    def enqueue(self, offers: List[Dict], change_only: bool = False) -> int:
+        """
+        Encola ofertas para escritura en segundo plano
+        
+        Args:
+            offers: Lista de diccionarios con los campos de `insert_flight_offer`
+            change_only: Guardar solo cambios de precio/disponibilidad
+        
+        Returns:
+            Profundidad de la cola después de encolar
+        """
+        if self._stop.is_set():
+            raise RuntimeError("La cola de escritura está cerrada")
+        
+        for offer in offers:
+            self._queue.put((offer, change_only))
+        
+        with self._stats_lock:
+            self._enqueued += len(offers)
+        
+        return self._queue.qsize()
+    
+    def _run(self):
+        """Bucle del hilo escritor: arma lotes por tamaño o por tiempo"""
+        while True:
+            try:
+                first = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            
+            while len(batch) < self.batch_size:
+                if self._stop.is_set():
+                    # Al cerrar se vacía la cola sin esperar el intervalo
+                    timeout = 0.01
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            self._flush(batch)
+            
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _flush(self, batch: List[tuple]):
+        """Escribe un lote (agrupado por modo de ingesta) con reintentos"""
+        groups: Dict[bool, List[Dict]] = {}
+        for offer, change_only in batch:
+            groups.setdefault(change_only, []).append(offer)
+        
+        for change_only, offers in groups.items():
+            started = time.perf_counter()
+            
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.db.insert_flight_offers(offers, change_only=change_only)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        print(f"Error escribiendo lote de {len(offers)} ofertas (descartado): {str(e)}")
+                        with self._stats_lock:
+                            self._failed += len(offers)
+                        offers = []
+                        break
+                    with self._stats_lock:
+                        self._retries += 1
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+            
+            elapsed = time.perf_counter() - started
+            
+            with self._stats_lock:
+                self._written += len(offers)
+                self._flushes += 1
+                self._flush_seconds_total += elapsed
+                self._last_flush_seconds = elapsed
+                self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+    
+    def flush(self, timeout: float = 30.0) -> bool:
+        """
+        Espera a que se escriba todo lo encolado hasta el momento
+        
+        Args:
+            timeout: Segundos máximos de espera
+        
+        Returns:
+            True si la cola quedó vacía dentro del plazo
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+    
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """
+        Deja de aceptar ofertas, vacía la cola y detiene el hilo escritor
+        
+        Args:
+            timeout: Segundos máximos para vaciar la cola
+        
+        Returns:
+            True si se escribió todo antes del plazo
+        """
+        if self._stop.is_set():
+            return not self._worker.is_alive()
+        
+        self._stop.set()
+        self._worker.join(timeout)
+        return not self._worker.is_alive()
+    
+    def stats(self) -> Dict:
+        """
+        Obtiene las métricas de la cola
+        
+        Returns:
+            Diccionario con queue_depth, enqueued, written, failed, retries,
+            flushes y latencias de vaciado (last/avg/max en segundos)
+        """
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'enqueued': self._enqueued,
+                'written': self._written,
+                'failed': self._failed,
+                'retries': self._retries,
+                'flushes': self._flushes,
+                'last_flush_seconds': self._last_flush_seconds,
+                'avg_flush_seconds': self._flush_seconds_total / self._flushes if self._flushes else 0.0,
+                'max_flush_seconds': self._max_flush_seconds
+            }